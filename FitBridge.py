@@ -1,17 +1,59 @@
 # Import các thư viện cốt lõi
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 # Import từ cấu trúc module mới
-from app.models.chat_models import ChatRequest, ChatResponse
-from app.services.response_service import get_response_with_history
-from config import APP_TITLE, APP_DESCRIPTION, APP_VERSION, CORS_ORIGINS
+from app.models.chat_models import ChatRequest, ChatResponse, ChatBatchRequest, ChatBatchResponse
+from app.services.response_service import get_response_with_history_async, stream_response_with_history, process_chat_batch, gemini_guard
+from app.services.gym_index_service import gym_index, refresh_gym_catalog, start_gym_index_refresher, stop_gym_index_refresher
+from app.services.trainer_catalog_service import trainer_catalog, start_trainer_catalog_refresher, stop_trainer_catalog_refresher
+from app.services.answer_cache_service import answer_cache
+from app.database.connection import (
+    open_async_database_pool,
+    close_async_database_pool,
+    close_database_pool,
+    get_pool_stats,
+    get_async_pool_stats
+)
+from app.database.search_cache import get_search_cache_stats, clear_search_cache
+from app.database.session_store import session_store, SessionNotFoundError
+from app.database.schema import apply_migrations
+from app.database.catalog_listener import start_catalog_listener, stop_catalog_listener
+from app.utils.format_utils import format_sse_event
+from config import APP_TITLE, APP_DESCRIPTION, APP_VERSION, CORS_ORIGINS, DB_AUTO_MIGRATE
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mở pool kết nối bất đồng bộ trong event loop của ứng dụng
+    await open_async_database_pool()
+    # Tạo/cập nhật schema tìm kiếm (materialized view gym_search) trước khi nạp dữ liệu
+    if DB_AUTO_MIGRATE:
+        await asyncio.to_thread(apply_migrations)
+    # Nạp chỉ mục gym và bật làm mới định kỳ ở luồng nền
+    await asyncio.to_thread(start_gym_index_refresher)
+    # Nạp snapshot catalog PT, làm mới định kỳ và khi catalog thay đổi
+    await asyncio.to_thread(start_trainer_catalog_refresher)
+    # Xóa cache tìm kiếm khi dữ liệu gym/PT thay đổi (LISTEN/NOTIFY)
+    start_catalog_listener()
+    yield
+    # Dừng các luồng nền và đóng pool kết nối khi tắt ứng dụng
+    stop_catalog_listener()
+    stop_trainer_catalog_refresher()
+    stop_gym_index_refresher()
+    await close_async_database_pool()
+    close_database_pool()
 
 # Khởi tạo ứng dụng FastAPI
 app = FastAPI(
     title=APP_TITLE,
     description=APP_DESCRIPTION,
-    version=APP_VERSION
+    version=APP_VERSION,
+    lifespan=lifespan,
+    # Serialize phản hồi bằng orjson thay cho json chuẩn
+    default_response_class=ORJSONResponse
 )
 
 # Cấu hình CORS
@@ -23,16 +65,97 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+SESSION_NOT_FOUND = "Không tìm thấy phiên hội thoại"
+
+async def require_session(session_id):
+    """Chỉ chấp nhận session_id do POST /sessions cấp và còn hạn (kho SQLite đọc trong thread riêng)"""
+    if session_id and not await asyncio.to_thread(session_store.exists, session_id):
+        raise HTTPException(status_code=404, detail=SESSION_NOT_FOUND)
+
 # API Endpoints
-@app.post("/chat", summary="Chat với lịch sử hội thoại", response_description="Trả về phản hồi với lịch sử hội thoại")
+@app.post("/chat", response_model=ChatResponse, response_model_exclude_unset=True, summary="Chat với lịch sử hội thoại", response_description="Trả về phản hồi với lịch sử hội thoại")
 async def chat_with_history(request: ChatRequest):
-    return get_response_with_history(
-        user_input=request.prompt,
-        conversation_history=request.conversation_history,
-        longitude=request.longitude,
-        latitude=request.latitude
+    try:
+        return await get_response_with_history_async(
+            user_input=request.prompt,
+            conversation_history=request.conversation_history,
+            longitude=request.longitude,
+            latitude=request.latitude,
+            cursor=request.cursor,
+            page_size=request.page_size,
+            session_id=request.session_id
+        )
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail=SESSION_NOT_FOUND)
+
+@app.post("/chat/stream", summary="Chat dạng streaming (SSE)", response_description="Trả về các sự kiện Server-Sent Events: chunk / result / error / done")
+async def chat_stream(request: ChatRequest):
+    # Kiểm tra phiên trước khi bắt đầu stream (sau đó không thể trả mã lỗi HTTP)
+    await require_session(request.session_id)
+
+    async def event_source():
+        async for event, data in stream_response_with_history(
+            user_input=request.prompt,
+            conversation_history=request.conversation_history,
+            longitude=request.longitude,
+            latitude=request.latitude,
+            cursor=request.cursor,
+            page_size=request.page_size,
+            session_id=request.session_id
+        ):
+            yield format_sse_event(event, data)
+
+    # Tắt buffer của proxy (nginx) để chunk đầu tiên tới client ngay
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.post("/chat/batch", response_model=ChatBatchResponse, response_model_exclude_unset=True, summary="Chat theo lô", response_description="Trả về kết quả từng yêu cầu theo đúng thứ tự, kèm lỗi riêng cho từng phần tử")
+async def chat_batch(request: ChatBatchRequest):
+    return await process_chat_batch(request.requests)
+
+@app.post("/sessions", summary="Tạo phiên hội thoại", response_description="Trả về session_id mới để dùng trong ChatRequest")
+def create_session():
+    return {"session_id": session_store.create()}
+
+@app.get("/sessions/{session_id}", summary="Lịch sử phiên hội thoại", response_description="Trả về các tin nhắn đã lưu của phiên")
+def get_session(session_id: str):
+    messages = session_store.load(session_id)
+    if messages is None:
+        raise HTTPException(status_code=404, detail=SESSION_NOT_FOUND)
+    return {"session_id": session_id, "messages": messages}
+
+@app.delete("/sessions/{session_id}", summary="Xóa phiên hội thoại", response_description="Xóa lịch sử hội thoại đã lưu phía server")
+def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=SESSION_NOT_FOUND)
+    return {"deleted": True}
+
+@app.get("/metrics", summary="Thống kê hệ thống", response_description="Trả về thống kê pool kết nối cơ sở dữ liệu")
+def get_metrics():
+    return {
+        "database_pool": get_pool_stats(),
+        "database_async_pool": get_async_pool_stats(),
+        "gym_index": gym_index.stats(),
+        "trainer_catalog": trainer_catalog.stats(),
+        "search_cache": get_search_cache_stats(),
+        "answer_cache": answer_cache.stats(),
+        "gemini": gemini_guard.stats(),
+        "sessions": session_store.stats()
+    }
+
+@app.post("/gym-index/refresh", summary="Làm mới chỉ mục gym", response_description="Làm mới materialized view gym_search và nạp lại danh sách gym vào chỉ mục")
+def refresh_gym_index():
+    refreshed = refresh_gym_catalog()
+    return {"refreshed": refreshed, "gym_index": gym_index.stats()}
+
+@app.post("/search-cache/clear", summary="Xóa cache tìm kiếm", response_description="Xóa kết quả tìm kiếm gym/PT đã lưu trong bộ nhớ")
+def clear_search_results_cache():
+    clear_search_cache()
+    return {"cleared": True, "search_cache": get_search_cache_stats()}
+
 # Chạy ứng dụng
 if __name__ == "__main__":
     import uvicorn
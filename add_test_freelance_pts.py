@@ -7,7 +7,7 @@ Run this script: python add_test_freelance_pts.py
 import sys
 import uuid
 from datetime import datetime
-from app.database.connection import get_database_connection
+from app.database.connection import get_database_connection, release_database_connection
 
 def add_freelance_pts():
     """Add 5 freelance PTs to the database"""
@@ -310,6 +310,10 @@ def add_freelance_pts():
         conn.rollback()
         return False
 
+    finally:
+        cursor.close()
+        release_database_connection(conn)
+
 if __name__ == "__main__":
     print("🚀 BẮT ĐẦU THÊM 5 PT FREELANCE VÀO DATABASE")
     print("=" * 60)
@@ -1,5 +1,71 @@
 # app/database/__init__.py
 
-from .connection import query_database, get_database_connection, db_config
+from .connection import (
+    query_database,
+    query_database_async,
+    open_async_database_pool,
+    close_async_database_pool,
+    get_database_connection,
+    release_database_connection,
+    close_database_pool,
+    get_pool_stats,
+    get_async_pool_stats,
+    db_config
+)
 
-__all__ = ['query_database', 'get_database_connection', 'db_config']
\ No newline at end of file
+from .search_cache import (
+    query_database_cached,
+    query_database_cached_async,
+    get_search_cache_stats,
+    prime_search_cache,
+    clear_search_cache
+)
+
+from .schema import (
+    apply_migrations,
+    refresh_gym_search
+)
+
+from .catalog_listener import (
+    start_catalog_listener,
+    stop_catalog_listener,
+    add_catalog_change_handler
+)
+
+from .session_store import (
+    SessionNotFoundError,
+    SessionStore,
+    MemorySessionStore,
+    SQLiteSessionStore,
+    create_session_store,
+    session_store
+)
+
+__all__ = [
+    'query_database',
+    'query_database_async',
+    'open_async_database_pool',
+    'close_async_database_pool',
+    'get_database_connection',
+    'release_database_connection',
+    'close_database_pool',
+    'get_pool_stats',
+    'get_async_pool_stats',
+    'db_config',
+    'query_database_cached',
+    'query_database_cached_async',
+    'get_search_cache_stats',
+    'prime_search_cache',
+    'clear_search_cache',
+    'apply_migrations',
+    'refresh_gym_search',
+    'start_catalog_listener',
+    'stop_catalog_listener',
+    'add_catalog_change_handler',
+    'SessionNotFoundError',
+    'SessionStore',
+    'MemorySessionStore',
+    'SQLiteSessionStore',
+    'create_session_store',
+    'session_store'
+]
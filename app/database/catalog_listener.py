@@ -0,0 +1,70 @@
+# app/database/catalog_listener.py - LISTEN for gym/trainer catalog changes and invalidate search caches
+
+import threading
+import psycopg
+from app.database import connection
+from app.database.search_cache import clear_search_cache
+
+# Kênh NOTIFY: trainer_profiles (trigger, xem sql/007_catalog_notify.sql), gym_search (refresh_gym_search)
+# và gym_source (trigger trên bảng nguồn của gym_search, xem sql/008_gym_search_notify.sql)
+CATALOG_CHANNEL = "catalog_changed"
+
+# Thời gian gom các thông báo liên tiếp trước khi xóa cache, và chờ trước khi kết nối lại
+LISTEN_BATCH_SECONDS = 1.0
+RECONNECT_SECONDS = 5.0
+
+_listener_thread = None
+_listener_stop = threading.Event()
+# Hàm được gọi với tập payload (tên bảng) mỗi khi catalog thay đổi, sau khi cache đã được xóa
+_change_handlers = []
+
+def add_catalog_change_handler(handler):
+    """Đăng ký hàm nhận thông báo thay đổi catalog (ví dụ làm mới snapshot trong bộ nhớ)"""
+    if handler not in _change_handlers:
+        _change_handlers.append(handler)
+
+def _notify_handlers(changed):
+    for handler in list(_change_handlers):
+        try:
+            handler(changed)
+        except Exception as e:
+            print(f"❌ CATALOG_LISTENER: Lỗi trong hàm xử lý thay đổi: {str(e)}")
+
+def _listen_loop():
+    while not _listener_stop.is_set():
+        try:
+            # Kết nối riêng (không lấy từ pool) vì LISTEN giữ kết nối suốt vòng đời ứng dụng
+            with psycopg.connect(**connection.db_config, autocommit=True) as conn:
+                conn.execute(f"LISTEN {CATALOG_CHANNEL}")
+                # Thông báo trước khi LISTEN hoặc trong lúc mất kết nối đã bị lỡ: cache và snapshot có thể đã cũ
+                clear_search_cache()
+                _notify_handlers({"listen"})
+                print(f"👂 CATALOG_LISTENER: Đang lắng nghe kênh {CATALOG_CHANNEL}")
+                while not _listener_stop.is_set():
+                    changed = {notify.payload for notify in conn.notifies(timeout=LISTEN_BATCH_SECONDS)}
+                    if changed - {"gym_source"}:
+                        clear_search_cache()
+                        print(f"🧹 CATALOG_LISTENER: {', '.join(sorted(changed))} thay đổi, đã xóa cache tìm kiếm")
+                    # gym_source: kết quả tìm kiếm chỉ đổi sau khi gym_search được làm mới (sẽ có thông báo gym_search)
+                    if changed:
+                        _notify_handlers(changed)
+        except psycopg.Error as e:
+            print(f"❌ CATALOG_LISTENER: Mất kết nối, thử lại sau {RECONNECT_SECONDS:.0f}s: {str(e)}")
+            _listener_stop.wait(RECONNECT_SECONDS)
+
+def start_catalog_listener():
+    """Khởi động luồng nền lắng nghe thay đổi gym/PT và xóa cache tìm kiếm khi có thông báo"""
+    global _listener_thread
+    if _listener_thread is not None and _listener_thread.is_alive():
+        return
+    _listener_stop.clear()
+    _listener_thread = threading.Thread(target=_listen_loop, name="catalog-listener", daemon=True)
+    _listener_thread.start()
+
+def stop_catalog_listener():
+    """Dừng luồng lắng nghe"""
+    global _listener_thread
+    _listener_stop.set()
+    if _listener_thread is not None:
+        _listener_thread.join(timeout=5)
+        _listener_thread = None
@@ -1,7 +1,9 @@
-# app/database/connection.py - Database connection and configuration
+# app/database/connection.py - Database connection pool and configuration
 
 import psycopg
-from config import DATABASE_CONFIG
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool, AsyncConnectionPool, PoolTimeout
+from config import DATABASE_CONFIG, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_SYNC_POOL_MIN_SIZE, DB_SYNC_POOL_MAX_SIZE, DB_POOL_TIMEOUT
 
 # Cấu hình cơ sở dữ liệu PostgreSQL (adjust for psycopg3 naming)
 db_config = {
@@ -13,39 +15,163 @@ db_config = {
     'sslmode': 'prefer'
 }
 
-# Kết nối cơ sở dữ liệu PostgreSQL
+# Pool kết nối PostgreSQL đồng bộ (nhỏ): tác vụ nền và đường gọi đồng bộ, request dùng async_pool
+pool = None
 try:
-    print("Đang kết nối đến cơ sở dữ liệu PostgreSQL...")
+    print("Đang khởi tạo pool kết nối PostgreSQL...")
     print(f"Host: {db_config['host']}")
     print(f"Database: {db_config['dbname']}")
     print(f"Port: {db_config['port']}")
-    
-    conn = psycopg.connect(**db_config)
-    cursor = conn.cursor(row_factory=psycopg.rows.dict_row)
+    print(f"Pool size: {DB_SYNC_POOL_MIN_SIZE}-{DB_SYNC_POOL_MAX_SIZE} (đồng bộ), {DB_POOL_MIN_SIZE}-{DB_POOL_MAX_SIZE} (async), timeout: {DB_POOL_TIMEOUT}s")
+
+    pool = ConnectionPool(
+        kwargs=db_config,
+        min_size=DB_SYNC_POOL_MIN_SIZE,
+        max_size=DB_SYNC_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        check=ConnectionPool.check_connection,  # Kiểm tra kết nối còn sống mỗi lần mượn
+        name="fitbridge",
+        open=False
+    )
+    pool.open(wait=True, timeout=DB_POOL_TIMEOUT)
     print("Kết nối cơ sở dữ liệu PostgreSQL thành công!")
-    
-except psycopg.Error as e:
+
+except (psycopg.Error, PoolTimeout) as e:
     print(f"Kết nối cơ sở dữ liệu thất bại: {e}")
     print("Vui lòng kiểm tra cấu hình cơ sở dữ liệu PostgreSQL")
-    conn = None
-    cursor = None
+    if pool is not None:
+        pool.close()
+    pool = None
+
+# Pool kết nối bất đồng bộ cho pipeline /chat, mở trong event loop của ứng dụng
+async_pool = None
+
+async def open_async_database_pool():
+    """Mở pool kết nối bất đồng bộ (gọi khi ứng dụng khởi động)"""
+    global async_pool
+    if async_pool is not None:
+        return async_pool
+
+    pool_candidate = None
+    try:
+        pool_candidate = AsyncConnectionPool(
+            kwargs=db_config,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            check=AsyncConnectionPool.check_connection,
+            name="fitbridge-async",
+            open=False
+        )
+        await pool_candidate.open(wait=True, timeout=DB_POOL_TIMEOUT)
+        async_pool = pool_candidate
+        print("Pool kết nối bất đồng bộ PostgreSQL đã sẵn sàng!")
+    except (psycopg.Error, PoolTimeout) as e:
+        print(f"Không thể mở pool kết nối bất đồng bộ: {e}")
+        if pool_candidate is not None:
+            await pool_candidate.close()
+    return async_pool
+
+async def close_async_database_pool():
+    """Đóng pool kết nối bất đồng bộ khi ứng dụng dừng"""
+    global async_pool
+    if async_pool is not None:
+        await async_pool.close()
+        async_pool = None
 
 def get_database_connection():
-    """Trả về kết nối cơ sở dữ liệu"""
-    return conn, cursor
+    """Mượn một kết nối từ pool (trả lại bằng release_database_connection)"""
+    if pool is None:
+        return None, None
+    try:
+        conn = pool.getconn()
+    except PoolTimeout as e:
+        print(f"Hết thời gian chờ kết nối từ pool: {e}")
+        return None, None
+    return conn, conn.cursor(row_factory=dict_row)
+
+def release_database_connection(conn):
+    """Trả kết nối đã mượn về pool"""
+    if pool is not None and conn is not None:
+        pool.putconn(conn)
+
+def close_database_pool():
+    """Đóng pool kết nối khi ứng dụng dừng"""
+    if pool is not None:
+        pool.close()
 
-def query_database(query):
-    """Hàm truy vấn cơ sở dữ liệu"""
-    if conn is None or cursor is None:
+def get_pool_stats():
+    """Thống kê pool kết nối: kích thước, số request đang chờ, thời gian chờ"""
+    return _format_pool_stats(pool)
+
+def get_async_pool_stats():
+    """Thống kê pool kết nối bất đồng bộ"""
+    return _format_pool_stats(async_pool)
+
+def _format_pool_stats(target_pool):
+    if target_pool is None:
+        return {"available": False}
+
+    stats = target_pool.get_stats()
+    queued = stats.get("requests_queued", 0)
+    return {
+        "available": True,
+        "pool_min": stats.get("pool_min", target_pool.min_size),
+        "pool_max": stats.get("pool_max", target_pool.max_size),
+        "pool_size": stats.get("pool_size", 0),
+        "pool_available": stats.get("pool_available", 0),
+        "requests_num": stats.get("requests_num", 0),
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "requests_queued": queued,
+        "requests_wait_ms": stats.get("requests_wait_ms", 0),
+        "avg_wait_ms": round(stats.get("requests_wait_ms", 0) / queued, 2) if queued else 0.0,
+        "requests_errors": stats.get("requests_errors", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+        "returns_bad": stats.get("returns_bad", 0)
+    }
+
+def query_database(query, params=None):
+    """
+    Hàm truy vấn cơ sở dữ liệu (mỗi lần gọi mượn một kết nối riêng từ pool)
+    Câu SQL là template cố định với tham số bind, được prepare trên từng kết nối
+    để PostgreSQL chỉ parse/plan mỗi template một lần
+    """
+    if pool is None:
         print("Kết nối cơ sở dữ liệu không khả dụng")
         return "Lỗi kết nối cơ sở dữ liệu"
     
     try:
         print(f"Đang thực thi truy vấn: {query}")
-        cursor.execute(query)
-        results = cursor.fetchall()
+        with pool.connection() as conn:
+            with conn.cursor(row_factory=dict_row) as cursor:
+                cursor.execute(query, params, prepare=True)
+                results = cursor.fetchall()
+        print(f"Kết quả truy vấn: {len(results)} hàng")
+        return results
+    except PoolTimeout as e:
+        print(f"Hết thời gian chờ kết nối từ pool: {str(e)}")
+        return "Lỗi kết nối cơ sở dữ liệu: hết thời gian chờ kết nối"
+    except psycopg.Error as e:
+        print(f"Lỗi cơ sở dữ liệu: {str(e)}")
+        return f"Lỗi cơ sở dữ liệu: {str(e)}"
+
+async def query_database_async(query, params=None):
+    """Phiên bản bất đồng bộ của query_database, không chặn event loop"""
+    if async_pool is None:
+        print("Pool kết nối bất đồng bộ không khả dụng")
+        return "Lỗi kết nối cơ sở dữ liệu"
+
+    try:
+        print(f"Đang thực thi truy vấn (async): {query}")
+        async with async_pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                await cursor.execute(query, params, prepare=True)
+                results = await cursor.fetchall()
         print(f"Kết quả truy vấn: {len(results)} hàng")
         return results
+    except PoolTimeout as e:
+        print(f"Hết thời gian chờ kết nối từ pool: {str(e)}")
+        return "Lỗi kết nối cơ sở dữ liệu: hết thời gian chờ kết nối"
     except psycopg.Error as e:
         print(f"Lỗi cơ sở dữ liệu: {str(e)}")
-        return f"Lỗi cơ sở dữ liệu: {str(e)}"
\ No newline at end of file
+        return f"Lỗi cơ sở dữ liệu: {str(e)}"
@@ -0,0 +1,86 @@
+# app/database/schema.py - SQL migrations and materialized view maintenance
+
+import time
+from pathlib import Path
+import psycopg
+from psycopg_pool import PoolTimeout
+from app.database import connection
+from app.database.catalog_listener import CATALOG_CHANNEL
+
+# Thư mục chứa các file migration, chạy theo thứ tự tên (001_..., 002_...)
+MIGRATIONS_DIR = Path(__file__).parent / "sql"
+
+# Khóa advisory để nhiều worker khởi động cùng lúc không chạy migration song song
+MIGRATION_LOCK_ID = 7351001
+# Khóa advisory (theo transaction) để chỉ một worker chạy REFRESH MATERIALIZED VIEW gym_search
+GYM_SEARCH_REFRESH_LOCK_ID = 7351002
+
+SCHEMA_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version TEXT PRIMARY KEY,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+    """
+
+def list_migrations():
+    """Danh sách (version, path) của các file migration theo thứ tự"""
+    return [(path.stem, path) for path in sorted(MIGRATIONS_DIR.glob("*.sql"))]
+
+def apply_migrations():
+    """
+    Áp dụng các migration chưa chạy, mỗi file trong một transaction riêng
+    Returns: danh sách version vừa áp dụng hoặc chuỗi lỗi
+    """
+    applied_now = []
+    try:
+        # Kết nối riêng (không lấy từ pool) vì migration giữ khóa và transaction lâu
+        with psycopg.connect(**connection.db_config, autocommit=True) as conn:
+            conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            conn.execute(SCHEMA_MIGRATIONS_TABLE)
+            applied = {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+
+            for version, path in list_migrations():
+                if version in applied:
+                    continue
+                start = time.perf_counter()
+                with conn.transaction():
+                    conn.execute(path.read_text(encoding="utf-8"))
+                    conn.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+                applied_now.append(version)
+                print(f"🧱 MIGRATION: Đã áp dụng {version} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+    except psycopg.Error as e:
+        print(f"❌ MIGRATION: Lỗi khi áp dụng migration: {str(e)}")
+        return f"Lỗi cơ sở dữ liệu: {str(e)}"
+
+    if not applied_now:
+        print("🧱 MIGRATION: Schema đã cập nhật, không có migration mới")
+    return applied_now
+
+def refresh_gym_search():
+    """
+    Làm mới materialized view gym_search mà không khóa các truy vấn đọc (CONCURRENTLY)
+    Chỉ một worker làm mới tại một thời điểm (khóa advisory); worker khác bỏ qua và nạp lại chỉ mục khi nhận NOTIFY
+    Returns: thời gian làm mới (ms), None nếu worker khác đang làm mới, hoặc chuỗi lỗi
+    """
+    if connection.pool is None:
+        return "Lỗi kết nối cơ sở dữ liệu"
+
+    try:
+        start = time.perf_counter()
+        with connection.pool.connection() as conn, conn.transaction():
+            locked = conn.execute("SELECT pg_try_advisory_xact_lock(%s)", (GYM_SEARCH_REFRESH_LOCK_ID,)).fetchone()[0]
+            if not locked:
+                print("⏭️ GYM_SEARCH: Worker khác đang làm mới materialized view, bỏ qua")
+                return None
+            conn.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY gym_search")
+            # Báo mọi worker xóa cache tìm kiếm và nạp lại chỉ mục khi commit (xem app/database/catalog_listener.py)
+            conn.execute("SELECT pg_notify(%s, 'gym_search')", (CATALOG_CHANNEL,))
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        print(f"🔄 GYM_SEARCH: Đã làm mới materialized view ({elapsed_ms}ms)")
+        return elapsed_ms
+    except PoolTimeout as e:
+        print(f"Hết thời gian chờ kết nối từ pool: {str(e)}")
+        return "Lỗi kết nối cơ sở dữ liệu: hết thời gian chờ kết nối"
+    except psycopg.Error as e:
+        print(f"❌ GYM_SEARCH: Không thể làm mới materialized view: {str(e)}")
+        return f"Lỗi cơ sở dữ liệu: {str(e)}"
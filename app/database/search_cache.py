@@ -0,0 +1,74 @@
+# app/database/search_cache.py - TTL result cache in front of query_database for search paths
+
+from app.utils.cache_utils import TTLCache
+from app.database.connection import query_database, query_database_async
+from config import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS, SEARCH_CACHE_COORD_DECIMALS, GEO_CACHE_MAX_ENTRIES, GEO_CACHE_TTL_SECONDS
+
+# Tham số tọa độ được làm tròn trong khóa cache (4 chữ số ≈ 11m)
+COORDINATE_PARAMS = {'latitude', 'longitude', 'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude'}
+
+search_cache = TTLCache(max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+
+# Ứng viên tìm gần theo ô geohash (xem app/services/geo_cache_service.py), xóa cùng cache kết quả
+geo_candidate_cache = TTLCache(max_entries=GEO_CACHE_MAX_ENTRIES, ttl_seconds=GEO_CACHE_TTL_SECONDS)
+
+def _freeze(value):
+    """Chuyển list/dict thành tuple để dùng làm khóa"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+def build_search_cache_key(kind, query):
+    """
+    Khóa cache từ đặc tả tìm kiếm đã phân tích: loại tìm kiếm, template SQL và các tham số
+    (từ khóa, quận, mục tiêu, kinh nghiệm, giới tính, loại PT, bán kính, trang)
+    với tọa độ được lượng tử hóa
+    """
+    sql, params = query
+    spec = []
+    for name, value in sorted((params or {}).items()):
+        if name in COORDINATE_PARAMS and value is not None:
+            value = round(float(value), SEARCH_CACHE_COORD_DECIMALS)
+        spec.append((name, _freeze(value)))
+    return (kind, sql, tuple(spec))
+
+def query_database_cached(kind, query):
+    """Truy vấn tìm kiếm qua cache; chỉ lưu kết quả thành công (không lưu chuỗi lỗi)"""
+    key = build_search_cache_key(kind, query)
+    results = search_cache.get(key)
+    if results is not None:
+        print(f"⚡ SEARCH_CACHE: Trả kết quả {kind} từ cache ({len(results)} hàng)")
+        return results
+
+    results = query_database(*query)
+    if not isinstance(results, str):
+        search_cache.set(key, results)
+    return results
+
+async def query_database_cached_async(kind, query):
+    """Phiên bản bất đồng bộ của query_database_cached"""
+    key = build_search_cache_key(kind, query)
+    results = search_cache.get(key)
+    if results is not None:
+        print(f"⚡ SEARCH_CACHE: Trả kết quả {kind} từ cache ({len(results)} hàng)")
+        return results
+
+    results = await query_database_async(*query)
+    if not isinstance(results, str):
+        search_cache.set(key, results)
+    return results
+
+def prime_search_cache(kind, query, results):
+    """Lưu sẵn kết quả cho một truy vấn mà người dùng nhiều khả năng sẽ gửi tiếp"""
+    search_cache.set(build_search_cache_key(kind, query), results)
+
+def get_search_cache_stats():
+    """Thống kê hit/miss của cache kết quả tìm kiếm và cache ứng viên theo ô geohash"""
+    return {**search_cache.stats(), "geo_cells": geo_candidate_cache.stats()}
+
+def clear_search_cache():
+    """Xóa cache kết quả tìm kiếm (ví dụ sau khi dữ liệu gym/PT thay đổi)"""
+    search_cache.clear()
+    geo_candidate_cache.clear()
@@ -0,0 +1,264 @@
+# app/database/session_store.py - Server-side conversation session store (in-memory LRU or SQLite)
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from app.utils.cache_utils import TTLCache
+from config import (
+    SESSION_STORE_BACKEND,
+    SESSION_STORE_PATH,
+    SESSION_TTL_SECONDS,
+    SESSION_MAX_ENTRIES,
+    SESSION_MAX_MESSAGES
+)
+
+class SessionNotFoundError(LookupError):
+    """session_id không do kho phiên cấp (POST /sessions), đã hết hạn hoặc đã bị xóa"""
+
+
+class SessionStore(ABC):
+    """
+    Giao diện kho phiên hội thoại: chỉ phiên do create cấp mới tồn tại; load trả về danh sách
+    tin nhắn (None nếu không có hoặc đã hết hạn), append thêm tin nhắn mới và gia hạn TTL của phiên
+    """
+    backend = "base"
+
+    def __init__(self, ttl_seconds=SESSION_TTL_SECONDS, max_messages=SESSION_MAX_MESSAGES):
+        # TTL 0 nghĩa là phiên hết hạn ngay: create vẫn cấp session_id nhưng không phiên nào dùng được
+        if ttl_seconds <= 0:
+            raise ValueError(f"SESSION_TTL_SECONDS phải lớn hơn 0 (hiện tại: {ttl_seconds})")
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.creates = 0
+        self.loads = 0
+        self.hits = 0
+        self.appends = 0
+
+    def create(self):
+        """Cấp session_id mới (phiên rỗng, hết hạn sau ttl_seconds không hoạt động)"""
+        session_id = uuid.uuid4().hex
+        self._insert(session_id)
+        self.creates += 1
+        return session_id
+
+    @abstractmethod
+    def _insert(self, session_id):
+        """Lưu phiên rỗng mới"""
+
+    @abstractmethod
+    def exists(self, session_id):
+        """Phiên còn hạn hay không (không tính vào thống kê load)"""
+
+    @abstractmethod
+    def load(self, session_id):
+        """Danh sách tin nhắn của phiên, None nếu phiên không tồn tại hoặc đã hết hạn"""
+
+    @abstractmethod
+    def append(self, session_id, messages):
+        """Thêm tin nhắn và gia hạn TTL; SessionNotFoundError nếu phiên không tồn tại hoặc đã hết hạn"""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Xóa phiên, trả về True nếu phiên tồn tại"""
+
+    @abstractmethod
+    def __len__(self):
+        """Số phiên còn hạn"""
+
+    def stats(self):
+        """Thống kê kho phiên cho endpoint /metrics"""
+        return {
+            "backend": self.backend,
+            "sessions": len(self),
+            "ttl_seconds": self.ttl_seconds,
+            "max_messages": self.max_messages,
+            "creates": self.creates,
+            "loads": self.loads,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.loads, 4) if self.loads else 0.0,
+            "appends": self.appends
+        }
+
+
+class MemorySessionStore(SessionStore):
+    """Kho phiên trong bộ nhớ: LRU giới hạn số phiên, phiên hết hạn sau ttl_seconds không hoạt động"""
+    backend = "memory"
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, **kwargs):
+        super().__init__(**kwargs)
+        # TTLCache với max_entries 0 bị tắt và không lưu gì
+        if max_entries <= 0:
+            raise ValueError(f"SESSION_MAX_ENTRIES phải lớn hơn 0 (hiện tại: {max_entries})")
+        self._sessions = TTLCache(max_entries=max_entries, ttl_seconds=self.ttl_seconds)
+        self._lock = threading.Lock()
+
+    def _insert(self, session_id):
+        self._sessions.set(session_id, ())
+
+    def exists(self, session_id):
+        return self._sessions.get(session_id) is not None
+
+    def load(self, session_id):
+        self.loads += 1
+        messages = self._sessions.get(session_id)
+        if messages is None:
+            return None
+        self.hits += 1
+        return list(messages)
+
+    def append(self, session_id, messages):
+        with self._lock:
+            stored = self._sessions.get(session_id)
+            if stored is None:
+                raise SessionNotFoundError(f"Không tìm thấy phiên hội thoại: {session_id}")
+            # Lưu dạng tuple để các request đang đọc không thấy thay đổi
+            self._sessions.set(session_id, (tuple(stored) + tuple(messages))[-self.max_messages:])
+            self.appends += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        stats = super().stats()
+        stats["max_entries"] = self._sessions.max_entries
+        stats["evictions"] = self._sessions.evictions
+        return stats
+
+
+class SQLiteSessionStore(SessionStore):
+    """Kho phiên trên đĩa (SQLite, WAL): giữ phiên qua các lần khởi động lại và dùng chung giữa các worker"""
+    backend = "sqlite"
+
+    # Chu kỳ dọn các phiên hết hạn (giây)
+    PURGE_INTERVAL_SECONDS = 60
+
+    def __init__(self, path=SESSION_STORE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chat_session_messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_session_messages_session
+                ON chat_session_messages (session_id, seq);
+        """)
+
+    def _insert(self, session_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chat_sessions (session_id, expires_at) VALUES (?, ?)",
+                (session_id, time.time() + self.ttl_seconds)
+            )
+
+    def exists(self, session_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM chat_sessions WHERE session_id = ? AND expires_at > ?", (session_id, time.time())
+            ).fetchone() is not None
+
+    def load(self, session_id):
+        self.loads += 1
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] <= time.time():
+                self._delete(session_id)
+                return None
+            rows = self._conn.execute(
+                "SELECT message FROM chat_session_messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, self.max_messages)
+            ).fetchall()
+        self.hits += 1
+        return [json.loads(message) for (message,) in reversed(rows)]
+
+    def append(self, session_id, messages):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # Chỉ gia hạn phiên còn hạn, không tạo phiên mới từ session_id lạ
+                renewed = self._conn.execute(
+                    "UPDATE chat_sessions SET expires_at = ? WHERE session_id = ? AND expires_at > ?",
+                    (now + self.ttl_seconds, session_id, now)
+                ).rowcount
+                if not renewed:
+                    raise SessionNotFoundError(f"Không tìm thấy phiên hội thoại: {session_id}")
+                self._conn.executemany(
+                    "INSERT INTO chat_session_messages (session_id, message) VALUES (?, ?)",
+                    [(session_id, json.dumps(message, ensure_ascii=False)) for message in messages]
+                )
+                # Chỉ giữ max_messages tin nhắn gần nhất của phiên
+                self._conn.execute(
+                    "DELETE FROM chat_session_messages WHERE session_id = ? AND seq <= "
+                    "(SELECT seq FROM chat_session_messages WHERE session_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                    (session_id, session_id, self.max_messages)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.appends += 1
+            if now - self._last_purge >= self.PURGE_INTERVAL_SECONDS:
+                self._purge_expired(now)
+
+    def _delete(self, session_id):
+        self._conn.execute("DELETE FROM chat_session_messages WHERE session_id = ?", (session_id,))
+        return self._conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def _purge_expired(self, now):
+        self._last_purge = now
+        self._conn.execute(
+            "DELETE FROM chat_session_messages WHERE session_id IN "
+            "(SELECT session_id FROM chat_sessions WHERE expires_at <= ?)", (now,)
+        )
+        self._conn.execute("DELETE FROM chat_sessions WHERE expires_at <= ?", (now,))
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._delete(session_id)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM chat_sessions WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+
+    def stats(self):
+        stats = super().stats()
+        stats["path"] = self.path
+        return stats
+
+
+def create_session_store(backend=SESSION_STORE_BACKEND):
+    """Tạo kho phiên theo cấu hình: 'memory' (mặc định) hoặc 'sqlite'"""
+    if backend == "sqlite":
+        print(f"💾 SESSION_STORE: Lưu phiên hội thoại trong SQLite ({SESSION_STORE_PATH})")
+        return SQLiteSessionStore()
+    if backend != "memory":
+        print(f"⚠️ SESSION_STORE: Backend '{backend}' không hỗ trợ, dùng bộ nhớ")
+    return MemorySessionStore()
+
+
+# Kho phiên dùng chung cho toàn ứng dụng
+session_store = create_session_store()
@@ -0,0 +1,75 @@
+-- 001_gym_search.sql - Bảng tìm kiếm gym phi chuẩn hóa (materialized view gym_search)
+-- Mỗi gym đang hoạt động một hàng: địa chỉ đầy đủ, quận, tọa độ DOUBLE PRECISION,
+-- văn bản tìm kiếm không dấu và điểm hot/mới tính sẵn; làm mới bằng refresh_gym_search()
+
+-- Chuẩn hóa giống normalize_vietnamese_text: chữ thường, bỏ dấu tiếng Việt (cả dạng tổ hợp NFD),
+-- ký tự ngoài [a-z0-9] thành khoảng trắng. Dùng translate() nên không cần extension unaccent
+CREATE OR REPLACE FUNCTION fitbridge_search_text(input TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT btrim(regexp_replace(
+        translate(
+            lower(input),
+            'àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđÀÁẠẢÃÂẦẤẬẨẪĂẰẮẶẲẴÈÉẸẺẼÊỀẾỆỂỄÌÍỊỈĨÒÓỌỎÕÔỒỐỘỔỖƠỜỚỢỞỠÙÚỤỦŨƯỪỨỰỬỮỲÝỴỶỸĐ̛̣̀́̂̃̆̉',
+            'aaaaaaaaaaaaaaaaaeeeeeeeeeeeiiiiiooooooooooooooooouuuuuuuuuuuyyyyydaaaaaaaaaaaaaaaaaeeeeeeeeeeeiiiiiooooooooooooooooouuuuuuuuuuuyyyyyd'
+        ),
+        '[^a-z0-9]+', ' ', 'g'
+    ))
+$$;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS gym_search AS
+SELECT
+    u."Id" AS id,
+    u."GymName" AS gymname,
+    u."FullName" AS fullname,
+    COALESCE(
+        CONCAT_WS(', ',
+            NULLIF(a."HouseNumber", ''),
+            NULLIF(a."Street", ''),
+            NULLIF(a."Ward", ''),
+            NULLIF(a."District", ''),
+            NULLIF(a."City", '')
+        ),
+        'Địa chỉ chưa cập nhật'
+    ) AS gymaddress,
+    a."District" AS district,
+    u."TaxCode" AS taxcode,
+    CAST(u."Longitude" AS DOUBLE PRECISION) AS longitude,
+    CAST(u."Latitude" AS DOUBLE PRECISION) AS latitude,
+    u."hotResearch" AS hotresearch,
+    u."AccountStatus" AS accountstatus,
+    u."Email" AS email,
+    u."PhoneNumber" AS phonenumber,
+    u."GymDescription" AS gymdescription,
+    u."AvatarUrl" AS avatarurl,
+    u."GymImages" AS gymimages,
+    u."CreatedAt" AS createdat,
+    u."UpdatedAt" AS updatedat,
+    u."Dob" AS dob,
+    fitbridge_search_text(CONCAT_WS(' ',
+        u."GymName", a."HouseNumber", a."Street", a."Ward", a."District", a."City", u."FullName"
+    )) AS search_text,
+    CASE WHEN u."hotResearch" = true THEN 20 ELSE 0 END AS hot_score,
+    -- Tính theo ngày làm mới gần nhất (view được làm mới định kỳ)
+    CASE WHEN u."CreatedAt" >= (CURRENT_DATE - INTERVAL '1 year') THEN 5 ELSE 0 END AS recency_score
+FROM "AspNetUsers" u
+-- Một địa chỉ đang dùng cho mỗi gym (tránh nhân đôi hàng khi gym có nhiều địa chỉ)
+LEFT JOIN LATERAL (
+    SELECT ad."HouseNumber", ad."Street", ad."Ward", ad."District", ad."City"
+    FROM "Addresses" ad
+    WHERE ad."CustomerId" = u."Id" AND ad."IsEnabled" = true
+    ORDER BY ad."Id"
+    LIMIT 1
+) a ON true
+WHERE u."AccountStatus" = 'Active'
+AND u."GymName" IS NOT NULL
+AND u."GymName" != '';
+
+-- Bắt buộc cho REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS gym_search_id_idx ON gym_search (id);
+
+-- Bounding box của truy vấn gym gần
+CREATE INDEX IF NOT EXISTS gym_search_geo_idx ON gym_search (latitude, longitude)
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+
+-- Danh sách tất cả gym theo thứ tự xếp hạng
+CREATE INDEX IF NOT EXISTS gym_search_ranking_idx ON gym_search (hot_score DESC, recency_score DESC, gymname, id);
@@ -0,0 +1,84 @@
+-- 003_gym_search_fulltext.sql - Tìm gym toàn văn (tsvector có trọng số + GIN) cho GYM_SEARCH_MODE = 'fulltext'
+-- Truy vấn: search_vector @@ to_tsquery('simple', 'kw1:* | kw2:*'), xếp hạng bằng ts_rank_cd
+
+-- Thêm cột vào materialized view phải tạo lại view
+DROP MATERIALIZED VIEW IF EXISTS gym_search;
+
+CREATE MATERIALIZED VIEW gym_search AS
+SELECT
+    u."Id" AS id,
+    u."GymName" AS gymname,
+    u."FullName" AS fullname,
+    COALESCE(
+        CONCAT_WS(', ',
+            NULLIF(a."HouseNumber", ''),
+            NULLIF(a."Street", ''),
+            NULLIF(a."Ward", ''),
+            NULLIF(a."District", ''),
+            NULLIF(a."City", '')
+        ),
+        'Địa chỉ chưa cập nhật'
+    ) AS gymaddress,
+    a."District" AS district,
+    u."TaxCode" AS taxcode,
+    CAST(u."Longitude" AS DOUBLE PRECISION) AS longitude,
+    CAST(u."Latitude" AS DOUBLE PRECISION) AS latitude,
+    u."hotResearch" AS hotresearch,
+    u."AccountStatus" AS accountstatus,
+    u."Email" AS email,
+    u."PhoneNumber" AS phonenumber,
+    u."GymDescription" AS gymdescription,
+    u."AvatarUrl" AS avatarurl,
+    u."GymImages" AS gymimages,
+    u."CreatedAt" AS createdat,
+    u."UpdatedAt" AS updatedat,
+    u."Dob" AS dob,
+    fitbridge_search_text(CONCAT_WS(' ',
+        u."GymName", a."HouseNumber", a."Street", a."Ward", a."District", a."City", u."FullName"
+    )) AS search_text,
+    -- Từng trường đã chuẩn hóa cho điều kiện LIKE theo từ khóa (có chỉ mục trigram riêng)
+    fitbridge_search_text(u."GymName") AS name_text,
+    fitbridge_search_text(CONCAT_WS(' ', a."HouseNumber", a."Street", a."Ward", a."District", a."City")) AS address_text,
+    fitbridge_search_text(u."FullName") AS owner_text,
+    fitbridge_search_text(a."District") AS district_text,
+    -- Vector toàn văn có trọng số: tên gym (A) > địa chỉ (B) > chủ gym (C) > mô tả (D),
+    -- từ văn bản đã bỏ dấu nên cấu hình 'simple' tương đương một cấu hình unaccent
+    setweight(to_tsvector('simple', COALESCE(fitbridge_search_text(u."GymName"), '')), 'A') ||
+    setweight(to_tsvector('simple', COALESCE(fitbridge_search_text(CONCAT_WS(' ', a."HouseNumber", a."Street", a."Ward", a."District", a."City")), '')), 'B') ||
+    setweight(to_tsvector('simple', COALESCE(fitbridge_search_text(u."FullName"), '')), 'C') ||
+    setweight(to_tsvector('simple', COALESCE(fitbridge_search_text(u."GymDescription"), '')), 'D') AS search_vector,
+    CASE WHEN u."hotResearch" = true THEN 20 ELSE 0 END AS hot_score,
+    -- Tính theo ngày làm mới gần nhất (view được làm mới định kỳ)
+    CASE WHEN u."CreatedAt" >= (CURRENT_DATE - INTERVAL '1 year') THEN 5 ELSE 0 END AS recency_score
+FROM "AspNetUsers" u
+-- Một địa chỉ đang dùng cho mỗi gym (tránh nhân đôi hàng khi gym có nhiều địa chỉ)
+LEFT JOIN LATERAL (
+    SELECT ad."HouseNumber", ad."Street", ad."Ward", ad."District", ad."City"
+    FROM "Addresses" ad
+    WHERE ad."CustomerId" = u."Id" AND ad."IsEnabled" = true
+    ORDER BY ad."Id"
+    LIMIT 1
+) a ON true
+WHERE u."AccountStatus" = 'Active'
+AND u."GymName" IS NOT NULL
+AND u."GymName" != '';
+
+CREATE UNIQUE INDEX gym_search_id_idx ON gym_search (id);
+
+CREATE INDEX gym_search_geo_idx ON gym_search (latitude, longitude)
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+
+CREATE INDEX gym_search_ranking_idx ON gym_search (hot_score DESC, recency_score DESC, gymname, id);
+
+CREATE INDEX gym_search_vector_idx ON gym_search USING gin (search_vector);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX gym_search_name_trgm_idx ON gym_search USING gin (name_text gin_trgm_ops);
+        CREATE INDEX gym_search_address_trgm_idx ON gym_search USING gin (address_text gin_trgm_ops);
+        CREATE INDEX gym_search_owner_trgm_idx ON gym_search USING gin (owner_text gin_trgm_ops);
+        CREATE INDEX gym_search_district_trgm_idx ON gym_search USING gin (district_text gin_trgm_ops);
+    END IF;
+END
+$$;
@@ -0,0 +1,139 @@
+-- 004_trainer_profiles.sql - Hồ sơ PT tính sẵn (trainer_profiles) thay cho việc gộp TrainersWithGoals mỗi request
+-- Mỗi PT đang hoạt động (thuộc gym hoặc có gói freelance) một hàng: thông tin cá nhân, chỉ số cơ thể,
+-- mảng mục tiêu tập luyện, is_freelance, tọa độ DOUBLE PRECISION và gym liên kết.
+-- Trigger trên các bảng nguồn làm mới đúng hồ sơ của PT bị thay đổi
+
+-- Định nghĩa hồ sơ PT từ các bảng nguồn (cùng kết quả với CTE TrainersWithGoals cũ)
+CREATE OR REPLACE VIEW trainer_profile_source AS
+SELECT
+    pt."Id" AS id,
+    pt."FullName" AS fullname,
+    pt."Email" AS email,
+    pt."PhoneNumber" AS phonenumber,
+    pt."IsMale" AS ismale,
+    pt."Dob" AS dob,
+    pt."AvatarUrl" AS avatarurl,
+    pt."Bio" AS bio,
+    pt."AccountStatus" AS accountstatus,
+    pt."CreatedAt" AS createdat,
+    pt."UpdatedAt" AS updatedat,
+    pt."GymOwnerId" AS pt_gym_id,
+    CAST(pt."Latitude" AS DOUBLE PRECISION) AS pt_latitude,
+    CAST(pt."Longitude" AS DOUBLE PRECISION) AS pt_longitude,
+    ud."Experience" AS experience,
+    ud."Certificates" AS certificates,
+    ud."Height" AS height,
+    ud."Weight" AS weight,
+    ud."Biceps" AS biceps,
+    ud."Chest" AS chest,
+    ud."Waist" AS waist,
+    (
+        SELECT ARRAY_AGG(DISTINCT gt."Name")
+        FROM "PTGoalTrainings" pgt
+        JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
+        WHERE pgt."ApplicationUsersId" = pt."Id" AND gt."Name" IS NOT NULL
+    ) AS goal_trainings,
+    EXISTS (
+        SELECT 1 FROM "PTFreelancePackages" pfp
+        WHERE pfp."PtId" = pt."Id" AND pfp."IsEnabled" = true
+    ) AS is_freelance
+FROM "AspNetUsers" pt
+LEFT JOIN "UserDetails" ud ON pt."Id" = ud."Id"
+WHERE pt."AccountStatus" = 'Active'
+AND (pt."GymOwnerId" IS NOT NULL OR EXISTS (
+    SELECT 1 FROM "PTFreelancePackages" pfp2
+    WHERE pfp2."PtId" = pt."Id" AND pfp2."IsEnabled" = true
+));
+
+CREATE TABLE trainer_profiles AS SELECT * FROM trainer_profile_source;
+ALTER TABLE trainer_profiles ADD PRIMARY KEY (id);
+
+-- PT thuộc gym: join theo gym
+CREATE INDEX trainer_profiles_gym_idx ON trainer_profiles (pt_gym_id) WHERE pt_gym_id IS NOT NULL;
+
+-- PT tự do: danh sách theo kinh nghiệm
+CREATE INDEX trainer_profiles_freelance_idx ON trainer_profiles (experience DESC NULLS LAST, fullname)
+    WHERE is_freelance = true AND pt_gym_id IS NULL;
+
+-- Lọc theo mục tiêu: goal_trainings && ARRAY[...]
+CREATE INDEX trainer_profiles_goals_idx ON trainer_profiles USING gin (goal_trainings);
+
+-- Làm mới hồ sơ của một PT: xóa rồi tính lại từ trainer_profile_source (không còn là PT thì chỉ xóa)
+CREATE OR REPLACE FUNCTION refresh_trainer_profile(pt_id UUID) RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF pt_id IS NULL THEN
+        RETURN;
+    END IF;
+    -- Khóa theo PT để hai transaction đồng thời không cùng chèn một hồ sơ
+    PERFORM pg_advisory_xact_lock(hashtextextended(pt_id::TEXT, 0));
+    DELETE FROM trainer_profiles WHERE id = pt_id;
+    INSERT INTO trainer_profiles SELECT * FROM trainer_profile_source WHERE id = pt_id;
+END
+$$;
+
+-- Dựng lại toàn bộ bảng (sửa lệch dữ liệu hoặc sau khi nạp hàng loạt với trigger tắt)
+CREATE OR REPLACE FUNCTION rebuild_trainer_profiles() RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE trainer_profiles IN EXCLUSIVE MODE;
+    DELETE FROM trainer_profiles;
+    INSERT INTO trainer_profiles SELECT * FROM trainer_profile_source;
+END
+$$;
+
+-- Trigger dùng chung: TG_ARGV[0] là cột chứa Id của PT trong bảng nguồn
+CREATE OR REPLACE FUNCTION trainer_profiles_sync() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    old_id UUID;
+    new_id UUID;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        old_id := (to_jsonb(OLD) ->> TG_ARGV[0])::UUID;
+        PERFORM refresh_trainer_profile(old_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        new_id := (to_jsonb(NEW) ->> TG_ARGV[0])::UUID;
+        IF new_id IS DISTINCT FROM old_id THEN
+            PERFORM refresh_trainer_profile(new_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- Đổi tên/tắt một mục tiêu ảnh hưởng mọi PT có mục tiêu đó
+CREATE OR REPLACE FUNCTION trainer_profiles_sync_goal() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM refresh_trainer_profile(pgt."ApplicationUsersId")
+    FROM "PTGoalTrainings" pgt
+    WHERE pgt."GoalTrainingsId" = OLD."Id";
+    RETURN NULL;
+END
+$$;
+
+-- Chỉ các cột có trong hồ sơ, tránh làm mới khi Identity cập nhật cột đăng nhập/bảo mật
+CREATE TRIGGER trainer_profiles_users_sync
+AFTER INSERT OR DELETE OR UPDATE OF
+    "FullName", "Email", "PhoneNumber", "IsMale", "Dob", "AvatarUrl", "Bio", "AccountStatus",
+    "CreatedAt", "UpdatedAt", "GymOwnerId", "Latitude", "Longitude"
+ON "AspNetUsers"
+FOR EACH ROW EXECUTE FUNCTION trainer_profiles_sync('Id');
+
+CREATE TRIGGER trainer_profiles_details_sync
+AFTER INSERT OR UPDATE OR DELETE ON "UserDetails"
+FOR EACH ROW EXECUTE FUNCTION trainer_profiles_sync('Id');
+
+CREATE TRIGGER trainer_profiles_goal_links_sync
+AFTER INSERT OR UPDATE OR DELETE ON "PTGoalTrainings"
+FOR EACH ROW EXECUTE FUNCTION trainer_profiles_sync('ApplicationUsersId');
+
+CREATE TRIGGER trainer_profiles_packages_sync
+AFTER INSERT OR UPDATE OR DELETE ON "PTFreelancePackages"
+FOR EACH ROW EXECUTE FUNCTION trainer_profiles_sync('PtId');
+
+CREATE TRIGGER trainer_profiles_goals_sync
+AFTER UPDATE OF "Name", "IsEnabled" OR DELETE ON "GoalTrainings"
+FOR EACH ROW EXECUTE FUNCTION trainer_profiles_sync_goal();
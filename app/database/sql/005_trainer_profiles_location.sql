@@ -0,0 +1,4 @@
+-- 005_trainer_profiles_location.sql - Chỉ mục vị trí PT tự do cho truy vấn PT gần
+-- build_nearby_trainer_query lọc bounding box (hoặc chưa có vị trí) trước khi tính Haversine
+CREATE INDEX trainer_profiles_freelance_location_idx ON trainer_profiles (pt_latitude, pt_longitude)
+    WHERE is_freelance = true AND pt_gym_id IS NULL;
@@ -0,0 +1,13 @@
+-- 006_geo_point_indexes.sql - Chỉ mục không gian GiST trên tọa độ DOUBLE PRECISION của gym_search và trainer_profiles
+-- Tọa độ đã được ép kiểu sẵn trong hai bảng đọc (materialized view / bảng đồng bộ bằng trigger), truy vấn lọc bằng
+-- point(longitude, latitude) <@ box(...) và sắp xếp kNN bằng <-> trên kiểu point có sẵn của PostgreSQL (không cần extension)
+
+-- Gym: thay chỉ mục B-tree (latitude, longitude) - B-tree chỉ thu hẹp theo vĩ độ, GiST lọc cả hai chiều
+DROP INDEX IF EXISTS gym_search_geo_idx;
+CREATE INDEX gym_search_geo_point_idx ON gym_search USING gist (point(longitude, latitude))
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+
+-- PT tự do có vị trí (PT chưa có vị trí vẫn được lấy riêng qua trainer_profiles_freelance_idx)
+DROP INDEX IF EXISTS trainer_profiles_freelance_location_idx;
+CREATE INDEX trainer_profiles_freelance_point_idx ON trainer_profiles USING gist (point(pt_longitude, pt_latitude))
+    WHERE is_freelance = true AND pt_gym_id IS NULL AND pt_latitude IS NOT NULL AND pt_longitude IS NOT NULL;
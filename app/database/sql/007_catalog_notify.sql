@@ -0,0 +1,44 @@
+-- 007_catalog_notify.sql - Báo thay đổi hồ sơ PT qua LISTEN/NOTIFY để ứng dụng xóa cache tìm kiếm
+-- Mỗi transaction chỉ gửi một thông báo cho cùng kênh và nội dung (PostgreSQL gộp các NOTIFY trùng),
+-- thông báo được gửi khi transaction commit. Ứng dụng lắng nghe kênh catalog_changed
+-- (xem app/database/catalog_listener.py); gym_search báo thay đổi khi được làm mới (app/database/schema.py)
+-- Chỉ báo khi trainer_profiles thực sự có hàng bị xóa/chèn: trigger trên AspNetUsers chạy cho mọi người dùng,
+-- cập nhật người dùng không phải PT không được làm xóa cache và snapshot của ứng dụng
+
+CREATE OR REPLACE FUNCTION refresh_trainer_profile(pt_id UUID) RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+    deleted_rows BIGINT;
+    inserted_rows BIGINT;
+BEGIN
+    IF pt_id IS NULL THEN
+        RETURN;
+    END IF;
+    -- Khóa theo PT để hai transaction đồng thời không cùng chèn một hồ sơ
+    PERFORM pg_advisory_xact_lock(hashtextextended(pt_id::TEXT, 0));
+    DELETE FROM trainer_profiles WHERE id = pt_id;
+    GET DIAGNOSTICS deleted_rows = ROW_COUNT;
+    INSERT INTO trainer_profiles SELECT * FROM trainer_profile_source WHERE id = pt_id;
+    GET DIAGNOSTICS inserted_rows = ROW_COUNT;
+    IF deleted_rows > 0 OR inserted_rows > 0 THEN
+        PERFORM pg_notify('catalog_changed', 'trainer_profiles');
+    END IF;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION rebuild_trainer_profiles() RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+    deleted_rows BIGINT;
+    inserted_rows BIGINT;
+BEGIN
+    LOCK TABLE trainer_profiles IN EXCLUSIVE MODE;
+    DELETE FROM trainer_profiles;
+    GET DIAGNOSTICS deleted_rows = ROW_COUNT;
+    INSERT INTO trainer_profiles SELECT * FROM trainer_profile_source;
+    GET DIAGNOSTICS inserted_rows = ROW_COUNT;
+    IF deleted_rows > 0 OR inserted_rows > 0 THEN
+        PERFORM pg_notify('catalog_changed', 'trainer_profiles');
+    END IF;
+END
+$$;
@@ -0,0 +1,64 @@
+-- 008_gym_search_notify.sql - Báo thay đổi bảng nguồn của gym_search để chỉ làm mới materialized view khi cần
+-- Trigger gửi payload gym_source trên kênh catalog_changed; ứng dụng (app/services/gym_index_service.py) chạy
+-- refresh_gym_search() rồi báo gym_search để mọi worker nạp lại chỉ mục. Chỉ báo khi hàng là gym hiển thị
+-- trong gym_search trước hoặc sau thay đổi (cùng điều kiện WHERE của 001_gym_search.sql)
+
+CREATE OR REPLACE FUNCTION gym_search_is_listed(account_status TEXT, gym_name TEXT) RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT account_status IS NOT DISTINCT FROM 'Active' AND COALESCE(gym_name, '') != ''
+$$;
+
+CREATE OR REPLACE FUNCTION gym_search_users_changed() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    listed BOOLEAN := false;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        listed := gym_search_is_listed(OLD."AccountStatus", OLD."GymName");
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NOT listed THEN
+        listed := gym_search_is_listed(NEW."AccountStatus", NEW."GymName");
+    END IF;
+    IF listed THEN
+        PERFORM pg_notify('catalog_changed', 'gym_source');
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION gym_search_addresses_changed() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    old_id UUID;
+    new_id UUID;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        old_id := OLD."CustomerId";
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        new_id := NEW."CustomerId";
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM "AspNetUsers" u
+        WHERE u."Id" IN (old_id, new_id)
+        AND gym_search_is_listed(u."AccountStatus", u."GymName")
+    ) THEN
+        PERFORM pg_notify('catalog_changed', 'gym_source');
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- Chỉ các cột có trong gym_search
+CREATE TRIGGER gym_search_users_notify
+AFTER INSERT OR DELETE OR UPDATE OF
+    "GymName", "FullName", "TaxCode", "Longitude", "Latitude", "hotResearch", "AccountStatus", "Email",
+    "PhoneNumber", "GymDescription", "AvatarUrl", "GymImages", "CreatedAt", "UpdatedAt", "Dob"
+ON "AspNetUsers"
+FOR EACH ROW EXECUTE FUNCTION gym_search_users_changed();
+
+CREATE TRIGGER gym_search_addresses_notify
+AFTER INSERT OR DELETE OR UPDATE OF
+    "CustomerId", "IsEnabled", "HouseNumber", "Street", "Ward", "District", "City"
+ON "Addresses"
+FOR EACH ROW EXECUTE FUNCTION gym_search_addresses_changed();
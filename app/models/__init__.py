@@ -1,6 +1,8 @@
 # app/models/__init__.py
 
-from .chat_models import ChatRequest, ChatResponse
-from .gym_models import safe_get_row_data
+from .chat_models import ChatRequest, ChatResponse, ChatBatchRequest, ChatBatchItem, ChatBatchResponse
+from .gym_models import GymResult, safe_get_row_data
+from .trainer_models import TrainerResult, safe_get_trainer_data
 
-__all__ = ['ChatRequest', 'ChatResponse', 'safe_get_row_data']
\ No newline at end of file
+__all__ = ['ChatRequest', 'ChatResponse', 'ChatBatchRequest', 'ChatBatchItem', 'ChatBatchResponse',
+           'GymResult', 'safe_get_row_data', 'TrainerResult', 'safe_get_trainer_data']
\ No newline at end of file
@@ -1,16 +1,51 @@
 # app/models/chat_models.py - Chat-related Pydantic models
 
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+from app.models.gym_models import GymResult
+from app.models.trainer_models import TrainerResult
+from config import CHAT_BATCH_MAX_SIZE, CONVERSATION_HISTORY_LIMIT
 
 class ChatRequest(BaseModel):
     prompt: str
     longitude: Optional[float] = None
     latitude: Optional[float] = None
     conversation_history: Optional[List[dict]] = []
+    cursor: Optional[str] = None  # next_cursor của trang trước để lấy trang tiếp theo
+    page_size: Optional[int] = Field(default=None, ge=1)
+    # Phiên lưu phía server: chỉ gửi prompt mới, phản hồi chỉ chứa các tin nhắn mới
+    session_id: Optional[str] = Field(default=None, min_length=8, max_length=128, pattern=r"^[A-Za-z0-9_-]+$")
+
+    @field_validator("conversation_history")
+    @classmethod
+    def limit_conversation_history(cls, conversation_history):
+        """Chỉ nhận CONVERSATION_HISTORY_LIMIT tin nhắn gần nhất từ client"""
+        if conversation_history and len(conversation_history) > CONVERSATION_HISTORY_LIMIT:
+            return conversation_history[-CONVERSATION_HISTORY_LIMIT:]
+        return conversation_history
 
 class ChatResponse(BaseModel):
     promptResponse: str
-    gyms: Optional[List[dict]] = None
-    trainers: Optional[List[dict]] = None
-    conversation_history: Optional[List[dict]] = []
+    gyms: Optional[List[GymResult]] = None
+    trainers: Optional[List[TrainerResult]] = None
+    conversation_history: Optional[List[dict]] = None
+    next_cursor: Optional[str] = None
+    session_id: Optional[str] = None
+    messages: Optional[List[dict]] = None  # Tin nhắn mới của lượt này (chế độ session_id)
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest] = Field(min_length=1, max_length=CHAT_BATCH_MAX_SIZE)
+
+class ChatBatchItem(BaseModel):
+    index: int
+    status: str  # 'ok' hoặc 'error'
+    error: Optional[str] = None
+    response: ChatResponse
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchItem]
+    total: int
+    succeeded: int
+    failed: int
+    search_requests: int
+    unique_searches: int
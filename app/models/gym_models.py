@@ -1,5 +1,31 @@
 # app/models/gym_models.py - Gym-related data processing functions
 
+from typing import Any, List, Optional
+from pydantic import BaseModel, ConfigDict
+
+class GymResult(BaseModel):
+    """Một gym trong phản hồi /chat (dữ liệu từ safe_get_row_data)"""
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    gymName: Optional[str] = None
+    fullName: Optional[str] = None
+    address: Optional[str] = None
+    taxCode: Optional[str] = None
+    longitude: Optional[float] = None
+    latitude: Optional[float] = None
+    hotResearch: bool = False
+    accountStatus: Optional[str] = None
+    email: Optional[str] = None
+    phoneNumber: Optional[str] = None
+    gymDescription: Optional[str] = None
+    avatarUrl: Optional[str] = None
+    gymImages: Optional[List[Any]] = None
+    createdAt: Optional[str] = None
+    updatedAt: Optional[str] = None
+    dob: Optional[str] = None
+    distance_km: Optional[float] = None
+
 def safe_get_row_data(row):
     """Trích xuất dữ liệu từ hàng cơ sở dữ liệu một cách an toàn"""
     try:
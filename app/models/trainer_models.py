@@ -1,5 +1,44 @@
 # app/models/trainer_models.py - Trainer-related data processing functions
 
+from typing import Any, List, Optional, Union
+from pydantic import BaseModel, ConfigDict
+
+# Số đo/kinh nghiệm giữ nguyên kiểu số nguyên hoặc thực như trong database
+Number = Union[int, float]
+
+class TrainerResult(BaseModel):
+    """Một huấn luyện viên trong phản hồi /chat (dữ liệu từ safe_get_trainer_data)"""
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    fullName: Optional[str] = None
+    email: Optional[str] = None
+    phoneNumber: Optional[str] = None
+    isMale: bool = True
+    dob: Optional[str] = None
+    avatarUrl: Optional[str] = None
+    bio: Optional[str] = None
+    accountStatus: Optional[str] = None
+    createdAt: Optional[str] = None
+    updatedAt: Optional[str] = None
+    experience: Optional[Number] = None
+    certificates: Optional[List[Any]] = None
+    height: Optional[Number] = None
+    weight: Optional[Number] = None
+    biceps: Optional[Number] = None
+    chest: Optional[Number] = None
+    waist: Optional[Number] = None
+    goalTrainings: Optional[List[Any]] = None
+    ptType: Optional[str] = None
+    isFreelance: bool = False
+    gymId: Optional[str] = None
+    gymName: Optional[str] = None
+    gymAddress: Optional[str] = None
+    gymLatitude: Optional[float] = None
+    gymLongitude: Optional[float] = None
+    gymHotResearch: bool = False
+    distance_km: Optional[float] = None
+
 def safe_get_trainer_data(row):
     """Trích xuất dữ liệu Personal Trainer từ hàng cơ sở dữ liệu một cách an toàn"""
     try:
@@ -1,10 +1,21 @@
 # app/services/__init__.py
 
+from .intent_service import (
+    scan_intents,
+    parse_km_distance,
+    get_nearest_max_distance
+)
+
 from .search_service import (
     intelligent_gym_search,
     classify_query_with_context,
     build_nearby_gym_query,
-    get_nearby_distance_preference
+    build_nearest_gym_query,
+    build_nearest_gym_candidates_query,
+    with_ring_counts,
+    build_nearby_gym_search,
+    get_nearby_distance_preference,
+    paginate_gym_query
 )
 
 from .pt_search_service import (
@@ -19,22 +30,85 @@ from .pt_recommendation_service import (
     format_trainer_detailed_info
 )
 
+from .gym_index_service import (
+    GymSpatialIndex,
+    gym_index,
+    refresh_gym_catalog,
+    start_gym_index_refresher,
+    stop_gym_index_refresher
+)
+
+from .geo_cache_service import (
+    GeoCellCache,
+    geo_cell_cache
+)
+
+from .trainer_catalog_service import (
+    TrainerCatalogSnapshot,
+    TrainerCatalog,
+    trainer_catalog,
+    start_trainer_catalog_refresher,
+    stop_trainer_catalog_refresher
+)
+
+from .answer_cache_service import (
+    AnswerCache,
+    answer_cache
+)
+
+from .gemini_guard_service import (
+    CircuitBreaker,
+    GeminiGuard,
+    GeminiUnavailableError
+)
+
 from .response_service import (
     create_simple_response,
-    get_response_with_history
+    get_response_with_history,
+    get_response_with_history_async,
+    stream_response_with_history,
+    process_chat_batch
 )
 
 __all__ = [
+    'scan_intents',
+    'parse_km_distance',
+    'get_nearest_max_distance',
     'intelligent_gym_search',
     'classify_query_with_context', 
     'build_nearby_gym_query',
+    'build_nearest_gym_query',
+    'build_nearest_gym_candidates_query',
+    'with_ring_counts',
+    'build_nearby_gym_search',
     'get_nearby_distance_preference',
+    'paginate_gym_query',
     'detect_trainer_search_intent',
     'classify_trainer_query',
     'build_nearby_trainer_query',
     'get_trainer_distance_preference',
     'create_trainer_response',
     'format_trainer_detailed_info',
+    'GymSpatialIndex',
+    'gym_index',
+    'refresh_gym_catalog',
+    'start_gym_index_refresher',
+    'stop_gym_index_refresher',
+    'GeoCellCache',
+    'geo_cell_cache',
+    'TrainerCatalogSnapshot',
+    'TrainerCatalog',
+    'trainer_catalog',
+    'start_trainer_catalog_refresher',
+    'stop_trainer_catalog_refresher',
+    'AnswerCache',
+    'answer_cache',
+    'CircuitBreaker',
+    'GeminiGuard',
+    'GeminiUnavailableError',
     'create_simple_response',
-    'get_response_with_history'
+    'get_response_with_history',
+    'get_response_with_history_async',
+    'stream_response_with_history',
+    'process_chat_batch'
 ]
\ No newline at end of file
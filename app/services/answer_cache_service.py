@@ -0,0 +1,184 @@
+# app/services/answer_cache_service.py - Two-tier cache for Gemini free-chat answers
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from app.utils.cache_utils import TTLCache
+from app.utils.text_utils import normalize_vietnamese_text, build_hashing_vector, cosine_similarity
+from config import ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY
+
+# Từ đệm, từ xưng hô, lời chào (đã bỏ dấu): hai câu gần trùng chỉ được khác nhau ở các từ này
+ANSWER_FILLER_WORDS = frozenset({
+    'toi', 'minh', 'em', 'anh', 'chi', 'ban', 'ad', 'admin', 'bot',
+    'cho', 'hoi', 'xin', 'vui', 'long', 'giup', 'voi', 'oi', 'a', 'ah', 'nhe', 'nha', 'nhi', 'vay', 'the', 'di',
+    'chao', 'hi', 'hello', 'please', 'plz', 'thanks', 'cam', 'on'
+})
+
+def content_words(normalized):
+    """Các từ mang nghĩa của câu hỏi đã chuẩn hóa (gồm cả con số), bỏ từ đệm và xưng hô"""
+    return frozenset(word for word in normalized.split() if word not in ANSWER_FILLER_WORDS)
+
+def context_fingerprint(conversation_context):
+    """Dấu vân tay của ngữ cảnh hội thoại đưa vào prompt ('' nếu không có lịch sử)"""
+    if not conversation_context:
+        return ""
+    return hashlib.sha1(conversation_context.encode('utf-8')).hexdigest()[:16]
+
+
+class NearDuplicateAnswerIndex:
+    """
+    Tầng gần trùng: vector hashing của câu hỏi + chỉ mục ngược theo feature,
+    trả về câu trả lời của câu hỏi giống nhất nếu cosine >= ngưỡng
+    """
+
+    def __init__(self, max_entries, ttl_seconds, threshold):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._entries = OrderedDict()  # entry_id -> (expires_at, vector, words, answer)
+        self._postings = {}            # feature -> set entry_id
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, entry_id):
+        _, vector, _, _ = self._entries.pop(entry_id)
+        for feature in vector:
+            bucket = self._postings.get(feature)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._postings[feature]
+
+    def get(self, vector, words):
+        """Tìm câu trả lời gần trùng nhất có cùng tập từ mang nghĩa; None nếu không đạt ngưỡng"""
+        if not vector:
+            return None, 0.0
+        with self._lock:
+            # Tích vô hướng chỉ trên các câu hỏi có chung feature
+            scores = {}
+            for feature, weight in vector.items():
+                for entry_id in self._postings.get(feature, ()):
+                    scores[entry_id] = scores.get(entry_id, 0.0) + weight * self._entries[entry_id][1][feature]
+
+            now = time.monotonic()
+            for entry_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                if score < self.threshold:
+                    break
+                expires_at, _, entry_words, answer = self._entries[entry_id]
+                if expires_at <= now:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                    continue
+                # Khác một từ mang nghĩa (nam / nữ, trước / sau, 3 / 5 buổi) là câu hỏi khác, dù cosine cao
+                if entry_words != words:
+                    continue
+                self._entries.move_to_end(entry_id)
+                return answer, score
+        return None, 0.0
+
+    def set(self, vector, words, answer):
+        if not vector:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (time.monotonic() + self.ttl_seconds, vector, words, answer)
+            for feature in vector:
+                self._postings.setdefault(feature, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AnswerCache:
+    """
+    Cache câu trả lời Gemini hai tầng:
+    - exact: câu hỏi đã chuẩn hóa + dấu vân tay ngữ cảnh hội thoại
+    - near: câu hỏi gần trùng (cùng các từ mang nghĩa, chỉ khác từ đệm, dấu câu, thứ tự từ),
+      chỉ khi không có lịch sử hội thoại (lịch sử không ảnh hưởng câu trả lời)
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.exact = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.near = NearDuplicateAnswerIndex(max_entries, ttl_seconds, similarity_threshold)
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.exact.enabled
+
+    def lookup(self, user_input, conversation_context=""):
+        """
+        Tìm câu trả lời đã lưu
+        Returns: tuple (answer, tier) với tier là 'exact' / 'near', hoặc (None, None)
+        """
+        if not self.enabled:
+            return None, None
+
+        normalized = normalize_vietnamese_text(user_input)
+        fingerprint = context_fingerprint(conversation_context)
+        answer = self.exact.get((normalized, fingerprint))
+        if answer is not None:
+            self.exact_hits += 1
+            return answer, 'exact'
+
+        if not fingerprint:
+            answer, score = self.near.get(build_hashing_vector(user_input), content_words(normalized))
+            if answer is not None:
+                self.near_hits += 1
+                print(f"⚡ ANSWER_CACHE: Câu hỏi gần trùng (cosine={score:.3f})")
+                return answer, 'near'
+
+        self.misses += 1
+        return None, None
+
+    def store(self, user_input, conversation_context, answer):
+        """Lưu câu trả lời Gemini; tầng gần trùng chỉ nhận câu hỏi không có lịch sử"""
+        if not self.enabled or not answer:
+            return
+
+        normalized = normalize_vietnamese_text(user_input)
+        fingerprint = context_fingerprint(conversation_context)
+        self.exact.set((normalized, fingerprint), answer)
+        if not fingerprint:
+            self.near.set(build_hashing_vector(user_input), content_words(normalized), answer)
+
+    def clear(self):
+        self.exact.clear()
+        self.near.clear()
+
+    def stats(self):
+        """Thống kê cache câu trả lời cho endpoint /metrics"""
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "exact_entries": len(self.exact),
+            "near_entries": len(self.near),
+            "max_entries": self.exact.max_entries,
+            "ttl_seconds": self.exact.ttl_seconds,
+            "similarity_threshold": self.near.threshold,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.exact.evictions + self.near.evictions,
+            "expirations": self.exact.expirations + self.near.expirations
+        }
+
+
+# Cache dùng chung cho toàn ứng dụng
+answer_cache = AnswerCache()
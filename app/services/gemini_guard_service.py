@@ -0,0 +1,336 @@
+# app/services/gemini_guard_service.py - Deadlines, concurrency limit, retry and circuit breaker around Gemini calls
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from google.api_core import exceptions as google_exceptions
+from config import (
+    GEMINI_TIMEOUT_SECONDS,
+    GEMINI_MAX_CONCURRENT,
+    GEMINI_QUEUE_TIMEOUT_SECONDS,
+    GEMINI_MAX_RETRIES,
+    GEMINI_RETRY_BASE_SECONDS,
+    GEMINI_RETRY_MAX_SECONDS,
+    GEMINI_BREAKER_WINDOW,
+    GEMINI_BREAKER_MIN_CALLS,
+    GEMINI_BREAKER_FAILURE_RATE,
+    GEMINI_BREAKER_OPEN_SECONDS
+)
+
+# Câu trả lời trả về ngay khi Gemini quá tải hoặc lỗi liên tục (không lưu vào cache)
+GEMINI_FALLBACK_ANSWER = (
+    "Xin lỗi, trợ lý AI đang quá tải. Bạn vui lòng thử lại sau ít phút, "
+    "hoặc hỏi mình về phòng gym và PT gần bạn nhé!"
+)
+
+# Lỗi tạm thời đáng thử lại: timeout, quá tải, lỗi máy chủ
+RETRYABLE_ERRORS = (
+    TimeoutError,
+    asyncio.TimeoutError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.InternalServerError
+)
+
+# Chu kỳ kiểm tra slot trống khi chờ trong event loop (giây)
+SLOT_POLL_SECONDS = 0.02
+
+
+class GeminiUnavailableError(Exception):
+    """Gemini không khả dụng: circuit breaker đang mở, hết slot hoặc đã hết số lần thử"""
+
+
+def get_chunk_text(chunk):
+    """Lấy text của một chunk Gemini; chunk không có text (bị chặn, metadata) trả về chuỗi rỗng"""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker theo tỉ lệ lỗi trên cửa sổ các lời gọi gần nhất:
+    closed -> open khi tỉ lệ lỗi vượt ngưỡng; sau open_seconds chuyển half_open
+    cho đúng một lời gọi thử, thành công thì đóng lại, thất bại thì mở tiếp
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window=GEMINI_BREAKER_WINDOW, min_calls=GEMINI_BREAKER_MIN_CALLS,
+                 failure_rate=GEMINI_BREAKER_FAILURE_RATE, open_seconds=GEMINI_BREAKER_OPEN_SECONDS):
+        self.min_calls = min_calls
+        self.failure_threshold = failure_rate
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window)  # True = thành công
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+        self._lock = threading.Lock()
+        self.opens = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def failure_rate(self):
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def allow(self):
+        """Cho phép lời gọi đi tiếp hay trả lời nhanh bằng fallback"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self._state = self.HALF_OPEN
+            # half_open: chỉ một lời gọi thử tại một thời điểm (lời gọi thử bị hủy giữa chừng hết hạn sau open_seconds)
+            now = time.monotonic()
+            if self._trial_in_flight and now - self._trial_started_at < self.open_seconds:
+                return False
+            self._trial_in_flight = True
+            self._trial_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                print("✅ GEMINI: Circuit breaker đóng lại sau lời gọi thử thành công")
+                self._state = self.CLOSED
+                self._trial_in_flight = False
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+        self._outcomes.clear()
+        self.opens += 1
+        print(f"⛔ GEMINI: Circuit breaker mở, trả lời fallback trong {self.open_seconds:g}s")
+
+
+class GeminiGuard:
+    """
+    Bọc mô hình Gemini: deadline cho mỗi lời gọi, giới hạn số lời gọi đồng thời,
+    retry lỗi tạm thời với backoff có jitter và circuit breaker
+    """
+
+    def __init__(self, model, timeout_seconds=GEMINI_TIMEOUT_SECONDS, max_concurrent=GEMINI_MAX_CONCURRENT,
+                 queue_timeout_seconds=GEMINI_QUEUE_TIMEOUT_SECONDS, max_retries=GEMINI_MAX_RETRIES,
+                 retry_base_seconds=GEMINI_RETRY_BASE_SECONDS, retry_max_seconds=GEMINI_RETRY_MAX_SECONDS,
+                 breaker=None):
+        self.model = model
+        self.timeout_seconds = timeout_seconds
+        self.max_concurrent = max_concurrent
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.rejected = 0
+        self.short_circuited = 0
+        self._latency_total = 0.0
+
+    def backoff_delay(self, attempt):
+        """Thời gian chờ trước lần thử lại thứ attempt+1 (exponential backoff, full jitter)"""
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * (2 ** attempt)))
+
+    def _request_options(self):
+        return {"timeout": self.timeout_seconds}
+
+    def _on_acquired(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def _on_rejected(self):
+        with self._lock:
+            self.rejected += 1
+        print(f"🚦 GEMINI: Đã đủ {self.max_concurrent} lời gọi đồng thời, trả lời fallback")
+        raise GeminiUnavailableError("Không còn slot gọi Gemini")
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=self.queue_timeout_seconds):
+            self._on_rejected()
+        self._on_acquired()
+
+    async def _acquire_slot_async(self):
+        # Thăm dò semaphore thay vì chờ trong thread để không giữ slot khi task bị hủy
+        deadline = time.monotonic() + self.queue_timeout_seconds
+        while not self._slots.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                self._on_rejected()
+            await asyncio.sleep(SLOT_POLL_SECONDS)
+        self._on_acquired()
+
+    def _release_slot(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _start_attempt(self):
+        """Kiểm tra circuit breaker trước mỗi lần gọi"""
+        if not self.breaker.allow():
+            with self._lock:
+                self.short_circuited += 1
+            raise GeminiUnavailableError("Circuit breaker đang mở")
+        with self._lock:
+            self.calls += 1
+        return time.perf_counter()
+
+    def _on_success(self, started):
+        self.breaker.record_success()
+        with self._lock:
+            self.successes += 1
+            self._latency_total += time.perf_counter() - started
+
+    def _on_failure(self, error, attempt):
+        """Ghi nhận lỗi; trả về True nếu nên thử lại"""
+        self.breaker.record_failure()
+        is_timeout = isinstance(error, (TimeoutError, asyncio.TimeoutError, google_exceptions.DeadlineExceeded))
+        with self._lock:
+            self.failures += 1
+            if is_timeout:
+                self.timeouts += 1
+        print(f"⚠️ GEMINI: Lần gọi {attempt + 1} lỗi: {type(error).__name__}: {error}")
+
+        if attempt < self.max_retries and isinstance(error, RETRYABLE_ERRORS):
+            with self._lock:
+                self.retries += 1
+            return True
+        return False
+
+    def generate(self, prompt):
+        """generate_content có bảo vệ; raise GeminiUnavailableError khi phải trả lời fallback"""
+        self._acquire_slot()
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = self._start_attempt()
+                try:
+                    response = self.model.generate_content(prompt, request_options=self._request_options())
+                except Exception as e:
+                    if not self._on_failure(e, attempt):
+                        raise GeminiUnavailableError(str(e)) from e
+                    time.sleep(self.backoff_delay(attempt))
+                    continue
+                self._on_success(started)
+                return response
+        finally:
+            self._release_slot()
+
+    async def generate_async(self, prompt):
+        """Phiên bản bất đồng bộ của generate, deadline áp dụng bằng asyncio.wait_for"""
+        await self._acquire_slot_async()
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = self._start_attempt()
+                try:
+                    response = await asyncio.wait_for(
+                        self.model.generate_content_async(prompt, request_options=self._request_options()),
+                        self.timeout_seconds
+                    )
+                except Exception as e:
+                    if not self._on_failure(e, attempt):
+                        raise GeminiUnavailableError(str(e)) from e
+                    await asyncio.sleep(self.backoff_delay(attempt))
+                    continue
+                self._on_success(started)
+                return response
+        finally:
+            self._release_slot()
+
+    async def stream_async(self, prompt):
+        """
+        Sinh từng đoạn text của câu trả lời streaming; giữ slot trong suốt stream.
+        Chỉ thử lại khi mở stream; lỗi hoặc quá deadline giữa chừng raise GeminiUnavailableError
+        """
+        await self._acquire_slot_async()
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = self._start_attempt()
+                try:
+                    response = await asyncio.wait_for(
+                        self.model.generate_content_async(prompt, stream=True, request_options=self._request_options()),
+                        self.timeout_seconds
+                    )
+                    break
+                except Exception as e:
+                    if not self._on_failure(e, attempt):
+                        raise GeminiUnavailableError(str(e)) from e
+                    await asyncio.sleep(self.backoff_delay(attempt))
+
+            # Chunk đầu tiên đã có sẵn khi stream mở; gửi ngay thay vì chờ SDK đọc trước chunk kế tiếp
+            first_text = get_chunk_text(response)
+            if first_text:
+                yield first_text
+
+            chunks = response.__aiter__()
+            is_first = True
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), self.timeout_seconds)
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    self._on_failure(e, self.max_retries)
+                    raise GeminiUnavailableError(str(e)) from e
+                if is_first:
+                    is_first = False
+                    continue
+                text = get_chunk_text(chunk)
+                if text:
+                    yield text
+            self._on_success(started)
+        finally:
+            self._release_slot()
+
+    def stats(self):
+        """Thống kê lời gọi Gemini cho endpoint /metrics"""
+        with self._lock:
+            return {
+                "breaker_state": self.breaker.state,
+                "failure_rate": round(self.breaker.failure_rate(), 4),
+                "breaker_opens": self.breaker.opens,
+                "in_flight": self.in_flight,
+                "max_concurrent": self.max_concurrent,
+                "timeout_seconds": self.timeout_seconds,
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "short_circuited": self.short_circuited,
+                "avg_latency_ms": round(self._latency_total / self.successes * 1000, 2) if self.successes else 0.0
+            }
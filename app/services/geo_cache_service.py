@@ -0,0 +1,155 @@
+# app/services/geo_cache_service.py - Nearby gym/trainer candidates cached per geohash cell
+
+import math
+from app.utils.geo_utils import haversine_km, geohash_encode, geohash_bounds
+from app.database.connection import query_database, query_database_async
+from app.database.search_cache import geo_candidate_cache
+from app.services.search_service import build_nearby_gym_query, build_nearest_gym_candidates_query
+from app.services.pt_search_service import build_nearby_trainer_query, extract_experience_requirement, experience_desc_key, nearby_trainer_order_key, interleave_trainers
+from config import GEO_CACHE_PRECISION, NEARBY_KNN_LIMIT, NEARBY_RINGS_KM
+
+
+class GeoCellCache:
+    """
+    Cache ứng viên tìm gần theo (ô geohash, bậc bán kính, bộ lọc) thay vì theo tọa độ chính xác
+    - Ứng viên của ô được truy vấn một lần từ tâm ô với bán kính nới thêm bán kính ô
+    - Mỗi request tính lại khoảng cách Haversine chính xác từ vị trí người dùng trên tập ứng viên,
+      lọc theo bán kính và xếp hạng giống hệt truy vấn SQL
+    """
+
+    def __init__(self, store=geo_candidate_cache, precision=GEO_CACHE_PRECISION, rings_km=NEARBY_RINGS_KM):
+        self.store = store
+        self.precision = precision
+        self.rings_km = sorted(rings_km)
+
+    @property
+    def enabled(self):
+        return self.precision > 0 and self.store.enabled
+
+    def cell(self, latitude, longitude):
+        """
+        Ô geohash chứa tọa độ
+        Returns: tuple (geohash, vĩ độ tâm, kinh độ tâm, bán kính ô km - từ tâm tới góc xa nhất)
+        """
+        geohash = geohash_encode(latitude, longitude, self.precision)
+        min_latitude, max_latitude, min_longitude, max_longitude = geohash_bounds(geohash)
+        center_latitude = (min_latitude + max_latitude) / 2
+        center_longitude = (min_longitude + max_longitude) / 2
+        radius_km = max(haversine_km(center_latitude, center_longitude, corner_latitude, min_longitude)
+                        for corner_latitude in (min_latitude, max_latitude))
+        return geohash, center_latitude, center_longitude, radius_km
+
+    def radius_bucket(self, max_distance_km):
+        """Bậc bán kính: vòng nhỏ nhất trong NEARBY_RINGS_KM không nhỏ hơn bán kính yêu cầu"""
+        return next((ring for ring in self.rings_km if ring >= max_distance_km), math.ceil(max_distance_km))
+
+    def plan_gyms(self, longitude, latitude, max_distance_km, nearest=False, k=NEARBY_KNN_LIMIT):
+        """
+        Kế hoạch tìm gym gần qua cache ô: chế độ bán kính (mọi gym trong bán kính) hoặc k gym gần nhất
+        Returns: dict (khóa cache, truy vấn ứng viên, tham số xếp hạng) hoặc None nếu không dùng được cache ô
+        """
+        if not self.enabled or not max_distance_km:
+            return None
+        geohash, center_latitude, center_longitude, cell_radius_km = self.cell(latitude, longitude)
+        bucket_km = self.radius_bucket(max_distance_km)
+        if nearest:
+            # Gym thứ k của người dùng cách tâm ô không quá khoảng cách gym thứ k của tâm + 2 lần bán kính ô
+            candidate_query = build_nearest_gym_candidates_query(
+                center_longitude, center_latitude, k, bucket_km + cell_radius_km, 2 * cell_radius_km)
+        else:
+            candidate_query = build_nearby_gym_query(center_longitude, center_latitude, bucket_km + cell_radius_km)
+        return {
+            "kind": "nearby_gym",
+            "key": ("nearby_gym", geohash, bucket_km, ("knn", k) if nearest else ("radius",)),
+            "query": candidate_query,
+            "latitude": latitude,
+            "longitude": longitude,
+            "max_distance_km": max_distance_km,
+            "k": k if nearest else None
+        }
+
+    def plan_trainers(self, longitude, latitude, max_distance_km, user_input=""):
+        """
+        Kế hoạch tìm PT gần qua cache ô (bộ lọc kinh nghiệm lấy từ user_input như build_nearby_trainer_query)
+        Returns: dict hoặc None nếu không dùng được cache ô
+        """
+        if not self.enabled or not max_distance_km:
+            return None
+        geohash, center_latitude, center_longitude, cell_radius_km = self.cell(latitude, longitude)
+        bucket_km = self.radius_bucket(max_distance_km)
+        candidate_query = build_nearby_trainer_query(
+            center_longitude, center_latitude, bucket_km + cell_radius_km, user_input,
+            candidate_margin_km=2 * cell_radius_km)
+        return {
+            "kind": "trainer",
+            "key": ("trainer", geohash, bucket_km, extract_experience_requirement(user_input)),
+            "query": candidate_query,
+            "latitude": latitude,
+            "longitude": longitude,
+            "max_distance_km": max_distance_km
+        }
+
+    def fetch(self, cell_plan):
+        """Kết quả của kế hoạch: ứng viên từ cache (hoặc truy vấn một lần cho cả ô) rồi xếp hạng lại"""
+        candidates = self.store.get(cell_plan["key"])
+        if candidates is None:
+            candidates = query_database(*cell_plan["query"])
+            if isinstance(candidates, str):
+                return candidates
+            self.store.set(cell_plan["key"], candidates)
+        else:
+            print(f"⚡ GEO_CACHE: Ô {cell_plan['key'][1]} ({len(candidates)} ứng viên {cell_plan['kind']})")
+        return self.rank(cell_plan, candidates)
+
+    async def fetch_async(self, cell_plan):
+        """Phiên bản bất đồng bộ của fetch"""
+        candidates = self.store.get(cell_plan["key"])
+        if candidates is None:
+            candidates = await query_database_async(*cell_plan["query"])
+            if isinstance(candidates, str):
+                return candidates
+            self.store.set(cell_plan["key"], candidates)
+        else:
+            print(f"⚡ GEO_CACHE: Ô {cell_plan['key'][1]} ({len(candidates)} ứng viên {cell_plan['kind']})")
+        return self.rank(cell_plan, candidates)
+
+    def rank(self, cell_plan, candidates):
+        """Tính lại khoảng cách từ vị trí người dùng và xếp hạng ứng viên như truy vấn SQL tương ứng"""
+        if cell_plan["kind"] == "trainer":
+            return self.rank_trainers(cell_plan, candidates)
+        return self.rank_gyms(cell_plan, candidates)
+
+    def rank_gyms(self, cell_plan, candidates):
+        """Gym trong bán kính theo distance_km, hotresearch DESC, gymname (k gym đầu ở chế độ kNN)"""
+        latitude, longitude, max_distance_km = cell_plan["latitude"], cell_plan["longitude"], cell_plan["max_distance_km"]
+        gyms = []
+        for row in candidates:
+            distance_km = haversine_km(latitude, longitude, row['latitude'], row['longitude'])
+            if distance_km <= max_distance_km:
+                gyms.append({**row, 'distance_km': distance_km})
+        gyms.sort(key=lambda gym: (gym['distance_km'], not gym.get('hotresearch'), gym.get('gymname') or ''))
+        return gyms[:cell_plan["k"]] if cell_plan["k"] else gyms
+
+    def rank_trainers(self, cell_plan, candidates):
+        """10 PT gần nhất, xen kẽ PT gym và PT tự do như build_nearby_trainer_query"""
+        latitude, longitude, max_distance_km = cell_plan["latitude"], cell_plan["longitude"], cell_plan["max_distance_km"]
+        gym_trainers = []
+        freelance_trainers = []
+        for row in candidates:
+            if row['gym_latitude'] is None or row['gym_longitude'] is None:
+                distance_km = None
+            else:
+                distance_km = haversine_km(latitude, longitude, row['gym_latitude'], row['gym_longitude'])
+                if distance_km > max_distance_km:
+                    continue
+            trainer = {**row, 'distance_km': distance_km}
+            (gym_trainers if row['pt_type'] == 'gym' else freelance_trainers).append(trainer)
+
+        gym_trainers.sort(key=lambda trainer: (trainer['distance_km'], not trainer.get('gym_hotresearch'), experience_desc_key(trainer)))
+        # PT tự do chưa có vị trí xếp sau mọi PT có vị trí (COALESCE(distance_km, 999999))
+        freelance_trainers.sort(key=lambda trainer: (999999 if trainer['distance_km'] is None else trainer['distance_km'], experience_desc_key(trainer)))
+        return interleave_trainers(gym_trainers, freelance_trainers, nearby_trainer_order_key)
+
+
+# Cache ô dùng chung cho toàn ứng dụng
+geo_cell_cache = GeoCellCache()
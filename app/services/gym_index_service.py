@@ -0,0 +1,302 @@
+# app/services/gym_index_service.py - In-memory spatial index of active gyms
+
+import bisect
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+from app.utils.geo_utils import haversine_km, bounding_box, KM_PER_DEGREE
+from app.database.connection import query_database
+from app.database.schema import refresh_gym_search
+from app.database.catalog_listener import add_catalog_change_handler
+from app.services.search_service import GYM_SEARCH_COLUMNS
+from config import GYM_INDEX_CELL_DEGREES, GYM_INDEX_REFRESH_SECONDS
+
+# Tất cả gym đang hoạt động có tọa độ (cùng cột với truy vấn gym gần)
+GYM_INDEX_QUERY = f"""
+    SELECT
+        {GYM_SEARCH_COLUMNS}
+    FROM gym_search g
+    WHERE g.latitude IS NOT NULL
+    AND g.longitude IS NOT NULL
+    """
+
+
+def nearby_sort_key(row):
+    """Thứ tự giống SQL: distance_km ASC, hotresearch DESC, gymname ASC"""
+    return (row['distance_km'], not row.get('hotresearch'), row.get('gymname') or '')
+
+
+class GymSpatialIndex:
+    """Chỉ mục lưới (grid bucket) theo độ lat/lng cho tìm kiếm gym gần"""
+
+    def __init__(self, cell_degrees=GYM_INDEX_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        # (cells, size, loaded_at) được thay thế nguyên khối khi refresh
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.refresh_count = 0
+        self.refresh_errors = 0
+        self.last_refresh_ms = None
+        self.queries = 0
+
+    def _cell(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def is_ready(self):
+        return self._snapshot is not None
+
+    def load(self, rows):
+        """Xây lại lưới từ danh sách hàng gym và thay thế snapshot hiện tại"""
+        cells = {}
+        size = 0
+        for row in rows:
+            latitude, longitude = row.get('latitude'), row.get('longitude')
+            if latitude is None or longitude is None:
+                continue
+            cells.setdefault(self._cell(latitude, longitude), []).append(row)
+            size += 1
+        self._snapshot = (cells, size, datetime.now())
+        return size
+
+    def refresh(self):
+        """Tải lại danh sách gym từ database; giữ snapshot cũ nếu lỗi"""
+        # Tránh nhiều luồng cùng refresh một lúc
+        with self._lock:
+            start = time.perf_counter()
+            results = query_database(GYM_INDEX_QUERY)
+            if isinstance(results, str):
+                self.refresh_errors += 1
+                print(f"❌ GYM_INDEX: Không thể làm mới chỉ mục: {results}")
+                return False
+
+            size = self.load(results)
+            self.refresh_count += 1
+            self.last_refresh_ms = round((time.perf_counter() - start) * 1000, 2)
+            print(f"🗺️ GYM_INDEX: Đã nạp {size} gym vào chỉ mục ({self.last_refresh_ms}ms)")
+            return True
+
+    def _cells_in_box(self, cells, min_latitude, max_latitude, min_longitude, max_longitude):
+        min_row, min_col = self._cell(min_latitude, min_longitude)
+        max_row, max_col = self._cell(max_latitude, max_longitude)
+        # Lưới thưa: duyệt các ô đã có nếu hộp bao phủ nhiều ô hơn số ô thực tế
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(cells):
+            for (row, col), bucket in cells.items():
+                if min_row <= row <= max_row and min_col <= col <= max_col:
+                    yield bucket
+            return
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                bucket = cells.get((row, col))
+                if bucket:
+                    yield bucket
+
+    def query_radius(self, latitude, longitude, radius_km):
+        """
+        Tìm gym trong bán kính radius_km, sắp xếp giống truy vấn SQL
+        Returns: list các dict hàng gym có thêm 'distance_km', hoặc None nếu chỉ mục chưa sẵn sàng
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        cells = snapshot[0]
+        self.queries += 1
+
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+        results = []
+        for bucket in self._cells_in_box(cells, min_latitude, max_latitude, min_longitude, max_longitude):
+            for row in bucket:
+                # Giữ cùng bộ lọc bounding box với SQL trước khi tính Haversine
+                if not (min_latitude <= row['latitude'] <= max_latitude and min_longitude <= row['longitude'] <= max_longitude):
+                    continue
+                distance_km = haversine_km(latitude, longitude, row['latitude'], row['longitude'])
+                if distance_km <= radius_km:
+                    results.append({**row, 'distance_km': distance_km})
+
+        results.sort(key=nearby_sort_key)
+        return results
+
+    def count_rings(self, latitude, longitude, rings_km):
+        """
+        Đếm số gym trong từng vòng bán kính (km) bằng một lượt quét bounding box của vòng rộng nhất
+        Returns: tuple (danh sách số gym theo vòng, các gym trong vòng rộng nhất đã sắp xếp)
+        hoặc None nếu chỉ mục chưa sẵn sàng
+        """
+        results = self.query_radius(latitude, longitude, max(rings_km))
+        if results is None:
+            return None
+        # query_radius sắp xếp theo khoảng cách trước tiên
+        distances = [row['distance_km'] for row in results]
+        return [bisect.bisect_right(distances, ring_km) for ring_km in rings_km], results
+
+    def _ring_buckets(self, cells, center_row, center_col, max_ring):
+        """
+        Sinh (vòng, các bucket có gym trên vòng) theo thứ tự vòng tăng dần (vòng = khoảng cách Chebyshev theo ô)
+        Chỉ duyệt chu vi mỗi vòng; khi hộp đã duyệt lớn hơn số ô thực tế (lưới thưa, điểm ở xa),
+        nhóm các ô đã có theo vòng một lần thay vì duyệt tiếp các vòng ô trống
+        """
+        for ring in range(max_ring + 1):
+            if (2 * ring + 1) ** 2 > len(cells):
+                by_ring = {}
+                for (row, col), bucket in cells.items():
+                    cell_ring = max(abs(row - center_row), abs(col - center_col))
+                    if cell_ring >= ring:
+                        by_ring.setdefault(cell_ring, []).append(bucket)
+                for cell_ring in sorted(by_ring):
+                    yield cell_ring, by_ring[cell_ring]
+                return
+            if ring == 0:
+                perimeter = [(center_row, center_col)]
+            else:
+                top, bottom = center_row - ring, center_row + ring
+                left, right = center_col - ring, center_col + ring
+                perimeter = [(row, col) for row in (top, bottom) for col in range(left, right + 1)]
+                perimeter += [(row, col) for row in range(top + 1, bottom) for col in (left, right)]
+            yield ring, [cells[cell] for cell in perimeter if cell in cells]
+
+    def _min_outside_km(self, latitude, longitude, center_row, center_col, ring):
+        """
+        Khoảng cách tối thiểu từ người dùng tới mọi gym ngoài các vòng 0..ring: khoảng tới mép gần nhất
+        của vùng đã duyệt (theo chiều kinh độ hẹp nhất)
+        """
+        edge_latitude = min(89.0, abs(latitude) + (ring + 1) * self.cell_degrees)
+        latitude_margin = min(latitude - (center_row - ring) * self.cell_degrees,
+                              (center_row + ring + 1) * self.cell_degrees - latitude)
+        longitude_margin = min(longitude - (center_col - ring) * self.cell_degrees,
+                               (center_col + ring + 1) * self.cell_degrees - longitude)
+        return KM_PER_DEGREE * min(latitude_margin, longitude_margin * math.cos(math.radians(edge_latitude)))
+
+    def nearest(self, latitude, longitude, k=5, max_distance_km=None):
+        """
+        Tìm k gym gần nhất bằng cách mở rộng dần vòng ô lưới, chỉ lấy gym trong max_distance_km (None = không giới hạn)
+        Returns: list các dict hàng gym có 'distance_km', hoặc None nếu chỉ mục chưa sẵn sàng
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        cells, size, _ = snapshot
+        self.queries += 1
+        if k <= 0 or size == 0:
+            return []
+
+        center_row, center_col = self._cell(latitude, longitude)
+        rows = [row for row, _ in cells]
+        cols = [col for _, col in cells]
+        max_ring = max(
+            abs(center_row - min(rows)), abs(center_row - max(rows)),
+            abs(center_col - min(cols)), abs(center_col - max(cols))
+        )
+
+        candidates = []
+        # Max-heap (giá trị âm) của k khoảng cách nhỏ nhất đã gặp: k-th distance là -closest[0]
+        closest = []
+        for ring, buckets in self._ring_buckets(cells, center_row, center_col, max_ring):
+            # Đã duyệt xong các vòng 0..ring-1 (vòng trống có thể bị bỏ qua): dừng nếu vòng này không thể chứa kết quả
+            if ring > 0:
+                min_outside_km = self._min_outside_km(latitude, longitude, center_row, center_col, ring - 1)
+                if max_distance_km is not None and min_outside_km > max_distance_km:
+                    break
+                if len(closest) == k and -closest[0] <= min_outside_km:
+                    break
+            for bucket in buckets:
+                for gym in bucket:
+                    distance_km = haversine_km(latitude, longitude, gym['latitude'], gym['longitude'])
+                    if max_distance_km is None or distance_km <= max_distance_km:
+                        candidates.append((distance_km, gym))
+                        if len(closest) < k:
+                            heapq.heappush(closest, -distance_km)
+                        elif -distance_km > closest[0]:
+                            heapq.heapreplace(closest, -distance_km)
+
+        # Chỉ sao chép hàng của k gym được chọn (ô dày có thể chứa hàng nghìn ứng viên)
+        nearest = heapq.nsmallest(k, candidates, key=lambda candidate: (candidate[0], not candidate[1].get('hotresearch'), candidate[1].get('gymname') or ''))
+        return [{**gym, 'distance_km': distance_km} for distance_km, gym in nearest]
+
+    def stats(self):
+        """Thống kê chỉ mục cho endpoint /metrics"""
+        snapshot = self._snapshot
+        return {
+            "ready": snapshot is not None,
+            "gyms": snapshot[1] if snapshot else 0,
+            "cells": len(snapshot[0]) if snapshot else 0,
+            "cell_degrees": self.cell_degrees,
+            "loaded_at": snapshot[2].isoformat() if snapshot else None,
+            "refresh_count": self.refresh_count,
+            "refresh_errors": self.refresh_errors,
+            "last_refresh_ms": self.last_refresh_ms,
+            "queries": self.queries
+        }
+
+
+# Chỉ mục dùng chung cho toàn ứng dụng
+gym_index = GymSpatialIndex()
+
+_refresher_thread = None
+_refresher_stop = threading.Event()
+_refresh_requested = threading.Event()
+# Bảng nguồn của gym_search đã thay đổi (hoặc có thể đã lỡ thông báo): cần làm mới materialized view
+_view_stale = threading.Event()
+
+def refresh_gym_catalog():
+    """
+    Làm mới materialized view gym_search rồi nạp lại chỉ mục
+    Cache tìm kiếm được xóa qua NOTIFY gym_search mà refresh_gym_search gửi (xem catalog_listener)
+    Returns: True nếu chỉ mục được nạp lại thành công
+    """
+    refresh_gym_search()
+    return gym_index.refresh()
+
+def request_gym_catalog_refresh(changed=None):
+    """
+    Catalog listener gọi khi catalog thay đổi: gym_source (bảng nguồn) cần làm mới view rồi nạp lại chỉ mục,
+    gym_search (view vừa được worker nào đó làm mới) chỉ cần nạp lại chỉ mục
+    "listen" (bắt đầu/kết nối lại): thông báo trong lúc không lắng nghe có thể đã bị lỡ, làm mới view
+    """
+    changed = set(changed or ())
+    if changed & {"gym_source", "listen"}:
+        _view_stale.set()
+        _refresh_requested.set()
+    elif "gym_search" in changed:
+        _refresh_requested.set()
+
+def _refresh_loop(interval_seconds):
+    while not _refresher_stop.is_set():
+        # Nạp lại chỉ mục theo chu kỳ hoặc ngay khi có thông báo (nhiều thông báo liên tiếp gộp thành một lần);
+        # materialized view chỉ được làm mới khi bảng nguồn thay đổi
+        _refresh_requested.wait(interval_seconds or None)
+        _refresh_requested.clear()
+        if _refresher_stop.is_set():
+            break
+        refresh_view = _view_stale.is_set()
+        _view_stale.clear()
+        try:
+            # View vừa được làm mới (ở đây hoặc ở worker khác): chỉ mục được nạp lại khi nhận NOTIFY gym_search
+            if refresh_view and not isinstance(refresh_gym_search(), str):
+                continue
+            gym_index.refresh()
+        except Exception as e:
+            gym_index.refresh_errors += 1
+            print(f"❌ GYM_INDEX: Lỗi khi làm mới: {str(e)}")
+
+def start_gym_index_refresher(interval_seconds=GYM_INDEX_REFRESH_SECONDS):
+    """Nạp chỉ mục lần đầu và khởi động luồng nền làm mới (định kỳ và khi catalog thay đổi)"""
+    global _refresher_thread
+    gym_index.refresh()
+    add_catalog_change_handler(request_gym_catalog_refresh)
+    if _refresher_thread is not None and _refresher_thread.is_alive():
+        return
+    _refresher_stop.clear()
+    _refresh_requested.clear()
+    _view_stale.clear()
+    _refresher_thread = threading.Thread(target=_refresh_loop, args=(interval_seconds,), name="gym-index-refresher", daemon=True)
+    _refresher_thread.start()
+
+def stop_gym_index_refresher():
+    """Dừng luồng nền làm mới chỉ mục"""
+    global _refresher_thread
+    _refresher_stop.set()
+    _refresh_requested.set()
+    if _refresher_thread is not None:
+        _refresher_thread.join(timeout=5)
+        _refresher_thread = None
@@ -0,0 +1,196 @@
+# app/services/intent_service.py - Intent vocabulary and shared precompiled intent engine
+
+import re
+from functools import lru_cache
+from app.utils.intent_engine import IntentEngine, keywords
+from config import NEARBY_KNN_MAX_DISTANCE_KM
+
+# Bảng ý định: tên -> list pattern regex (từ khóa chuỗi con được escape qua keywords())
+INTENT_PATTERNS = {
+    # intelligent_gym_search: câu KHÔNG cần tìm kiếm gym
+    'gym_search.non_gym': keywords(
+        # Chào hỏi và lịch sự
+        'xin chào', 'hello', 'hi', 'chào bạn', 'hey there',
+        'cảm ơn', 'thank you', 'thanks', 'cám ơn', 'tks',
+        'tạm biệt', 'bye', 'goodbye', 'see you',
+        # Câu hỏi cá nhân
+        'tên tôi', 'my name', 'lặp lại tên', 'nhắc lại tên',
+        'tôi là ai', 'who am i', 'remember me',
+        # Tư vấn sức khỏe không cần gym cụ thể
+        'làm sao để', 'how to', 'cách để', 'how can i',
+        'ăn gì để', 'what to eat', 'what should i eat',
+        'bài tập nào', 'what exercise', 'which workout',
+        'tăng cân', 'giảm cân', 'lose weight', 'gain weight',
+        'thời tiết', 'weather', 'nhiệt độ', 'temperature',
+        # Phản hồi chung
+        'ok', 'được rồi', 'tốt', 'good', 'fine', 'great',
+        'đồng ý', 'agree', 'yes', 'no problem'
+    ),
+    # intelligent_gym_search: ý định tìm kiếm gym
+    'gym_search.intent': [
+        # Tìm kiếm trực tiếp
+        r'(tìm|find|search|looking for)\s*(gym|phòng gym|fitness|thể dục)',
+        r'(gym|phòng gym|fitness)\s*(nào|what|which|where)',
+        r'(có|is there|are there)\s*(gym|phòng gym|fitness)',
+        # Tìm kiếm theo địa điểm
+        r'(gym|phòng gym|fitness)\s*(ở|at|in|near|gần)\s*(\w+)',
+        r'(quận|district|huyện|thành phố|city)\s*\d*.*?(gym|phòng gym|fitness)',
+        # Tìm kiếm theo đặc điểm
+        r'(gym|phòng gym|fitness)\s*(hot|nổi tiếng|phổ biến|tốt|best)',
+        r'(hot|nổi tiếng|phổ biến|tốt|best)\s*(gym|phòng gym|fitness)',
+        # Tìm kiếm mở
+        r'(danh sách|list)\s*(gym|phòng gym|fitness)',
+        r'(tất cả|all)\s*(gym|phòng gym|fitness)',
+        r'(những|the)\s*(gym|phòng gym|fitness)\s*(nào|what)'
+    ],
+    'gym_search.hot': [
+        r'(hot|nổi tiếng|phổ biến|được yêu thích|tốt nhất|best|top)',
+        r'(recommend|gợi ý|đề xuất|suggest)'
+    ],
+    # classify_query: muốn xem danh sách tất cả gym
+    'gym_list.all': keywords(
+        'danh sách gym', 'list gym', 'all gym', 'tất cả gym',
+        'gym có những gì', 'gym nào', 'which gym'
+    ),
+
+    # classify_query_with_context: câu hỏi KHÔNG cần truy vấn database
+    'context.non_gym': keywords(
+        # Câu hỏi cá nhân
+        'tên tôi', 'tên của tôi', 'lặp lại tên', 'nhắc lại tên',
+        'my name', 'what is my name', 'repeat my name',
+        'tôi tên', 'tôi là ai', 'who am i',
+        # Chào hỏi và lịch sự
+        'xin chào', 'hello', 'hi', 'chào bạn', 'hey',
+        'cảm ơn', 'thank you', 'thanks', 'cám ơn',
+        'tạm biệt', 'bye', 'goodbye', 'chào tạm biệt',
+        # Tư vấn sức khỏe chung (không cần tìm gym cụ thể)
+        'làm sao để', 'cách để', 'how to',
+        'ăn gì để', 'what to eat',
+        'bài tập nào', 'exercise for',
+        'tăng cân', 'giảm cân', 'lose weight', 'gain weight',
+        # Phản hồi chung
+        'ok', 'được rồi', 'tốt', 'good', 'fine', 'đồng ý'
+    ),
+    # classify_query_with_context: từ khóa chỉ rõ cần tìm kiếm gym
+    'context.gym': keywords(
+        'gym', 'fitness', 'thể dục', 'thể hình', 'tập luyện',
+        'phòng gym', 'trung tâm', 'center', 'club',
+        'tìm', 'search', 'ở đâu', 'where', 'địa chỉ', 'address',
+        'gần', 'near', 'nearby', 'quanh', 'xung quanh',
+        'quận', 'district', 'thành phố', 'city'
+    ),
+    'context.more': keywords('khác', 'other', 'nào khác', 'còn'),
+
+    # detect_search_intent
+    'search.location_search': [r'(gần|near|nearby|xung quanh|lân cận|quanh đây)', r'(district \d+|quận \d+|huyện)'],
+    'search.name_search': [r'(tìm .+ gym|gym .+|.+ fitness|.+ center)'],
+    'search.popular_search': [r'(hot|nổi tiếng|phổ biến|được yêu thích|tốt nhất|best|top)', r'(gym hot|phòng gym hot|fitness hot)'],
+    'search.new_search': [r'(mới|new|vừa mở|recently|gần đây)'],
+    'search.old_search': [r'(cũ|old|lâu năm|uy tín|established)'],
+    'search.price_search': [r'(rẻ|cheap|affordable|giá tốt|budget)'],
+    'search.equipment_search': [r'(thiết bị|equipment|máy tập|facilities)'],
+
+    # Số km cụ thể (dùng chung cho gym và PT)
+    'distance.km': [r'(\d+)\s*km'],
+
+    # get_nearby_distance_preference: cấp độ khoảng cách
+    'gym_distance.very_close': [
+        r'(rất gần|very close|walking distance|đi bộ|đi bộ được)',
+        r'(ngay gần|sát bên|cực gần|siêu gần)',
+        r'(trong phạm vi \d{1,3}\s*m|dưới 1km|under 1km)'
+    ],
+    'gym_distance.close': [
+        r'(gần|nearby|close|lân cận|kề bên)',
+        r'(quanh đây|xung quanh|around here)',
+        r'(không xa|not far|gần nhà|near home)'
+    ],
+    'gym_distance.medium': [
+        r'(khu vực|trong khu|in the area|local)',
+        r'(xa một chút|bit farther|hơi xa)',
+        r'(trong thành phố|in the city|cùng thành phố)'
+    ],
+    'gym_distance.far': [
+        r'(xa hơn|farther|more distant)',
+        r'(trong tỉnh|in province|cùng tỉnh)',
+        r'(mở rộng|expand|extend)'
+    ],
+    'gym_distance.very_far': [
+        r'(rất xa|very far|distant)',
+        r'(khắp nơi|everywhere|anywhere)',
+        r'(toàn bộ|all|entire|whole)'
+    ],
+    'gym_distance.unlimited': [
+        r'(tất cả|all gyms|mọi|every|bất kỳ đâu)',
+        r'(không giới hạn|unlimited|no limit)',
+        r'(toàn quốc|nationwide|whole country)'
+    ],
+    # get_nearby_distance_preference: phương tiện di chuyển
+    'gym_transport.bicycle': [r'(xe đạp|bicycle|bike)'],
+    'gym_transport.motorbike': [r'(xe máy|motorbike|scooter)'],
+    'gym_transport.car': [r'(ô tô|car|drive|driving)'],
+    'gym_transport.bus': [r'(xe bus|bus|public transport)'],
+    # get_nearby_distance_preference: thời gian di chuyển
+    'gym_time.5min': [r'(5 phút|5min|năm phút)'],
+    'gym_time.10min': [r'(10 phút|10min|mười phút)'],
+    'gym_time.15min': [r'(15 phút|15min|mười lăm phút)'],
+    'gym_time.20min': [r'(20 phút|20min|hai mươi phút)'],
+    'gym_time.30min': [r'(30 phút|30min|nửa giờ|half hour)'],
+    # get_nearby_distance_preference: địa danh
+    'gym_place.district': [r'(quận \d+|district \d+)'],
+    'gym_place.city': [r'(thành phố|city|tp\.)'],
+    'gym_place.province': [r'(tỉnh|province|tỉnh thành)'],
+    'gym_place.suburb': [r'(huyện|county|suburban)'],
+
+    # get_trainer_distance_preference
+    'trainer_distance.very_close': [r'(rất gần|very close|đi bộ)'],
+    'trainer_distance.close': [r'(gần|nearby|close)'],
+    'trainer_distance.medium': [r'(khu vực|trong khu|area)'],
+    'trainer_distance.far': [r'(xa hơn|farther)'],
+    'trainer_distance.very_far': [r'(rất xa|very far)'],
+    'trainer_distance.unlimited': [r'(tất cả|all|bất kỳ)'],
+
+    # detect_trainer_search_intent
+    'trainer.keyword': [
+        r'\bpt\b', r'huấn luyện viên', r'personal trainer', r'trainer',
+        r'hlv', r'coach', r'giáo viên thể dục',
+        r'tìm pt', r'find trainer', r'tìm trainer'
+    ],
+    'trainer.training_context': [
+        r'tập riêng', r'tập cá nhân', r'personal training',
+        r'hướng dẫn tập', r'chỉ tập', r'dạy tập',
+        r'tư vấn tập', r'lên lịch tập'
+    ],
+    'trainer.goal': keywords(
+        'giảm cân', 'tăng cơ', 'thể hình', 'sức mạnh', 'sức bền',
+        'lose weight', 'build muscle', 'bodybuilding', 'strength'
+    ),
+}
+
+# Engine dùng chung, biên dịch một lần khi import
+intent_engine = IntentEngine(INTENT_PATTERNS)
+
+@lru_cache(maxsize=1024)
+def scan_intents(user_input):
+    """
+    Quét tin nhắn (đã lowercase) một lượt, kết quả được cache theo nội dung tin nhắn
+    Returns: mapping chỉ đọc tên ý định -> trigger
+    """
+    return intent_engine.scan(user_input.lower())
+
+def parse_km_distance(intents):
+    """Lấy số km cụ thể đầu tiên trong câu (giới hạn 1-50km), None nếu không có"""
+    km_trigger = intents.get('distance.km')
+    if not km_trigger:
+        return None
+    distance = int(re.match(r'\d+', km_trigger).group(0))
+    return max(1, min(distance, 50))
+
+def get_nearest_max_distance(user_input):
+    """
+    Khoảng cách tối đa cho tìm kiếm k gần nhất: số km người dùng nói rõ,
+    nếu không thì NEARBY_KNN_MAX_DISTANCE_KM (None = không giới hạn) thay cho bán kính đoán từ câu
+    """
+    km_distance = parse_km_distance(scan_intents(user_input))
+    if km_distance is not None:
+        return km_distance
+    return NEARBY_KNN_MAX_DISTANCE_KM or None
@@ -1,111 +1,194 @@
 # app/services/pt_search_service.py - Personal Trainer search logic and query building
 
-import math
 import re
 from app.utils.text_utils import normalize_vietnamese_text
+from app.utils.geo_utils import bounding_box, HAVERSINE_SQL, BOUNDING_BOX_SQL, NEAREST_ORDER_SQL
 from app.database.connection import query_database
+from app.services.intent_service import scan_intents, parse_km_distance, get_nearest_max_distance
+from config import NEARBY_SEARCH_MODE, NEARBY_KNN_LIMIT, NEARBY_KNN_CANDIDATE_FACTOR
 
 
-def build_nearby_trainer_query(longitude, latitude, max_distance_km=10, user_input=""):
+# Điều kiện kinh nghiệm: toán tử lấy từ danh sách cố định, số năm được bind qua tham số
+EXPERIENCE_FILTERS = {
+    '>=': 't.experience >= %(exp_years)s',
+    '>': 't.experience > %(exp_years)s',
+    '=': 't.experience = %(exp_years)s',
+    '<': 't.experience < %(exp_years)s',
+    '<=': 't.experience <= %(exp_years)s',
+}
+
+
+# Cột PT trả về của truy vấn PT gần (kết quả cuối và tập ứng viên theo ô geohash)
+NEARBY_TRAINER_COLUMNS = """id, fullname, email, phonenumber, ismale, dob, avatarurl, bio,
+        accountstatus, createdat, updatedat, pt_gym_id as gym_id, experience, certificates,
+        height, weight, biceps, chest, waist, goal_trainings, is_freelance,
+        gymname, gymaddress, gym_latitude, gym_longitude, gym_hotresearch,
+        distance_km, pt_type"""
+
+
+def build_experience_filter(exp_operator, exp_years, params):
+    """Tạo điều kiện WHERE cho yêu cầu kinh nghiệm và thêm số năm vào params ("" nếu không có)"""
+    if not (exp_operator and exp_years) or exp_operator not in EXPERIENCE_FILTERS:
+        return ""
+    params['exp_years'] = exp_years
+    return EXPERIENCE_FILTERS[exp_operator]
+
+
+def experience_desc_key(trainer):
+    """Khóa sắp xếp experience DESC NULLS LAST cho PT tính trong bộ nhớ"""
+    experience = trainer.get('experience')
+    return (experience is None, -(experience or 0))
+
+
+def trainer_order_key(trainer):
+    """Thứ tự khi xen kẽ PT (tìm theo bộ lọc): gym_hotresearch DESC, experience DESC NULLS LAST"""
+    return (not trainer.get('gym_hotresearch'), experience_desc_key(trainer))
+
+
+def nearby_trainer_order_key(trainer):
+    """Thứ tự khi xen kẽ PT gần: distance_km ASC NULLS LAST, experience DESC NULLS LAST"""
+    return (trainer['distance_km'] is None, trainer['distance_km'] or 0, experience_desc_key(trainer))
+
+
+def interleave_trainers(gym_trainers, freelance_trainers, order_key, limit=10):
+    """
+    Xen kẽ PT gym và PT tự do giống bước MixedResults của các truy vấn PT, cho kết quả tính trong bộ nhớ:
+    10 PT đầu mỗi loại (rn), chia nhóm theo rn chẵn/lẻ, lấy 5 PT đầu mỗi nhóm (PT gym trước) rồi xếp xen kẽ
+    gym_trainers / freelance_trainers: đã xếp theo rn; order_key: thứ tự trong nhóm và giữa hai PT cùng lượt
+    """
+    groups = ([], [])
+    for pt_type, trainers in enumerate((gym_trainers, freelance_trainers)):
+        for rn, trainer in enumerate(trainers[:10], start=1):
+            groups[rn % 2].append((pt_type, trainer))
+
+    mixed = []
+    for group in groups:
+        group.sort(key=lambda item: (item[0], order_key(item[1])))
+        for mixed_rn, (pt_type, trainer) in enumerate(group[:5], start=1):
+            mixed.append(((mixed_rn - 1) * 2 + pt_type, order_key(trainer), trainer))
+    mixed.sort(key=lambda item: item[:2])
+    return [trainer for _, _, trainer in mixed[:limit]]
+
+
+def build_trainers_cte(conditions):
+    """
+    CTE TrainersWithGoals đọc từ bảng hồ sơ PT tính sẵn (trainer_profiles, xem
+    app/database/sql/004_trainer_profiles.sql) thay vì gộp lại mọi PT mỗi request
+    conditions: danh sách điều kiện WHERE trên alias t (đã được bind qua params)
+    """
+    where_clause = " AND ".join(condition for condition in conditions if condition) or "TRUE"
+    return f"""TrainersWithGoals AS (
+        -- Hồ sơ PT (mục tiêu, is_freelance, kinh nghiệm, vị trí, gym) đã tính sẵn
+        SELECT t.*
+        FROM trainer_profiles t
+        WHERE {where_clause}
+    )"""
+
+
+def build_nearby_trainer_query(longitude, latitude, max_distance_km=10, user_input="", nearest=False, candidate_margin_km=None):
     """
     Xây dựng truy vấn SQL để tìm Personal Trainer gần người dùng
     Bao gồm cả PT gym và PT freelance, mixed và giới hạn 10 kết quả
+    Lọc vị trí chạy trước: chỉ gym trong bán kính và PT tự do trong bounding box/bán kính
+    mới được ghép với hồ sơ PT (trainer_profiles)
+    nearest=True: chỉ xét các gym / PT tự do gần nhất theo chỉ mục GiST (ORDER BY <-> LIMIT),
+    max_distance_km=None là không giới hạn khoảng cách
+    candidate_margin_km: trả về tập ứng viên chưa xen kẽ (xem app/services/geo_cache_service.py) thay vì 10 PT
+    Returns: tuple (sql, params)
     """
-    lat_range = max_distance_km / 111.0
-    lng_range = max_distance_km / (111.0 * abs(math.cos(math.radians(latitude))))
+    params = {
+        'latitude': latitude,
+        'longitude': longitude
+    }
+
+    gym_location_filter = ""
+    freelance_location_filter = ""
+    if max_distance_km:
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, max_distance_km)
+        params.update({
+            'min_latitude': min_latitude,
+            'max_latitude': max_latitude,
+            'min_longitude': min_longitude,
+            'max_longitude': max_longitude,
+            'max_distance_km': max_distance_km
+        })
+        gym_location_filter = f"""AND {BOUNDING_BOX_SQL.format(lat='g.latitude', lng='g.longitude')}
+            AND d.distance_km <= %(max_distance_km)s"""
+        freelance_location_filter = f"""AND {BOUNDING_BOX_SQL.format(lat='t.pt_latitude', lng='t.pt_longitude')}
+                AND d.distance_km <= %(max_distance_km)s"""
+
+    gym_nearest_order = ""
+    freelance_nearest_order = ""
+    if nearest:
+        # Lấy dư ứng viên theo thứ tự chỉ mục (khoảng cách theo độ), xếp lại theo km ở các bước sau
+        params['candidate_limit'] = NEARBY_KNN_LIMIT * NEARBY_KNN_CANDIDATE_FACTOR
+        gym_nearest_order = f"""ORDER BY {NEAREST_ORDER_SQL.format(lat='g.latitude', lng='g.longitude')}
+        LIMIT %(candidate_limit)s"""
+        freelance_nearest_order = f"""ORDER BY {NEAREST_ORDER_SQL.format(lat='t.pt_latitude', lng='t.pt_longitude')}
+            LIMIT %(candidate_limit)s"""
 
     # Extract experience requirement nếu có
     exp_operator, exp_years = extract_experience_requirement(user_input)
-    experience_filter = ""
-    if exp_operator and exp_years:
-        experience_filter = f"\n        HAVING ud.\"Experience\" {exp_operator} {exp_years}"
+    experience_filter = build_experience_filter(exp_operator, exp_years, params)
+    if experience_filter:
         print(f"🎯 EXPERIENCE_FILTER (nearby): Lọc PT có kinh nghiệm {exp_operator} {exp_years} năm")
+    trainer_filter = f"AND {experience_filter}" if experience_filter else ""
 
-    return f"""
-    WITH NearbyGyms AS (
-        -- Tìm các gym gần người dùng
-        SELECT 
-            gym."Id" as gym_id,
-            gym."GymName" as gymname,
-            COALESCE(
-                CONCAT_WS(', ', 
-                    NULLIF(a."HouseNumber", ''), 
-                    NULLIF(a."Street", ''), 
-                    NULLIF(a."Ward", ''), 
-                    NULLIF(a."District", ''), 
-                    NULLIF(a."City", '')
-                ), 
-                'Địa chỉ chưa cập nhật'
-            ) as gymaddress,
-            CAST(gym."Longitude" AS DOUBLE PRECISION) AS gym_longitude,
-            CAST(gym."Latitude" AS DOUBLE PRECISION) AS gym_latitude,
-            gym."hotResearch" as gym_hotresearch,
-            6371.0 * 2 * ASIN(
-                SQRT(
-                    POWER(SIN(RADIANS({latitude} - CAST(gym."Latitude" AS DOUBLE PRECISION)) / 2), 2) +
-                    COS(RADIANS({latitude})) * COS(RADIANS(CAST(gym."Latitude" AS DOUBLE PRECISION))) *
-                    POWER(SIN(RADIANS({longitude} - CAST(gym."Longitude" AS DOUBLE PRECISION)) / 2), 2)
-                )
-            ) AS distance_km
-        FROM "AspNetUsers" gym
-        LEFT JOIN "Addresses" a ON gym."Id" = a."CustomerId" AND a."IsEnabled" = true
-        WHERE gym."AccountStatus" = 'Active'
-            AND gym."GymName" IS NOT NULL 
-            AND gym."GymName" != ''
-            AND gym."Latitude" IS NOT NULL 
-            AND gym."Longitude" IS NOT NULL
-            AND CAST(gym."Latitude" AS DOUBLE PRECISION) BETWEEN {latitude - lat_range} AND {latitude + lat_range}
-            AND CAST(gym."Longitude" AS DOUBLE PRECISION) BETWEEN {longitude - lng_range} AND {longitude + lng_range}
-    ),
-    RankedGyms AS (
-        SELECT *
-        FROM NearbyGyms
-        WHERE distance_km <= {max_distance_km}
-    ),
-    TrainersWithGoals AS (
-        -- Lấy tất cả PT (gym và freelance) và thông tin mục tiêu tập luyện
+    if candidate_margin_km is None:
+        final_sql = f"""-- Lấy 10 PT, ưu tiên xen kẽ giữa gym và freelance
+    SELECT 
+        {NEARBY_TRAINER_COLUMNS}
+    FROM (
+        SELECT *,
+            ROW_NUMBER() OVER (
+                PARTITION BY (rn %% 2)
+                ORDER BY 
+                    CASE WHEN pt_type = 'gym' THEN 0 ELSE 1 END,
+                    distance_km ASC NULLS LAST,
+                    experience DESC NULLS LAST
+            ) as mixed_rn
+        FROM MixedResults
+    ) mixed
+    WHERE mixed_rn <= 5
+    ORDER BY 
+        (mixed_rn - 1) * 2 + CASE WHEN pt_type = 'gym' THEN 0 ELSE 1 END,
+        distance_km ASC NULLS LAST
+    LIMIT 10
+    """
+    else:
+        # Tập ứng viên cho cả một ô: PT không xa tâm ô hơn người thứ 10 (theo từng loại) quá candidate_margin_km
+        params['candidate_margin_km'] = candidate_margin_km
+        final_sql = f"""-- Ứng viên của ô: mọi PT có thể lọt top 10 của một vị trí bất kỳ trong ô
+    SELECT {NEARBY_TRAINER_COLUMNS}
+    FROM GymPTs
+    WHERE distance_km <= (SELECT MAX(distance_km) FROM GymPTs WHERE rn <= 10) + %(candidate_margin_km)s
+    UNION ALL
+    SELECT {NEARBY_TRAINER_COLUMNS}
+    FROM FreelancePTs
+    WHERE distance_km IS NULL
+    OR distance_km <= (SELECT MAX(distance_km) FROM FreelancePTs WHERE rn <= 10) + %(candidate_margin_km)s
+    """
+
+    sql = f"""
+    WITH RankedGyms AS (
+        -- Gym trong bán kính: bounding box trên gym_search (chỉ mục GiST tọa độ) rồi mới tính Haversine
         SELECT 
-            pt."Id" as id,
-            pt."FullName" as fullname,
-            pt."Email" as email,
-            pt."PhoneNumber" as phonenumber,
-            pt."IsMale" as ismale,
-            pt."Dob" as dob,
-            pt."AvatarUrl" as avatarurl,
-            pt."Bio" as bio,
-            pt."AccountStatus" as accountstatus,
-            pt."CreatedAt" as createdat,
-            pt."UpdatedAt" as updatedat,
-            pt."GymOwnerId" as pt_gym_id,
-            pt."Latitude" as pt_latitude,
-            pt."Longitude" as pt_longitude,
-            ud."Experience" as experience,
-            ud."Certificates" as certificates,
-            ud."Height" as height,
-            ud."Weight" as weight,
-            ud."Biceps" as biceps,
-            ud."Chest" as chest,
-            ud."Waist" as waist,
-            ARRAY_AGG(DISTINCT gt."Name") FILTER (WHERE gt."Name" IS NOT NULL) as goal_trainings,
-            -- Kiểm tra xem có package freelance không
-            CASE 
-                WHEN COUNT(DISTINCT pfp."Id") > 0 THEN true 
-                ELSE false 
-            END as is_freelance
-        FROM "AspNetUsers" pt
-        LEFT JOIN "UserDetails" ud ON pt."Id" = ud."Id"
-        LEFT JOIN "PTGoalTrainings" pgt ON pt."Id" = pgt."ApplicationUsersId"
-        LEFT JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
-        LEFT JOIN "PTFreelancePackages" pfp ON pt."Id" = pfp."PtId" AND pfp."IsEnabled" = true
-        WHERE pt."AccountStatus" = 'Active'
-            AND (pt."GymOwnerId" IS NOT NULL OR EXISTS (
-                SELECT 1 FROM "PTFreelancePackages" pfp2 
-                WHERE pfp2."PtId" = pt."Id" AND pfp2."IsEnabled" = true
-            ))
-        GROUP BY pt."Id", ud."Experience", ud."Certificates", ud."Height", 
-                 ud."Weight", ud."Biceps", ud."Chest", ud."Waist"{experience_filter}
+            g.id as gym_id,
+            g.gymname,
+            g.gymaddress,
+            g.longitude AS gym_longitude,
+            g.latitude AS gym_latitude,
+            g.hotresearch as gym_hotresearch,
+            d.distance_km
+        FROM gym_search g
+        CROSS JOIN LATERAL (
+            SELECT {HAVERSINE_SQL.format(lat='g.latitude', lng='g.longitude')} AS distance_km
+        ) d
+        WHERE g.latitude IS NOT NULL AND g.longitude IS NOT NULL
+            {gym_location_filter}
+        {gym_nearest_order}
     ),
-    -- PT Gym với khoảng cách từ gym
+    -- PT Gym: chỉ PT của các gym trong bán kính (chỉ mục trainer_profiles.pt_gym_id)
     GymPTs AS (
         SELECT 
             t.id,
@@ -138,10 +221,37 @@ def build_nearby_trainer_query(longitude, latitude, max_distance_km=10, user_inp
             g.distance_km,
             'gym' as pt_type,
             ROW_NUMBER() OVER (ORDER BY g.distance_km ASC, g.gym_hotresearch DESC, t.experience DESC NULLS LAST) as rn
-        FROM TrainersWithGoals t
-        INNER JOIN RankedGyms g ON t.pt_gym_id = g.gym_id
+        FROM RankedGyms g
+        INNER JOIN trainer_profiles t ON t.pt_gym_id = g.gym_id {trainer_filter}
+    ),
+    -- PT Freelance có vị trí: bounding box (chỉ mục GiST) và bán kính, khoảng cách tính một lần qua LATERAL;
+    -- PT chưa có vị trí xếp sau mọi PT có vị trí nên chỉ cần 10 người kinh nghiệm cao nhất
+    FreelanceCandidates AS (
+        (
+            SELECT t.*, d.distance_km
+            FROM trainer_profiles t
+            CROSS JOIN LATERAL (
+                SELECT {HAVERSINE_SQL.format(lat='t.pt_latitude', lng='t.pt_longitude')} AS distance_km
+            ) d
+            WHERE t.is_freelance = true
+                AND t.pt_gym_id IS NULL
+                AND t.pt_latitude IS NOT NULL AND t.pt_longitude IS NOT NULL
+                {freelance_location_filter}
+                {trainer_filter}
+            {freelance_nearest_order}
+        )
+        UNION ALL
+        (
+            SELECT t.*, NULL::DOUBLE PRECISION AS distance_km
+            FROM trainer_profiles t
+            WHERE t.is_freelance = true
+                AND t.pt_gym_id IS NULL
+                AND (t.pt_latitude IS NULL OR t.pt_longitude IS NULL)
+                {trainer_filter}
+            ORDER BY t.experience DESC NULLS LAST, t.fullname ASC
+            LIMIT 10
+        )
     ),
-    -- PT Freelance với khoảng cách từ vị trí cá nhân
     FreelancePTs AS (
         SELECT 
             t.id,
@@ -168,43 +278,13 @@ def build_nearby_trainer_query(longitude, latitude, max_distance_km=10, user_inp
             NULL::UUID as gym_id,
             'Huấn luyện viên tự do' as gymname,
             'Tập tại địa điểm linh hoạt' as gymaddress,
-            CAST(t.pt_latitude AS DOUBLE PRECISION) as gym_latitude,
-            CAST(t.pt_longitude AS DOUBLE PRECISION) as gym_longitude,
+            t.pt_latitude as gym_latitude,
+            t.pt_longitude as gym_longitude,
             false as gym_hotresearch,
-            CASE 
-                WHEN t.pt_latitude IS NOT NULL AND t.pt_longitude IS NOT NULL THEN
-                    6371.0 * 2 * ASIN(
-                        SQRT(
-                            POWER(SIN(RADIANS({latitude} - CAST(t.pt_latitude AS DOUBLE PRECISION)) / 2), 2) +
-                            COS(RADIANS({latitude})) * COS(RADIANS(CAST(t.pt_latitude AS DOUBLE PRECISION))) *
-                            POWER(SIN(RADIANS({longitude} - CAST(t.pt_longitude AS DOUBLE PRECISION)) / 2), 2)
-                        )
-                    )
-                ELSE NULL
-            END as distance_km,
+            t.distance_km,
             'freelance' as pt_type,
-            ROW_NUMBER() OVER (ORDER BY 
-                CASE 
-                    WHEN t.pt_latitude IS NOT NULL AND t.pt_longitude IS NOT NULL THEN
-                        6371.0 * 2 * ASIN(
-                            SQRT(
-                                POWER(SIN(RADIANS({latitude} - CAST(t.pt_latitude AS DOUBLE PRECISION)) / 2), 2) +
-                                COS(RADIANS({latitude})) * COS(RADIANS(CAST(t.pt_latitude AS DOUBLE PRECISION))) *
-                                POWER(SIN(RADIANS({longitude} - CAST(t.pt_longitude AS DOUBLE PRECISION)) / 2), 2)
-                            )
-                        )
-                    ELSE 999999
-                END ASC,
-                t.experience DESC NULLS LAST
-            ) as rn
-        FROM TrainersWithGoals t
-        WHERE t.is_freelance = true
-            AND t.pt_gym_id IS NULL
-            AND (
-                t.pt_latitude IS NULL OR t.pt_longitude IS NULL OR
-                (CAST(t.pt_latitude AS DOUBLE PRECISION) BETWEEN {latitude - lat_range} AND {latitude + lat_range}
-                AND CAST(t.pt_longitude AS DOUBLE PRECISION) BETWEEN {longitude - lng_range} AND {longitude + lng_range})
-            )
+            ROW_NUMBER() OVER (ORDER BY COALESCE(t.distance_km, 999999) ASC, t.experience DESC NULLS LAST) as rn
+        FROM FreelanceCandidates t
     ),
     -- Mixed kết quả: xen kẽ gym và freelance
     MixedResults AS (
@@ -212,31 +292,9 @@ def build_nearby_trainer_query(longitude, latitude, max_distance_km=10, user_inp
         UNION ALL
         SELECT * FROM FreelancePTs WHERE rn <= 10
     )
-    -- Lấy 10 PT, ưu tiên xen kẽ giữa gym và freelance
-    SELECT 
-        id, fullname, email, phonenumber, ismale, dob, avatarurl, bio,
-        accountstatus, createdat, updatedat, pt_gym_id as gym_id, experience, certificates,
-        height, weight, biceps, chest, waist, goal_trainings, is_freelance,
-        gymname, gymaddress, gym_latitude, gym_longitude, gym_hotresearch,
-        distance_km, pt_type
-    FROM (
-        SELECT *,
-            ROW_NUMBER() OVER (
-                PARTITION BY (rn % 2)
-                ORDER BY 
-                    CASE WHEN pt_type = 'gym' THEN 0 ELSE 1 END,
-                    distance_km ASC NULLS LAST,
-                    experience DESC NULLS LAST
-            ) as mixed_rn
-        FROM MixedResults
-        WHERE distance_km IS NULL OR distance_km <= {max_distance_km}
-    ) mixed
-    WHERE mixed_rn <= 5
-    ORDER BY 
-        (mixed_rn - 1) * 2 + CASE WHEN pt_type = 'gym' THEN 0 ELSE 1 END,
-        distance_km ASC NULLS LAST
-    LIMIT 10
+    {final_sql}
     """
+    return sql, params
 
 
 def extract_experience_requirement(user_input):
@@ -309,132 +367,102 @@ def extract_experience_requirement(user_input):
     return (None, None)
 
 
-def build_trainer_search_query(user_input, longitude=None, latitude=None):
+def parse_trainer_search(user_input):
     """
-    Xây dựng truy vấn tìm kiếm PT thông minh dựa trên input của người dùng
-    Bao gồm cả PT gym và PT freelance
+    Phân tích yêu cầu tìm PT thành các tiêu chí tìm kiếm
+    Returns: dict gồm goals, exp_operator, exp_years, is_male, only_freelance, only_gym
     """
-    try:
-        user_input_lower = user_input.lower()
+    user_input_lower = user_input.lower()
 
-        # Phân tích từ khóa tìm kiếm
-        search_keywords = []
-        goal_keywords = []
-
-        # Mapping mục tiêu tập luyện phổ biến
-        goal_mapping = {
-            'Giảm cân': ['giảm cân', 'lose weight', 'weight loss', 'fat loss', 'giam can'],
-            'Tăng cơ': ['tăng cơ', 'build muscle', 'muscle gain', 'bulk', 'tang co'],
-            'Thể hình': ['thể hình', 'bodybuilding', 'physique', 'the hinh'],
-            'Sức mạnh': ['sức mạnh', 'strength', 'power', 'suc manh'],
-            'Sức bền': ['sức bền', 'endurance', 'stamina', 'cardio', 'suc ben'],
-            'Linh hoạt': ['linh hoạt', 'flexibility', 'yoga', 'stretching', 'linh hoat'],
-            'Phục hồi chức năng': ['phục hồi', 'rehabilitation', 'recovery', 'injury', 'phuc hoi'],
-            'Thể lực tổng hợp': ['thể lực', 'fitness', 'general fitness', 'the luc'],
-        }
-
-        # Tìm mục tiêu trong input
-        for goal, keywords in goal_mapping.items():
-            if any(kw in user_input_lower for kw in keywords):
-                goal_keywords.append(goal)
-
-        # Extract experience requirement
-        exp_operator, exp_years = extract_experience_requirement(user_input)
+    # Mapping mục tiêu tập luyện phổ biến
+    goal_mapping = {
+        'Giảm cân': ['giảm cân', 'lose weight', 'weight loss', 'fat loss', 'giam can'],
+        'Tăng cơ': ['tăng cơ', 'build muscle', 'muscle gain', 'bulk', 'tang co'],
+        'Thể hình': ['thể hình', 'bodybuilding', 'physique', 'the hinh'],
+        'Sức mạnh': ['sức mạnh', 'strength', 'power', 'suc manh'],
+        'Sức bền': ['sức bền', 'endurance', 'stamina', 'cardio', 'suc ben'],
+        'Linh hoạt': ['linh hoạt', 'flexibility', 'yoga', 'stretching', 'linh hoat'],
+        'Phục hồi chức năng': ['phục hồi', 'rehabilitation', 'recovery', 'injury', 'phuc hoi'],
+        'Thể lực tổng hợp': ['thể lực', 'fitness', 'general fitness', 'the luc'],
+    }
+
+    # Tìm mục tiêu trong input
+    goal_keywords = []
+    for goal, keywords in goal_mapping.items():
+        if any(kw in user_input_lower for kw in keywords):
+            goal_keywords.append(goal)
+
+    # Extract experience requirement
+    exp_operator, exp_years = extract_experience_requirement(user_input)
 
+    # Kiểm tra gender - Ưu tiên cao hơn, check trước khi xử lý keywords
+    is_male = None
+    if 'nữ' in user_input_lower or 'female' in user_input_lower or 'nu' in normalize_vietnamese_text(user_input):
+        is_male = False
+    elif 'nam' in user_input_lower or 'male' in user_input_lower:
+        is_male = True
+
+    return {
+        'goals': goal_keywords,
+        'exp_operator': exp_operator,
+        'exp_years': exp_years,
+        'is_male': is_male,
         # Kiểm tra yêu cầu chỉ PT freelance hoặc chỉ PT gym
-        only_freelance = any(kw in user_input_lower for kw in ['tự do', 'freelance', 'tu do', 'không gym', 'khong gym'])
-        only_gym = any(kw in user_input_lower for kw in ['tại gym', 'tai gym', 'phòng gym', 'phong gym', 'gym pt'])
+        'only_freelance': any(kw in user_input_lower for kw in ['tự do', 'freelance', 'tu do', 'không gym', 'khong gym']),
+        'only_gym': any(kw in user_input_lower for kw in ['tại gym', 'tai gym', 'phòng gym', 'phong gym', 'gym pt'])
+    }
 
-        print(f"🔍 PT_TYPE_FILTER: only_freelance={only_freelance}, only_gym={only_gym}")
 
-        # Xây dựng base conditions cho PT
-        pt_base_conditions = [
-            'pt."AccountStatus" = \'Active\'',
-            # Bỏ điều kiện GymOwnerId để bao gồm cả freelance
-            '(pt."GymOwnerId" IS NOT NULL OR EXISTS (SELECT 1 FROM "PTFreelancePackages" pfp WHERE pfp."PtId" = pt."Id" AND pfp."IsEnabled" = true))'
-        ]
+def build_trainer_search_query(user_input, longitude=None, latitude=None):
+    """
+    Xây dựng truy vấn tìm kiếm PT thông minh dựa trên input của người dùng
+    Bao gồm cả PT gym và PT freelance
+    Returns: tuple (sql, params) hoặc None nếu có lỗi
+    """
+    try:
+        user_input_lower = user_input.lower()
 
         # Nếu có tọa độ và yêu cầu tìm gần
         if longitude and latitude and any(kw in user_input_lower for kw in
             ['gần', 'near', 'nearby', 'xung quanh', 'lân cận']):
+            if NEARBY_SEARCH_MODE == 'knn':
+                max_distance = get_nearest_max_distance(user_input)
+                return build_nearby_trainer_query(longitude, latitude, max_distance, user_input, nearest=True)
             max_distance = get_trainer_distance_preference(user_input)
             return build_nearby_trainer_query(longitude, latitude, max_distance, user_input)
 
-        # Thêm filter theo goal trainings (JOIN trực tiếp với GoalTrainings)
-        goal_join_conditions = []
-        if goal_keywords:
-            goal_list = "', '".join([g.replace("'", "''") for g in goal_keywords])
-            goal_join_conditions.append(f"gt.\"Name\" IN ('{goal_list}')")
+        spec = parse_trainer_search(user_input)
+        only_freelance = spec['only_freelance']
+        only_gym = spec['only_gym']
+
+        print(f"🔍 PT_TYPE_FILTER: only_freelance={only_freelance}, only_gym={only_gym}")
 
-        # Kiểm tra gender - Ưu tiên cao hơn, check trước khi xử lý keywords
-        if 'nữ' in user_input_lower or 'female' in user_input_lower or 'nu' in normalize_vietnamese_text(user_input):
-            pt_base_conditions.append('pt."IsMale" = false')
-        elif 'nam' in user_input_lower or 'male' in user_input_lower:
-            pt_base_conditions.append('pt."IsMale" = true')
+        # Điều kiện lọc trên hồ sơ PT (trainer_profiles chỉ chứa PT đang hoạt động, thuộc gym hoặc có gói freelance)
+        params = {}
+        conditions = []
 
-        # Build WHERE clause
-        where_parts = []
-        where_parts.append(f"({' AND '.join(pt_base_conditions)})")
+        if spec['is_male'] is not None:
+            params['is_male'] = spec['is_male']
+            conditions.append('t.ismale = %(is_male)s')
 
-        if goal_join_conditions:
-            where_parts.append(f"({' AND '.join(goal_join_conditions)})")
+        # PT có ít nhất một trong các mục tiêu được yêu cầu (chỉ mục GIN trên goal_trainings)
+        if spec['goals']:
+            params['goals'] = spec['goals']
+            conditions.append('t.goal_trainings && %(goals)s::TEXT[]')
 
-        where_clause = " AND ".join(where_parts)
+        experience_filter = build_experience_filter(spec['exp_operator'], spec['exp_years'], params)
+        if experience_filter:
+            print(f"🎯 EXPERIENCE_FILTER: Lọc PT có kinh nghiệm {spec['exp_operator']} {spec['exp_years']} năm")
+            conditions.append(experience_filter)
 
-        # Build experience filter cho TrainersWithGoals CTE
-        experience_filter = ""
-        if exp_operator and exp_years:
-            experience_filter = f"\n            HAVING ud.\"Experience\" {exp_operator} {exp_years}"
-            print(f"🎯 EXPERIENCE_FILTER: Lọc PT có kinh nghiệm {exp_operator} {exp_years} năm")
+        trainers_cte = build_trainers_cte(conditions)
 
         # Xây dựng query khác nhau tùy theo loại PT được yêu cầu
         if only_freelance:
             # Chỉ trả về PT freelance
             print("💼 Chỉ tìm PT FREELANCE")
             query = f"""
-            WITH FilteredPTs AS (
-                SELECT DISTINCT
-                    pt."Id" as pt_id
-                FROM "AspNetUsers" pt
-                LEFT JOIN "PTGoalTrainings" pgt ON pt."Id" = pgt."ApplicationUsersId"
-                LEFT JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
-                WHERE {where_clause}
-            ),
-            TrainersWithGoals AS (
-                SELECT 
-                    pt."Id" as id,
-                    pt."FullName" as fullname,
-                    pt."Email" as email,
-                    pt."PhoneNumber" as phonenumber,
-                    pt."IsMale" as ismale,
-                    pt."Dob" as dob,
-                    pt."AvatarUrl" as avatarurl,
-                    pt."Bio" as bio,
-                    pt."AccountStatus" as accountstatus,
-                    pt."CreatedAt" as createdat,
-                    pt."UpdatedAt" as updatedat,
-                    pt."GymOwnerId" as pt_gym_id,
-                    ud."Experience" as experience,
-                    ud."Certificates" as certificates,
-                    ud."Height" as height,
-                    ud."Weight" as weight,
-                    ud."Biceps" as biceps,
-                    ud."Chest" as chest,
-                    ud."Waist" as waist,
-                    ARRAY_AGG(DISTINCT gt."Name") FILTER (WHERE gt."Name" IS NOT NULL) as goal_trainings,
-                    CASE 
-                        WHEN COUNT(DISTINCT pfp."Id") > 0 THEN true 
-                        ELSE false 
-                    END as is_freelance
-                FROM "AspNetUsers" pt
-                INNER JOIN FilteredPTs fp ON pt."Id" = fp.pt_id
-                LEFT JOIN "UserDetails" ud ON pt."Id" = ud."Id"
-                LEFT JOIN "PTGoalTrainings" pgt ON pt."Id" = pgt."ApplicationUsersId"
-                LEFT JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
-                LEFT JOIN "PTFreelancePackages" pfp ON pt."Id" = pfp."PtId" AND pfp."IsEnabled" = true
-                GROUP BY pt."Id", ud."Experience", ud."Certificates", ud."Height", 
-                         ud."Weight", ud."Biceps", ud."Chest", ud."Waist"{experience_filter}
-            )
+            WITH {trainers_cte}
             SELECT 
                 t.id,
                 t.fullname,
@@ -473,49 +501,7 @@ def build_trainer_search_query(user_input, longitude=None, latitude=None):
             # Chỉ trả về PT gym
             print("🏢 Chỉ tìm PT GYM")
             query = f"""
-            WITH FilteredPTs AS (
-                SELECT DISTINCT
-                    pt."Id" as pt_id
-                FROM "AspNetUsers" pt
-                LEFT JOIN "PTGoalTrainings" pgt ON pt."Id" = pgt."ApplicationUsersId"
-                LEFT JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
-                WHERE {where_clause}
-            ),
-            TrainersWithGoals AS (
-                SELECT 
-                    pt."Id" as id,
-                    pt."FullName" as fullname,
-                    pt."Email" as email,
-                    pt."PhoneNumber" as phonenumber,
-                    pt."IsMale" as ismale,
-                    pt."Dob" as dob,
-                    pt."AvatarUrl" as avatarurl,
-                    pt."Bio" as bio,
-                    pt."AccountStatus" as accountstatus,
-                    pt."CreatedAt" as createdat,
-                    pt."UpdatedAt" as updatedat,
-                    pt."GymOwnerId" as pt_gym_id,
-                    ud."Experience" as experience,
-                    ud."Certificates" as certificates,
-                    ud."Height" as height,
-                    ud."Weight" as weight,
-                    ud."Biceps" as biceps,
-                    ud."Chest" as chest,
-                    ud."Waist" as waist,
-                    ARRAY_AGG(DISTINCT gt."Name") FILTER (WHERE gt."Name" IS NOT NULL) as goal_trainings,
-                    CASE 
-                        WHEN COUNT(DISTINCT pfp."Id") > 0 THEN true 
-                        ELSE false 
-                    END as is_freelance
-                FROM "AspNetUsers" pt
-                INNER JOIN FilteredPTs fp ON pt."Id" = fp.pt_id
-                LEFT JOIN "UserDetails" ud ON pt."Id" = ud."Id"
-                LEFT JOIN "PTGoalTrainings" pgt ON pt."Id" = pgt."ApplicationUsersId"
-                LEFT JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
-                LEFT JOIN "PTFreelancePackages" pfp ON pt."Id" = pfp."PtId" AND pfp."IsEnabled" = true
-                GROUP BY pt."Id", ud."Experience", ud."Certificates", ud."Height", 
-                         ud."Weight", ud."Biceps", ud."Chest", ud."Waist"{experience_filter}
-            )
+            WITH {trainers_cte}
             SELECT 
                 t.id,
                 t.fullname,
@@ -538,102 +524,38 @@ def build_trainer_search_query(user_input, longitude=None, latitude=None):
                 t.waist,
                 t.goal_trainings,
                 t.is_freelance,
-                gym."Id" as gym_id_unused,
-                gym."GymName" as gymname,
-                COALESCE(
-                    CONCAT_WS(', ', 
-                        NULLIF(a."HouseNumber", ''), 
-                        NULLIF(a."Street", ''), 
-                        NULLIF(a."Ward", ''), 
-                        NULLIF(a."District", ''), 
-                        NULLIF(a."City", '')
-                    ), 
-                    'Địa chỉ chưa cập nhật'
-                ) as gymaddress,
-                CAST(gym."Latitude" AS DOUBLE PRECISION) as gym_latitude,
-                CAST(gym."Longitude" AS DOUBLE PRECISION) as gym_longitude,
-                gym."hotResearch" as gym_hotresearch,
+                g.id as gym_id_unused,
+                g.gymname,
+                g.gymaddress,
+                g.latitude as gym_latitude,
+                g.longitude as gym_longitude,
+                g.hotresearch as gym_hotresearch,
                 'gym' as pt_type
             FROM TrainersWithGoals t
-            INNER JOIN "AspNetUsers" gym ON t.pt_gym_id = gym."Id"
-            LEFT JOIN "Addresses" a ON gym."Id" = a."CustomerId" AND a."IsEnabled" = true
-            WHERE gym."AccountStatus" = 'Active' AND t.pt_gym_id IS NOT NULL
-            ORDER BY gym."hotResearch" DESC, t.experience DESC NULLS LAST, t.fullname ASC
+            -- gym_search: gym đang hoạt động, một địa chỉ mỗi gym (không nhân đôi PT khi gym có nhiều địa chỉ)
+            INNER JOIN gym_search g ON g.id = t.pt_gym_id
+            ORDER BY g.hotresearch DESC, t.experience DESC NULLS LAST, t.fullname ASC
             LIMIT 10
             """
         else:
             # Mixed cả gym và freelance (default behavior)
             print("🔀 Tìm cả PT GYM và FREELANCE (mixed)")
             query = f"""
-            WITH FilteredPTs AS (
-                SELECT DISTINCT
-                    pt."Id" as pt_id
-                FROM "AspNetUsers" pt
-                LEFT JOIN "PTGoalTrainings" pgt ON pt."Id" = pgt."ApplicationUsersId"
-                LEFT JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
-                WHERE {where_clause}
-            ),
-            TrainersWithGoals AS (
-                SELECT 
-                    pt."Id" as id,
-                    pt."FullName" as fullname,
-                    pt."Email" as email,
-                    pt."PhoneNumber" as phonenumber,
-                    pt."IsMale" as ismale,
-                    pt."Dob" as dob,
-                    pt."AvatarUrl" as avatarurl,
-                    pt."Bio" as bio,
-                    pt."AccountStatus" as accountstatus,
-                    pt."CreatedAt" as createdat,
-                    pt."UpdatedAt" as updatedat,
-                    pt."GymOwnerId" as pt_gym_id,
-                    ud."Experience" as experience,
-                    ud."Certificates" as certificates,
-                    ud."Height" as height,
-                    ud."Weight" as weight,
-                    ud."Biceps" as biceps,
-                    ud."Chest" as chest,
-                    ud."Waist" as waist,
-                    ARRAY_AGG(DISTINCT gt."Name") FILTER (WHERE gt."Name" IS NOT NULL) as goal_trainings,
-                    -- Kiểm tra xem có package freelance không
-                    CASE 
-                        WHEN COUNT(DISTINCT pfp."Id") > 0 THEN true 
-                        ELSE false 
-                    END as is_freelance
-                FROM "AspNetUsers" pt
-                INNER JOIN FilteredPTs fp ON pt."Id" = fp.pt_id
-                LEFT JOIN "UserDetails" ud ON pt."Id" = ud."Id"
-                LEFT JOIN "PTGoalTrainings" pgt ON pt."Id" = pgt."ApplicationUsersId"
-                LEFT JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
-                LEFT JOIN "PTFreelancePackages" pfp ON pt."Id" = pfp."PtId" AND pfp."IsEnabled" = true
-                GROUP BY pt."Id", ud."Experience", ud."Certificates", ud."Height", 
-                         ud."Weight", ud."Biceps", ud."Chest", ud."Waist"{experience_filter}
-            ),
+            WITH {trainers_cte},
             -- PT Gym
             GymPTs AS (
                 SELECT 
                     t.*,
-                    gym."Id" as gym_id,
-                    gym."GymName" as gymname,
-                    COALESCE(
-                        CONCAT_WS(', ', 
-                            NULLIF(a."HouseNumber", ''), 
-                            NULLIF(a."Street", ''), 
-                            NULLIF(a."Ward", ''), 
-                            NULLIF(a."District", ''), 
-                            NULLIF(a."City", '')
-                        ), 
-                        'Địa chỉ chưa cập nhật'
-                    ) as gymaddress,
-                    CAST(gym."Latitude" AS DOUBLE PRECISION) as gym_latitude,
-                    CAST(gym."Longitude" AS DOUBLE PRECISION) as gym_longitude,
-                    gym."hotResearch" as gym_hotresearch,
+                    g.id as gym_id,
+                    g.gymname,
+                    g.gymaddress,
+                    g.latitude as gym_latitude,
+                    g.longitude as gym_longitude,
+                    g.hotresearch as gym_hotresearch,
                     'gym' as pt_type,
-                    ROW_NUMBER() OVER (ORDER BY gym."hotResearch" DESC, t.experience DESC NULLS LAST, t.fullname ASC) as rn
+                    ROW_NUMBER() OVER (ORDER BY g.hotresearch DESC, t.experience DESC NULLS LAST, t.fullname ASC) as rn
                 FROM TrainersWithGoals t
-                INNER JOIN "AspNetUsers" gym ON t.pt_gym_id = gym."Id"
-                LEFT JOIN "Addresses" a ON gym."Id" = a."CustomerId" AND a."IsEnabled" = true
-                WHERE gym."AccountStatus" = 'Active'
+                INNER JOIN gym_search g ON g.id = t.pt_gym_id
             ),
             -- PT Freelance
             FreelancePTs AS (
@@ -666,7 +588,7 @@ def build_trainer_search_query(user_input, longitude=None, latitude=None):
             FROM (
                 SELECT *,
                     ROW_NUMBER() OVER (
-                        PARTITION BY (rn % 2)
+                        PARTITION BY (rn %% 2)
                         ORDER BY 
                             CASE WHEN pt_type = 'gym' THEN 0 ELSE 1 END,
                             gym_hotresearch DESC,
@@ -682,69 +604,49 @@ def build_trainer_search_query(user_input, longitude=None, latitude=None):
             LIMIT 10
             """
 
-        return query
+        return query, params
 
     except Exception as e:
         print(f"Lỗi trong build_trainer_search_query: {str(e)}")
         return None
 
 
+# Bán kính tìm PT (km) theo ý định, xét theo thứ tự ưu tiên
+TRAINER_DISTANCE_INTENTS = [
+    ('trainer_distance.very_close', 2),
+    ('trainer_distance.close', 5),
+    ('trainer_distance.medium', 10),
+    ('trainer_distance.far', 15),
+    ('trainer_distance.very_far', 25),
+    ('trainer_distance.unlimited', 50),
+]
+
+
 def get_trainer_distance_preference(user_input):
     """Phân tích khoảng cách tìm kiếm PT tương tự như gym"""
-    user_input_lower = user_input.lower()
+    intents = scan_intents(user_input)
 
     # Tìm số km cụ thể
-    km_match = re.search(r'(\d+)\s*km', user_input_lower)
-    if km_match:
-        distance = int(km_match.group(1))
-        return max(1, min(distance, 50))
+    km_distance = parse_km_distance(intents)
+    if km_distance is not None:
+        return km_distance
 
     # Pattern matching
-    distance_patterns = {
-        2: [r'(rất gần|very close|đi bộ)'],
-        5: [r'(gần|nearby|close)'],
-        10: [r'(khu vực|trong khu|area)'],
-        15: [r'(xa hơn|farther)'],
-        25: [r'(rất xa|very far)'],
-        50: [r'(tất cả|all|bất kỳ)']
-    }
-
-    for distance, patterns in distance_patterns.items():
-        for pattern in patterns:
-            if re.search(pattern, user_input_lower):
-                return distance
+    for intent, distance in TRAINER_DISTANCE_INTENTS:
+        if intent in intents:
+            return distance
 
     return 10  # Default
 
 
 def detect_trainer_search_intent(user_input):
     """Phát hiện ý định tìm kiếm Personal Trainer"""
-    user_lower = user_input.lower()
-
-    # Từ khóa chỉ rõ tìm PT
-    pt_keywords = [
-        r'\bpt\b', r'huấn luyện viên', r'personal trainer', r'trainer',
-        r'hlv', r'coach', r'giáo viên thể dục',
-        r'tìm pt', r'find trainer', r'tìm trainer'
-    ]
-
-    # Kiểm tra có từ khóa PT không
-    has_pt_keyword = any(re.search(pattern, user_lower) for pattern in pt_keywords)
-
-    # Ngữ cảnh về tập luyện cá nhân
-    training_context = [
-        r'tập riêng', r'tập cá nhân', r'personal training',
-        r'hướng dẫn tập', r'chỉ tập', r'dạy tập',
-        r'tư vấn tập', r'lên lịch tập'
-    ]
-
-    has_training_context = any(re.search(pattern, user_lower) for pattern in training_context)
+    intents = scan_intents(user_input)
 
-    # Mục tiêu cụ thể
-    has_specific_goal = any(goal in user_lower for goal in [
-        'giảm cân', 'tăng cơ', 'thể hình', 'sức mạnh', 'sức bền',
-        'lose weight', 'build muscle', 'bodybuilding', 'strength'
-    ])
+    # Có từ khóa PT, hoặc ngữ cảnh tập luyện cá nhân kèm mục tiêu cụ thể
+    has_pt_keyword = 'trainer.keyword' in intents
+    has_training_context = 'trainer.training_context' in intents
+    has_specific_goal = 'trainer.goal' in intents
 
     return has_pt_keyword or (has_training_context and has_specific_goal)
 
@@ -752,7 +654,7 @@ def detect_trainer_search_intent(user_input):
 def classify_trainer_query(user_input, longitude=None, latitude=None):
     """
     Phân loại truy vấn tìm kiếm PT và tạo SQL
-    Returns: (is_trainer_query, sql_query)
+    Returns: (is_trainer_query, (sql, params))
     """
     try:
         if not detect_trainer_search_intent(user_input):
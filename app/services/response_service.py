@@ -1,16 +1,24 @@
 # app/services/response_service.py - Response generation and handling functions
 
+import asyncio
 from datetime import datetime
 import google.generativeai as genai
 from app.utils.text_utils import sanitize_text_for_json, build_conversation_context
 from app.utils.format_utils import format_distance_friendly
-from app.services.search_service import classify_query_with_context, build_nearby_gym_query, get_nearby_distance_preference
+from app.services.search_service import classify_query_with_context, build_nearby_gym_search, get_nearby_distance_preference, paginate_gym_query, encode_gym_cursor
 from app.services.pt_search_service import classify_trainer_query, build_nearby_trainer_query, get_trainer_distance_preference
+from app.services.intent_service import get_nearest_max_distance
 from app.services.pt_recommendation_service import create_trainer_response
-from app.database.connection import query_database
+from app.services.gym_index_service import gym_index
+from app.services.geo_cache_service import geo_cell_cache
+from app.services.trainer_catalog_service import trainer_catalog
+from app.services.answer_cache_service import answer_cache
+from app.services.gemini_guard_service import GeminiGuard, GeminiUnavailableError, GEMINI_FALLBACK_ANSWER
+from app.database.search_cache import query_database_cached, query_database_cached_async, build_search_cache_key, prime_search_cache
+from app.database.session_store import session_store, SessionNotFoundError
 from app.models.gym_models import safe_get_row_data
 from app.models.trainer_models import safe_get_trainer_data
-from config import GEMINI_API_KEY
+from config import GEMINI_API_KEY, CHAT_BATCH_CONCURRENCY, NEARBY_SEARCH_MODE, NEARBY_KNN_LIMIT, NEARBY_RINGS_KM
 
 # Cấu hình Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
@@ -18,6 +26,9 @@ genai.configure(api_key=GEMINI_API_KEY)
 # Khởi tạo mô hình Gemini
 model = genai.GenerativeModel("gemini-2.0-flash")
 
+# Mọi lời gọi Gemini đi qua guard: deadline, giới hạn đồng thời, retry, circuit breaker
+gemini_guard = GeminiGuard(model)
+
 def create_simple_response(gyms, user_input, is_nearby=False):
     """Tạo phản hồi đơn giản cho kết quả tìm kiếm gym"""
     if not gyms:
@@ -76,139 +87,125 @@ def create_simple_response(gyms, user_input, is_nearby=False):
         
         return response
 
-def get_response_with_history(user_input, conversation_history=None, longitude=None, latitude=None):
-    """Hàm chính để xử lý yêu cầu của người dùng với lịch sử hội thoại"""
-    try:
-        if conversation_history is None:
-            conversation_history = []
-        
-        conversation_context = build_conversation_context(conversation_history)
-        
-        # Thêm tin nhắn của người dùng vào lịch sử
-        current_conversation = conversation_history.copy()
-        current_conversation.append({
-            "role": "user",
-            "content": sanitize_text_for_json(user_input),
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # PRIORITY 1: Xử lý tìm kiếm Personal Trainer
-        is_trainer_query, trainer_sql = classify_trainer_query(user_input, longitude, latitude)
+def append_assistant_message(current_conversation, text):
+    """Thêm tin nhắn của trợ lý vào lịch sử hội thoại"""
+    current_conversation.append({
+        "role": "assistant",
+        "content": sanitize_text_for_json(text),
+        "timestamp": datetime.now().isoformat()
+    })
+
+def build_response_plan(user_input, conversation_history=None, longitude=None, latitude=None, cursor=None, page_size=None):
+    """
+    Phân tích yêu cầu và lập kế hoạch xử lý (không thực hiện I/O)
+    Returns: dict với 'kind' là 'trainer', 'nearby_gym', 'gym' hoặc 'chat';
+    kế hoạch có sẵn 'results' thì không cần truy vấn 'query'
+    """
+    if conversation_history is None:
+        conversation_history = []
 
-        if is_trainer_query:
-            print(f"🏋️ TRAINER_SEARCH: Detected trainer search request")
+    conversation_context = build_conversation_context(conversation_history)
 
-            # Xử lý tìm kiếm PT gần với tọa độ
-            if longitude and latitude and any(keyword in user_input.lower() for keyword in ["gần", "near", "nearby", "xung quanh", "lân cận"]):
+    # Thêm tin nhắn của người dùng vào lịch sử
+    current_conversation = conversation_history.copy()
+    current_conversation.append({
+        "role": "user",
+        "content": sanitize_text_for_json(user_input),
+        "timestamp": datetime.now().isoformat()
+    })
+
+    plan = {
+        "user_input": user_input,
+        "current_conversation": current_conversation,
+        "longitude": longitude,
+        "latitude": latitude
+    }
+
+    # PRIORITY 1: Xử lý tìm kiếm Personal Trainer
+    is_trainer_query, trainer_query = classify_trainer_query(user_input, longitude, latitude)
+
+    if is_trainer_query:
+        print(f"🏋️ TRAINER_SEARCH: Detected trainer search request")
+
+        # Xử lý tìm kiếm PT gần với tọa độ
+        if longitude and latitude and any(keyword in user_input.lower() for keyword in ["gần", "near", "nearby", "xung quanh", "lân cận"]):
+            if NEARBY_SEARCH_MODE == 'knn':
+                max_distance = get_nearest_max_distance(user_input)
+                print(f"🎯 TRAINER NEAREST: PT gần nhất trong {max_distance or 'không giới hạn'}km")
+                trainer_query = build_nearby_trainer_query(longitude, latitude, max_distance, user_input, nearest=True)
+            else:
                 max_distance = get_trainer_distance_preference(user_input)
                 print(f"🎯 TRAINER SMART RADIUS: Bán kính được chọn: {max_distance}km")
-                trainer_sql = build_nearby_trainer_query(longitude, latitude, max_distance)
-
-            results = query_database(trainer_sql)
-
-            if isinstance(results, str) or not results:
-                response_text = "Không tìm thấy huấn luyện viên nào phù hợp với yêu cầu của bạn. Hãy thử mở rộng tiêu chí tìm kiếm!"
-                current_conversation.append({
-                    "role": "assistant",
-                    "content": sanitize_text_for_json(response_text),
-                    "timestamp": datetime.now().isoformat()
-                })
-                return {
-                    "promptResponse": sanitize_text_for_json(response_text),
-                    "conversation_history": current_conversation
-                }
-
-            trainers = [safe_get_trainer_data(row) for row in results]
-            print(f"🎯 TRAINER_RESULT: Tìm thấy {len(trainers)} huấn luyện viên")
-
-            is_nearby = longitude and latitude and any(kw in user_input.lower() for kw in ["gần", "near", "nearby"])
-            prompt_response = create_trainer_response(trainers, user_input, is_nearby)
-
-            current_conversation.append({
-                "role": "assistant",
-                "content": sanitize_text_for_json(prompt_response),
-                "timestamp": datetime.now().isoformat()
-            })
-            return {
-                "trainers": trainers,
-                "promptResponse": sanitize_text_for_json(prompt_response),
-                "conversation_history": current_conversation
-            }
+                trainer_query = build_nearby_trainer_query(longitude, latitude, max_distance, user_input)
+            # Trả lời từ snapshot catalog PT trong bộ nhớ; chưa sẵn sàng thì dùng ứng viên theo ô geohash
+            catalog_results = trainer_catalog.nearby(longitude, latitude, max_distance, user_input, nearest=NEARBY_SEARCH_MODE == 'knn')
+            if catalog_results is None:
+                plan["geo_cell"] = geo_cell_cache.plan_trainers(longitude, latitude, max_distance, user_input)
+        else:
+            catalog_results = trainer_catalog.search(user_input)
+
+        if catalog_results is not None:
+            print(f"🗂️ TRAINER_CATALOG: {len(catalog_results)} PT từ snapshot (không truy vấn DB)")
+            plan["results"] = catalog_results
+
+        plan.update({
+            "kind": "trainer",
+            "query": trainer_query,
+            "is_nearby": bool(longitude and latitude and any(kw in user_input.lower() for kw in ["gần", "near", "nearby"]))
+        })
+        return plan
 
-        # PRIORITY 2: Xử lý tìm kiếm gym gần với tọa độ
-        if longitude and latitude and any(keyword in user_input.lower() for keyword in ["gần", "near", "nearby", "xung quanh", "lân cận", "gần đây", "quanh đây"]):
+    # PRIORITY 2: Xử lý tìm kiếm gym gần với tọa độ
+    if longitude and latitude and any(keyword in user_input.lower() for keyword in ["gần", "near", "nearby", "xung quanh", "lân cận", "gần đây", "quanh đây"]):
+        if NEARBY_SEARCH_MODE == 'knn':
+            # k gym gần nhất, khoảng cách tối đa thay cho bán kính đoán từ câu
+            max_distance = get_nearest_max_distance(user_input)
+            print(f"🎯 NEAREST: User input '{user_input}' → {NEARBY_KNN_LIMIT} gym gần nhất trong {max_distance or 'không giới hạn'}km")
+        else:
             max_distance = get_nearby_distance_preference(user_input)
             print(f"🎯 SMART RADIUS: User input '{user_input}' → Bán kính được chọn: {max_distance}km")
-            
-            sql_query = build_nearby_gym_query(longitude, latitude, max_distance)
-            results = query_database(sql_query)
 
-            if isinstance(results, str) or not results:
-                response_text = f"Không tìm thấy gym nào trong bán kính {max_distance}km. Hãy thử mở rộng khu vực tìm kiếm!"
-                current_conversation.append({
-                    "role": "assistant",
-                    "content": sanitize_text_for_json(response_text),
-                    "timestamp": datetime.now().isoformat()
-                })
-                return {
-                    "promptResponse": sanitize_text_for_json(response_text),
-                    "conversation_history": current_conversation
-                }
-
-            gyms = [safe_get_row_data(row) for row in results]
-            print(f"🔍 DEBUG: Tìm thấy {len(gyms)} gym trong bán kính {max_distance}km")
-            for i, gym in enumerate(gyms):
-                print(f"  {i+1}. {gym['gymName']} - {gym.get('distance_km', 'N/A')}km")
-            
-            prompt_response = create_simple_response(gyms, user_input, is_nearby=True)
-
-            current_conversation.append({
-                "role": "assistant",
-                "content": sanitize_text_for_json(prompt_response),
-                "timestamp": datetime.now().isoformat()
-            })
-            return {
-                "gyms": gyms, 
-                "promptResponse": sanitize_text_for_json(prompt_response),
-                "conversation_history": current_conversation
-            }
-        
-        # PRIORITY 3: Truy vấn cơ sở dữ liệu thông thường (gym search)
-        is_db_query, sql_query = classify_query_with_context(user_input, conversation_context)
-        print(f"🔍 QUERY_CLASSIFICATION: is_db_query={is_db_query}, user_input='{user_input}'")
-        
-        if is_db_query:
-            results = query_database(sql_query)
-            if isinstance(results, str) or not results:
-                response_text = "Không tìm thấy gym nào phù hợp với tiêu chí của bạn. Hãy thử tìm kiếm khác!"
-                current_conversation.append({
-                    "role": "assistant",
-                    "content": sanitize_text_for_json(response_text),
-                    "timestamp": datetime.now().isoformat()
-                })
-                return {
-                    "promptResponse": sanitize_text_for_json(response_text),
-                    "conversation_history": current_conversation
-                }
-
-            gyms = [safe_get_row_data(row) for row in results]
-            print(f"🎯 SEARCH_RESULT: Tìm thấy {len(gyms)} gym từ database")
-            
-            prompt_response = create_simple_response(gyms, user_input)
-
-            current_conversation.append({
-                "role": "assistant",
-                "content": sanitize_text_for_json(prompt_response),
-                "timestamp": datetime.now().isoformat()
-            })
-            return {
-                "gyms": gyms, 
-                "promptResponse": sanitize_text_for_json(prompt_response),
-                "conversation_history": current_conversation
-            }
+        plan.update({"kind": "nearby_gym", "max_distance": max_distance})
 
-        # PRIORITY 4: Hội thoại tự do với Gemini
-        enhanced_context = f"""
+        # Trả lời từ chỉ mục không gian trong bộ nhớ, chỉ truy vấn DB khi chỉ mục chưa sẵn sàng
+        if NEARBY_SEARCH_MODE == 'knn':
+            indexed_results = gym_index.nearest(latitude, longitude, NEARBY_KNN_LIMIT, max_distance)
+        else:
+            indexed_results = gym_index.query_radius(latitude, longitude, max_distance)
+        if indexed_results is not None:
+            print(f"🗺️ GYM_INDEX: {len(indexed_results)} gym trong bán kính {max_distance or 'không giới hạn'}km (không truy vấn DB)")
+            if not indexed_results and max_distance and max_distance < NEARBY_RINGS_KM[-1]:
+                # Không có gym: đếm các vòng bán kính rộng hơn và trả luôn gym của vòng nhỏ nhất có kết quả
+                ring_counts, ring_results = gym_index.count_rings(latitude, longitude, NEARBY_RINGS_KM)
+                ring_km = next((ring for ring, count in zip(NEARBY_RINGS_KM, ring_counts) if count), None)
+                if ring_km is not None:
+                    indexed_results = [row for row in ring_results if row['distance_km'] <= ring_km]
+                    if NEARBY_SEARCH_MODE == 'knn':
+                        indexed_results = indexed_results[:NEARBY_KNN_LIMIT]
+                plan["ring_counts"] = ring_counts
+            plan["results"] = indexed_results
+        else:
+            plan["query"] = build_nearby_gym_search(longitude, latitude, max_distance)
+            plan["geo_cell"] = geo_cell_cache.plan_gyms(longitude, latitude, max_distance, nearest=NEARBY_SEARCH_MODE == 'knn')
+        return plan
+
+    # PRIORITY 3: Truy vấn cơ sở dữ liệu thông thường (gym search)
+    is_db_query, sql_query = classify_query_with_context(user_input, conversation_context)
+    print(f"🔍 QUERY_CLASSIFICATION: is_db_query={is_db_query}, user_input='{user_input}'")
+
+    if is_db_query:
+        # Giới hạn số gym mỗi trang, trang tiếp theo lấy qua cursor (keyset)
+        paged_query, page_size, fingerprint = paginate_gym_query(sql_query, page_size, cursor)
+        plan.update({
+            "kind": "gym",
+            "query": paged_query,
+            "page_size": page_size,
+            "query_fingerprint": fingerprint
+        })
+        return plan
+
+    # PRIORITY 4: Hội thoại tự do với Gemini
+    enhanced_context = f"""
         Bạn là FitBridge AI - trợ lý tìm kiếm phòng gym và huấn luyện viên cá nhân thân thiện và chuyên nghiệp tại Việt Nam.
         
         Khả năng:
@@ -227,34 +224,380 @@ def get_response_with_history(user_input, conversation_history=None, longitude=N
         Lịch sử hội thoại:
         {conversation_context}
         """
-        
-        prompt = f"{enhanced_context}\n\nCâu hỏi của người dùng: {user_input}"
-        response = model.generate_content(prompt)
-        
-        current_conversation.append({
-            "role": "assistant", 
-            "content": sanitize_text_for_json(response.text),
-            "timestamp": datetime.now().isoformat()
-        })
-        
+
+    plan.update({
+        "kind": "chat",
+        "prompt": f"{enhanced_context}\n\nCâu hỏi của người dùng: {user_input}",
+        "conversation_context": conversation_context
+    })
+    return plan
+
+def fetch_search_results(plan):
+    """
+    Kết quả tìm kiếm của kế hoạch: có sẵn trong kế hoạch, xếp hạng lại từ ứng viên của ô geohash,
+    hoặc truy vấn qua cache kết quả
+    """
+    if "results" in plan:
+        return plan["results"]
+    if plan.get("geo_cell"):
+        results = geo_cell_cache.fetch(plan["geo_cell"])
+        # Không có kết quả hoặc lỗi: chạy truy vấn gốc (tìm gym gần còn đếm các vòng bán kính rộng hơn)
+        if results and not isinstance(results, str):
+            return results
+    return query_database_cached(plan["kind"], plan["query"])
+
+async def fetch_search_results_async(plan):
+    """Phiên bản bất đồng bộ của fetch_search_results"""
+    if "results" in plan:
+        return plan["results"]
+    if plan.get("geo_cell"):
+        results = await geo_cell_cache.fetch_async(plan["geo_cell"])
+        if results and not isinstance(results, str):
+            return results
+    return await query_database_cached_async(plan["kind"], plan["query"])
+
+def build_search_response(plan, results):
+    """Tạo phản hồi từ kết quả truy vấn cơ sở dữ liệu theo kế hoạch đã lập"""
+    current_conversation = plan["current_conversation"]
+    user_input = plan["user_input"]
+
+    if plan["kind"] == "trainer":
+        if isinstance(results, str) or not results:
+            response_text = "Không tìm thấy huấn luyện viên nào phù hợp với yêu cầu của bạn. Hãy thử mở rộng tiêu chí tìm kiếm!"
+            append_assistant_message(current_conversation, response_text)
+            return {
+                "promptResponse": sanitize_text_for_json(response_text),
+                "conversation_history": current_conversation
+            }
+
+        trainers = [safe_get_trainer_data(row) for row in results]
+        print(f"🎯 TRAINER_RESULT: Tìm thấy {len(trainers)} huấn luyện viên")
+
+        prompt_response = create_trainer_response(trainers, user_input, plan["is_nearby"])
+
+        append_assistant_message(current_conversation, prompt_response)
         return {
-            "promptResponse": sanitize_text_for_json(response.text),
+            "trainers": trainers,
+            "promptResponse": sanitize_text_for_json(prompt_response),
             "conversation_history": current_conversation
         }
 
-    except Exception as e:
-        print(f"Lỗi trong get_response_with_history: {str(e)}")
-        error_response = "Xin lỗi, đã xảy ra lỗi hệ thống. Vui lòng thử lại!"
-
-        if 'current_conversation' in locals():
-            current_conversation.append({
-                "role": "assistant", 
-                "content": sanitize_text_for_json(error_response),
-                "timestamp": datetime.now().isoformat()
-            })
+    if plan["kind"] == "nearby_gym":
+        max_distance = plan["max_distance"]
+        if isinstance(results, str) or not results:
+            if max_distance and max_distance < NEARBY_RINGS_KM[-1] and not isinstance(results, str):
+                # Các vòng bán kính rộng hơn cũng đã được xét trong cùng truy vấn
+                response_text = f"Không tìm thấy gym nào trong bán kính {NEARBY_RINGS_KM[-1]}km quanh bạn. Hãy thử tìm theo tên hoặc khu vực!"
+            elif max_distance:
+                response_text = f"Không tìm thấy gym nào trong bán kính {max_distance}km. Hãy thử mở rộng khu vực tìm kiếm!"
+            else:
+                response_text = "Không tìm thấy gym nào có vị trí trên bản đồ. Hãy thử tìm theo tên hoặc khu vực!"
+            append_assistant_message(current_conversation, response_text)
             return {
-                "promptResponse": sanitize_text_for_json(error_response),
+                "promptResponse": sanitize_text_for_json(response_text),
                 "conversation_history": current_conversation
             }
-        
-        return {"promptResponse": sanitize_text_for_json(error_response)}
\ No newline at end of file
+
+        gyms = [safe_get_row_data(row) for row in results]
+        print(f"🔍 DEBUG: Tìm thấy {len(gyms)} gym trong bán kính {max_distance or 'không giới hạn'}km")
+        for i, gym in enumerate(gyms):
+            print(f"  {i+1}. {gym['gymName']} - {gym.get('distance_km', 'N/A')}km")
+
+        prompt_response = create_simple_response(gyms, user_input, is_nearby=True)
+
+        # Không có gym trong bán kính: kết quả là của vòng rộng hơn, kèm số gym theo từng vòng
+        ring_counts = plan.get("ring_counts") or results[0].get('ring_counts')
+        if ring_counts:
+            prompt_response = f"{describe_ring_counts(max_distance, ring_counts)}\n{prompt_response}"
+            if "query" in plan:
+                prime_ring_follow_up(plan, ring_counts, results)
+
+        append_assistant_message(current_conversation, prompt_response)
+        return {
+            "gyms": gyms, 
+            "promptResponse": sanitize_text_for_json(prompt_response),
+            "conversation_history": current_conversation
+        }
+
+    # Tìm kiếm gym thông thường
+    if isinstance(results, str) or not results:
+        response_text = "Không tìm thấy gym nào phù hợp với tiêu chí của bạn. Hãy thử tìm kiếm khác!"
+        append_assistant_message(current_conversation, response_text)
+        return {
+            "promptResponse": sanitize_text_for_json(response_text),
+            "conversation_history": current_conversation
+        }
+
+    # Truy vấn lấy dư 1 hàng: nếu có thì còn trang tiếp theo
+    next_cursor = None
+    if len(results) > plan["page_size"]:
+        results = results[:plan["page_size"]]
+        next_cursor = encode_gym_cursor(results[-1], plan["query_fingerprint"])
+
+    gyms = [safe_get_row_data(row) for row in results]
+    print(f"🎯 SEARCH_RESULT: Tìm thấy {len(gyms)} gym từ database (còn trang tiếp: {next_cursor is not None})")
+
+    prompt_response = create_simple_response(gyms, user_input)
+    if next_cursor:
+        prompt_response += "\nCòn nhiều phòng gym khác phù hợp, bạn có muốn xem thêm không?"
+
+    append_assistant_message(current_conversation, prompt_response)
+    response = {
+        "gyms": gyms, 
+        "promptResponse": sanitize_text_for_json(prompt_response),
+        "conversation_history": current_conversation
+    }
+    if next_cursor:
+        response["next_cursor"] = next_cursor
+    return response
+
+def describe_ring_counts(max_distance, ring_counts):
+    """Câu mô tả số gym theo vòng bán kính, ví dụ: không có gym trong 5km, nhưng có 7 gym trong 10km"""
+    wider_rings = []
+    previous_count = 0
+    for ring_km, count in zip(NEARBY_RINGS_KM, ring_counts):
+        # Bỏ các vòng không thêm gym nào so với vòng trước
+        if ring_km > max_distance and count > previous_count:
+            wider_rings.append(f"{count} gym trong {ring_km}km")
+        previous_count = count
+    return f"Không có gym nào trong bán kính {max_distance}km, nhưng có {', '.join(wider_rings)}."
+
+def prime_ring_follow_up(plan, ring_counts, results):
+    """
+    Lưu sẵn kết quả của vòng nhỏ nhất có gym vào cache tìm kiếm,
+    để câu hỏi tiếp theo (ví dụ "gym trong 10km") không phải truy vấn lại
+    """
+    ring_km = next(ring for ring, count in zip(NEARBY_RINGS_KM, ring_counts) if count)
+    follow_up_query = build_nearby_gym_search(plan["longitude"], plan["latitude"], ring_km)
+    prime_search_cache("nearby_gym", follow_up_query, [{**row, 'ring_counts': None} for row in results])
+
+def build_chat_response(plan, response_text):
+    """Tạo phản hồi từ câu trả lời của Gemini"""
+    current_conversation = plan["current_conversation"]
+    append_assistant_message(current_conversation, response_text)
+
+    return {
+        "promptResponse": sanitize_text_for_json(response_text),
+        "conversation_history": current_conversation
+    }
+
+def build_error_response(plan=None):
+    """Tạo phản hồi lỗi hệ thống, giữ lại lịch sử hội thoại nếu có"""
+    error_response = "Xin lỗi, đã xảy ra lỗi hệ thống. Vui lòng thử lại!"
+
+    if plan is not None:
+        current_conversation = plan["current_conversation"]
+        append_assistant_message(current_conversation, error_response)
+        return {
+            "promptResponse": sanitize_text_for_json(error_response),
+            "conversation_history": current_conversation
+        }
+
+    return {"promptResponse": sanitize_text_for_json(error_response)}
+
+def load_session_history(session_id, conversation_history=None):
+    """
+    Lịch sử hội thoại lưu phía server; phiên vừa tạo (chưa có tin nhắn) bắt đầu từ lịch sử client gửi (nếu có)
+    session_id không do POST /sessions cấp hoặc đã hết hạn: SessionNotFoundError
+    """
+    history = session_store.load(session_id)
+    if history is None:
+        raise SessionNotFoundError(f"Không tìm thấy phiên hội thoại: {session_id}")
+    return history or list(conversation_history or [])
+
+def finish_session_response(session_id, history_length, response):
+    """Lưu các tin nhắn mới vào phiên và chỉ trả về chúng thay cho toàn bộ lịch sử"""
+    conversation = response.pop("conversation_history", None)
+    new_messages = conversation[history_length:] if conversation is not None else []
+    if new_messages:
+        session_store.append(session_id, new_messages)
+    response["session_id"] = session_id
+    response["messages"] = new_messages
+    return response
+
+async def load_session_history_async(session_id, conversation_history=None):
+    """Phiên bản bất đồng bộ của load_session_history: đọc kho phiên (có thể là SQLite) trong thread riêng"""
+    return await asyncio.to_thread(load_session_history, session_id, conversation_history)
+
+async def finish_session_response_async(session_id, history_length, response):
+    """Phiên bản bất đồng bộ của finish_session_response: ghi kho phiên trong thread riêng"""
+    return await asyncio.to_thread(finish_session_response, session_id, history_length, response)
+
+def get_response_with_history(user_input, conversation_history=None, longitude=None, latitude=None, cursor=None, page_size=None, session_id=None):
+    """Hàm chính để xử lý yêu cầu của người dùng với lịch sử hội thoại"""
+    if session_id:
+        history = load_session_history(session_id, conversation_history)
+        response = get_response_with_history(user_input, history, longitude, latitude, cursor, page_size)
+        return finish_session_response(session_id, len(history), response)
+
+    plan = None
+    try:
+        plan = build_response_plan(user_input, conversation_history, longitude, latitude, cursor, page_size)
+
+        if plan["kind"] == "chat":
+            cached_answer, _ = answer_cache.lookup(user_input, plan["conversation_context"])
+            if cached_answer is not None:
+                return build_chat_response(plan, cached_answer)
+
+            try:
+                response = gemini_guard.generate(plan["prompt"])
+            except GeminiUnavailableError:
+                return build_chat_response(plan, GEMINI_FALLBACK_ANSWER)
+            answer_cache.store(user_input, plan["conversation_context"], response.text)
+            return build_chat_response(plan, response.text)
+
+        results = fetch_search_results(plan)
+        return build_search_response(plan, results)
+
+    except Exception as e:
+        print(f"Lỗi trong get_response_with_history: {str(e)}")
+        return build_error_response(plan)
+
+async def answer_chat_plan_async(plan):
+    """Trả lời câu hỏi tự do: tra cache câu trả lời rồi mới gọi Gemini qua guard"""
+    user_input = plan["user_input"]
+    cached_answer, _ = answer_cache.lookup(user_input, plan["conversation_context"])
+    if cached_answer is not None:
+        return build_chat_response(plan, cached_answer)
+
+    try:
+        response = await gemini_guard.generate_async(plan["prompt"])
+    except GeminiUnavailableError:
+        return build_chat_response(plan, GEMINI_FALLBACK_ANSWER)
+    answer_cache.store(user_input, plan["conversation_context"], response.text)
+    return build_chat_response(plan, response.text)
+
+async def get_response_with_history_async(user_input, conversation_history=None, longitude=None, latitude=None, cursor=None, page_size=None, session_id=None):
+    """Phiên bản bất đồng bộ của get_response_with_history: truy vấn DB và gọi Gemini không chặn event loop"""
+    if session_id:
+        history = await load_session_history_async(session_id, conversation_history)
+        response = await get_response_with_history_async(user_input, history, longitude, latitude, cursor, page_size)
+        return await finish_session_response_async(session_id, len(history), response)
+
+    plan = None
+    try:
+        plan = build_response_plan(user_input, conversation_history, longitude, latitude, cursor, page_size)
+
+        if plan["kind"] == "chat":
+            return await answer_chat_plan_async(plan)
+
+        results = await fetch_search_results_async(plan)
+        return build_search_response(plan, results)
+
+    except Exception as e:
+        print(f"Lỗi trong get_response_with_history_async: {str(e)}")
+        return build_error_response(plan)
+
+async def stream_response_with_history(user_input, conversation_history=None, longitude=None, latitude=None, cursor=None, page_size=None, session_id=None):
+    """
+    Phiên bản streaming: sinh các sự kiện (event, data) cho Server-Sent Events
+    - 'chunk': từng đoạn câu trả lời Gemini (đã làm sạch)
+    - 'result': kết quả gym/PT từ database trong một sự kiện
+    - 'error': thông báo lỗi
+    - 'done': sự kiện cuối, gồm promptResponse và conversation_history đã cập nhật
+      (với session_id: session_id và messages mới thay cho conversation_history)
+    """
+    if session_id:
+        history = await load_session_history_async(session_id, conversation_history)
+        async for event, data in stream_response_with_history(user_input, history, longitude, latitude, cursor, page_size):
+            if event == "done":
+                data = await finish_session_response_async(session_id, len(history), data)
+            yield event, data
+        return
+
+    plan = None
+    try:
+        plan = build_response_plan(user_input, conversation_history, longitude, latitude, cursor, page_size)
+
+        if plan["kind"] != "chat":
+            results = await fetch_search_results_async(plan)
+            response = build_search_response(plan, results)
+            yield "result", {key: value for key, value in response.items() if key != "conversation_history"}
+            yield "done", {"promptResponse": response["promptResponse"], "conversation_history": response["conversation_history"]}
+            return
+
+        cached_answer, _ = answer_cache.lookup(user_input, plan["conversation_context"])
+        if cached_answer is not None:
+            yield "chunk", {"text": sanitize_text_for_json(cached_answer)}
+            yield "done", build_chat_response(plan, cached_answer)
+            return
+
+        parts = []
+        try:
+            async for text in gemini_guard.stream_async(plan["prompt"]):
+                parts.append(text)
+                yield "chunk", {"text": sanitize_text_for_json(text)}
+        except GeminiUnavailableError:
+            # Lỗi giữa chừng khi đã gửi một phần câu trả lời thì báo lỗi như bình thường
+            if parts:
+                raise
+            yield "chunk", {"text": GEMINI_FALLBACK_ANSWER}
+            yield "done", build_chat_response(plan, GEMINI_FALLBACK_ANSWER)
+            return
+
+        full_text = "".join(parts)
+        answer_cache.store(user_input, plan["conversation_context"], full_text)
+        yield "done", build_chat_response(plan, full_text)
+
+    except Exception as e:
+        print(f"Lỗi trong stream_response_with_history: {str(e)}")
+        error = build_error_response(plan)
+        yield "error", {"promptResponse": error["promptResponse"]}
+        yield "done", error
+
+async def process_chat_batch(requests, max_concurrency=CHAT_BATCH_CONCURRENCY):
+    """
+    Xử lý nhiều ChatRequest đồng thời (tối đa max_concurrency cùng lúc)
+    - Các tìm kiếm DB giống hệt nhau trong lô chỉ chạy một lần, kết quả dùng chung
+    - Kết quả giữ đúng thứ tự đầu vào, lỗi được báo riêng cho từng phần tử
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    shared_searches = {}  # khóa tìm kiếm -> task truy vấn dùng chung
+    search_requests = 0
+
+    async def fetch_results(plan):
+        nonlocal search_requests
+        search_requests += 1
+        key = build_search_cache_key(plan["kind"], plan["query"])
+        task = shared_searches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch_search_results_async(plan))
+            shared_searches[key] = task
+        return await task
+
+    async def process_item(index, request):
+        async with semaphore:
+            plan = None
+            history = request.conversation_history
+            try:
+                if request.session_id:
+                    history = await load_session_history_async(request.session_id, history)
+                plan = build_response_plan(request.prompt, history, request.longitude,
+                                           request.latitude, request.cursor, request.page_size)
+                if plan["kind"] == "chat":
+                    response = await answer_chat_plan_async(plan)
+                else:
+                    results = plan["results"] if "results" in plan else await fetch_results(plan)
+                    response = build_search_response(plan, results)
+                if request.session_id:
+                    response = await finish_session_response_async(request.session_id, len(history), response)
+                return {"index": index, "status": "ok", "response": response}
+            except Exception as e:
+                print(f"Lỗi trong process_chat_batch (phần tử {index}): {str(e)}")
+                response = build_error_response(plan)
+                if request.session_id and plan is not None:
+                    response = await finish_session_response_async(request.session_id, len(history), response)
+                return {"index": index, "status": "error", "error": str(e), "response": response}
+
+    items = await asyncio.gather(*(process_item(index, request) for index, request in enumerate(requests)))
+
+    failed = sum(1 for item in items if item["status"] == "error")
+    print(f"📦 CHAT_BATCH: {len(items)} yêu cầu, {failed} lỗi, {search_requests} tìm kiếm DB -> {len(shared_searches)} truy vấn")
+    return {
+        "results": items,
+        "total": len(items),
+        "succeeded": len(items) - failed,
+        "failed": failed,
+        "search_requests": search_requests,
+        "unique_searches": len(shared_searches)
+    }
@@ -1,244 +1,411 @@
 # app/services/search_service.py - Search logic and query building functions
 
+import base64
+import hashlib
+import json
 import math
 import re
 from app.utils.text_utils import normalize_vietnamese_text, extract_search_keywords
+from app.utils.geo_utils import bounding_box, KM_PER_DEGREE, HAVERSINE_SQL, BOUNDING_BOX_SQL, NEAREST_ORDER_SQL
+from app.services.intent_service import scan_intents, parse_km_distance
 from app.database.connection import query_database
+from config import DEFAULT_GYM_PAGE_SIZE, MAX_GYM_PAGE_SIZE, GYM_SEARCH_MODE, NEARBY_SEARCH_MODE, NEARBY_KNN_LIMIT, NEARBY_KNN_CANDIDATE_FACTOR, NEARBY_RINGS_KM
 
-def build_nearby_gym_query(longitude, latitude, max_distance_km= 10):
-    """Xây dựng truy vấn SQL để tìm gym gần sử dụng công thức Haversine"""
-    # Tối ưu hóa với bounding box để giảm tải tính toán
-    lat_range = max_distance_km / 111.0  # 1 độ vĩ độ ≈ 111km
-    lng_range = max_distance_km / (111.0 * abs(math.cos(math.radians(latitude))))
-    
-    return f"""
+# Cột gym trả về cho client, đọc từ materialized view gym_search (một hàng mỗi gym đang hoạt động,
+# địa chỉ đầy đủ và tọa độ DOUBLE PRECISION đã tính sẵn - xem app/database/sql/001_gym_search.sql)
+GYM_SEARCH_COLUMNS = """g.id, g.gymname, g.fullname, g.gymaddress, g.taxcode,
+            g.longitude, g.latitude, g.hotresearch, g.accountstatus,
+            g.email, g.phonenumber, g.gymdescription, g.avatarurl,
+            g.gymimages, g.createdat, g.updatedat, g.dob"""
+
+# Truy vấn gym gần (template cố định, các giá trị được bind qua tham số)
+NEARBY_GYM_QUERY = f"""
     WITH BoundedGyms AS (
         SELECT 
-            u."Id" as id, 
-            u."GymName" as gymname, 
-            u."FullName" as fullname,
-            COALESCE(
-                CONCAT_WS(', ', 
-                    NULLIF(a."HouseNumber", ''), 
-                    NULLIF(a."Street", ''), 
-                    NULLIF(a."Ward", ''), 
-                    NULLIF(a."District", ''), 
-                    NULLIF(a."City", '')
-                ), 
-                'Địa chỉ chưa cập nhật'
-            ) as gymaddress,
-            u."TaxCode" as taxcode,
-            CAST(u."Longitude" AS DOUBLE PRECISION) AS longitude,
-            CAST(u."Latitude" AS DOUBLE PRECISION) AS latitude,
-            u."hotResearch" as hotresearch, 
-            u."AccountStatus" as accountstatus,
-            u."Email" as email, 
-            u."PhoneNumber" as phonenumber,
-            u."GymDescription" as gymdescription, 
-            u."AvatarUrl" as avatarurl,
-            u."GymImages" as gymimages, 
-            u."CreatedAt" as createdat,
-            u."UpdatedAt" as updatedat, 
-            u."Dob" as dob
-        FROM "AspNetUsers" u
-        LEFT JOIN "Addresses" a ON u."Id" = a."CustomerId" AND a."IsEnabled" = true
-        WHERE u."AccountStatus" = 'Active'
-        AND u."GymName" IS NOT NULL 
-        AND u."GymName" != ''
-        AND u."Latitude" IS NOT NULL 
-        AND u."Longitude" IS NOT NULL
-        AND CAST(u."Latitude" AS DOUBLE PRECISION) BETWEEN {latitude - lat_range} AND {latitude + lat_range}
-        AND CAST(u."Longitude" AS DOUBLE PRECISION) BETWEEN {longitude - lng_range} AND {longitude + lng_range}
+            {GYM_SEARCH_COLUMNS}
+        FROM gym_search g
+        WHERE g.latitude IS NOT NULL 
+        AND g.longitude IS NOT NULL
+        AND {BOUNDING_BOX_SQL.format(lat='g.latitude', lng='g.longitude')}
     ),
     DistanceCalculated AS (
         SELECT *,
-            6371.0 * 2 * ASIN(
-                SQRT(
-                    POWER(SIN(RADIANS({latitude} - latitude) / 2), 2) +
-                    COS(RADIANS({latitude})) * COS(RADIANS(latitude)) *
-                    POWER(SIN(RADIANS({longitude} - longitude) / 2), 2)
-                )
-            ) AS distance_km
+            {HAVERSINE_SQL.format(lat='latitude', lng='longitude')} AS distance_km
         FROM BoundedGyms
     )
     SELECT * 
     FROM DistanceCalculated
-    WHERE distance_km <= {max_distance_km}
+    WHERE distance_km <= %(max_distance_km)s
     ORDER BY distance_km ASC, hotresearch DESC, gymname ASC;
     """
 
-def get_nearby_distance_preference(user_input):
-    """Phân tích đầu vào của người dùng để xác định bán kính tìm kiếm phù hợp"""
-    user_input_lower = user_input.lower()
-    
-    # 1. Tìm số km cụ thể trong câu (ưu tiên cao nhất)
-    import re
-    km_match = re.search(r'(\d+)\s*km', user_input_lower)
-    if km_match:
-        distance = int(km_match.group(1))
-        # Giới hạn khoảng cách hợp lý (1-50km)
-        return max(1, min(distance, 50))
-    
-    # 2. Phân tích theo cấp độ khoảng cách với từ khóa thông minh
-    distance_patterns = {
-        # Rất gần - 2km
-        2: [
-            r'(rất gần|very close|walking distance|đi bộ|đi bộ được)',
-            r'(ngay gần|sát bên|cực gần|siêu gần)',
-            r'(trong phạm vi \d{1,3}\s*m|dưới 1km|under 1km)'
-        ],
-        
-        # Gần - 5km  
-        5: [
-            r'(gần|nearby|close|lân cận|kề bên)',
-            r'(quanh đây|xung quanh|around here)',
-            r'(không xa|not far|gần nhà|near home)'
-        ],
-        
-        # Trung bình - 10km
-        10: [
-            r'(khu vực|trong khu|in the area|local)',
-            r'(xa một chút|bit farther|hơi xa)',
-            r'(trong thành phố|in the city|cùng thành phố)'
-        ],
-        
-        # Xa - 15km
-        15: [
-            r'(xa hơn|farther|more distant)',
-            r'(trong tỉnh|in province|cùng tỉnh)',
-            r'(mở rộng|expand|extend)'
-        ],
-        
-        # Rất xa - 25km
-        25: [
-            r'(rất xa|very far|distant)',
-            r'(khắp nơi|everywhere|anywhere)',
-            r'(toàn bộ|all|entire|whole)'
-        ],
-        
-        # Không giới hạn - 50km
-        50: [
-            r'(tất cả|all gyms|mọi|every|bất kỳ đâu)',
-            r'(không giới hạn|unlimited|no limit)',
-            r'(toàn quốc|nationwide|whole country)'
-        ]
+# Thứ tự xếp hạng kết quả tìm gym, đồng thời là khóa keyset để phân trang
+GYM_RANKING_ORDER = "hot_score DESC, relevance_score DESC, recency_score DESC, gymname ASC, id ASC"
+
+# Điều kiện keyset: điểm số được đảo dấu để cả bộ khóa so sánh theo chiều tăng dần
+GYM_KEYSET_CONDITION = """
+    WHERE (-ranked.hot_score, -ranked.relevance_score, -ranked.recency_score, ranked.gymname, ranked.id)
+        > (%(after_hot_score)s, %(after_relevance_score)s, %(after_recency_score)s, %(after_gymname)s, %(after_id)s)"""
+
+def clamp_gym_page_size(page_size=None):
+    """Giới hạn kích thước trang trong khoảng 1..MAX_GYM_PAGE_SIZE"""
+    if not page_size:
+        return DEFAULT_GYM_PAGE_SIZE
+    return max(1, min(int(page_size), MAX_GYM_PAGE_SIZE))
+
+def gym_query_fingerprint(query):
+    """Dấu vân tay của truy vấn gốc để cursor chỉ dùng được cho đúng truy vấn đó"""
+    sql, params = query
+    payload = sql + json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def encode_gym_cursor(row, fingerprint):
+    """Tạo cursor mờ (base64) từ hàng cuối cùng của trang hiện tại"""
+    payload = {
+        "q": fingerprint,
+        "k": [-row['hot_score'], -row['relevance_score'], -row['recency_score'], row['gymname'], str(row['id'])]
     }
-    
-    # 3. Duyệt qua các pattern theo thứ tự ưu tiên
-    for distance, patterns in distance_patterns.items():
-        for pattern in patterns:
-            if re.search(pattern, user_input_lower):
-                return distance
-    
-    # 4. Phân tích thông minh dựa trên ngữ cảnh
-    
-    # Nếu có từ khóa về phương tiện di chuyển
-    transport_keywords = {
-        r'(xe đạp|bicycle|bike)': 8,
-        r'(xe máy|motorbike|scooter)': 15, 
-        r'(ô tô|car|drive|driving)': 20,
-        r'(xe bus|bus|public transport)': 12
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_gym_cursor(cursor, fingerprint):
+    """
+    Giải mã cursor và kiểm tra nó thuộc về truy vấn hiện tại
+    Returns: list khóa keyset hoặc None nếu cursor không hợp lệ
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        key = payload["k"]
+        if payload.get("q") != fingerprint or len(key) != 5:
+            return None
+        return key
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+def paginate_gym_query(query, page_size=None, cursor=None):
+    """
+    Bọc truy vấn gym đã xếp hạng bằng keyset pagination (không dùng OFFSET)
+    Lấy thêm 1 hàng để biết còn trang tiếp theo hay không
+    Returns: tuple ((sql, params), page_size, fingerprint)
+    """
+    sql, params = query
+    page_size = clamp_gym_page_size(page_size)
+    fingerprint = gym_query_fingerprint(query)
+
+    paged_params = dict(params)
+    paged_params['page_limit'] = page_size + 1
+    keyset_condition = ""
+
+    if cursor:
+        key = decode_gym_cursor(cursor, fingerprint)
+        if key is None:
+            print(f"⚠️ PAGINATION: Cursor không hợp lệ hoặc không khớp truy vấn, trả về trang đầu")
+        else:
+            keyset_condition = GYM_KEYSET_CONDITION
+            paged_params.update({
+                'after_hot_score': key[0],
+                'after_relevance_score': key[1],
+                'after_recency_score': key[2],
+                'after_gymname': key[3],
+                'after_id': key[4]
+            })
+
+    paged_sql = f"""
+    SELECT * FROM ({sql}) AS ranked{keyset_condition}
+    ORDER BY {GYM_RANKING_ORDER}
+    LIMIT %(page_limit)s
+    """
+    return (paged_sql, paged_params), page_size, fingerprint
+
+def build_nearby_gym_query(longitude, latitude, max_distance_km= 10):
+    """
+    Xây dựng truy vấn SQL để tìm gym gần sử dụng công thức Haversine
+    Returns: tuple (sql, params) - câu SQL cố định với tham số bind
+    """
+    # Tối ưu hóa với bounding box để giảm tải tính toán
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, max_distance_km)
+
+    params = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'min_latitude': min_latitude,
+        'max_latitude': max_latitude,
+        'min_longitude': min_longitude,
+        'max_longitude': max_longitude,
+        'max_distance_km': max_distance_km
     }
-    
-    for pattern, distance in transport_keywords.items():
-        if re.search(pattern, user_input_lower):
-            return distance
-    
-    # Nếu có từ khóa về thời gian
-    time_keywords = {
-        r'(5 phút|5min|năm phút)': 3,
-        r'(10 phút|10min|mười phút)': 5,
-        r'(15 phút|15min|mười lăm phút)': 8,
-        r'(20 phút|20min|hai mươi phút)': 12,
-        r'(30 phút|30min|nửa giờ|half hour)': 18
+
+    return NEARBY_GYM_QUERY, params
+
+def build_nearest_gym_query(longitude, latitude, k=NEARBY_KNN_LIMIT, max_distance_km=None):
+    """
+    Xây dựng truy vấn k gym gần nhất: quét chỉ mục GiST theo thứ tự khoảng cách (ORDER BY <-> LIMIT)
+    thay vì lấy mọi gym trong bán kính rồi sắp xếp; max_distance_km=None là không giới hạn
+    Returns: tuple (sql, params) - cùng cột và thứ tự với truy vấn gym gần
+    """
+    params = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'k': k,
+        'candidate_limit': k * NEARBY_KNN_CANDIDATE_FACTOR
     }
-    
-    for pattern, distance in time_keywords.items():
-        if re.search(pattern, user_input_lower):
-            return distance
-    
-    # 5. Phân tích theo địa danh cụ thể
-    location_keywords = {
-        r'(quận \d+|district \d+)': 8,        # Trong quận
-        r'(thành phố|city|tp\.)': 15,         # Trong thành phố  
-        r'(tỉnh|province|tỉnh thành)': 25,    # Trong tỉnh
-        r'(huyện|county|suburban)': 20        # Ngoại thành
+
+    distance_filter = ""
+    if max_distance_km:
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, max_distance_km)
+        params.update({
+            'min_latitude': min_latitude,
+            'max_latitude': max_latitude,
+            'min_longitude': min_longitude,
+            'max_longitude': max_longitude,
+            'max_distance_km': max_distance_km
+        })
+        distance_filter = f"AND {BOUNDING_BOX_SQL.format(lat='g.latitude', lng='g.longitude')}"
+
+    sql = f"""
+    WITH Candidates AS (
+        -- Ứng viên theo thứ tự chỉ mục (khoảng cách theo độ), lấy dư để xếp lại theo km
+        SELECT 
+            {GYM_SEARCH_COLUMNS}
+        FROM gym_search g
+        WHERE g.latitude IS NOT NULL 
+        AND g.longitude IS NOT NULL
+        {distance_filter}
+        ORDER BY {NEAREST_ORDER_SQL.format(lat='g.latitude', lng='g.longitude')}
+        LIMIT %(candidate_limit)s
+    ),
+    DistanceCalculated AS (
+        SELECT *,
+            {HAVERSINE_SQL.format(lat='latitude', lng='longitude')} AS distance_km
+        FROM Candidates
+    )
+    SELECT * 
+    FROM DistanceCalculated
+    {"WHERE distance_km <= %(max_distance_km)s" if max_distance_km else ""}
+    ORDER BY distance_km ASC, hotresearch DESC, gymname ASC
+    LIMIT %(k)s
+    """
+    return sql, params
+
+def with_ring_counts(query, rings_km=NEARBY_RINGS_KM, limit=None):
+    """
+    Bọc truy vấn gym gần (build_nearby_gym_query / build_nearest_gym_query): nếu không có gym nào trong bán kính,
+    cùng request quét một lần bounding box của vòng rộng nhất, đếm số gym trong từng vòng (một phép gộp)
+    và trả về các gym của vòng nhỏ nhất có kết quả (tối đa limit gym), mỗi hàng kèm cột ring_counts.
+    Khi truy vấn gốc có kết quả, ring_counts là NULL và vòng rộng không bị quét
+    Returns: tuple (sql, params)
+    """
+    sql, params = query
+    rings = sorted(rings_km)
+    max_distance_km = params.get('max_distance_km')
+    if not rings or not max_distance_km or max_distance_km >= rings[-1]:
+        return query
+
+    ring_params = {f'ring_{i}': km for i, km in enumerate(rings)}
+    widest = f"%(ring_{len(rings) - 1})s"
+    ring_min_latitude, ring_max_latitude, ring_min_longitude, ring_max_longitude = bounding_box(
+        params['latitude'], params['longitude'], rings[-1])
+    ring_params.update({
+        'ring_min_latitude': ring_min_latitude,
+        'ring_max_latitude': ring_max_latitude,
+        'ring_min_longitude': ring_min_longitude,
+        'ring_max_longitude': ring_max_longitude
+    })
+    if limit:
+        ring_params['ring_limit'] = limit
+
+    ring_counts = ",\n                ".join(
+        f"COUNT(*) FILTER (WHERE distance_km <= %(ring_{i})s)" for i in range(len(rings)))
+    ring_km = "\n                ".join(
+        f"WHEN MIN(distance_km) <= %(ring_{i})s THEN %(ring_{i})s" for i in range(len(rings)))
+
+    ring_sql = f"""
+    WITH Nearby AS ({sql.strip().rstrip(';')}
+    ),
+    -- Chỉ chạy khi truy vấn gốc rỗng (điều kiện một lần, không tương quan)
+    RingScan AS (
+        SELECT 
+            {GYM_SEARCH_COLUMNS},
+            d.distance_km
+        FROM gym_search g
+        CROSS JOIN LATERAL (
+            SELECT {HAVERSINE_SQL.format(lat='g.latitude', lng='g.longitude')} AS distance_km
+        ) d
+        WHERE NOT EXISTS (SELECT 1 FROM Nearby)
+        AND g.latitude IS NOT NULL 
+        AND g.longitude IS NOT NULL
+        AND point(g.longitude, g.latitude) <@ box(point(%(ring_min_longitude)s, %(ring_min_latitude)s),
+                                                   point(%(ring_max_longitude)s, %(ring_max_latitude)s))
+        AND d.distance_km <= {widest}
+    ),
+    -- MATERIALIZED: đếm một lần, không tính lại cho từng hàng của RingScan khi ghép
+    RingCounts AS MATERIALIZED (
+        SELECT 
+            ARRAY[
+                {ring_counts}
+            ]::INT[] AS ring_counts,
+            CASE
+                {ring_km}
+            END AS ring_km
+        FROM RingScan
+    )
+    SELECT * FROM (
+        SELECT n.*, NULL::INT[] AS ring_counts FROM Nearby n
+        UNION ALL
+        (
+            SELECT r.*, c.ring_counts
+            FROM RingScan r
+            CROSS JOIN RingCounts c
+            WHERE r.distance_km <= c.ring_km
+            ORDER BY r.distance_km ASC, r.hotresearch DESC, r.gymname ASC
+            {"LIMIT %(ring_limit)s" if limit else ""}
+        )
+    ) results
+    ORDER BY distance_km ASC, hotresearch DESC, gymname ASC
+    """
+    return ring_sql, {**params, **ring_params}
+
+def build_nearby_gym_search(longitude, latitude, max_distance_km, search_mode=NEARBY_SEARCH_MODE):
+    """
+    Truy vấn gym gần cho /chat theo chế độ: 'knn' (k gym gần nhất) hoặc 'radius' (mọi gym trong bán kính),
+    kèm số gym theo vòng bán kính khi không có kết quả
+    Returns: tuple (sql, params)
+    """
+    if search_mode == 'knn':
+        return with_ring_counts(build_nearest_gym_query(longitude, latitude, NEARBY_KNN_LIMIT, max_distance_km), limit=NEARBY_KNN_LIMIT)
+    return with_ring_counts(build_nearby_gym_query(longitude, latitude, max_distance_km))
+
+def build_nearest_gym_candidates_query(longitude, latitude, k, max_distance_km, margin_km):
+    """
+    Ứng viên gym cho cả một ô quanh tâm (longitude, latitude): mọi gym cách tâm không quá
+    khoảng cách tới gym thứ k + margin_km (tối đa max_distance_km). Với margin_km gấp đôi bán kính ô,
+    k gym gần nhất của bất kỳ vị trí nào trong ô đều nằm trong tập ứng viên
+    Returns: tuple (sql, params)
+    """
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, max_distance_km)
+    params = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'min_latitude': min_latitude,
+        'max_latitude': max_latitude,
+        'min_longitude': min_longitude,
+        'max_longitude': max_longitude,
+        'max_distance_km': max_distance_km,
+        'k': k,
+        'candidate_limit': k * NEARBY_KNN_CANDIDATE_FACTOR,
+        'margin_km': margin_km,
+        'km_per_latitude_degree': KM_PER_DEGREE,
+        'km_per_longitude_degree': KM_PER_DEGREE * abs(math.cos(math.radians(latitude)))
     }
+
+    sql = f"""
+    WITH Nearest AS (
+        SELECT {HAVERSINE_SQL.format(lat='g.latitude', lng='g.longitude')} AS distance_km
+        FROM gym_search g
+        WHERE g.latitude IS NOT NULL 
+        AND g.longitude IS NOT NULL
+        AND {BOUNDING_BOX_SQL.format(lat='g.latitude', lng='g.longitude')}
+        ORDER BY {NEAREST_ORDER_SQL.format(lat='g.latitude', lng='g.longitude')}
+        LIMIT %(candidate_limit)s
+    ),
+    -- Khoảng cách gym thứ k trong các ứng viên theo chỉ mục là cận trên của khoảng cách gym thứ k thật;
+    -- ít hơn k gym thì LEAST bỏ qua NULL và giữ nguyên max_distance_km
+    Cutoff AS (
+        SELECT LEAST(%(max_distance_km)s, (
+            SELECT distance_km FROM Nearest ORDER BY distance_km OFFSET %(k)s - 1 LIMIT 1
+        ) + %(margin_km)s) AS radius_km
+    )
+    SELECT 
+        {GYM_SEARCH_COLUMNS},
+        d.distance_km
+    FROM gym_search g
+    CROSS JOIN LATERAL (
+        SELECT {HAVERSINE_SQL.format(lat='g.latitude', lng='g.longitude')} AS distance_km
+    ) d
+    WHERE g.latitude IS NOT NULL 
+    AND g.longitude IS NOT NULL
+    AND point(g.longitude, g.latitude) <@ (
+        SELECT box(point(%(longitude)s - radius_km / %(km_per_longitude_degree)s, %(latitude)s - radius_km / %(km_per_latitude_degree)s),
+                   point(%(longitude)s + radius_km / %(km_per_longitude_degree)s, %(latitude)s + radius_km / %(km_per_latitude_degree)s))
+        FROM Cutoff
+    )
+    AND d.distance_km <= (SELECT radius_km FROM Cutoff)
+    ORDER BY d.distance_km ASC, g.hotresearch DESC, g.gymname ASC
+    """
+    return sql, params
+
+# Bán kính (km) theo ý định, xét theo thứ tự ưu tiên:
+# cấp độ khoảng cách -> phương tiện di chuyển -> thời gian -> địa danh
+NEARBY_DISTANCE_INTENTS = [
+    ('gym_distance.very_close', 2),   # Rất gần
+    ('gym_distance.close', 5),        # Gần
+    ('gym_distance.medium', 10),      # Trung bình
+    ('gym_distance.far', 15),         # Xa
+    ('gym_distance.very_far', 25),    # Rất xa
+    ('gym_distance.unlimited', 50),   # Không giới hạn
+    ('gym_transport.bicycle', 8),
+    ('gym_transport.motorbike', 15),
+    ('gym_transport.car', 20),
+    ('gym_transport.bus', 12),
+    ('gym_time.5min', 3),
+    ('gym_time.10min', 5),
+    ('gym_time.15min', 8),
+    ('gym_time.20min', 12),
+    ('gym_time.30min', 18),
+    ('gym_place.district', 8),        # Trong quận
+    ('gym_place.city', 15),           # Trong thành phố
+    ('gym_place.province', 25),       # Trong tỉnh
+    ('gym_place.suburb', 20),         # Ngoại thành
+]
+
+def get_nearby_distance_preference(user_input):
+    """Phân tích đầu vào của người dùng để xác định bán kính tìm kiếm phù hợp"""
+    intents = scan_intents(user_input)
+    
+    # 1. Tìm số km cụ thể trong câu (ưu tiên cao nhất)
+    km_distance = parse_km_distance(intents)
+    if km_distance is not None:
+        return km_distance
     
-    for pattern, distance in location_keywords.items():
-        if re.search(pattern, user_input_lower):
+    # 2-5. Cấp độ khoảng cách, phương tiện, thời gian, địa danh
+    for intent, distance in NEARBY_DISTANCE_INTENTS:
+        if intent in intents:
             return distance
     
     # 6. Mặc định thông minh dựa trên độ dài câu
-    if len(user_input_lower.split()) <= 3:
+    word_count = len(user_input.lower().split())
+    if word_count <= 3:
         return 8   # Câu ngắn -> tìm gần
-    elif len(user_input_lower.split()) <= 6:
+    elif word_count <= 6:
         return 10  # Câu trung bình -> tìm vừa
     else:
         return 12  # Câu dài -> có thể muốn tìm rộng hơn
 
-def intelligent_gym_search(user_input):
-    """Tìm kiếm gym thông minh với khả năng phân tích ngữ nghĩa nâng cao"""
+def build_fulltext_query(keywords):
+    """tsquery tiền tố nối bằng OR từ các từ khóa đã chuẩn hóa, ví dụ 'yoga:* | sao:*'"""
+    return " | ".join(f"{keyword}:*" for keyword in keywords)
+
+def intelligent_gym_search(user_input, search_mode=GYM_SEARCH_MODE):
+    """
+    Tìm kiếm gym thông minh với khả năng phân tích ngữ nghĩa nâng cao
+    search_mode: 'fulltext' (tsvector, xếp hạng ts_rank_cd) hoặc 'like'
+    Returns: tuple (sql, params) hoặc None nếu không cần truy vấn
+    """
     try:
         # Kiểm tra đầu vào
         if not user_input or not isinstance(user_input, str):
             return None
         
         user_input_lower = user_input.lower()
+        intents = scan_intents(user_input)
         
-        # 1. Danh sách từ khóa chỉ rõ KHÔNG cần tìm kiếm gym (mở rộng)
-        non_gym_indicators = [
-            # Chào hỏi và lịch sự
-            'xin chào', 'hello', 'hi', 'chào bạn', 'hey there',
-            'cảm ơn', 'thank you', 'thanks', 'cám ơn', 'tks',
-            'tạm biệt', 'bye', 'goodbye', 'see you',
-            
-            # Câu hỏi cá nhân  
-            'tên tôi', 'my name', 'lặp lại tên', 'nhắc lại tên',
-            'tôi là ai', 'who am i', 'remember me',
-            
-            # Tư vấn sức khỏe không cần gym cụ thể
-            'làm sao để', 'how to', 'cách để', 'how can i',
-            'ăn gì để', 'what to eat', 'what should i eat',
-            'bài tập nào', 'what exercise', 'which workout',
-            'tăng cân', 'giảm cân', 'lose weight', 'gain weight',
-            'thời tiết', 'weather', 'nhiệt độ', 'temperature',
-            
-            # Phản hồi chung
-            'ok', 'được rồi', 'tốt', 'good', 'fine', 'great',
-            'đồng ý', 'agree', 'yes', 'no problem'
-        ]
-        
-        # Nếu có từ khóa không liên quan gym, return None ngay
-        if any(indicator in user_input_lower for indicator in non_gym_indicators):
+        # 1. Nếu có từ khóa không liên quan gym (chào hỏi, tư vấn chung...), return None ngay
+        if 'gym_search.non_gym' in intents:
             return None
         
-        # 2. Phân tích ý định tìm kiếm gym (cải thiện)
-        gym_search_patterns = [
-            # Tìm kiếm trực tiếp
-            r'(tìm|find|search|looking for)\s*(gym|phòng gym|fitness|thể dục)',
-            r'(gym|phòng gym|fitness)\s*(nào|what|which|where)',
-            r'(có|is there|are there)\s*(gym|phòng gym|fitness)',
-            
-            # Tìm kiếm theo địa điểm
-            r'(gym|phòng gym|fitness)\s*(ở|at|in|near|gần)\s*(\w+)',
-            r'(quận|district|huyện|thành phố|city)\s*\d*.*?(gym|phòng gym|fitness)',
-            
-            # Tìm kiếm theo đặc điểm
-            r'(gym|phòng gym|fitness)\s*(hot|nổi tiếng|phổ biến|tốt|best)',
-            r'(hot|nổi tiếng|phổ biến|tốt|best)\s*(gym|phòng gym|fitness)',
-            
-            # Tìm kiếm mở
-            r'(danh sách|list)\s*(gym|phòng gym|fitness)',
-            r'(tất cả|all)\s*(gym|phòng gym|fitness)',
-            r'(những|the)\s*(gym|phòng gym|fitness)\s*(nào|what)'
-        ]
-        
-        # Kiểm tra xem có khớp với pattern tìm kiếm gym không
-        has_gym_search_intent = any(re.search(pattern, user_input_lower) for pattern in gym_search_patterns)
-        
-        # Nếu không có ý định tìm kiếm gym rõ ràng, return None
-        if not has_gym_search_intent:
+        # 2. Nếu không có ý định tìm kiếm gym rõ ràng, return None
+        if 'gym_search.intent' not in intents:
             return None
         
         # 3. Trích xuất thông tin tìm kiếm thông minh
@@ -263,11 +430,7 @@ def intelligent_gym_search(user_input):
         search_info['keywords'] = keywords[:5]  # Lấy tối đa 5 từ khóa quan trọng nhất
         
         # Phát hiện tìm kiếm hot/phổ biến
-        hot_patterns = [
-            r'(hot|nổi tiếng|phổ biến|được yêu thích|tốt nhất|best|top)',
-            r'(recommend|gợi ý|đề xuất|suggest)'
-        ]
-        search_info['hot_search'] = any(re.search(pattern, user_input_lower) for pattern in hot_patterns)
+        search_info['hot_search'] = 'gym_search.hot' in intents
         
         # Phát hiện địa điểm cụ thể
         location_patterns = [
@@ -308,11 +471,14 @@ def intelligent_gym_search(user_input):
                     break
 
         # 4. Xây dựng truy vấn SQL thông minh cho AspNetUsers table
-        base_conditions = ['"AccountStatus" = \'Active\'', '"GymName" IS NOT NULL', '"GymName" != \'\'']
+        # Chỉ ghép các đoạn SQL cố định, mọi giá trị người dùng đều được bind qua params
+        # gym_search chỉ chứa gym đang hoạt động có tên, chỉ cần thêm điều kiện theo yêu cầu
+        base_conditions = []
+        params = {}
 
         # Ưu tiên gym hot nếu có yêu cầu
         if search_info['hot_search']:
-            base_conditions.append('"hotResearch" = true')
+            base_conditions.append('g.hotresearch = true')
             search_info['search_type'] = 'hot'
         
         # Xây dựng điều kiện tìm kiếm từ keywords - chỉ khi không phải district_specific
@@ -321,176 +487,122 @@ def intelligent_gym_search(user_input):
         
         # Nếu không phải tìm kiếm theo quận cụ thể, mới áp dụng keyword filtering
         if search_info['search_type'] != 'district_specific':
-            for keyword in search_info['keywords']:
-                if keyword and len(keyword) >= 2:
-                    # Escape single quotes để tránh SQL injection
-                    safe_keyword = keyword.replace("'", "''")
-                    valid_keywords.append(safe_keyword)
-                    search_conditions.extend([
-                        f'"GymName" ILIKE \'%{safe_keyword}%\'',
-                        f'COALESCE(CONCAT_WS(\', \', NULLIF(a."HouseNumber", \'\'), NULLIF(a."Street", \'\'), NULLIF(a."Ward", \'\'), NULLIF(a."District", \'\'), NULLIF(a."City", \'\')), \'Địa chỉ chưa cập nhật\') ILIKE \'%{safe_keyword}%\'',
-                        f'"FullName" ILIKE \'%{safe_keyword}%\''
-                    ])
+            valid_keywords = [keyword for keyword in search_info['keywords'] if keyword and len(keyword) >= 2]
+            if valid_keywords and search_mode == 'fulltext':
+                # Khớp toàn văn trên search_vector (chỉ mục GIN), từ khóa là tiền tố của từ
+                params['ts_query'] = build_fulltext_query(valid_keywords)
+                search_conditions.append("g.search_vector @@ to_tsquery('simple', %(ts_query)s)")
+            elif valid_keywords:
+                # Từ khóa đã chuẩn hóa (không dấu, chữ thường) nên so với các cột *_text đã chuẩn hóa,
+                # LIKE '%kw%' trên các cột này dùng được chỉ mục GIN trigram
+                params['keyword_patterns'] = [f"%{keyword}%" for keyword in valid_keywords]
+                search_conditions.extend([
+                    'g.name_text LIKE ANY(%(keyword_patterns)s)',
+                    'g.address_text LIKE ANY(%(keyword_patterns)s)',
+                    'g.owner_text LIKE ANY(%(keyword_patterns)s)'
+                ])
 
         # Thêm điều kiện địa điểm nếu có - Cải thiện logic filtering
-        district_conditions = []
         if search_info['location']:
-            safe_location = search_info['location'].replace("'", "''")
-
             # Nếu tìm kiếm theo quận cụ thể, sử dụng logic filtering chính xác
             if search_info['search_type'] == 'district_specific':
                 if district_number:
                     # Xử lý quận có số (Quận 1, Quận 3, Quận 7, etc.)
-                    district_conditions = [
-                        f'COALESCE(CONCAT_WS(\', \', NULLIF(a."HouseNumber", \'\'), NULLIF(a."Street", \'\'), NULLIF(a."Ward", \'\'), NULLIF(a."District", \'\'), NULLIF(a."City", \'\')), \'Địa chỉ chưa cập nhật\') ILIKE \'%quận {district_number}%\'',
-                        f'COALESCE(CONCAT_WS(\', \', NULLIF(a."HouseNumber", \'\'), NULLIF(a."Street", \'\'), NULLIF(a."Ward", \'\'), NULLIF(a."District", \'\'), NULLIF(a."City", \'\')), \'Địa chỉ chưa cập nhật\') ILIKE \'%district {district_number}%\'',
-                        f'a."District" ILIKE \'%quận {district_number}%\'',
-                        f'a."District" ILIKE \'%district {district_number}%\''
-                    ]
+                    params['district_address_patterns'] = [f"%quan {district_number}%", f"%district {district_number}%"]
+                    params['district_patterns'] = [f"%quan {district_number}%", f"%district {district_number}%"]
                 elif district_name:
-                    # Xử lý quận có tên (Quận Hải Châu, Quận Đống Đa, etc.)
-                    safe_district_name = district_name.replace("'", "''")
-                    district_conditions = [
-                        f'COALESCE(CONCAT_WS(\', \', NULLIF(a."HouseNumber", \'\'), NULLIF(a."Street", \'\'), NULLIF(a."Ward", \'\'), NULLIF(a."District", \'\'), NULLIF(a."City", \'\')), \'Địa chỉ chưa cập nhật\') ILIKE \'%quận {safe_district_name}%\'',
-                        f'COALESCE(CONCAT_WS(\', \', NULLIF(a."HouseNumber", \'\'), NULLIF(a."Street", \'\'), NULLIF(a."Ward", \'\'), NULLIF(a."District", \'\'), NULLIF(a."City", \'\')), \'Địa chỉ chưa cập nhật\') ILIKE \'%district {safe_district_name}%\'',
-                        f'a."District" ILIKE \'%quận {safe_district_name}%\'',
-                        f'a."District" ILIKE \'%{safe_district_name}%\'',
-                        f'a."District" = \'Quận {safe_district_name}\''
-                    ]
+                    # Xử lý quận có tên (Quận Hải Châu, Quận Đống Đa, etc.), so khớp không dấu
+                    district_name = normalize_vietnamese_text(district_name)
+                    if district_name:
+                        params['district_address_patterns'] = [f"%quan {district_name}%", f"%district {district_name}%"]
+                        params['district_patterns'] = [f"%quan {district_name}%", f"%{district_name}%"]
 
                 # Thêm điều kiện quận như một điều kiện bắt buộc (AND), không phải tùy chọn (OR)
-                base_conditions.append(f"({' OR '.join(district_conditions)})")
+                if 'district_patterns' in params:
+                    base_conditions.append(
+                        '(g.address_text LIKE ANY(%(district_address_patterns)s) '
+                        'OR g.district_text LIKE ANY(%(district_patterns)s))'
+                    )
             else:
                 # Tìm kiếm địa điểm chung khác
+                params['location_pattern'] = f"%{normalize_vietnamese_text(search_info['location'])}%"
                 search_conditions.extend([
-                    f'COALESCE(CONCAT_WS(\', \', NULLIF(a."HouseNumber", \'\'), NULLIF(a."Street", \'\'), NULLIF(a."Ward", \'\'), NULLIF(a."District", \'\'), NULLIF(a."City", \'\')), \'Địa chỉ chưa cập nhật\') ILIKE \'%{safe_location}%\'',
-                    f'"GymName" ILIKE \'%{safe_location}%\''
+                    'g.address_text LIKE %(location_pattern)s',
+                    'g.name_text LIKE %(location_pattern)s'
                 ])
 
         # Xây dựng mệnh đề WHERE
-        where_clause = " AND ".join(base_conditions)
-        
         if search_conditions:
             keyword_clause = " OR ".join(search_conditions)
-            where_clause += f" AND ({keyword_clause})"
+            base_conditions.append(f"({keyword_clause})")
         elif not search_info['hot_search'] and search_info['search_type'] != 'district_specific':
             # Nếu không có từ khóa và không phải tìm kiếm hot và không phải tìm kiếm theo quận cụ thể, return None
             return None
+
+        where_clause = " AND ".join(base_conditions) or "TRUE"
         
         # 5. Tạo SQL query với scoring thông minh
-        if valid_keywords or search_info['search_type'] == 'district_specific':
-            primary_keyword = valid_keywords[0] if valid_keywords else 'gym'
-            sql_query = f"""
-            SELECT 
-                u."Id" as id, u."GymName" as gymname, u."FullName" as fullname,
-                COALESCE(
-                    CONCAT_WS(', ', 
-                        NULLIF(a."HouseNumber", ''), 
-                        NULLIF(a."Street", ''), 
-                        NULLIF(a."Ward", ''), 
-                        NULLIF(a."District", ''), 
-                        NULLIF(a."City", '')
-                    ), 
-                    'Địa chỉ chưa cập nhật'
-                ) as gymaddress,
-                u."TaxCode" as taxcode,
-                u."Longitude" as longitude, u."Latitude" as latitude,
-                u."hotResearch" as hotresearch, u."AccountStatus" as accountstatus,
-                u."Email" as email, u."PhoneNumber" as phonenumber,
-                u."GymDescription" as gymdescription, u."AvatarUrl" as avatarurl,
-                u."GymImages" as gymimages, u."CreatedAt" as createdat,
-                u."UpdatedAt" as updatedat, u."Dob" as dob,
-                CASE WHEN u."hotResearch" = true THEN 20 ELSE 0 END as hot_score,
-                CASE 
-                    WHEN u."GymName" ILIKE '%{primary_keyword}%' THEN 30
-                    WHEN COALESCE(
-                        CONCAT_WS(', ', 
-                            NULLIF(a."HouseNumber", ''), 
-                            NULLIF(a."Street", ''), 
-                            NULLIF(a."Ward", ''), 
-                            NULLIF(a."District", ''), 
-                            NULLIF(a."City", '')
-                        ), 
-                        'Địa chỉ chưa cập nhật'
-                    ) ILIKE '%{primary_keyword}%' THEN 25
-                    WHEN u."FullName" ILIKE '%{primary_keyword}%' THEN 15
+        if 'ts_query' in params:
+            # ts_rank_cd theo trọng số tên > địa chỉ > chủ gym > mô tả, chuẩn hóa về 0..1 (32) rồi nhân 100;
+            # điểm hot và điểm mới vẫn xếp cùng theo GYM_RANKING_ORDER
+            relevance_sql = "ts_rank_cd(g.search_vector, to_tsquery('simple', %(ts_query)s), 32) * 100"
+        elif valid_keywords or search_info['search_type'] == 'district_specific':
+            params['primary_pattern'] = f"%{valid_keywords[0] if valid_keywords else 'gym'}%"
+            relevance_sql = """CASE 
+                    WHEN g.name_text LIKE %(primary_pattern)s THEN 30
+                    WHEN g.address_text LIKE %(primary_pattern)s THEN 25
+                    WHEN g.owner_text LIKE %(primary_pattern)s THEN 15
                     ELSE 5
-                END as relevance_score,
-                CASE 
-                    WHEN u."CreatedAt" >= (CURRENT_DATE - INTERVAL '1 year') THEN 5 
-                    ELSE 0 
-                END as recency_score
-            FROM "AspNetUsers" u
-            LEFT JOIN "Addresses" a ON u."Id" = a."CustomerId" AND a."IsEnabled" = true
-            WHERE {where_clause}
-            ORDER BY hot_score DESC, relevance_score DESC, recency_score DESC, gymname ASC
-            """
+                END"""
         else:
             # Query cho tìm kiếm general hoặc hot gym
-            sql_query = f"""
+            relevance_sql = "10"
+
+        sql_query = f"""
             SELECT 
-                u."Id" as id, u."GymName" as gymname, u."FullName" as fullname,
-                COALESCE(
-                    CONCAT_WS(', ', 
-                        NULLIF(a."HouseNumber", ''), 
-                        NULLIF(a."Street", ''), 
-                        NULLIF(a."Ward", ''), 
-                        NULLIF(a."District", ''), 
-                        NULLIF(a."City", '')
-                    ), 
-                    'Địa chỉ chưa cập nhật'
-                ) as gymaddress,
-                u."TaxCode" as taxcode,
-                u."Longitude" as longitude, u."Latitude" as latitude,
-                u."hotResearch" as hotresearch, u."AccountStatus" as accountstatus,
-                u."Email" as email, u."PhoneNumber" as phonenumber,
-                u."GymDescription" as gymdescription, u."AvatarUrl" as avatarurl,
-                u."GymImages" as gymimages, u."CreatedAt" as createdat,
-                u."UpdatedAt" as updatedat, u."Dob" as dob,
-                CASE WHEN u."hotResearch" = true THEN 20 ELSE 0 END as hot_score,
-                10 as relevance_score,
-                CASE 
-                    WHEN u."CreatedAt" >= (CURRENT_DATE - INTERVAL '1 year') THEN 5 
-                    ELSE 0 
-                END as recency_score
-            FROM "AspNetUsers" u
-            LEFT JOIN "Addresses" a ON u."Id" = a."CustomerId" AND a."IsEnabled" = true
+                {GYM_SEARCH_COLUMNS},
+                g.hot_score,
+                {relevance_sql} as relevance_score,
+                g.recency_score
+            FROM gym_search g
             WHERE {where_clause}
-            ORDER BY hot_score DESC, relevance_score DESC, recency_score DESC, gymname ASC
+            ORDER BY {GYM_RANKING_ORDER}
             """
         
         print(f"🤖 INTELLIGENT SEARCH: Input='{user_input}' | Type={search_info['search_type']} | Keywords={search_info['keywords'][:3]}")
-        return sql_query
+        return sql_query, params
         
     except Exception as e:
         print(f"Lỗi trong intelligent_gym_search: {str(e)}")
         return None
 
+# Ý định tìm kiếm theo thứ tự trả về của detect_search_intent
+SEARCH_INTENTS = [
+    'location_search', 'name_search', 'popular_search', 'new_search',
+    'old_search', 'price_search', 'equipment_search'
+]
+
 def detect_search_intent(user_input):
     """Phát hiện ý định tìm kiếm từ đầu vào của người dùng"""
-    user_lower = user_input.lower()
-    
-    intent_patterns = {
-        'location_search': [r'(gần|near|nearby|xung quanh|lân cận|quanh đây)', r'(district \d+|quận \d+|huyện)'],
-        'name_search': [r'(tìm .+ gym|gym .+|.+ fitness|.+ center)'],
-        'popular_search': [r'(hot|nổi tiếng|phổ biến|được yêu thích|tốt nhất|best|top)', r'(gym hot|phòng gym hot|fitness hot)'],
-        'new_search': [r'(mới|new|vừa mở|recently|gần đây)'],
-        'old_search': [r'(cũ|old|lâu năm|uy tín|established)'],
-        'price_search': [r'(rẻ|cheap|affordable|giá tốt|budget)'],
-        'equipment_search': [r'(thiết bị|equipment|máy tập|facilities)']
-    }
-    
-    detected_intents = []
-    for intent, patterns in intent_patterns.items():
-        for pattern in patterns:
-            if re.search(pattern, user_lower):
-                detected_intents.append(intent)
-                break
-    
-    return detected_intents
+    intents = scan_intents(user_input)
+    return [intent for intent in SEARCH_INTENTS if f'search.{intent}' in intents]
+
+# Truy vấn danh sách tất cả gym
+ALL_GYMS_QUERY = f"""
+            SELECT 
+                {GYM_SEARCH_COLUMNS},
+                g.hot_score,
+                10 as relevance_score,
+                g.recency_score
+            FROM gym_search g
+            ORDER BY {GYM_RANKING_ORDER}
+            """
 
 def classify_query(user_input):
-    """Phân loại truy vấn và tạo SQL nếu cần - Được cải thiện"""
+    """
+    Phân loại truy vấn và tạo SQL nếu cần - Được cải thiện
+    Returns: (is_db_query, (sql, params))
+    """
     try:
         # 1. Ưu tiên sử dụng intelligent search trước
         intelligent_query = intelligent_gym_search(user_input)
@@ -502,45 +614,9 @@ def classify_query(user_input):
         # - Câu hỏi không liên quan đến tìm kiếm gym
         # - Hoặc là câu hỏi chào hỏi, tư vấn chung
         
-        user_input_lower = user_input.lower()
-        
-        # 3. Kiểm tra một số trường hợp đặc biệt cuối cùng
-        special_gym_cases = [
-            'danh sách gym', 'list gym', 'all gym', 'tất cả gym',
-            'gym có những gì', 'gym nào', 'which gym'
-        ]
-        
-        if any(case in user_input_lower for case in special_gym_cases):
-            # Trường hợp muốn xem tất cả gym
-            return True, """
-            SELECT 
-                u."Id" as id, u."GymName" as gymname, u."FullName" as fullname,
-                COALESCE(
-                    CONCAT_WS(', ', 
-                        NULLIF(a."HouseNumber", ''), 
-                        NULLIF(a."Street", ''), 
-                        NULLIF(a."Ward", ''), 
-                        NULLIF(a."District", ''), 
-                        NULLIF(a."City", '')
-                    ), 
-                    'Địa chỉ chưa cập nhật'
-                ) as gymaddress,
-                u."TaxCode" as taxcode,
-                u."Longitude" as longitude, u."Latitude" as latitude,
-                u."hotResearch" as hotresearch, u."AccountStatus" as accountstatus,
-                u."Email" as email, u."PhoneNumber" as phonenumber,
-                u."GymDescription" as gymdescription, u."AvatarUrl" as avatarurl,
-                u."GymImages" as gymimages, u."CreatedAt" as createdat,
-                u."UpdatedAt" as updatedat, u."Dob" as dob,
-                CASE WHEN u."hotResearch" = true THEN 20 ELSE 0 END as hot_score,
-                10 as relevance_score
-            FROM "AspNetUsers" u
-            LEFT JOIN "Addresses" a ON u."Id" = a."CustomerId" AND a."IsEnabled" = true
-            WHERE u."AccountStatus" = 'Active'
-            AND u."GymName" IS NOT NULL 
-            AND u."GymName" != ''
-            ORDER BY hot_score DESC, gymname ASC
-            """
+        # 3. Kiểm tra một số trường hợp đặc biệt cuối cùng: muốn xem tất cả gym
+        if 'gym_list.all' in scan_intents(user_input):
+            return True, (ALL_GYMS_QUERY, {})
         
         # 4. Nếu không khớp với trường hợp nào -> không cần truy vấn database
         print(f"❌ NO_DB_QUERY: '{user_input}' không cần truy vấn database")
@@ -552,46 +628,14 @@ def classify_query(user_input):
 
 def classify_query_with_context(user_input, conversation_context):
     """Phân loại truy vấn với ngữ cảnh hội thoại"""
-    user_input_lower = user_input.lower()
-    
-    # Danh sách từ khóa chỉ các câu hỏi KHÔNG cần truy vấn database
-    non_gym_keywords = [
-        # Câu hỏi cá nhân
-        'tên tôi', 'tên của tôi', 'lặp lại tên', 'nhắc lại tên', 
-        'my name', 'what is my name', 'repeat my name',
-        'tôi tên', 'tôi là ai', 'who am i',
-        
-        # Chào hỏi và lịch sự
-        'xin chào', 'hello', 'hi', 'chào bạn', 'hey',
-        'cảm ơn', 'thank you', 'thanks', 'cám ơn',
-        'tạm biệt', 'bye', 'goodbye', 'chào tạm biệt',
-        
-        # Tư vấn sức khỏe chung (không cần tìm gym cụ thể)
-        'làm sao để', 'cách để', 'how to',
-        'ăn gì để', 'what to eat',
-        'bài tập nào', 'exercise for',
-        'tăng cân', 'giảm cân', 'lose weight', 'gain weight',
-        
-        # Phản hồi chung
-        'ok', 'được rồi', 'tốt', 'good', 'fine', 'đồng ý'
-    ]
+    intents = scan_intents(user_input)
     
-    # Kiểm tra nếu input chứa từ khóa không cần truy vấn DB
-    if any(keyword in user_input_lower for keyword in non_gym_keywords):
+    # Câu hỏi cá nhân, chào hỏi, tư vấn chung -> không cần truy vấn DB
+    if 'context.non_gym' in intents:
         return False, None
     
-    # Danh sách từ khóa chỉ rõ cần tìm kiếm gym
-    gym_search_keywords = [
-        'gym', 'fitness', 'thể dục', 'thể hình', 'tập luyện',
-        'phòng gym', 'trung tâm', 'center', 'club',
-        'tìm', 'search', 'ở đâu', 'where', 'địa chỉ', 'address',
-        'gần', 'near', 'nearby', 'quanh', 'xung quanh',
-        'quận', 'district', 'thành phố', 'city'
-    ]
-    
     # Chỉ tiếp tục nếu có từ khóa liên quan đến tìm kiếm gym
-    has_gym_intent = any(keyword in user_input_lower for keyword in gym_search_keywords)
-    if not has_gym_intent:
+    if 'context.gym' not in intents:
         return False, None
     
     detected_intents = detect_search_intent(user_input)
@@ -601,12 +645,10 @@ def classify_query_with_context(user_input, conversation_context):
     if conversation_context:
         gym_names_in_context = re.findall(r'(\w+\s*(?:gym|fitness|center))', conversation_context.lower())
         
-        if gym_names_in_context and any(word in user_input.lower() for word in ['khác', 'other', 'nào khác', 'còn']):
-            excluded_gyms = ' AND '.join([f"GymName NOT LIKE '%{name.split()[0]}%'" for name in gym_names_in_context])
+        if gym_names_in_context and 'context.more' in intents:
             base_query = intelligent_gym_search(user_input)
-            if base_query and excluded_gyms:
-                enhanced_query = base_query.replace('WHERE Active = 1', f'WHERE Active = 1 AND {excluded_gyms}')
-                return True, enhanced_query
+            if base_query:
+                return True, base_query
     
     # Sử dụng phân loại thông thường
     return classify_query(user_input)
\ No newline at end of file
@@ -0,0 +1,449 @@
+# app/services/trainer_catalog_service.py - Columnar NumPy snapshot of the trainer catalog
+
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from app.utils.geo_utils import haversine_km_array, KM_PER_DEGREE
+from app.database.connection import query_database
+from app.database.catalog_listener import add_catalog_change_handler
+from app.services.pt_search_service import (
+    parse_trainer_search, extract_experience_requirement, interleave_trainers,
+    trainer_order_key, nearby_trainer_order_key
+)
+from config import TRAINER_CATALOG_ENABLED, TRAINER_CATALOG_REFRESH_SECONDS, NEARBY_KNN_LIMIT, NEARBY_KNN_CANDIDATE_FACTOR
+
+# Mọi hồ sơ PT kèm gym (gym_search: gym đang hoạt động, tọa độ DOUBLE PRECISION, một địa chỉ mỗi gym)
+# name_rank: thứ tự fullname theo collation của database, dùng làm tiêu chí phụ khi sắp xếp trong bộ nhớ
+TRAINER_CATALOG_QUERY = """
+    SELECT
+        t.id, t.fullname, t.email, t.phonenumber, t.ismale, t.dob, t.avatarurl, t.bio,
+        t.accountstatus, t.createdat, t.updatedat, t.pt_gym_id AS gym_id, t.experience, t.certificates,
+        t.height, t.weight, t.biceps, t.chest, t.waist, t.goal_trainings, t.is_freelance,
+        t.pt_latitude, t.pt_longitude,
+        g.id IS NOT NULL AS gym_active,
+        g.gymname,
+        g.gymaddress,
+        g.latitude AS gym_latitude,
+        g.longitude AS gym_longitude,
+        g.hotresearch AS gym_hotresearch,
+        ROW_NUMBER() OVER (ORDER BY t.fullname, t.id) AS name_rank
+    FROM trainer_profiles t
+    LEFT JOIN gym_search g ON g.id = t.pt_gym_id
+    """
+
+# Cột hồ sơ PT trả về (giống các truy vấn PT)
+TRAINER_PROFILE_FIELDS = (
+    'id', 'fullname', 'email', 'phonenumber', 'ismale', 'dob', 'avatarurl', 'bio',
+    'accountstatus', 'createdat', 'updatedat', 'gym_id', 'experience', 'certificates',
+    'height', 'weight', 'biceps', 'chest', 'waist', 'goal_trainings', 'is_freelance'
+)
+
+# Loại PT: PT của gym đang hoạt động, PT tự do (có gói freelance, không thuộc gym), còn lại không được tìm thấy
+PT_TYPE_GYM = 0
+PT_TYPE_FREELANCE = 1
+PT_TYPE_NONE = -1
+
+TRAINERS_PER_TYPE = 10
+# Khoảng cách thay cho PT tự do chưa có vị trí khi xếp hạng (giống COALESCE(distance_km, 999999))
+UNLOCATED_DISTANCE_KM = 999999.0
+
+# Toán tử kinh nghiệm giống EXPERIENCE_FILTERS của truy vấn SQL (NaN = kinh nghiệm NULL, luôn không thỏa)
+EXPERIENCE_COMPARATORS = {
+    '>=': np.greater_equal,
+    '>': np.greater,
+    '=': np.equal,
+    '<': np.less,
+    '<=': np.less_equal,
+}
+
+FREELANCE_GYMNAME = 'Huấn luyện viên tự do'
+FREELANCE_GYMADDRESS = 'Tập tại địa điểm linh hoạt'
+
+
+def _nearest_candidates(rows, latitude, longitude, row_latitude, row_longitude):
+    """
+    Giữ NEARBY_KNN_LIMIT * NEARBY_KNN_CANDIDATE_FACTOR hàng gần nhất theo khoảng cách phẳng trên độ,
+    giống ORDER BY point <-> point LIMIT %(candidate_limit)s của build_nearby_trainer_query(nearest=True)
+    """
+    candidate_limit = NEARBY_KNN_LIMIT * NEARBY_KNN_CANDIDATE_FACTOR
+    if len(rows) <= candidate_limit:
+        return rows
+    planar = np.hypot(row_longitude - longitude, row_latitude - latitude)
+    return rows[np.argsort(planar, kind='stable')[:candidate_limit]]
+
+
+def _ranks(order):
+    """Đổi thứ tự (mảng chỉ số) thành hạng của từng phần tử"""
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    return ranks
+
+
+class TrainerCatalogSnapshot:
+    """
+    Ảnh chụp catalog PT dạng cột NumPy (mỗi PT một vị trí trong mọi mảng), không thay đổi sau khi tạo
+    - Bộ lọc giới tính / mục tiêu (bitmask) / kinh nghiệm là phép so sánh trên cả mảng
+    - Thứ tự tĩnh (hot, kinh nghiệm, tên) tính sẵn thành hạng, top-k bằng argpartition
+    - Khoảng cách Haversine vector hóa: một lần cho mỗi gym (PT gym lấy khoảng cách của gym),
+      PT tự do có vị trí chỉ tính trong dải vĩ độ của bán kính
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.size = len(rows)
+        self.loaded_at = datetime.now()
+
+        self.pt_type = np.array([
+            PT_TYPE_GYM if row['gym_active']
+            else PT_TYPE_FREELANCE if row['is_freelance'] and row['gym_id'] is None
+            else PT_TYPE_NONE
+            for row in rows
+        ], dtype=np.int8)
+        self.is_gym = self.pt_type == PT_TYPE_GYM
+        self.is_freelance = self.pt_type == PT_TYPE_FREELANCE
+        self.hot = np.array([bool(row['gym_hotresearch']) for row in rows], dtype=bool)
+        self.experience = np.array([np.nan if row['experience'] is None else row['experience'] for row in rows], dtype=np.float64)
+        self.gender = np.array([-1 if row['ismale'] is None else int(row['ismale']) for row in rows], dtype=np.int8)
+        self.name_rank = np.array([row['name_rank'] for row in rows], dtype=np.int64)
+
+        # Mục tiêu: mỗi mục tiêu một bit, nhiều từ 64 bit nếu có hơn 64 mục tiêu
+        self.goal_vocabulary = {goal: bit for bit, goal in enumerate(sorted({
+            goal for row in rows for goal in (row['goal_trainings'] or [])
+        }))}
+        self.goal_bits = np.zeros((self.size, max(1, -(-len(self.goal_vocabulary) // 64))), dtype=np.uint64)
+        for index, row in enumerate(rows):
+            for goal in row['goal_trainings'] or []:
+                bit = self.goal_vocabulary[goal]
+                self.goal_bits[index, bit // 64] |= np.uint64(1 << (bit % 64))
+
+        # Gym: tọa độ theo mã gym, PT gym trỏ tới mã gym của mình (-1 nếu không phải PT gym)
+        gym_codes = {}
+        gym_locations = []
+        self.gym_code = np.full(self.size, -1, dtype=np.int32)
+        for index in np.flatnonzero(self.is_gym):
+            row = rows[index]
+            code = gym_codes.get(row['gym_id'])
+            if code is None:
+                code = gym_codes[row['gym_id']] = len(gym_locations)
+                gym_locations.append((row['gym_latitude'], row['gym_longitude']))
+            self.gym_code[index] = code
+        self.gym_latitude, self.gym_longitude = self._coordinates(gym_locations)
+
+        # PT gym nhóm theo gym: PT của gym c nằm ở gym_trainer_rows[gym_offsets[c]:gym_offsets[c + 1]]
+        gym_rows = np.flatnonzero(self.is_gym)
+        self.gym_trainer_rows = gym_rows[np.argsort(self.gym_code[gym_rows], kind='stable')]
+        self.gym_trainer_counts = np.bincount(self.gym_code[gym_rows], minlength=len(gym_locations))
+        self.gym_offsets = np.concatenate(([0], np.cumsum(self.gym_trainer_counts)))
+
+        # Thứ tự tĩnh giống SQL (np.lexsort: khóa cuối là khóa chính), tên theo collation của database
+        experience_missing = np.isnan(self.experience)
+        experience_desc = -np.nan_to_num(self.experience)
+        # PT gym: hotResearch DESC, experience DESC NULLS LAST, fullname
+        self.gym_rank = _ranks(np.lexsort((self.name_rank, experience_desc, experience_missing, ~self.hot)))
+        # PT tự do: experience DESC NULLS LAST, fullname
+        self.freelance_rank = _ranks(np.lexsort((self.name_rank, experience_desc, experience_missing)))
+
+        # PT tự do có vị trí xếp theo vĩ độ (cắt dải vĩ độ của bán kính bằng searchsorted),
+        # PT tự do chưa có vị trí xếp theo freelance_rank
+        freelance_rows = np.flatnonzero(self.is_freelance)
+        latitude, longitude = self._coordinates(
+            [(rows[index]['pt_latitude'], rows[index]['pt_longitude']) for index in freelance_rows])
+        located = ~np.isnan(latitude)
+        order = np.argsort(latitude[located])
+        self.located_rows = freelance_rows[located][order]
+        self.located_latitude = latitude[located][order]
+        self.located_longitude = longitude[located][order]
+        unlocated_rows = freelance_rows[~located]
+        self.unlocated_rows = unlocated_rows[np.argsort(self.freelance_rank[unlocated_rows])]
+
+    @staticmethod
+    def _coordinates(locations):
+        """Mảng (vĩ độ, kinh độ) float64, NaN khi thiếu một trong hai tọa độ"""
+        coordinates = np.array([
+            (np.nan, np.nan) if latitude is None or longitude is None else (latitude, longitude)
+            for latitude, longitude in locations
+        ], dtype=np.float64).reshape(-1, 2)
+        return coordinates[:, 0].copy(), coordinates[:, 1].copy()
+
+    def filter_mask(self, is_male=None, goals=None, exp_operator=None, exp_years=None):
+        """Mặt nạ bool các PT thỏa bộ lọc (giống điều kiện WHERE của build_trainer_search_query)"""
+        mask = np.ones(self.size, dtype=bool)
+        if is_male is not None:
+            mask &= self.gender == int(is_male)
+        if goals:
+            query_bits = np.zeros(self.goal_bits.shape[1], dtype=np.uint64)
+            for goal in goals:
+                bit = self.goal_vocabulary.get(goal)
+                if bit is not None:
+                    query_bits[bit // 64] |= np.uint64(1 << (bit % 64))
+            # Có ít nhất một mục tiêu chung (goal_trainings && goals)
+            mask &= (self.goal_bits & query_bits).any(axis=1)
+        if exp_operator and exp_years and exp_operator in EXPERIENCE_COMPARATORS:
+            mask &= EXPERIENCE_COMPARATORS[exp_operator](self.experience, exp_years)
+        return mask
+
+    @staticmethod
+    def top_k(rows, rank, distances=None, k=TRAINERS_PER_TYPE):
+        """
+        k PT đầu trong rows theo (distances, rank) - hoặc chỉ rank - bằng argpartition rồi sắp xếp phần nhỏ còn lại
+        Returns: tuple (chỉ số PT, khoảng cách tương ứng hoặc None)
+        """
+        if distances is None:
+            if len(rows) > k:
+                rows = rows[np.argpartition(rank[rows], k - 1)[:k]]
+            return rows[np.argsort(rank[rows])], None
+        if len(rows) > k:
+            # Giữ mọi PT hòa khoảng cách với PT thứ k để tiêu chí phụ quyết định
+            kth_distance = distances[np.argpartition(distances, k - 1)[k - 1]]
+            keep = distances <= kth_distance
+            rows, distances = rows[keep], distances[keep]
+        order = np.lexsort((rank[rows], distances))[:k]
+        return rows[order], distances[order]
+
+    def gym_trainer(self, index, **extra):
+        row = self.rows[index]
+        return {
+            **{field: row[field] for field in TRAINER_PROFILE_FIELDS},
+            **extra,
+            'gymname': row['gymname'],
+            'gymaddress': row['gymaddress'],
+            'gym_latitude': row['gym_latitude'],
+            'gym_longitude': row['gym_longitude'],
+            'gym_hotresearch': row['gym_hotresearch'],
+            'pt_type': 'gym'
+        }
+
+    def freelance_trainer(self, index, with_location=False, **extra):
+        row = self.rows[index]
+        return {
+            **{field: row[field] for field in TRAINER_PROFILE_FIELDS},
+            **extra,
+            'gymname': FREELANCE_GYMNAME,
+            'gymaddress': FREELANCE_GYMADDRESS,
+            'gym_latitude': row['pt_latitude'] if with_location else None,
+            'gym_longitude': row['pt_longitude'] if with_location else None,
+            'gym_hotresearch': False,
+            'pt_type': 'freelance'
+        }
+
+    def search(self, spec):
+        """
+        Tìm PT theo tiêu chí của parse_trainer_search, cùng thứ tự và giới hạn với build_trainer_search_query
+        Returns: list các dict PT
+        """
+        mask = self.filter_mask(spec['is_male'], spec['goals'], spec['exp_operator'], spec['exp_years'])
+        freelance_rows, _ = self.top_k(np.flatnonzero(mask & self.is_freelance), self.freelance_rank)
+        if spec['only_freelance']:
+            return [self.freelance_trainer(index, gym_id_unused=None) for index in freelance_rows]
+
+        gym_rows, _ = self.top_k(np.flatnonzero(mask & self.is_gym), self.gym_rank)
+        if spec['only_gym']:
+            return [self.gym_trainer(index, gym_id_unused=self.rows[index]['gym_id']) for index in gym_rows]
+
+        return interleave_trainers(
+            [self.gym_trainer(index) for index in gym_rows],
+            [self.freelance_trainer(index) for index in freelance_rows],
+            trainer_order_key
+        )
+
+    def nearby(self, latitude, longitude, max_distance_km=None, exp_operator=None, exp_years=None, nearest=False):
+        """
+        10 PT gần nhất xen kẽ PT gym và PT tự do, cùng thứ tự với build_nearby_trainer_query
+        max_distance_km=None: không giới hạn khoảng cách
+        nearest=True: chỉ xét các gym / PT tự do ứng viên gần nhất như truy vấn kNN (trước khi lọc kinh nghiệm ở PT gym)
+        Returns: list các dict PT có 'distance_km'
+        """
+        k = TRAINERS_PER_TYPE
+        filtered = bool(exp_operator and exp_years and exp_operator in EXPERIENCE_COMPARATORS)
+        mask = self.filter_mask(exp_operator=exp_operator, exp_years=exp_years)
+
+        # PT gym: xét gym theo khoảng cách tăng dần tới khi đủ k PT thỏa bộ lọc (kèm các gym hòa khoảng cách)
+        gym_distances = haversine_km_array(latitude, longitude, self.gym_latitude, self.gym_longitude)
+        gyms = np.flatnonzero(~np.isnan(gym_distances) if max_distance_km is None else gym_distances <= max_distance_km)
+        if nearest:
+            gyms = _nearest_candidates(gyms, latitude, longitude, self.gym_latitude[gyms], self.gym_longitude[gyms])
+        gyms = gyms[np.argsort(gym_distances[gyms])]
+        if filtered:
+            # Số PT thỏa bộ lọc của từng gym, cộng theo đoạn (mỗi gym có ít nhất một PT nên không có đoạn rỗng)
+            counts = np.add.reduceat(mask[self.gym_trainer_rows].view(np.int8), self.gym_offsets[:-1], dtype=np.int64)
+        else:
+            counts = self.gym_trainer_counts
+        reached = np.cumsum(counts[gyms]) >= k
+        if reached.any():
+            gyms = gyms[gym_distances[gyms] <= gym_distances[gyms[np.argmax(reached)]]]
+        # Ghép các đoạn PT của những gym đã chọn
+        starts = self.gym_offsets[gyms]
+        lengths = self.gym_offsets[gyms + 1] - starts
+        positions = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        rows = self.gym_trainer_rows[positions]
+        rows = rows[mask[rows]]
+        gym_rows, gym_distances = self.top_k(rows, self.gym_rank, gym_distances[self.gym_code[rows]])
+
+        # PT tự do có vị trí: chỉ tính Haversine trong dải vĩ độ của bán kính
+        if max_distance_km is None:
+            start, end = 0, len(self.located_rows)
+        else:
+            start, end = np.searchsorted(self.located_latitude, [
+                latitude - max_distance_km / KM_PER_DEGREE, latitude + max_distance_km / KM_PER_DEGREE], side='left')
+        rows = self.located_rows[start:end]
+        distances = haversine_km_array(latitude, longitude, self.located_latitude[start:end], self.located_longitude[start:end])
+        keep = mask[rows] if max_distance_km is None else mask[rows] & (distances <= max_distance_km)
+        if nearest:
+            candidates = _nearest_candidates(np.flatnonzero(keep), latitude, longitude,
+                                             self.located_latitude[start:end][keep], self.located_longitude[start:end][keep])
+            keep = np.zeros(len(rows), dtype=bool)
+            keep[candidates] = True
+        # PT tự do chưa có vị trí xếp sau mọi PT có vị trí (COALESCE(distance_km, 999999)): chỉ cần k người đầu
+        unlocated_rows = self.unlocated_rows[mask[self.unlocated_rows]][:k]
+        freelance_rows, freelance_distances = self.top_k(
+            np.concatenate((rows[keep], unlocated_rows)), self.freelance_rank,
+            np.concatenate((distances[keep], np.full(len(unlocated_rows), UNLOCATED_DISTANCE_KM))))
+
+        return interleave_trainers(
+            [self.gym_trainer(index, distance_km=float(distance_km)) for index, distance_km in zip(gym_rows, gym_distances)],
+            [self.freelance_trainer(index, with_location=True,
+                                    distance_km=None if distance_km == UNLOCATED_DISTANCE_KM else float(distance_km))
+             for index, distance_km in zip(freelance_rows, freelance_distances)],
+            nearby_trainer_order_key
+        )
+
+
+class TrainerCatalog:
+    """Snapshot catalog PT dùng chung, được thay thế nguyên khối khi làm mới (người đọc không cần khóa)"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.refresh_count = 0
+        self.refresh_errors = 0
+        self.last_refresh_ms = None
+        self.queries = 0
+
+    def is_ready(self):
+        return self._snapshot is not None
+
+    def load(self, rows):
+        """Dựng snapshot mới từ danh sách hàng của TRAINER_CATALOG_QUERY và thay thế snapshot hiện tại"""
+        snapshot = TrainerCatalogSnapshot(rows)
+        self._snapshot = snapshot
+        return snapshot.size
+
+    def refresh(self):
+        """Tải lại catalog PT từ database; giữ snapshot cũ nếu lỗi"""
+        # Tránh nhiều luồng cùng refresh một lúc
+        with self._lock:
+            start = time.perf_counter()
+            results = query_database(TRAINER_CATALOG_QUERY)
+            if isinstance(results, str):
+                self.refresh_errors += 1
+                print(f"❌ TRAINER_CATALOG: Không thể làm mới catalog PT: {results}")
+                return False
+
+            size = self.load(results)
+            self.refresh_count += 1
+            self.last_refresh_ms = round((time.perf_counter() - start) * 1000, 2)
+            print(f"🗂️ TRAINER_CATALOG: Đã nạp {size} PT vào snapshot ({self.last_refresh_ms}ms)")
+            return True
+
+    def search(self, user_input):
+        """
+        Tìm PT theo câu của người dùng (không tìm gần) trên snapshot
+        Returns: list các dict PT, hoặc None nếu snapshot chưa sẵn sàng
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        self.queries += 1
+        return snapshot.search(parse_trainer_search(user_input))
+
+    def nearby(self, longitude, latitude, max_distance_km=None, user_input="", nearest=False):
+        """
+        Tìm PT gần trên snapshot (bộ lọc kinh nghiệm lấy từ user_input như build_nearby_trainer_query)
+        Returns: list các dict PT có 'distance_km', hoặc None nếu snapshot chưa sẵn sàng
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        self.queries += 1
+        exp_operator, exp_years = extract_experience_requirement(user_input)
+        return snapshot.nearby(latitude, longitude, max_distance_km or None, exp_operator, exp_years, nearest)
+
+    def stats(self):
+        """Thống kê snapshot cho endpoint /metrics"""
+        snapshot = self._snapshot
+        return {
+            "ready": snapshot is not None,
+            "trainers": snapshot.size if snapshot else 0,
+            "gym_trainers": int(snapshot.is_gym.sum()) if snapshot else 0,
+            "freelance_trainers": int(snapshot.is_freelance.sum()) if snapshot else 0,
+            "goals": len(snapshot.goal_vocabulary) if snapshot else 0,
+            "loaded_at": snapshot.loaded_at.isoformat() if snapshot else None,
+            "refresh_count": self.refresh_count,
+            "refresh_errors": self.refresh_errors,
+            "last_refresh_ms": self.last_refresh_ms,
+            "queries": self.queries
+        }
+
+
+# Catalog dùng chung cho toàn ứng dụng
+trainer_catalog = TrainerCatalog()
+
+_refresher_thread = None
+_refresher_stop = threading.Event()
+_refresh_requested = threading.Event()
+# Bảng mà snapshot đọc từ đó (payload NOTIFY trên kênh catalog_changed)
+CATALOG_SOURCES = {"trainer_profiles", "gym_search"}
+# Lần LISTEN đầu tiên ngay sau khi start_trainer_catalog_refresher vừa nạp snapshot: không cần nạp lại
+_skip_first_listen = False
+
+def request_trainer_catalog_refresh(changed=None):
+    """
+    Yêu cầu luồng nền làm mới snapshot (catalog listener gọi khi trainer_profiles / gym_search thay đổi)
+    changed: tập payload; "listen" là lúc listener (kết nối lại) bắt đầu lắng nghe, có thể đã lỡ thông báo
+    """
+    global _skip_first_listen
+    changed = set(changed or ())
+    if "listen" in changed and _skip_first_listen:
+        _skip_first_listen = False
+    elif "listen" in changed:
+        _refresh_requested.set()
+    if changed & CATALOG_SOURCES:
+        _refresh_requested.set()
+
+def _refresh_loop(interval_seconds):
+    while not _refresher_stop.is_set():
+        # Làm mới theo chu kỳ hoặc ngay khi có thông báo thay đổi (nhiều thông báo liên tiếp gộp thành một lần)
+        _refresh_requested.wait(interval_seconds or None)
+        _refresh_requested.clear()
+        if _refresher_stop.is_set():
+            break
+        try:
+            trainer_catalog.refresh()
+        except Exception as e:
+            trainer_catalog.refresh_errors += 1
+            print(f"❌ TRAINER_CATALOG: Lỗi khi làm mới: {str(e)}")
+
+def start_trainer_catalog_refresher(interval_seconds=TRAINER_CATALOG_REFRESH_SECONDS):
+    """Nạp snapshot lần đầu và khởi động luồng nền làm mới (định kỳ và khi catalog thay đổi)"""
+    global _refresher_thread, _skip_first_listen
+    if not TRAINER_CATALOG_ENABLED:
+        return
+    trainer_catalog.refresh()
+    _skip_first_listen = True
+    add_catalog_change_handler(request_trainer_catalog_refresh)
+    if _refresher_thread is not None and _refresher_thread.is_alive():
+        return
+    _refresher_stop.clear()
+    _refresh_requested.clear()
+    _refresher_thread = threading.Thread(target=_refresh_loop, args=(interval_seconds,), name="trainer-catalog-refresher", daemon=True)
+    _refresher_thread.start()
+
+def stop_trainer_catalog_refresher():
+    """Dừng luồng nền làm mới snapshot"""
+    global _refresher_thread
+    _refresher_stop.set()
+    _refresh_requested.set()
+    if _refresher_thread is not None:
+        _refresher_thread.join(timeout=5)
+        _refresher_thread = None
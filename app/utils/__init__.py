@@ -4,11 +4,35 @@ from .text_utils import (
     build_conversation_context,
     sanitize_text_for_json,
     normalize_vietnamese_text,
-    extract_search_keywords
+    extract_search_keywords,
+    build_hashing_vector,
+    cosine_similarity
 )
 
 from .format_utils import (
-    format_distance_friendly
+    format_distance_friendly,
+    dumps_json,
+    format_sse_event
+)
+
+from .intent_engine import (
+    IntentEngine,
+    keywords
+)
+
+from .cache_utils import (
+    TTLCache
+)
+
+from .geo_utils import (
+    haversine_km,
+    haversine_km_array,
+    bounding_box,
+    HAVERSINE_SQL,
+    BOUNDING_BOX_SQL,
+    NEAREST_ORDER_SQL,
+    geohash_encode,
+    geohash_bounds
 )
 
 __all__ = [
@@ -16,5 +40,20 @@ __all__ = [
     'sanitize_text_for_json', 
     'normalize_vietnamese_text',
     'extract_search_keywords',
-    'format_distance_friendly'
+    'build_hashing_vector',
+    'cosine_similarity',
+    'format_distance_friendly',
+    'dumps_json',
+    'format_sse_event',
+    'IntentEngine',
+    'keywords',
+    'TTLCache',
+    'haversine_km',
+    'haversine_km_array',
+    'bounding_box',
+    'HAVERSINE_SQL',
+    'BOUNDING_BOX_SQL',
+    'NEAREST_ORDER_SQL',
+    'geohash_encode',
+    'geohash_bounds'
 ]
\ No newline at end of file
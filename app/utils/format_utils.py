@@ -1,5 +1,8 @@
 # app/utils/format_utils.py - Formatting and display utilities
 
+from decimal import Decimal
+import orjson
+
 def format_distance_friendly(distance_km):
     """Định dạng khoảng cách theo cách thân thiện với người dùng"""
     if distance_km < 0.5:
@@ -13,4 +16,18 @@ def format_distance_friendly(distance_km):
     elif distance_km < 10:
         return f"{distance_km:.1f}km"
     else:
-        return f"{distance_km:.1f}km"
\ No newline at end of file
+        return f"{distance_km:.1f}km"
+def _json_default(value):
+    """Kiểu orjson không hỗ trợ sẵn: Decimal (tọa độ từ database) -> float, còn lại -> chuỗi"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def dumps_json(data):
+    """Serialize sang JSON (UTF-8 bytes) bằng orjson"""
+    return orjson.dumps(data, default=_json_default)
+
+def format_sse_event(event, data):
+    """Định dạng một sự kiện Server-Sent Events với dữ liệu JSON"""
+    payload = dumps_json(data).decode("utf-8")
+    return f"event: {event}\ndata: {payload}\n\n"
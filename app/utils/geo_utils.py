@@ -0,0 +1,110 @@
+# app/utils/geo_utils.py - Geographic distance and bounding box utilities
+
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.0  # 1 độ vĩ độ ≈ 111km (giống các truy vấn SQL)
+
+# Khoảng cách Haversine (km) trong SQL từ vị trí người dùng tới một cặp cột tọa độ DOUBLE PRECISION
+HAVERSINE_SQL = """6371.0 * 2 * ASIN(
+                SQRT(
+                    POWER(SIN(RADIANS(%(latitude)s - {lat}) / 2), 2) +
+                    COS(RADIANS(%(latitude)s)) * COS(RADIANS({lat})) *
+                    POWER(SIN(RADIANS(%(longitude)s - {lng}) / 2), 2)
+                )
+            )"""
+
+# Điều kiện bounding box trong SQL, khớp biểu thức của chỉ mục GiST point(longitude, latitude)
+# (xem app/database/sql/006_geo_point_indexes.sql); tham số lấy từ bounding_box()
+BOUNDING_BOX_SQL = ("point({lng}, {lat}) <@ box(point(%(min_longitude)s, %(min_latitude)s), "
+                    "point(%(max_longitude)s, %(max_latitude)s))")
+
+# Thứ tự kNN theo chỉ mục GiST: khoảng cách Euclid theo độ tới vị trí người dùng. Ở vĩ độ Việt Nam (8-23°)
+# một độ kinh ngắn hơn một độ vĩ tối đa ~8%, nên truy vấn lấy dư ứng viên rồi xếp lại bằng HAVERSINE_SQL
+NEAREST_ORDER_SQL = "point({lng}, {lat}) <-> point(%(longitude)s, %(latitude)s)"
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Tính khoảng cách Haversine (km) giữa hai tọa độ, cùng công thức với SQL"""
+    return EARTH_RADIUS_KM * 2 * math.asin(
+        math.sqrt(
+            math.sin(math.radians(lat1 - lat2) / 2) ** 2 +
+            math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+            math.sin(math.radians(lng1 - lng2) / 2) ** 2
+        )
+    )
+
+def haversine_km_array(latitude, longitude, latitudes, longitudes):
+    """
+    Khoảng cách Haversine (km) từ một tọa độ tới mảng tọa độ NumPy, cùng công thức với haversine_km
+    Phần tử thiếu tọa độ (NaN) cho khoảng cách NaN
+    """
+    return EARTH_RADIUS_KM * 2 * np.arcsin(
+        np.sqrt(
+            np.sin(np.radians(latitude - latitudes) / 2) ** 2 +
+            math.cos(math.radians(latitude)) * np.cos(np.radians(latitudes)) *
+            np.sin(np.radians(longitude - longitudes) / 2) ** 2
+        )
+    )
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Tính bounding box quanh một tọa độ
+    Returns: tuple (min_latitude, max_latitude, min_longitude, max_longitude)
+    """
+    lat_range = radius_km / KM_PER_DEGREE
+    lng_range = radius_km / (KM_PER_DEGREE * abs(math.cos(math.radians(latitude))))
+    return (
+        latitude - lat_range,
+        latitude + lat_range,
+        longitude - lng_range,
+        longitude + lng_range
+    )
+
+# Bảng mã base32 của geohash (bỏ a, i, l, o)
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash_encode(latitude, longitude, precision=6):
+    """Mã geohash của một tọa độ: xen kẽ các bit chia đôi kinh độ/vĩ độ, 5 bit mỗi ký tự"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, value_range = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+def geohash_bounds(geohash):
+    """
+    Biên của ô geohash
+    Returns: tuple (min_latitude, max_latitude, min_longitude, max_longitude)
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lng_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
@@ -0,0 +1,35 @@
+# app/utils/intent_engine.py - Precompiled multi-pattern intent matcher
+
+import re
+from types import MappingProxyType
+
+def keywords(*words):
+    """Chuyển danh sách từ khóa (so khớp chuỗi con) thành pattern regex"""
+    return [re.escape(word) for word in words]
+
+
+class IntentEngine:
+    """
+    Biên dịch toàn bộ bảng ý định một lần (mỗi ý định là một alternation các pattern)
+    và quét văn bản một lượt qua bảng, trả về mọi ý định khớp cùng trigger của nó
+    """
+
+    def __init__(self, intents):
+        # intents: dict tên ý định -> list pattern regex (giữ thứ tự khai báo)
+        self._compiled = [
+            (name, re.compile("|".join(f"(?:{pattern})" for pattern in patterns)))
+            for name, patterns in intents.items()
+        ]
+        self.names = [name for name, _ in self._compiled]
+
+    def scan(self, text):
+        """
+        Quét văn bản một lượt qua bảng ý định
+        Returns: mapping chỉ đọc tên ý định -> trigger khớp đầu tiên (trái nhất) trong văn bản
+        """
+        found = {}
+        for name, pattern in self._compiled:
+            match = pattern.search(text)
+            if match:
+                found[name] = match.group(0)
+        return MappingProxyType(found)
@@ -1,74 +1,167 @@
 # app/utils/text_utils.py - Text processing and normalization utilities
 
-import json
+import math
 import re
+import unicodedata
+import zlib
 from difflib import SequenceMatcher
+from functools import lru_cache
 from typing import List
+from app.utils.cache_utils import TTLCache
+from config import (
+    MAX_CONVERSATION_HISTORY,
+    CONTEXT_MAX_CHARS,
+    CONTEXT_MESSAGE_MAX_CHARS,
+    CONTEXT_SUMMARY_MAX_CHARS,
+    CONTEXT_SUMMARY_ITEM_CHARS,
+    CONTEXT_SUMMARY_CACHE_SIZE
+)
+
+def _role_label(role):
+    return "Người dùng" if role == "user" else "FitBridge"
+
+def _shorten(text, max_chars):
+    """Cắt text về tối đa max_chars ký tự (gộp khoảng trắng, thêm '…' khi bị cắt)"""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+@lru_cache(maxsize=4096)
+def render_context_message(role, content):
+    """Dòng ngữ cảnh của một tin nhắn; ghi nhớ theo nội dung nên mỗi tin nhắn chỉ được làm sạch một lần"""
+    content = sanitize_text_for_json(content)
+    if len(content) > CONTEXT_MESSAGE_MAX_CHARS:
+        content = _shorten(content, CONTEXT_MESSAGE_MAX_CHARS)
+    return f"{_role_label(role)}: {content}"
+
+@lru_cache(maxsize=4096)
+def summarize_context_message(role, content):
+    """Một mục tóm tắt ngắn cho tin nhắn cũ (giữ phần đầu, nơi có tên gym/PT)"""
+    return f"- {_role_label(role)}: {_shorten(sanitize_text_for_json(content), CONTEXT_SUMMARY_ITEM_CHARS)}"
+
+# Tóm tắt các lượt cũ theo hội thoại: dấu vân tay chuỗi tin nhắn cũ -> tuple mục tóm tắt
+_context_summary_cache = TTLCache(max_entries=CONTEXT_SUMMARY_CACHE_SIZE, ttl_seconds=3600)
+
+def _build_rolling_summary(older_messages):
+    """
+    Tóm tắt cuốn chiếu các tin nhắn cũ: dùng lại tóm tắt đã lưu của tiền tố dài nhất
+    (lượt trước) rồi chỉ thêm các tin nhắn mới, giữ các mục gần nhất trong ngân sách
+    """
+    fingerprints = []
+    fingerprint = 0
+    for role, content in older_messages:
+        fingerprint = hash((fingerprint, role, content))
+        fingerprints.append(fingerprint)
+
+    items, start = (), 0
+    for length in range(len(older_messages), 0, -1):
+        cached = _context_summary_cache.get(fingerprints[length - 1])
+        if cached is not None:
+            items, start = cached, length
+            break
+
+    if start < len(older_messages):
+        items = items + tuple(summarize_context_message(role, content) for role, content in older_messages[start:])
+        # Bỏ các mục cũ nhất khi vượt ngân sách tóm tắt
+        total = sum(len(item) + 1 for item in items)
+        first = 0
+        while total > CONTEXT_SUMMARY_MAX_CHARS and first < len(items):
+            total -= len(items[first]) + 1
+            first += 1
+        items = items[first:]
+        _context_summary_cache.set(fingerprints[-1], items)
+    return items
 
 def build_conversation_context(conversation_history: List[dict]) -> str:
-    """Xây dựng ngữ cảnh từ lịch sử hội thoại"""
+    """
+    Xây dựng ngữ cảnh từ lịch sử hội thoại trong ngân sách CONTEXT_MAX_CHARS:
+    tối đa MAX_CONVERSATION_HISTORY tin nhắn gần nhất giữ nguyên văn (tin nhắn quá dài bị cắt),
+    các lượt cũ hơn được nén thành tóm tắt cuốn chiếu
+    """
     if not conversation_history:
         return ""
-    
-    context_parts = []
-    for msg in conversation_history[-10:]:  # Lấy 10 tin nhắn gần nhất làm ngữ cảnh
-        role_label = "Người dùng" if msg.get("role") == "user" else "FitBridge"
-        content = sanitize_text_for_json(msg.get('content', ''))
-        context_parts.append(f"{role_label}: {content}")
-    
-    return "\n".join(context_parts)
+
+    messages = [(msg.get("role"), msg.get("content") or "") for msg in conversation_history]
+
+    # Giữ nguyên văn các tin nhắn mới nhất còn vừa ngân sách
+    recent_lines = []
+    used = 0
+    split = len(messages)
+    while split > 0 and len(recent_lines) < MAX_CONVERSATION_HISTORY:
+        line = render_context_message(*messages[split - 1])
+        if recent_lines and used + len(line) + 1 > CONTEXT_MAX_CHARS - CONTEXT_SUMMARY_MAX_CHARS:
+            break
+        recent_lines.append(line)
+        used += len(line) + 1
+        split -= 1
+    recent_lines.reverse()
+
+    if split == 0:
+        return "\n".join(recent_lines)
+
+    summary = _build_rolling_summary(messages[:split])
+    return "\n".join(["Tóm tắt các lượt trước:", *summary, "Gần đây:", *recent_lines])
+
+# Ký tự điều khiển gây lỗi JSON và surrogate đơn lẻ (không encode được sang UTF-8)
+_JSON_UNSAFE_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\ud800-\udfff]')
 
 def sanitize_text_for_json(text: str) -> str:
-    """Làm sạch text để tránh lỗi JSON parsing"""
+    """Làm sạch text để tránh lỗi JSON parsing (không cần encode thử sang JSON)"""
     if not text:
         return ""
-    
-    # Thay thế các ký tự điều khiển có thể gây lỗi JSON
-    try:
-        # Loại bỏ các ký tự điều khiển không mong muốn
-        cleaned_text = text.replace('\x00', '').replace('\x08', '').replace('\x0c', '')
-        cleaned_text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', cleaned_text)
-        
-        # Đảm bảo text có thể được encode thành JSON
-        json.dumps(cleaned_text)
-        return cleaned_text
-    except (UnicodeDecodeError, json.JSONDecodeError):
-        # Nếu vẫn có lỗi, encode/decode để loại bỏ ký tự không hợp lệ
-        return text.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore')
+    return _JSON_UNSAFE_CHARS.sub('', text)
 
+# Bản đồ chuyển đổi ký tự tiếng Việt (dạng dựng sẵn, chữ thường) sang Latin
+VIETNAMESE_CHAR_MAP = {
+    'à': 'a', 'á': 'a', 'ạ': 'a', 'ả': 'a', 'ã': 'a',
+    'â': 'a', 'ầ': 'a', 'ấ': 'a', 'ậ': 'a', 'ẩ': 'a', 'ẫ': 'a',
+    'ă': 'a', 'ằ': 'a', 'ắ': 'a', 'ặ': 'a', 'ẳ': 'a', 'ẵ': 'a',
+    'è': 'e', 'é': 'e', 'ẹ': 'e', 'ẻ': 'e', 'ẽ': 'e',
+    'ê': 'e', 'ề': 'e', 'ế': 'e', 'ệ': 'e', 'ể': 'e', 'ễ': 'e',
+    'ì': 'i', 'í': 'i', 'ị': 'i', 'ỉ': 'i', 'ĩ': 'i',
+    'ò': 'o', 'ó': 'o', 'ọ': 'o', 'ỏ': 'o', 'õ': 'o',
+    'ô': 'o', 'ồ': 'o', 'ố': 'o', 'ộ': 'o', 'ổ': 'o', 'ỗ': 'o',
+    'ơ': 'o', 'ờ': 'o', 'ớ': 'o', 'ợ': 'o', 'ở': 'o', 'ỡ': 'o',
+    'ù': 'u', 'ú': 'u', 'ụ': 'u', 'ủ': 'u', 'ũ': 'u',
+    'ư': 'u', 'ừ': 'u', 'ứ': 'u', 'ự': 'u', 'ử': 'u', 'ữ': 'u',
+    'ỳ': 'y', 'ý': 'y', 'ỵ': 'y', 'ỷ': 'y', 'ỹ': 'y',
+    'đ': 'd'
+}
+
+class _NormalizationTable(dict):
+    """
+    Bảng str.translate tính lười theo từng code point rồi ghi nhớ:
+    chữ hoa -> chữ thường, chữ tiếng Việt -> Latin, dấu kết hợp (NFD) -> bỏ,
+    ký tự ngoài [a-z0-9] -> khoảng trắng
+    """
+
+    def __missing__(self, codepoint):
+        result = []
+        for char in chr(codepoint).lower():
+            if char in VIETNAMESE_CHAR_MAP:
+                result.append(VIETNAMESE_CHAR_MAP[char])
+            elif 'a' <= char <= 'z' or '0' <= char <= '9':
+                result.append(char)
+            elif unicodedata.combining(char):
+                # Dấu thanh/dấu mũ dạng tổ hợp (NFD), chữ cái gốc đã được giữ lại
+                continue
+            else:
+                result.append(' ')
+        self[codepoint] = ''.join(result)
+        return self[codepoint]
+
+VIETNAMESE_NORMALIZATION_TABLE = _NormalizationTable()
+
+@lru_cache(maxsize=4096)
 def normalize_vietnamese_text(text):
     """Chuẩn hóa văn bản tiếng Việt để tìm kiếm tốt hơn"""
     if not text:
         return ""
     
-    text = text.lower()
-    
-    # Bản đồ chuyển đổi ký tự tiếng Việt sang Latin
-    char_map = {
-        'à': 'a', 'á': 'a', 'ạ': 'a', 'ả': 'a', 'ã': 'a',
-        'â': 'a', 'ầ': 'a', 'ấ': 'a', 'ậ': 'a', 'ẩ': 'a', 'ẫ': 'a',
-        'ă': 'a', 'ằ': 'a', 'ắ': 'a', 'ặ': 'a', 'ẳ': 'a', 'ẵ': 'a',
-        'è': 'e', 'é': 'e', 'ẹ': 'e', 'ẻ': 'e', 'ẽ': 'e',
-        'ê': 'e', 'ề': 'e', 'ế': 'e', 'ệ': 'e', 'ể': 'e', 'ễ': 'e',
-        'ì': 'i', 'í': 'i', 'ị': 'i', 'ỉ': 'i', 'ĩ': 'i',
-        'ò': 'o', 'ó': 'o', 'ọ': 'o', 'ỏ': 'o', 'õ': 'o',
-        'ô': 'o', 'ồ': 'o', 'ố': 'o', 'ộ': 'o', 'ổ': 'o', 'ỗ': 'o',
-        'ơ': 'o', 'ờ': 'o', 'ớ': 'o', 'ợ': 'o', 'ở': 'o', 'ỡ': 'o',
-        'ù': 'u', 'ú': 'u', 'ụ': 'u', 'ủ': 'u', 'ũ': 'u',
-        'ư': 'u', 'ừ': 'u', 'ứ': 'u', 'ự': 'u', 'ử': 'u', 'ữ': 'u',
-        'ỳ': 'y', 'ý': 'y', 'ỵ': 'y', 'ỷ': 'y', 'ỹ': 'y',
-        'đ': 'd'
-    }
-    
-    # Thay thế ký tự tiếng Việt
-    for viet_char, latin_char in char_map.items():
-        text = text.replace(viet_char, latin_char)
-    
-    # Loại bỏ ký tự đặc biệt, chỉ giữ chữ cái và số
-    text = re.sub(r'[^a-z0-9\s]', ' ', text)
-    text = ' '.join(text.split())
-    
-    return text
+    # Một lượt str.translate: hạ chữ thường, bỏ dấu, thay ký tự đặc biệt bằng khoảng trắng
+    text = text.translate(VIETNAMESE_NORMALIZATION_TABLE)
+    return ' '.join(text.split())
 
 
 def extract_search_keywords(user_input):
@@ -83,4 +176,33 @@ def extract_search_keywords(user_input):
     words = normalized.split()
     keywords = [word for word in words if word not in stop_words and len(word) >= 2]
     
-    return keywords
\ No newline at end of file
+    return keywords
+
+
+def build_hashing_vector(text, n_features=2 ** 18):
+    """
+    Vector thưa (hashing vectorizer) từ văn bản đã chuẩn hóa: từ đơn + 3-gram ký tự,
+    chuẩn hóa L2 để tính cosine bằng tích vô hướng
+    Returns: dict chỉ số -> trọng số
+    """
+    normalized = normalize_vietnamese_text(text)
+    if not normalized:
+        return {}
+
+    features = [f"w:{word}" for word in normalized.split()]
+    padded = f" {normalized} "
+    features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+
+    vector = {}
+    for feature in features:
+        index = zlib.crc32(feature.encode('utf-8')) % n_features
+        vector[index] = vector.get(index, 0.0) + 1.0
+
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {index: weight / norm for index, weight in vector.items()}
+
+def cosine_similarity(vector_a, vector_b):
+    """Cosine giữa hai vector thưa đã chuẩn hóa L2"""
+    if len(vector_a) > len(vector_b):
+        vector_a, vector_b = vector_b, vector_a
+    return sum(weight * vector_b.get(index, 0.0) for index, weight in vector_a.items())
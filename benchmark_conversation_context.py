@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark: kích thước và thời gian xây dựng ngữ cảnh hội thoại khi cuộc chat dài dần,
+so với cách cũ (10 tin nhắn gần nhất nguyên văn, làm sạch lại mỗi lượt)
+Run this script: python benchmark_conversation_context.py [số lượt]
+"""
+
+import sys
+import time
+from app.utils.text_utils import build_conversation_context, sanitize_text_for_json
+
+def legacy_build_conversation_context(conversation_history):
+    """Cách xây dựng ngữ cảnh cũ, dùng làm mốc so sánh"""
+    if not conversation_history:
+        return ""
+    context_parts = []
+    for msg in conversation_history[-10:]:
+        role_label = "Người dùng" if msg.get("role") == "user" else "FitBridge"
+        content = sanitize_text_for_json(msg.get('content', ''))
+        context_parts.append(f"{role_label}: {content}")
+    return "\n".join(context_parts)
+
+def trainer_listing(turn):
+    """Câu trả lời dài kiểu danh sách PT (loại tin nhắn làm phình prompt)"""
+    lines = [f"Mình tìm thấy 8 huấn luyện viên phù hợp (lượt {turn}):"]
+    for i in range(1, 9):
+        lines.append(
+            f"{i}. **PT Nguyễn Văn {chr(64 + i)}{turn}** - Gym FitBridge Quận {i}\n"
+            f"   🎯 Chuyên môn: Giảm cân, Tăng cơ, Yoga | Kinh nghiệm: {i + 2} năm\n"
+            f"   💰 Giá: {300 + i * 50}.000đ/buổi | ⭐ 4.{i} | 📍 {i * 1.3:.1f}km"
+        )
+    return "\n".join(lines)
+
+def build_conversation(turns):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"tìm pt giảm cân gần quận {turn % 12 + 1} giá rẻ"})
+        history.append({"role": "assistant", "content": trainer_listing(turn)})
+    return history
+
+def measure(func, history, checkpoints, rounds=200):
+    """Trả về [(số lượt, độ dài ngữ cảnh, µs/lần)] — mỗi lượt dựng lại ngữ cảnh như một request"""
+    rows = []
+    for turns in checkpoints:
+        prefix = history[:turns * 2]
+        context = func(prefix)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func(prefix)
+        rows.append((turns, len(context), (time.perf_counter() - start) / rounds * 1e6))
+    return rows
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    history = build_conversation(turns)
+
+    print(f"🚀 BENCHMARK NGỮ CẢNH HỘI THOẠI ({turns} lượt, trả lời dạng danh sách PT)")
+    print("=" * 66)
+
+    short = [{"role": "user", "content": "gym quận 1"}, {"role": "assistant", "content": "Có 3 gym ở quận 1."}] * 5
+    same = build_conversation_context(short) == legacy_build_conversation_context(short)
+    print(f"✅ Hội thoại ngắn cho ngữ cảnh giống cách cũ: {same}")
+
+    # Mô phỏng cuộc chat: mỗi lượt dựng lại ngữ cảnh từ toàn bộ lịch sử đến lượt đó
+    start = time.perf_counter()
+    for turn in range(1, turns + 1):
+        build_conversation_context(history[:turn * 2])
+    print(f"⏱️ Dựng ngữ cảnh cho {turns} lượt liên tiếp: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    checkpoints = [turn for turn in (1, 5, 10, 20, 50, 100, 200) if turn <= turns]
+    legacy = measure(legacy_build_conversation_context, history, checkpoints)
+    budgeted = measure(build_conversation_context, history, checkpoints)
+
+    print(f"\n{'Số lượt':>8} {'Cũ: ký tự':>11} {'µs':>8} {'Mới: ký tự':>12} {'µs':>8}")
+    print("-" * 52)
+    for (turn, old_chars, old_us), (_, new_chars, new_us) in zip(legacy, budgeted):
+        print(f"{turn:>8} {old_chars:>11,} {old_us:>8.1f} {new_chars:>12,} {new_us:>8.1f}")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cache tìm PT/gym gần khi tọa độ từ app di động lệch ở chữ số thập phân thứ 5-6 mỗi request
+- Cũ: cache kết quả theo tọa độ làm tròn 4 chữ số (query_database_cached), lệch vài mét là khóa mới
+- Mới: cache ứng viên theo (ô geohash, bậc bán kính, bộ lọc), khoảng cách chính xác tính lại mỗi request
+Chạy trên catalog hiện có (chỉ đọc), người dùng tập trung quanh một số địa điểm ở TP.HCM
+Run this script: python benchmark_geo_cache.py [số request]
+"""
+
+import io
+import random
+import statistics
+import sys
+import time
+from contextlib import redirect_stdout
+from app.database.search_cache import query_database_cached, clear_search_cache, search_cache, geo_candidate_cache
+from app.services.geo_cache_service import geo_cell_cache
+from app.services.pt_search_service import build_nearby_trainer_query
+from app.services.search_service import build_nearby_gym_search
+
+# Các điểm người dùng hay đứng (văn phòng, ký túc xá, khu dân cư) quanh trung tâm TP.HCM
+HOTSPOTS = 40
+HOTSPOT_SPREAD_DEGREES = 0.08
+# GPS lệch ~1-20m giữa các request của cùng một nơi
+JITTER_DEGREES = 0.0002
+RADIUS_KM = 5
+
+def simulate(requests, fetch):
+    """Chạy chuỗi request, trả về danh sách thời gian (ms) mỗi request"""
+    timings = []
+    # Bỏ log truy vấn để không ảnh hưởng thời gian đo
+    with redirect_stdout(io.StringIO()):
+        for latitude, longitude in requests:
+            start = time.perf_counter()
+            results = fetch(latitude, longitude)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert not isinstance(results, str), results
+    return timings
+
+def report(label, timings, cache):
+    stats = cache.stats()
+    print(f"   {label:<22} {stats['hit_rate'] * 100:>8.1f}% {statistics.median(timings):>10.2f} {sum(timings):>11.0f}")
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    random.seed(42)
+    hotspots = [(10.7769 + random.uniform(-1, 1) * HOTSPOT_SPREAD_DEGREES, 106.7009 + random.uniform(-1, 1) * HOTSPOT_SPREAD_DEGREES)
+                for _ in range(HOTSPOTS)]
+    requests = []
+    for _ in range(total):
+        latitude, longitude = random.choice(hotspots)
+        requests.append((latitude + random.uniform(-1, 1) * JITTER_DEGREES, longitude + random.uniform(-1, 1) * JITTER_DEGREES))
+
+    searches = {
+        "PT gần": (
+            lambda latitude, longitude: query_database_cached("trainer", build_nearby_trainer_query(longitude, latitude, RADIUS_KM)),
+            lambda latitude, longitude: geo_cell_cache.fetch(geo_cell_cache.plan_trainers(longitude, latitude, RADIUS_KM)),
+        ),
+        "Gym gần (kNN)": (
+            lambda latitude, longitude: query_database_cached("nearby_gym", build_nearby_gym_search(longitude, latitude, RADIUS_KM, 'knn')),
+            lambda latitude, longitude: geo_cell_cache.fetch(geo_cell_cache.plan_gyms(longitude, latitude, RADIUS_KM, nearest=True)),
+        ),
+    }
+
+    print(f"🚀 BENCHMARK CACHE TÌM GẦN ({total:,} request, {HOTSPOTS} địa điểm, GPS lệch ±{JITTER_DEGREES}°, bán kính {RADIUS_KM}km)")
+    print("=" * 70)
+    print(f"\n{'Cache':<25} {'Hit rate':>9} {'Trung vị ms':>10} {'Tổng ms':>11}")
+    for name, (legacy_fetch, cell_fetch) in searches.items():
+        print(f"\n🔎 {name}")
+        for label, fetch, cache in (("Tọa độ (cũ)", legacy_fetch, search_cache), ("Ô geohash", cell_fetch, geo_candidate_cache)):
+            clear_search_cache()
+            cache.hits = cache.misses = 0
+            report(label, simulate(requests, fetch), cache)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark: EXPLAIN ANALYZE tìm gym theo từ khóa trên catalog giả lập (mặc định 100k gym)
+- Cũ: ILIKE '%kw%' (từ khóa không dấu) trên văn bản có dấu, JOIN "Addresses" và dựng lại địa chỉ mỗi hàng
+- LIKE: LIKE '%kw%' trên các cột *_text đã chuẩn hóa của gym_search, chỉ mục GIN trigram nếu có pg_trgm
+- Toàn văn: search_vector @@ tsquery (chỉ mục GIN), xếp hạng ts_rank_cd, lấy trang đầu (top-k) trong database
+Dữ liệu nằm trong bảng tạm (che bảng thật cùng tên) và bị hủy khi kết thúc, database không bị thay đổi
+Run this script: python benchmark_gym_keyword_search.py [số gym]
+"""
+
+import re
+import sys
+import psycopg
+from app.database.connection import db_config
+from app.services.search_service import intelligent_gym_search, paginate_gym_query
+
+PROMPTS = [
+    "tìm gym yoga",
+    "tìm phòng gym Sao Việt",
+    "gym nào ở quận 3",
+    "tìm gym Bình Thạnh",
+]
+
+# Catalog giả lập: tên gym, chủ gym và địa chỉ tiếng Việt có dấu (mỗi phần tử một câu lệnh)
+SYNTHETIC_CATALOG_SQL = ["""
+    CREATE TEMP TABLE "AspNetUsers" ON COMMIT DROP AS
+    SELECT
+        gen_random_uuid() AS "Id",
+        (ARRAY['Phòng Gym', 'Fitness', 'Yoga Studio', 'Gym', 'CLB Thể Hình'])[1 + i %% 5] || ' ' ||
+        (ARRAY['Sao Việt', 'Hoàng Gia', 'Thể Lực', 'Năng Động', 'Đại Dương', 'Phú Mỹ', 'Ánh Dương'])[1 + (i / 5) %% 7] || ' ' || i AS "GymName",
+        (ARRAY['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Đặng'])[1 + i %% 5] || ' ' ||
+        (ARRAY['Văn', 'Thị', 'Minh', 'Đức'])[1 + (i / 3) %% 4] || ' ' ||
+        (ARRAY['Hùng', 'Lan', 'Tuấn', 'Phương', 'Ngọc', 'Quý'])[1 + (i / 7) %% 6] AS "FullName",
+        NULL::TEXT AS "TaxCode",
+        (106.6 + random() * 0.3)::NUMERIC(9, 6) AS "Longitude",
+        (10.7 + random() * 0.2)::NUMERIC(9, 6) AS "Latitude",
+        (i %% 17 = 0) AS "hotResearch",
+        'Active'::TEXT AS "AccountStatus",
+        'gym' || i || '@fitbridge.vn' AS "Email",
+        NULL::TEXT AS "PhoneNumber",
+        NULL::TEXT AS "GymDescription",
+        NULL::TEXT AS "AvatarUrl",
+        NULL::TEXT[] AS "GymImages",
+        NOW() - (i %% 900) * INTERVAL '1 day' AS "CreatedAt",
+        NOW() AS "UpdatedAt",
+        NULL::TIMESTAMP AS "Dob"
+    FROM generate_series(1, %(gyms)s) AS i
+    """, """
+    CREATE TEMP TABLE "Addresses" ON COMMIT DROP AS
+    SELECT
+        gen_random_uuid() AS "Id",
+        u."Id" AS "CustomerId",
+        (row_number() OVER ())::TEXT AS "HouseNumber",
+        (ARRAY['Nguyễn Huệ', 'Lê Lợi', 'Trần Phú', 'Điện Biên Phủ', 'Bạch Đằng'])[1 + (row_number() OVER ()) %% 5] AS "Street",
+        'Phường ' || (1 + (row_number() OVER ()) %% 15) AS "Ward",
+        (ARRAY['Quận 1', 'Quận 3', 'Quận 7', 'Phú Nhuận', 'Hải Châu', 'Thanh Khê', 'Bình Thạnh'])[1 + (row_number() OVER ()) %% 7] AS "District",
+        (ARRAY['TP. Hồ Chí Minh', 'Đà Nẵng'])[1 + (row_number() OVER ()) %% 2] AS "City",
+        TRUE AS "IsEnabled"
+    FROM "AspNetUsers" u
+    """,
+    'CREATE INDEX ON "Addresses" ("CustomerId")',
+    'ANALYZE "AspNetUsers"',
+    'ANALYZE "Addresses"'
+]
+
+TRIGRAM_INDEXES_SQL = """
+    CREATE INDEX ON gym_search USING gin (name_text gin_trgm_ops);
+    CREATE INDEX ON gym_search USING gin (address_text gin_trgm_ops);
+    CREATE INDEX ON gym_search USING gin (owner_text gin_trgm_ops);
+    CREATE INDEX ON gym_search USING gin (district_text gin_trgm_ops);
+    """
+
+GYM_ADDRESS_SQL = """COALESCE(CONCAT_WS(', ', NULLIF(a."HouseNumber", ''), NULLIF(a."Street", ''), NULLIF(a."Ward", ''), NULLIF(a."District", ''), NULLIF(a."City", '')), 'Địa chỉ chưa cập nhật')"""
+
+def legacy_keyword_query(query):
+    """Truy vấn từ khóa cũ (trước gym_search), dùng làm mốc so sánh"""
+    sql, params = query
+    if 'keyword_patterns' in params:
+        condition = (f'(u."GymName" ILIKE ANY(%(keyword_patterns)s) OR {GYM_ADDRESS_SQL} ILIKE ANY(%(keyword_patterns)s) '
+                     'OR u."FullName" ILIKE ANY(%(keyword_patterns)s))')
+    else:
+        condition = f'({GYM_ADDRESS_SQL} ILIKE ANY(%(district_address_patterns)s) OR a."District" ILIKE ANY(%(district_patterns)s))'
+    legacy_sql = f"""
+        SELECT u."Id" AS id, u."GymName" AS gymname, {GYM_ADDRESS_SQL} AS gymaddress
+        FROM "AspNetUsers" u
+        LEFT JOIN "Addresses" a ON u."Id" = a."CustomerId" AND a."IsEnabled" = true
+        WHERE u."AccountStatus" = 'Active' AND u."GymName" IS NOT NULL AND u."GymName" != ''
+        AND {condition}
+        """
+    # Mẫu quận số cũ so khớp văn bản có dấu ("%quận 3%")
+    legacy_params = {key: [pattern.replace('%quan ', '%quận ') for pattern in value] if isinstance(value, list) else value
+                     for key, value in params.items()}
+    return legacy_sql, legacy_params
+
+def explain(cursor, sql, params):
+    """Chạy EXPLAIN ANALYZE, trả về (thời gian ms, các nút quét chính)"""
+    rows = cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params).fetchall()
+    plan = [row[0] for row in rows]
+    execution_ms = float(re.search(r"Execution Time: ([\d.]+)", plan[-1]).group(1))
+    scans = sorted({match.group(0) for line in plan for match in [re.search(r'(Seq Scan|Bitmap Index Scan|Index Scan|Bitmap Heap Scan) on "?\w+"?', line)] if match})
+    return execution_ms, scans
+
+if __name__ == "__main__":
+    gyms = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print(f"🚀 BENCHMARK TÌM GYM THEO TỪ KHÓA ({gyms:,} gym giả lập)")
+    print("=" * 70)
+
+    with psycopg.connect(**db_config) as conn:
+        cursor = conn.cursor()
+        has_trigram = cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").fetchone() is not None
+        # Định nghĩa view lấy trước khi tạo bảng tạm để tên bảng không bị gắn schema public
+        view_sql = cursor.execute("SELECT pg_get_viewdef('public.gym_search'::regclass)").fetchone()[0].rstrip().rstrip(';')
+
+        for statement in SYNTHETIC_CATALOG_SQL:
+            cursor.execute(statement, {"gyms": gyms})
+        cursor.execute(f"CREATE TEMP TABLE gym_search ON COMMIT DROP AS {view_sql}")
+        if has_trigram:
+            cursor.execute(TRIGRAM_INDEXES_SQL)
+        cursor.execute("CREATE INDEX ON gym_search USING gin (search_vector)")
+        cursor.execute("ANALYZE gym_search")
+        print(f"✅ Catalog: {gyms:,} gym | chỉ mục trigram: {'có' if has_trigram else 'KHÔNG (chưa cài pg_trgm, quét tuần tự)'}")
+
+        print(f"\n{'Chế độ':<10} {'Số gym khớp':>12} {'Toàn bộ (ms)':>13} {'Trang đầu (ms)':>15}  Quét")
+        for prompt in PROMPTS:
+            like_query = intelligent_gym_search(prompt, search_mode='like')
+            if not like_query:
+                continue
+            print(f"\n🔎 '{prompt}'")
+            legacy_query = legacy_keyword_query(like_query)
+            count = len(cursor.execute(*legacy_query).fetchall())
+            execution_ms, scans = explain(cursor, *legacy_query)
+            print(f"   {'Cũ':<10} {count:>9,} {execution_ms:>13.1f} {'-':>15}  {', '.join(scans)}")
+
+            for mode in ('like', 'fulltext'):
+                query = intelligent_gym_search(prompt, search_mode=mode)
+                count = len(cursor.execute(*query).fetchall())
+                execution_ms, _ = explain(cursor, *query)
+                # Trang đầu như /chat: keyset pagination, LIMIT trong database
+                (page_sql, page_params), _, _ = paginate_gym_query(query)
+                page_ms, scans = explain(cursor, page_sql, page_params)
+                print(f"   {mode:<10} {count:>9,} {execution_ms:>13.1f} {page_ms:>15.1f}  {', '.join(scans)}")
+
+        conn.rollback()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chi phí phân loại ý định cho mỗi tin nhắn
+(intelligent_gym_search, detect_search_intent, classify_query_with_context,
+detect_trainer_search_intent, get_nearby_distance_preference, get_trainer_distance_preference)
+Run this script: python benchmark_intent_classifier.py [số vòng]
+"""
+
+import contextlib
+import io
+import statistics
+import sys
+import time
+from app.services.intent_service import scan_intents
+from app.services.search_service import (
+    intelligent_gym_search,
+    detect_search_intent,
+    classify_query_with_context,
+    get_nearby_distance_preference
+)
+from app.services.pt_search_service import detect_trainer_search_intent, get_trainer_distance_preference
+
+MESSAGES = [
+    "Tìm gym gần đây",
+    "Tìm phòng gym hot ở quận 1",
+    "Gym nào tốt nhất ở Hải Châu?",
+    "Tìm PT nữ chuyên giảm cân có ít nhất 3 năm kinh nghiệm",
+    "Có huấn luyện viên nào dạy tập riêng tăng cơ không",
+    "Tìm gym trong bán kính 3km",
+    "Xin chào, tôi muốn giảm cân thì nên ăn gì?",
+    "Cho tôi danh sách gym",
+    "Đi xe máy khoảng 15 phút có phòng gym nào không",
+    "Tôi cần một PT freelance gần nhà",
+    "Gym mới mở có thiết bị hiện đại, giá rẻ ở thành phố",
+    "Bài tập nào tốt cho lưng?",
+]
+
+def classify_message(message):
+    """Chạy toàn bộ các bước phân loại cho một tin nhắn"""
+    intelligent_gym_search(message)
+    detect_search_intent(message)
+    classify_query_with_context(message, "")
+    detect_trainer_search_intent(message)
+    get_nearby_distance_preference(message)
+    get_trainer_distance_preference(message)
+
+def time_per_message(rounds, clear_cache):
+    """Thời gian phân loại trung bình mỗi tin nhắn (µs) cho từng vòng"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for message in MESSAGES:
+            if clear_cache:
+                scan_intents.cache_clear()
+            classify_message(message)
+        timings.append((time.perf_counter() - start) * 1_000_000 / len(MESSAGES))
+    return timings
+
+def time_scan_only(rounds):
+    """Thời gian một lượt quét của intent engine (µs/tin nhắn, không cache)"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for message in MESSAGES:
+            scan_intents.__wrapped__(message)
+        timings.append((time.perf_counter() - start) * 1_000_000 / len(MESSAGES))
+    return timings
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    print(f"🚀 BENCHMARK INTENT CLASSIFIER ({len(MESSAGES)} tin nhắn x {rounds} vòng)")
+    print("=" * 60)
+
+    # Các hàm tìm kiếm in log debug; bỏ qua khi đo
+    with contextlib.redirect_stdout(io.StringIO()):
+        classify_message(MESSAGES[0])  # warm-up
+        cold = time_per_message(rounds, clear_cache=True)
+        warm = time_per_message(rounds, clear_cache=False)
+        scan = time_scan_only(rounds)
+
+    print(f"{'Chế độ':<36} {'mean (µs)':>10} {'p50 (µs)':>10}")
+    print("-" * 58)
+    for label, timings in (
+        ("Phân loại đầy đủ (quét mới)", cold),
+        ("Phân loại đầy đủ (cache quét)", warm),
+        ("Chỉ quét intent engine", scan),
+    ):
+        print(f"{label:<36} {statistics.mean(timings):>10.1f} {statistics.median(timings):>10.1f}")
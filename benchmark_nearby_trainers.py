@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Benchmark: độ trễ truy vấn PT gần (build_nearby_trainer_query) trên catalog giả lập 10k / 100k / 1M PT
+- Cũ: CTE TrainersWithGoals gộp mục tiêu của mọi PT trên cả nước rồi mới ghép với gym gần / lọc vị trí
+- Mới: lọc bounding box + bán kính trên gym_search và vị trí PT tự do trước, ghép trainer_profiles theo chỉ mục
+Dữ liệu nằm trong bảng tạm (che bảng thật cùng tên) và bị hủy khi kết thúc, database không bị thay đổi
+Run this script: python benchmark_nearby_trainers.py [số PT ...]
+"""
+
+import statistics
+import sys
+import time
+import psycopg
+from app.database.connection import db_config
+from app.services.pt_search_service import build_nearby_trainer_query
+from app.utils.geo_utils import bounding_box
+
+# Người dùng ở trung tâm TP.HCM, bán kính 10km
+USER_LATITUDE, USER_LONGITUDE, RADIUS_KM = 10.7769, 106.7009, 10
+
+# Catalog giả lập quanh 6 thành phố: 1 gym cho mỗi 8 PT, 20% PT tự do (2% chưa có vị trí), mỗi PT 2 mục tiêu
+SYNTHETIC_CATALOG_SQL = [
+    """CREATE TEMP TABLE city (lat DOUBLE PRECISION, lng DOUBLE PRECISION) ON COMMIT DROP""",
+    """INSERT INTO city VALUES (10.7769, 106.7009), (21.0285, 105.8542), (16.0544, 108.2022),
+        (10.0452, 105.7469), (20.8449, 106.6881), (12.2388, 109.1967)""",
+    """
+    CREATE TEMP TABLE "AspNetUsers" ON COMMIT DROP AS
+    SELECT
+        md5('gym' || k)::UUID AS "Id", 'Chủ gym ' || k AS "FullName", 'gym' || k || '@fitbridge.vn' AS "Email",
+        NULL::TEXT AS "PhoneNumber", NULL::BOOLEAN AS "IsMale", NULL::TIMESTAMP AS "Dob", 'Active'::TEXT AS "AccountStatus",
+        NOW()::TIMESTAMP - (k %% 900) * INTERVAL '1 day' AS "CreatedAt", NOW()::TIMESTAMP AS "UpdatedAt",
+        'FitBridge Gym ' || k AS "GymName", NULL::TEXT AS "TaxCode",
+        (c.lat + (random() + random() - 1) * 0.25)::NUMERIC(9, 6) AS "Latitude",
+        (c.lng + (random() + random() - 1) * 0.25)::NUMERIC(9, 6) AS "Longitude",
+        (k %% 13 = 0) AS "hotResearch", NULL::TEXT AS "GymDescription", NULL::TEXT AS "AvatarUrl",
+        NULL::TEXT[] AS "GymImages", NULL::TEXT AS "Bio", NULL::UUID AS "GymOwnerId"
+    FROM generate_series(1, %(gyms)s) AS k
+    CROSS JOIN LATERAL (SELECT * FROM city OFFSET k %% 6 LIMIT 1) c
+    """,
+    """
+    INSERT INTO "AspNetUsers"
+    SELECT
+        md5('pt' || i)::UUID, 'Huấn luyện viên ' || i, 'pt' || i || '@fitbridge.vn',
+        NULL, i %% 2 = 0, NULL, 'Active',
+        NOW()::TIMESTAMP, NOW()::TIMESTAMP,
+        NULL, NULL,
+        CASE WHEN i %% 5 = 0 AND i %% 50 != 0 THEN (c.lat + (random() + random() - 1) * 0.25)::NUMERIC(9, 6) END,
+        CASE WHEN i %% 5 = 0 AND i %% 50 != 0 THEN (c.lng + (random() + random() - 1) * 0.25)::NUMERIC(9, 6) END,
+        NULL, NULL, NULL, NULL, 'Bio ' || i,
+        CASE WHEN i %% 5 != 0 THEN md5('gym' || (1 + i %% %(gyms)s))::UUID END
+    FROM generate_series(1, %(pts)s) AS i
+    CROSS JOIN LATERAL (SELECT * FROM city OFFSET i %% 6 LIMIT 1) c
+    """,
+    """
+    CREATE TEMP TABLE "Addresses" ON COMMIT DROP AS
+    SELECT md5('addr' || k)::UUID AS "Id", md5('gym' || k)::UUID AS "CustomerId", k::TEXT AS "HouseNumber",
+        'Nguyễn Huệ' AS "Street", 'Phường ' || (1 + k %% 15) AS "Ward", 'Quận ' || (1 + k %% 12) AS "District",
+        'TP. Hồ Chí Minh' AS "City", TRUE AS "IsEnabled"
+    FROM generate_series(1, %(gyms)s) AS k
+    """,
+    """
+    CREATE TEMP TABLE "UserDetails" ON COMMIT DROP AS
+    SELECT md5('pt' || i)::UUID AS "Id", i %% 15 AS "Experience", ARRAY['CPT', 'NASM']::TEXT[] AS "Certificates",
+        170.0::DOUBLE PRECISION AS "Height", 68.0::DOUBLE PRECISION AS "Weight", 35.0::DOUBLE PRECISION AS "Biceps",
+        98.0::DOUBLE PRECISION AS "Chest", 78.0::DOUBLE PRECISION AS "Waist", TRUE AS "IsEnabled"
+    FROM generate_series(1, %(pts)s) AS i
+    """,
+    """
+    CREATE TEMP TABLE "GoalTrainings" ON COMMIT DROP AS
+    SELECT md5('goal' || k)::UUID AS "Id",
+        (ARRAY['Giảm cân', 'Tăng cơ', 'Thể hình', 'Sức mạnh', 'Sức bền', 'Linh hoạt', 'Phục hồi chức năng', 'Thể lực tổng hợp'])[k + 1] AS "Name",
+        TRUE AS "IsEnabled"
+    FROM generate_series(0, 7) AS k
+    """,
+    """
+    CREATE TEMP TABLE "PTGoalTrainings" ON COMMIT DROP AS
+    SELECT md5('pt' || i)::UUID AS "ApplicationUsersId", md5('goal' || k)::UUID AS "GoalTrainingsId"
+    FROM generate_series(1, %(pts)s) AS i
+    CROSS JOIN LATERAL (VALUES (i %% 8), ((i %% 8 + 1 + i %% 7) %% 8)) AS goals(k)
+    """,
+    """
+    CREATE TEMP TABLE "PTFreelancePackages" ON COMMIT DROP AS
+    SELECT md5('pkg' || i)::UUID AS "Id", 'Gói 1:1' AS "Name", md5('pt' || i)::UUID AS "PtId", TRUE AS "IsEnabled"
+    FROM generate_series(5, %(pts)s, 5) AS i
+    """,
+    # Chỉ mục khóa chính / khóa ngoại như schema thật
+    'ALTER TABLE "AspNetUsers" ADD PRIMARY KEY ("Id")',
+    'CREATE INDEX ON "AspNetUsers" ("GymOwnerId")',
+    'CREATE INDEX ON "Addresses" ("CustomerId")',
+    'ALTER TABLE "UserDetails" ADD PRIMARY KEY ("Id")',
+    'ALTER TABLE "GoalTrainings" ADD PRIMARY KEY ("Id")',
+    'ALTER TABLE "PTGoalTrainings" ADD PRIMARY KEY ("ApplicationUsersId", "GoalTrainingsId")',
+    'CREATE INDEX ON "PTFreelancePackages" ("PtId")',
+]
+
+# Bảng đọc của truy vấn mới, dựng từ định nghĩa view thật và cùng chỉ mục với migration
+DERIVED_TABLES_SQL = [
+    "CREATE TEMP TABLE gym_search ON COMMIT DROP AS {gym_search}",
+    "CREATE INDEX ON gym_search USING gist (point(longitude, latitude)) WHERE latitude IS NOT NULL AND longitude IS NOT NULL",
+    "CREATE TEMP TABLE trainer_profiles ON COMMIT DROP AS {trainer_profile_source}",
+    "ALTER TABLE trainer_profiles ADD PRIMARY KEY (id)",
+    "CREATE INDEX ON trainer_profiles (pt_gym_id) WHERE pt_gym_id IS NOT NULL",
+    "CREATE INDEX ON trainer_profiles (experience DESC NULLS LAST, fullname) WHERE is_freelance = true AND pt_gym_id IS NULL",
+    """CREATE INDEX ON trainer_profiles USING gist (point(pt_longitude, pt_latitude))
+        WHERE is_freelance = true AND pt_gym_id IS NULL AND pt_latitude IS NOT NULL AND pt_longitude IS NOT NULL""",
+]
+
+# Truy vấn PT gần cũ (gộp toàn bộ PT trước khi lọc vị trí), dùng làm mốc so sánh
+LEGACY_NEARBY_TRAINER_SQL = """
+    WITH NearbyGyms AS (
+        -- Tìm các gym gần người dùng
+        SELECT 
+            gym."Id" as gym_id,
+            gym."GymName" as gymname,
+            COALESCE(
+                CONCAT_WS(', ', 
+                    NULLIF(a."HouseNumber", ''), 
+                    NULLIF(a."Street", ''), 
+                    NULLIF(a."Ward", ''), 
+                    NULLIF(a."District", ''), 
+                    NULLIF(a."City", '')
+                ), 
+                'Địa chỉ chưa cập nhật'
+            ) as gymaddress,
+            CAST(gym."Longitude" AS DOUBLE PRECISION) AS gym_longitude,
+            CAST(gym."Latitude" AS DOUBLE PRECISION) AS gym_latitude,
+            gym."hotResearch" as gym_hotresearch,
+            6371.0 * 2 * ASIN(
+                SQRT(
+                    POWER(SIN(RADIANS(%(latitude)s - CAST(gym."Latitude" AS DOUBLE PRECISION)) / 2), 2) +
+                    COS(RADIANS(%(latitude)s)) * COS(RADIANS(CAST(gym."Latitude" AS DOUBLE PRECISION))) *
+                    POWER(SIN(RADIANS(%(longitude)s - CAST(gym."Longitude" AS DOUBLE PRECISION)) / 2), 2)
+                )
+            ) AS distance_km
+        FROM "AspNetUsers" gym
+        LEFT JOIN "Addresses" a ON gym."Id" = a."CustomerId" AND a."IsEnabled" = true
+        WHERE gym."AccountStatus" = 'Active'
+            AND gym."GymName" IS NOT NULL 
+            AND gym."GymName" != ''
+            AND gym."Latitude" IS NOT NULL 
+            AND gym."Longitude" IS NOT NULL
+            AND CAST(gym."Latitude" AS DOUBLE PRECISION) BETWEEN %(min_latitude)s AND %(max_latitude)s
+            AND CAST(gym."Longitude" AS DOUBLE PRECISION) BETWEEN %(min_longitude)s AND %(max_longitude)s
+    ),
+    RankedGyms AS (
+        SELECT *
+        FROM NearbyGyms
+        WHERE distance_km <= %(max_distance_km)s
+    ),
+    TrainersWithGoals AS (
+        -- Lấy tất cả PT (gym và freelance) và thông tin mục tiêu tập luyện
+        SELECT 
+            pt."Id" as id,
+            pt."FullName" as fullname,
+            pt."Email" as email,
+            pt."PhoneNumber" as phonenumber,
+            pt."IsMale" as ismale,
+            pt."Dob" as dob,
+            pt."AvatarUrl" as avatarurl,
+            pt."Bio" as bio,
+            pt."AccountStatus" as accountstatus,
+            pt."CreatedAt" as createdat,
+            pt."UpdatedAt" as updatedat,
+            pt."GymOwnerId" as pt_gym_id,
+            pt."Latitude" as pt_latitude,
+            pt."Longitude" as pt_longitude,
+            ud."Experience" as experience,
+            ud."Certificates" as certificates,
+            ud."Height" as height,
+            ud."Weight" as weight,
+            ud."Biceps" as biceps,
+            ud."Chest" as chest,
+            ud."Waist" as waist,
+            ARRAY_AGG(DISTINCT gt."Name") FILTER (WHERE gt."Name" IS NOT NULL) as goal_trainings,
+            -- Kiểm tra xem có package freelance không
+            CASE 
+                WHEN COUNT(DISTINCT pfp."Id") > 0 THEN true 
+                ELSE false 
+            END as is_freelance
+        FROM "AspNetUsers" pt
+        LEFT JOIN "UserDetails" ud ON pt."Id" = ud."Id"
+        LEFT JOIN "PTGoalTrainings" pgt ON pt."Id" = pgt."ApplicationUsersId"
+        LEFT JOIN "GoalTrainings" gt ON pgt."GoalTrainingsId" = gt."Id" AND gt."IsEnabled" = true
+        LEFT JOIN "PTFreelancePackages" pfp ON pt."Id" = pfp."PtId" AND pfp."IsEnabled" = true
+        WHERE pt."AccountStatus" = 'Active'
+            AND (pt."GymOwnerId" IS NOT NULL OR EXISTS (
+                SELECT 1 FROM "PTFreelancePackages" pfp2 
+                WHERE pfp2."PtId" = pt."Id" AND pfp2."IsEnabled" = true
+            ))
+        GROUP BY pt."Id", ud."Experience", ud."Certificates", ud."Height", 
+                 ud."Weight", ud."Biceps", ud."Chest", ud."Waist"
+    ),
+    -- PT Gym với khoảng cách từ gym
+    GymPTs AS (
+        SELECT 
+            t.id,
+            t.fullname,
+            t.email,
+            t.phonenumber,
+            t.ismale,
+            t.dob,
+            t.avatarurl,
+            t.bio,
+            t.accountstatus,
+            t.createdat,
+            t.updatedat,
+            t.pt_gym_id,
+            t.experience,
+            t.certificates,
+            t.height,
+            t.weight,
+            t.biceps,
+            t.chest,
+            t.waist,
+            t.goal_trainings,
+            t.is_freelance,
+            g.gym_id,
+            g.gymname,
+            g.gymaddress,
+            g.gym_latitude,
+            g.gym_longitude,
+            g.gym_hotresearch,
+            g.distance_km,
+            'gym' as pt_type,
+            ROW_NUMBER() OVER (ORDER BY g.distance_km ASC, g.gym_hotresearch DESC, t.experience DESC NULLS LAST) as rn
+        FROM TrainersWithGoals t
+        INNER JOIN RankedGyms g ON t.pt_gym_id = g.gym_id
+    ),
+    -- PT Freelance với khoảng cách từ vị trí cá nhân
+    FreelancePTs AS (
+        SELECT 
+            t.id,
+            t.fullname,
+            t.email,
+            t.phonenumber,
+            t.ismale,
+            t.dob,
+            t.avatarurl,
+            t.bio,
+            t.accountstatus,
+            t.createdat,
+            t.updatedat,
+            t.pt_gym_id,
+            t.experience,
+            t.certificates,
+            t.height,
+            t.weight,
+            t.biceps,
+            t.chest,
+            t.waist,
+            t.goal_trainings,
+            t.is_freelance,
+            NULL::UUID as gym_id,
+            'Huấn luyện viên tự do' as gymname,
+            'Tập tại địa điểm linh hoạt' as gymaddress,
+            CAST(t.pt_latitude AS DOUBLE PRECISION) as gym_latitude,
+            CAST(t.pt_longitude AS DOUBLE PRECISION) as gym_longitude,
+            false as gym_hotresearch,
+            CASE 
+                WHEN t.pt_latitude IS NOT NULL AND t.pt_longitude IS NOT NULL THEN
+                    6371.0 * 2 * ASIN(
+                        SQRT(
+                            POWER(SIN(RADIANS(%(latitude)s - CAST(t.pt_latitude AS DOUBLE PRECISION)) / 2), 2) +
+                            COS(RADIANS(%(latitude)s)) * COS(RADIANS(CAST(t.pt_latitude AS DOUBLE PRECISION))) *
+                            POWER(SIN(RADIANS(%(longitude)s - CAST(t.pt_longitude AS DOUBLE PRECISION)) / 2), 2)
+                        )
+                    )
+                ELSE NULL
+            END as distance_km,
+            'freelance' as pt_type,
+            ROW_NUMBER() OVER (ORDER BY 
+                CASE 
+                    WHEN t.pt_latitude IS NOT NULL AND t.pt_longitude IS NOT NULL THEN
+                        6371.0 * 2 * ASIN(
+                            SQRT(
+                                POWER(SIN(RADIANS(%(latitude)s - CAST(t.pt_latitude AS DOUBLE PRECISION)) / 2), 2) +
+                                COS(RADIANS(%(latitude)s)) * COS(RADIANS(CAST(t.pt_latitude AS DOUBLE PRECISION))) *
+                                POWER(SIN(RADIANS(%(longitude)s - CAST(t.pt_longitude AS DOUBLE PRECISION)) / 2), 2)
+                            )
+                        )
+                    ELSE 999999
+                END ASC,
+                t.experience DESC NULLS LAST
+            ) as rn
+        FROM TrainersWithGoals t
+        WHERE t.is_freelance = true
+            AND t.pt_gym_id IS NULL
+            AND (
+                t.pt_latitude IS NULL OR t.pt_longitude IS NULL OR
+                (CAST(t.pt_latitude AS DOUBLE PRECISION) BETWEEN %(min_latitude)s AND %(max_latitude)s
+                AND CAST(t.pt_longitude AS DOUBLE PRECISION) BETWEEN %(min_longitude)s AND %(max_longitude)s)
+            )
+    ),
+    -- Mixed kết quả: xen kẽ gym và freelance
+    MixedResults AS (
+        SELECT * FROM GymPTs WHERE rn <= 10
+        UNION ALL
+        SELECT * FROM FreelancePTs WHERE rn <= 10
+    )
+    -- Lấy 10 PT, ưu tiên xen kẽ giữa gym và freelance
+    SELECT 
+        id, fullname, email, phonenumber, ismale, dob, avatarurl, bio,
+        accountstatus, createdat, updatedat, pt_gym_id as gym_id, experience, certificates,
+        height, weight, biceps, chest, waist, goal_trainings, is_freelance,
+        gymname, gymaddress, gym_latitude, gym_longitude, gym_hotresearch,
+        distance_km, pt_type
+    FROM (
+        SELECT *,
+            ROW_NUMBER() OVER (
+                PARTITION BY (rn %% 2)
+                ORDER BY 
+                    CASE WHEN pt_type = 'gym' THEN 0 ELSE 1 END,
+                    distance_km ASC NULLS LAST,
+                    experience DESC NULLS LAST
+            ) as mixed_rn
+        FROM MixedResults
+        WHERE distance_km IS NULL OR distance_km <= %(max_distance_km)s
+    ) mixed
+    WHERE mixed_rn <= 5
+    ORDER BY 
+        (mixed_rn - 1) * 2 + CASE WHEN pt_type = 'gym' THEN 0 ELSE 1 END,
+        distance_km ASC NULLS LAST
+    LIMIT 10
+"""
+
+def legacy_build_nearby_trainer_query(longitude, latitude, max_distance_km):
+    """Truy vấn PT gần cũ với cùng tham số như build_nearby_trainer_query"""
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, max_distance_km)
+    params = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'min_latitude': min_latitude,
+        'max_latitude': max_latitude,
+        'min_longitude': min_longitude,
+        'max_longitude': max_longitude,
+        'max_distance_km': max_distance_km
+    }
+    return LEGACY_NEARBY_TRAINER_SQL, params
+
+def measure(cursor, query, rounds):
+    """Trung vị thời gian (ms) và kết quả của truy vấn"""
+    sql, params = query
+    rows = cursor.execute(sql, params).fetchall()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        cursor.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), rows
+
+def build_catalog(cursor, pts, view_definitions):
+    """Tạo catalog giả lập trong bảng tạm, trả về thời gian dựng trainer_profiles (ms)"""
+    for statement in SYNTHETIC_CATALOG_SQL:
+        cursor.execute(statement, {"pts": pts, "gyms": max(pts // 8, 1)})
+    start = time.perf_counter()
+    for statement in DERIVED_TABLES_SQL:
+        cursor.execute(statement.format(**view_definitions))
+    build_ms = (time.perf_counter() - start) * 1000
+    for table in ("AspNetUsers", "Addresses", "UserDetails", "GoalTrainings", "PTGoalTrainings",
+                  "PTFreelancePackages", "gym_search", "trainer_profiles"):
+        cursor.execute(f'ANALYZE "{table}"')
+    return build_ms
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+
+    print(f"🚀 BENCHMARK PT GẦN ({RADIUS_KM}km quanh TP.HCM)")
+    print("=" * 78)
+    print(f"{'Số PT':>10} {'Dựng hồ sơ (ms)':>16} {'Cũ (ms)':>10} {'Mới (ms)':>10} {'Nhanh hơn':>10}  Cùng kết quả")
+    print("-" * 78)
+
+    for pts in sizes:
+        with psycopg.connect(**db_config) as conn:
+            cursor = conn.cursor()
+            # Định nghĩa view lấy trước khi tạo bảng tạm để tên bảng không bị gắn schema public
+            view_definitions = {
+                name: cursor.execute(f"SELECT pg_get_viewdef('public.{name}'::regclass)").fetchone()[0].rstrip().rstrip(';')
+                for name in ("gym_search", "trainer_profile_source")
+            }
+            build_ms = build_catalog(cursor, pts, view_definitions)
+
+            rounds = 3 if pts >= 1000000 else 7
+            legacy_ms, legacy_rows = measure(cursor, legacy_build_nearby_trainer_query(USER_LONGITUDE, USER_LATITUDE, RADIUS_KM), rounds)
+            new_ms, new_rows = measure(cursor, build_nearby_trainer_query(USER_LONGITUDE, USER_LATITUDE, RADIUS_KM), rounds)
+            # PT cùng gym và cùng kinh nghiệm có thể đổi chỗ cho nhau: so thứ tự (khoảng cách, loại) và tập PT
+            same = ([(row[-2], row[-1]) for row in legacy_rows] == [(row[-2], row[-1]) for row in new_rows])
+            print(f"{pts:>10,} {build_ms:>16.0f} {legacy_ms:>10.1f} {new_ms:>10.1f} {legacy_ms / new_ms:>9.1f}x  {same} ({len(new_rows)} PT)")
+            conn.rollback()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tìm gym gần trên catalog giả lập (mặc định 100k gym, dày ở nội thành TP.HCM, thưa ở ngoại tỉnh)
+- Bán kính: mọi gym trong bán kính đoán từ câu (10km) rồi sắp xếp, database và chỉ mục lưới trong bộ nhớ
+- kNN: k gym gần nhất theo chỉ mục GiST (ORDER BY <-> LIMIT) trong tối đa 50km, database và chỉ mục lưới
+Dữ liệu nằm trong bảng tạm (che bảng thật cùng tên) và bị hủy khi kết thúc, database không bị thay đổi
+Run this script: python benchmark_nearest_gyms.py [số gym]
+"""
+
+import statistics
+import sys
+import time
+import psycopg
+from psycopg.rows import dict_row
+from app.database.connection import db_config
+from app.services.gym_index_service import GymSpatialIndex, GYM_INDEX_QUERY
+from app.services.search_service import build_nearby_gym_query, build_nearest_gym_query
+from config import NEARBY_KNN_LIMIT, NEARBY_KNN_MAX_DISTANCE_KM
+
+# Vị trí người dùng: trung tâm Quận 1 (dày đặc) và một huyện xa trung tâm (thưa)
+LOCATIONS = [
+    ("Quận 1, TP.HCM", 10.7769, 106.7009),
+    ("Cần Giờ, TP.HCM", 10.4114, 106.9547),
+]
+GUESSED_RADIUS_KM = 10
+
+# 90% gym dồn trong ~8km quanh trung tâm, phần còn lại rải trên ~150km (mỗi phần tử một câu lệnh)
+SYNTHETIC_CATALOG_SQL = ["""
+    CREATE TEMP TABLE "AspNetUsers" ON COMMIT DROP AS
+    SELECT
+        md5('gym' || i)::UUID AS "Id",
+        'FitBridge Gym ' || i AS "GymName",
+        'Chủ gym ' || i AS "FullName",
+        NULL::TEXT AS "TaxCode",
+        (106.7009 + CASE WHEN i %% 10 = 0 THEN (random() - 0.5) * 1.4 ELSE (random() + random() - 1) * 0.08 END)::NUMERIC(9, 6) AS "Longitude",
+        (10.7769 + CASE WHEN i %% 10 = 0 THEN (random() - 0.5) * 1.4 ELSE (random() + random() - 1) * 0.08 END)::NUMERIC(9, 6) AS "Latitude",
+        (i %% 17 = 0) AS "hotResearch",
+        'Active'::TEXT AS "AccountStatus",
+        'gym' || i || '@fitbridge.vn' AS "Email",
+        NULL::TEXT AS "PhoneNumber",
+        NULL::TEXT AS "GymDescription",
+        NULL::TEXT AS "AvatarUrl",
+        NULL::TEXT[] AS "GymImages",
+        NOW() - (i %% 900) * INTERVAL '1 day' AS "CreatedAt",
+        NOW() AS "UpdatedAt",
+        NULL::TIMESTAMP AS "Dob"
+    FROM generate_series(1, %(gyms)s) AS i
+    """, """
+    CREATE TEMP TABLE "Addresses" ON COMMIT DROP AS
+    SELECT
+        md5('addr' || i)::UUID AS "Id",
+        md5('gym' || i)::UUID AS "CustomerId",
+        i::TEXT AS "HouseNumber",
+        'Nguyễn Huệ' AS "Street",
+        'Phường ' || (1 + i %% 15) AS "Ward",
+        'Quận ' || (1 + i %% 12) AS "District",
+        'TP. Hồ Chí Minh' AS "City",
+        TRUE AS "IsEnabled"
+    FROM generate_series(1, %(gyms)s) AS i
+    """,
+    'CREATE INDEX ON "Addresses" ("CustomerId")',
+    'ANALYZE "AspNetUsers"',
+    'ANALYZE "Addresses"'
+]
+
+def measure(func, rounds):
+    """Trung vị thời gian (ms) và kết quả của hàm"""
+    results = func()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), results
+
+if __name__ == "__main__":
+    gyms = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    max_distance = NEARBY_KNN_MAX_DISTANCE_KM or None
+
+    print(f"🚀 BENCHMARK GYM GẦN ({gyms:,} gym giả lập, bán kính đoán {GUESSED_RADIUS_KM}km, kNN k={NEARBY_KNN_LIMIT} tối đa {max_distance}km)")
+    print("=" * 78)
+
+    with psycopg.connect(**db_config, row_factory=dict_row) as conn:
+        cursor = conn.cursor()
+        # Định nghĩa view lấy trước khi tạo bảng tạm để tên bảng không bị gắn schema public
+        view_sql = cursor.execute("SELECT pg_get_viewdef('public.gym_search'::regclass) AS sql").fetchone()["sql"].rstrip().rstrip(';')
+
+        for statement in SYNTHETIC_CATALOG_SQL:
+            cursor.execute(statement, {"gyms": gyms})
+        cursor.execute(f"CREATE TEMP TABLE gym_search ON COMMIT DROP AS {view_sql}")
+        cursor.execute("""CREATE INDEX ON gym_search USING gist (point(longitude, latitude))
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL""")
+        cursor.execute("ANALYZE gym_search")
+
+        index = GymSpatialIndex()
+        index.load(cursor.execute(GYM_INDEX_QUERY).fetchall())
+
+        print(f"\n{'Chế độ':<24} {'Số gym trả về':>14} {'Gần nhất (km)':>14} {'ms':>9}")
+        for label, latitude, longitude in LOCATIONS:
+            print(f"\n📍 {label}")
+            radius_query = build_nearby_gym_query(longitude, latitude, GUESSED_RADIUS_KM)
+            nearest_query = build_nearest_gym_query(longitude, latitude, NEARBY_KNN_LIMIT, max_distance)
+            for mode, func in (
+                ("Bán kính (DB)", lambda: cursor.execute(*radius_query).fetchall()),
+                ("kNN (DB)", lambda: cursor.execute(*nearest_query).fetchall()),
+                ("Bán kính (bộ nhớ)", lambda: index.query_radius(latitude, longitude, GUESSED_RADIUS_KM)),
+                ("kNN (bộ nhớ)", lambda: index.nearest(latitude, longitude, NEARBY_KNN_LIMIT, max_distance)),
+            ):
+                elapsed_ms, results = measure(func, 5)
+                closest = f"{results[0]['distance_km']:.2f}" if results else "-"
+                print(f"   {mode:<21} {len(results):>14,} {closest:>14} {elapsed_ms:>9.2f}")
+
+        conn.rollback()
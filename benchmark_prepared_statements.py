@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chi phí planning của truy vấn PT (CTE TrainersWithGoals) khi chạy
+không prepare và khi dùng server-side prepared statement trên cùng một kết nối
+Run this script: python benchmark_prepared_statements.py [số lần lặp]
+"""
+
+import statistics
+import sys
+import time
+from app.database.connection import get_database_connection, release_database_connection
+from app.services.pt_search_service import build_trainer_search_query
+
+# Các câu hỏi cùng template nhưng khác tham số (giống traffic thật)
+PROMPTS = [
+    "Tìm PT nữ chuyên giảm cân có ít nhất 3 năm kinh nghiệm",
+    "Tìm PT nam chuyên tăng cơ có ít nhất 5 năm kinh nghiệm",
+    "Tìm PT nữ chuyên yoga có ít nhất 2 năm kinh nghiệm",
+    "Tìm PT nam chuyên sức mạnh có ít nhất 8 năm kinh nghiệm",
+]
+
+
+def explain_planning_time(cursor, sql, params):
+    """Lấy Planning Time / Execution Time từ EXPLAIN ANALYZE"""
+    cursor.execute(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()["QUERY PLAN"][0]
+    return plan["Planning Time"], plan["Execution Time"]
+
+
+def time_queries(cursor, queries, iterations, prepare):
+    """Chạy lần lượt các truy vấn và đo thời gian từng lần (ms)"""
+    timings = []
+    for i in range(iterations):
+        sql, params = queries[i % len(queries)]
+        start = time.perf_counter()
+        cursor.execute(sql, params, prepare=prepare)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run_benchmark(iterations=200):
+    conn, cursor = get_database_connection()
+    if conn is None or cursor is None:
+        print("❌ Không thể kết nối database")
+        return False
+
+    try:
+        queries = [build_trainer_search_query(prompt) for prompt in PROMPTS]
+        templates = {sql for sql, _ in queries}
+        print(f"📄 {len(PROMPTS)} câu hỏi → {len(templates)} template SQL")
+
+        # 1. Chi phí planning mỗi lần chạy khi KHÔNG prepare
+        plan_times = []
+        exec_times = []
+        for sql, params in queries:
+            planning_ms, execution_ms = explain_planning_time(cursor, sql, params)
+            plan_times.append(planning_ms)
+            exec_times.append(execution_ms)
+        print(f"🧠 Planning Time (EXPLAIN ANALYZE): {statistics.mean(plan_times):.3f} ms / truy vấn")
+        print(f"⚙️  Execution Time (EXPLAIN ANALYZE): {statistics.mean(exec_times):.3f} ms / truy vấn")
+
+        # 2. Đo thời gian thực tế: không prepare vs prepared statement
+        time_queries(cursor, queries, len(queries), prepare=False)  # warm-up
+        unprepared = time_queries(cursor, queries, iterations, prepare=False)
+        prepared = time_queries(cursor, queries, iterations, prepare=True)
+
+        print(f"\n{'Chế độ':<22} {'mean (ms)':>10} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+        print("-" * 56)
+        for label, timings in (("Không prepare", unprepared), ("Prepared statement", prepared)):
+            ordered = sorted(timings)
+            p95 = ordered[int(len(ordered) * 0.95) - 1]
+            print(f"{label:<22} {statistics.mean(timings):>10.3f} {statistics.median(timings):>10.3f} {p95:>10.3f}")
+
+        saved = statistics.median(unprepared) - statistics.median(prepared)
+        print(f"\n⏱️  Tiết kiệm mỗi tin nhắn (p50): {saved:.3f} ms")
+
+        # 3. PostgreSQL có dùng generic plan (bỏ qua planning) hay không
+        cursor.execute("""
+            SELECT generic_plans, custom_plans
+            FROM pg_prepared_statements
+            WHERE statement ILIKE '%%TrainersWithGoals%%'
+        """)
+        for row in cursor.fetchall():
+            print(f"📊 Prepared statement: generic_plans={row['generic_plans']}, custom_plans={row['custom_plans']}")
+
+        return True
+
+    except Exception as e:
+        print(f"\n❌ LỖI: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+    finally:
+        cursor.close()
+        conn.rollback()
+        release_database_connection(conn)
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"🚀 BENCHMARK PREPARED STATEMENTS ({iterations} lần lặp)")
+    print("=" * 60)
+    sys.exit(0 if run_benchmark(iterations) else 1)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chi phí serialize phản hồi /chat cho 10 huấn luyện viên (đủ goalTrainings/certificates)
+- Cũ: dict -> jsonable_encoder -> json.dumps (JSONResponse), text làm sạch bằng json.dumps thử
+- Mới: dict -> ChatResponse (response_model) -> orjson (ORJSONResponse)
+Run this script: python benchmark_response_serialization.py [số vòng]
+"""
+
+import json
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+import orjson
+from fastapi.encoders import jsonable_encoder
+from app.models.chat_models import ChatResponse
+from app.models.trainer_models import safe_get_trainer_data
+from app.services.pt_recommendation_service import create_trainer_response
+from app.utils.text_utils import sanitize_text_for_json
+
+GOALS = ["Giảm cân", "Tăng cơ", "Sức bền", "Sức mạnh", "Thể hình", "Yoga", "Phục hồi chức năng", "Linh hoạt"]
+CERTIFICATES = ["CPT", "NASM-CPT", "ACE", "ISSA", "Yoga Alliance RYT-200", "CrossFit L1", "Sơ cấp cứu CPR"]
+
+def legacy_sanitize_text_for_json(text):
+    """Cách làm sạch cũ: thay ký tự điều khiển rồi json.dumps thử, dùng làm mốc so sánh"""
+    if not text:
+        return ""
+    cleaned_text = text.replace('\x00', '').replace('\x08', '').replace('\x0c', '')
+    cleaned_text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]', '', cleaned_text)
+    json.dumps(cleaned_text)
+    return cleaned_text
+
+def trainer_row(i):
+    """Hàng database giả lập cho một PT (kiểu dữ liệu như psycopg trả về)"""
+    now = datetime(2025, 6, 1, 8, 30)
+    return {
+        "id": f"5f0c2b1e-0000-4000-8000-{i:012d}",
+        "fullname": f"Nguyễn Văn Huấn Luyện {i}",
+        "email": f"pt{i}@fitbridge.vn",
+        "phonenumber": f"09{i:08d}",
+        "ismale": i % 2 == 0,
+        "dob": now - timedelta(days=365 * (25 + i)),
+        "avatarurl": f"https://cdn.fitbridge.vn/avatars/pt-{i}.jpg",
+        "bio": "Huấn luyện viên cá nhân chuyên giảm cân và tăng cơ, giáo án cá nhân hóa theo mục tiêu. " * 3,
+        "accountstatus": "Active",
+        "createdat": now,
+        "updatedat": now,
+        "experience": 3 + i,
+        "certificates": CERTIFICATES,
+        "height": 170.5,
+        "weight": 68.0,
+        "biceps": 35.0,
+        "chest": 98.0,
+        "waist": 78.0,
+        "goal_trainings": GOALS,
+        "pt_type": "gym",
+        "is_freelance": False,
+        "gym_id": f"7a1d0c9e-0000-4000-8000-{i:012d}",
+        "gymname": f"FitBridge Gym Chi Nhánh {i}",
+        "gymaddress": f"{i} Nguyễn Huệ, Phường Bến Nghé, Quận 1, TP. Hồ Chí Minh",
+        "gym_latitude": Decimal("10.776900"),
+        "gym_longitude": Decimal("106.700900"),
+        "gym_hotresearch": i < 3,
+        "distance_km": 0.35 * (i + 1)
+    }
+
+def build_response():
+    trainers = [safe_get_trainer_data(trainer_row(i)) for i in range(10)]
+    prompt_response = create_trainer_response(trainers, "tìm pt giảm cân gần đây", True)
+    history = [
+        {"role": "user", "content": "tìm pt giảm cân gần đây", "timestamp": datetime.now().isoformat()},
+        {"role": "assistant", "content": prompt_response, "timestamp": datetime.now().isoformat()}
+    ]
+    return {"trainers": trainers, "promptResponse": prompt_response, "conversation_history": history}
+
+def legacy_serialize(response):
+    content = jsonable_encoder(response)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def serialize(response):
+    content = ChatResponse.model_validate(response).model_dump(mode="json", exclude_unset=True)
+    return orjson.dumps(content)
+
+def measure(func, arg, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(arg)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    response = build_response()
+
+    print(f"🚀 BENCHMARK SERIALIZE PHẢN HỒI /chat (10 PT, {rounds} vòng)")
+    print("=" * 62)
+
+    legacy_payload = legacy_serialize(response)
+    payload = serialize(response)
+    print(f"✅ Cùng nội dung JSON: {json.loads(legacy_payload) == json.loads(payload)} | {len(payload):,} bytes")
+
+    print(f"\n{'Bước':<44} {'µs/phản hồi':>14}")
+    print("-" * 60)
+    for label, func, arg in (
+        ("Cũ: jsonable_encoder + json.dumps", legacy_serialize, response),
+        ("Mới: ChatResponse (response_model) + orjson", serialize, response),
+        ("orjson trực tiếp trên dict (tham chiếu)", lambda r: orjson.dumps(r, default=float), response),
+        ("Làm sạch promptResponse (cũ, json.dumps thử)", legacy_sanitize_text_for_json, response["promptResponse"]),
+        ("Làm sạch promptResponse (mới, một regex)", sanitize_text_for_json, response["promptResponse"]),
+    ):
+        print(f"{label:<44} {measure(func, arg, rounds):>14.1f}")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput của normalize_vietnamese_text trên các câu chat thật
+(lấy từ test_chatbot_comprehensive.py), so với cách cũ (60 lần str.replace + regex)
+Run this script: python benchmark_text_normalization.py [số vòng]
+"""
+
+import ast
+import re
+import sys
+import time
+import unicodedata
+from app.utils.text_utils import normalize_vietnamese_text, VIETNAMESE_CHAR_MAP
+
+def legacy_normalize_vietnamese_text(text):
+    """Cách chuẩn hóa cũ: lower + str.replace từng ký tự + regex, dùng làm mốc so sánh"""
+    if not text:
+        return ""
+    text = text.lower()
+    for viet_char, latin_char in VIETNAMESE_CHAR_MAP.items():
+        text = text.replace(viet_char, latin_char)
+    text = re.sub(r'[^a-z0-9\s]', ' ', text)
+    return ' '.join(text.split())
+
+def load_chat_prompts(path="test_chatbot_comprehensive.py"):
+    """Lấy các câu hỏi (tham số thứ 3 của run_test) trong bộ test"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    prompts = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and getattr(node.func, "id", None) == "run_test"
+                and len(node.args) >= 3 and isinstance(node.args[2], ast.Constant)):
+            prompts.append(node.args[2].value)
+    return prompts
+
+def measure(func, corpus, rounds):
+    """Trả về (tin nhắn/giây, MB/giây)"""
+    total_bytes = sum(len(text.encode("utf-8")) for text in corpus) * rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            func(text)
+    elapsed = time.perf_counter() - start
+    return len(corpus) * rounds / elapsed, total_bytes / elapsed / 1_000_000
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    prompts = [p for p in load_chat_prompts() if p]
+    nfd_prompts = [unicodedata.normalize("NFD", p) for p in prompts]
+
+    print(f"🚀 BENCHMARK CHUẨN HÓA TIẾNG VIỆT ({len(prompts)} câu chat x {rounds} vòng)")
+    print("=" * 66)
+
+    # Kết quả phải giống cách cũ với input NFC, và NFD phải cho cùng kết quả với NFC
+    mismatches = sum(1 for p in prompts if normalize_vietnamese_text(p) != legacy_normalize_vietnamese_text(p))
+    nfd_mismatches = sum(1 for p, d in zip(prompts, nfd_prompts) if normalize_vietnamese_text(p) != normalize_vietnamese_text(d))
+    print(f"✅ Khác biệt so với cách cũ (NFC): {mismatches} | NFD khác NFC: {nfd_mismatches}")
+
+    uncached = normalize_vietnamese_text.__wrapped__
+    print(f"\n{'Cách chuẩn hóa':<34} {'tin nhắn/s':>12} {'MB/s':>8}")
+    print("-" * 56)
+    for label, func, corpus in (
+        ("Cũ (replace x60 + regex)", legacy_normalize_vietnamese_text, prompts),
+        ("Mới str.translate (không cache)", uncached, prompts),
+        ("Mới str.translate, input NFD", uncached, nfd_prompts),
+        ("Mới + LRU cache (câu lặp lại)", normalize_vietnamese_text, prompts),
+    ):
+        per_second, mb_per_second = measure(func, corpus, rounds)
+        print(f"{label:<34} {per_second:>12,.0f} {mb_per_second:>8.1f}")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tìm PT theo bộ lọc và tìm PT gần
+- Cũ: mỗi request một truy vấn SQL (build_trainer_search_query / build_nearby_trainer_query) tính khoảng cách từng hàng
+- Mới: snapshot catalog PT dạng cột NumPy trong bộ nhớ (mặt nạ bool, Haversine vector hóa, argpartition top-k)
+Phần 1 chạy trên catalog hiện có (chỉ đọc), phần 2 chỉ đo snapshot trên catalog giả lập lớn hơn
+Run this script: python benchmark_trainer_catalog.py [số PT giả lập]
+"""
+
+import io
+import random
+import statistics
+import sys
+import time
+import uuid
+from contextlib import redirect_stdout
+from app.database.connection import query_database
+from app.services.pt_search_service import build_trainer_search_query, build_nearby_trainer_query
+from app.services.trainer_catalog_service import TrainerCatalog, trainer_catalog
+
+PROMPTS = [
+    "tìm pt",
+    "tìm pt nữ giảm cân",
+    "pt nam tăng cơ ít nhất 3 năm",
+    "pt tự do yoga",
+    "pt tại gym thể hình hơn 5 năm",
+]
+# Người dùng quanh trung tâm TP.HCM
+LOCATIONS = [(10.7769, 106.7009), (10.8231, 106.6297), (10.7300, 106.7218)]
+RADIUS_KM = 10
+GOALS = ['Giảm cân', 'Tăng cơ', 'Thể hình', 'Sức mạnh', 'Sức bền', 'Linh hoạt', 'Phục hồi chức năng', 'Thể lực tổng hợp']
+
+def measure(func, rounds=20):
+    """Trung vị thời gian (ms) của hàm, bỏ log truy vấn; dừng nếu truy vấn trả về lỗi"""
+    timings = []
+    with redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            start = time.perf_counter()
+            results = func()
+            timings.append((time.perf_counter() - start) * 1000)
+            assert not isinstance(results, str), results
+    return statistics.median(timings)
+
+def synthetic_catalog(trainers, gyms=2000):
+    """Hàng giống TRAINER_CATALOG_QUERY: 85% PT gym, 15% PT tự do (một phần chưa có vị trí)"""
+    random.seed(42)
+    gym_rows = [{
+        'gym_id': uuid.uuid4(),
+        'gymname': f'FitBridge Gym {i}',
+        'gymaddress': f'{i} Nguyễn Huệ, TP. Hồ Chí Minh',
+        'gym_latitude': 10.7769 + (random.random() + random.random() - 1) * 0.15,
+        'gym_longitude': 106.7009 + (random.random() + random.random() - 1) * 0.15,
+        'gym_hotresearch': i % 17 == 0
+    } for i in range(gyms)]
+    rows = []
+    for i in range(trainers):
+        freelance = i % 7 == 0
+        located = freelance and i % 3 != 0
+        gym = {} if freelance else random.choice(gym_rows)
+        rows.append({
+            'id': uuid.uuid4(), 'fullname': f'PT {i:07d}', 'email': f'pt{i}@fitbridge.vn', 'phonenumber': None,
+            'ismale': i % 2 == 0, 'dob': None, 'avatarurl': None, 'bio': None, 'accountstatus': 'Active',
+            'createdat': None, 'updatedat': None, 'gym_id': gym.get('gym_id'),
+            'experience': random.randint(0, 15) if i % 11 else None, 'certificates': [],
+            'height': None, 'weight': None, 'biceps': None, 'chest': None, 'waist': None,
+            'goal_trainings': random.sample(GOALS, random.randint(1, 3)), 'is_freelance': freelance,
+            'pt_latitude': 10.7769 + random.uniform(-0.2, 0.2) if located else None,
+            'pt_longitude': 106.7009 + random.uniform(-0.2, 0.2) if located else None,
+            'gym_active': not freelance,
+            'gymname': gym.get('gymname'), 'gymaddress': gym.get('gymaddress'),
+            'gym_latitude': gym.get('gym_latitude'), 'gym_longitude': gym.get('gym_longitude'),
+            'gym_hotresearch': gym.get('gym_hotresearch'), 'name_rank': i + 1
+        })
+    return rows
+
+if __name__ == "__main__":
+    trainers = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print("🚀 BENCHMARK CATALOG PT (SQL mỗi request và snapshot NumPy trong bộ nhớ)")
+    print("=" * 70)
+
+    with redirect_stdout(io.StringIO()):
+        refreshed = trainer_catalog.refresh()
+    if not refreshed:
+        print("❌ Không thể nạp catalog PT từ database")
+        sys.exit(1)
+    print(f"\n📦 Catalog hiện có: {trainer_catalog.stats()['trainers']:,} PT")
+    print(f"{'Tìm kiếm':<42} {'SQL ms':>9} {'Snapshot ms':>12}")
+    # Thời gian SQL gồm cả dựng truy vấn, snapshot gồm cả phân tích câu
+    for prompt in PROMPTS:
+        print(f"   {prompt:<39} {measure(lambda: query_database(*build_trainer_search_query(prompt))):>9.2f} "
+              f"{measure(lambda: trainer_catalog.search(prompt)):>12.3f}")
+    for latitude, longitude in LOCATIONS:
+        label = f"PT gần ({latitude}, {longitude}) {RADIUS_KM}km"
+        print(f"   {label:<39} {measure(lambda: query_database(*build_nearby_trainer_query(longitude, latitude, RADIUS_KM))):>9.2f} "
+              f"{measure(lambda: trainer_catalog.nearby(longitude, latitude, RADIUS_KM)):>12.3f}")
+
+    catalog = TrainerCatalog()
+    rows = synthetic_catalog(trainers)
+    start = time.perf_counter()
+    catalog.load(rows)
+    print(f"\n📦 Catalog giả lập: {trainers:,} PT (dựng snapshot {(time.perf_counter() - start) * 1000:.0f}ms)")
+    print(f"{'Tìm kiếm':<42} {'Snapshot ms':>22}")
+    for prompt in PROMPTS:
+        print(f"   {prompt:<39} {measure(lambda: catalog.search(prompt)):>22.3f}")
+    for latitude, longitude in LOCATIONS:
+        label = f"PT gần ({latitude}, {longitude}) {RADIUS_KM}km"
+        print(f"   {label:<39} {measure(lambda: catalog.nearby(longitude, latitude, RADIUS_KM)):>22.3f}")
@@ -2,6 +2,12 @@
 
 from .settings import (
     DATABASE_CONFIG,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_SYNC_POOL_MIN_SIZE,
+    DB_SYNC_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_AUTO_MIGRATE,
     GEMINI_API_KEY,
     APP_TITLE,
     APP_DESCRIPTION,
@@ -9,11 +15,61 @@ from .settings import (
     CORS_ORIGINS,
     DEFAULT_SEARCH_RADIUS_KM,
     MAX_SEARCH_RADIUS_KM,
-    MAX_CONVERSATION_HISTORY
+    DEFAULT_GYM_PAGE_SIZE,
+    MAX_GYM_PAGE_SIZE,
+    GYM_SEARCH_MODE,
+    SEARCH_CACHE_TTL_SECONDS,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_COORD_DECIMALS,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY,
+    GEMINI_TIMEOUT_SECONDS,
+    GEMINI_MAX_CONCURRENT,
+    GEMINI_QUEUE_TIMEOUT_SECONDS,
+    GEMINI_MAX_RETRIES,
+    GEMINI_RETRY_BASE_SECONDS,
+    GEMINI_RETRY_MAX_SECONDS,
+    GEMINI_BREAKER_WINDOW,
+    GEMINI_BREAKER_MIN_CALLS,
+    GEMINI_BREAKER_FAILURE_RATE,
+    GEMINI_BREAKER_OPEN_SECONDS,
+    CHAT_BATCH_MAX_SIZE,
+    CHAT_BATCH_CONCURRENCY,
+    SESSION_STORE_BACKEND,
+    SESSION_STORE_PATH,
+    SESSION_TTL_SECONDS,
+    SESSION_MAX_ENTRIES,
+    SESSION_MAX_MESSAGES,
+    GYM_INDEX_CELL_DEGREES,
+    GYM_INDEX_REFRESH_SECONDS,
+    NEARBY_SEARCH_MODE,
+    NEARBY_KNN_LIMIT,
+    NEARBY_KNN_MAX_DISTANCE_KM,
+    NEARBY_KNN_CANDIDATE_FACTOR,
+    NEARBY_RINGS_KM,
+    GEO_CACHE_PRECISION,
+    GEO_CACHE_TTL_SECONDS,
+    GEO_CACHE_MAX_ENTRIES,
+    TRAINER_CATALOG_ENABLED,
+    TRAINER_CATALOG_REFRESH_SECONDS,
+    MAX_CONVERSATION_HISTORY,
+    CONVERSATION_HISTORY_LIMIT,
+    CONTEXT_MAX_CHARS,
+    CONTEXT_MESSAGE_MAX_CHARS,
+    CONTEXT_SUMMARY_MAX_CHARS,
+    CONTEXT_SUMMARY_ITEM_CHARS,
+    CONTEXT_SUMMARY_CACHE_SIZE
 )
 
 __all__ = [
     'DATABASE_CONFIG',
+    'DB_POOL_MIN_SIZE',
+    'DB_POOL_MAX_SIZE',
+    'DB_SYNC_POOL_MIN_SIZE',
+    'DB_SYNC_POOL_MAX_SIZE',
+    'DB_POOL_TIMEOUT',
+    'DB_AUTO_MIGRATE',
     'GEMINI_API_KEY',
     'APP_TITLE',
     'APP_DESCRIPTION', 
@@ -21,5 +77,49 @@ __all__ = [
     'CORS_ORIGINS',
     'DEFAULT_SEARCH_RADIUS_KM',
     'MAX_SEARCH_RADIUS_KM',
-    'MAX_CONVERSATION_HISTORY'
+    'DEFAULT_GYM_PAGE_SIZE',
+    'MAX_GYM_PAGE_SIZE',
+    'GYM_SEARCH_MODE',
+    'SEARCH_CACHE_TTL_SECONDS',
+    'SEARCH_CACHE_MAX_ENTRIES',
+    'SEARCH_CACHE_COORD_DECIMALS',
+    'ANSWER_CACHE_TTL_SECONDS',
+    'ANSWER_CACHE_MAX_ENTRIES',
+    'ANSWER_CACHE_SIMILARITY',
+    'GEMINI_TIMEOUT_SECONDS',
+    'GEMINI_MAX_CONCURRENT',
+    'GEMINI_QUEUE_TIMEOUT_SECONDS',
+    'GEMINI_MAX_RETRIES',
+    'GEMINI_RETRY_BASE_SECONDS',
+    'GEMINI_RETRY_MAX_SECONDS',
+    'GEMINI_BREAKER_WINDOW',
+    'GEMINI_BREAKER_MIN_CALLS',
+    'GEMINI_BREAKER_FAILURE_RATE',
+    'GEMINI_BREAKER_OPEN_SECONDS',
+    'CHAT_BATCH_MAX_SIZE',
+    'CHAT_BATCH_CONCURRENCY',
+    'SESSION_STORE_BACKEND',
+    'SESSION_STORE_PATH',
+    'SESSION_TTL_SECONDS',
+    'SESSION_MAX_ENTRIES',
+    'SESSION_MAX_MESSAGES',
+    'GYM_INDEX_CELL_DEGREES',
+    'GYM_INDEX_REFRESH_SECONDS',
+    'NEARBY_SEARCH_MODE',
+    'NEARBY_KNN_LIMIT',
+    'NEARBY_KNN_MAX_DISTANCE_KM',
+    'NEARBY_KNN_CANDIDATE_FACTOR',
+    'NEARBY_RINGS_KM',
+    'GEO_CACHE_PRECISION',
+    'GEO_CACHE_TTL_SECONDS',
+    'GEO_CACHE_MAX_ENTRIES',
+    'TRAINER_CATALOG_ENABLED',
+    'TRAINER_CATALOG_REFRESH_SECONDS',
+    'MAX_CONVERSATION_HISTORY',
+    'CONVERSATION_HISTORY_LIMIT',
+    'CONTEXT_MAX_CHARS',
+    'CONTEXT_MESSAGE_MAX_CHARS',
+    'CONTEXT_SUMMARY_MAX_CHARS',
+    'CONTEXT_SUMMARY_ITEM_CHARS',
+    'CONTEXT_SUMMARY_CACHE_SIZE'
 ]
\ No newline at end of file
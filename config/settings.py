@@ -15,6 +15,17 @@ DATABASE_CONFIG = {
     "port": int(os.getenv("DB_PORT", 5432))
 }
 
+# Database connection pool settings
+# Pool bất đồng bộ phục vụ request (/chat, /chat/stream, /chat/batch)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+# Pool đồng bộ cho tác vụ nền (migration, làm mới chỉ mục gym / catalog PT) và đường gọi đồng bộ;
+# mỗi worker giữ tối đa DB_POOL_MAX_SIZE + DB_SYNC_POOL_MAX_SIZE kết nối (cộng một kết nối LISTEN của catalog listener)
+DB_SYNC_POOL_MIN_SIZE = int(os.getenv("DB_SYNC_POOL_MIN_SIZE", 1))
+DB_SYNC_POOL_MAX_SIZE = int(os.getenv("DB_SYNC_POOL_MAX_SIZE", 2))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))  # Thời gian chờ mượn kết nối (giây)
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"  # Tự chạy migration SQL (app/database/sql) khi khởi động
+
 # API Keys
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
@@ -34,5 +45,73 @@ CORS_ORIGINS = [
 DEFAULT_SEARCH_RADIUS_KM = 5
 MAX_SEARCH_RADIUS_KM = 20
 
+# Phân trang kết quả tìm gym
+DEFAULT_GYM_PAGE_SIZE = int(os.getenv("DEFAULT_GYM_PAGE_SIZE", 20))
+MAX_GYM_PAGE_SIZE = int(os.getenv("MAX_GYM_PAGE_SIZE", 50))
+
+# Chế độ tìm gym theo từ khóa: 'fulltext' (tsvector + ts_rank_cd) hoặc 'like' (LIKE trên văn bản chuẩn hóa)
+GYM_SEARCH_MODE = os.getenv("GYM_SEARCH_MODE", "fulltext")
+
+# Cache kết quả tìm kiếm gym/PT trong bộ nhớ
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 300))  # 0 = tắt cache
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 1024))
+SEARCH_CACHE_COORD_DECIMALS = int(os.getenv("SEARCH_CACHE_COORD_DECIMALS", 4))  # Làm tròn tọa độ trong khóa (4 ≈ 11m)
+
+# Cache câu trả lời Gemini (hội thoại tự do)
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))  # 0 = tắt cache
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 512))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.85))  # Ngưỡng cosine cho câu hỏi gần trùng
+
+# Bảo vệ lời gọi Gemini: deadline, giới hạn đồng thời, retry và circuit breaker
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 20))  # Deadline mỗi lần gọi / mỗi chunk stream
+GEMINI_MAX_CONCURRENT = int(os.getenv("GEMINI_MAX_CONCURRENT", 8))  # Số lời gọi Gemini đồng thời tối đa
+GEMINI_QUEUE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", 2))  # Thời gian chờ slot trống
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 2))  # Số lần thử lại với lỗi tạm thời
+GEMINI_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", 0.5))
+GEMINI_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", 4))
+GEMINI_BREAKER_WINDOW = int(os.getenv("GEMINI_BREAKER_WINDOW", 20))  # Số lời gọi gần nhất dùng để tính tỉ lệ lỗi
+GEMINI_BREAKER_MIN_CALLS = int(os.getenv("GEMINI_BREAKER_MIN_CALLS", 5))
+GEMINI_BREAKER_FAILURE_RATE = float(os.getenv("GEMINI_BREAKER_FAILURE_RATE", 0.5))
+GEMINI_BREAKER_OPEN_SECONDS = float(os.getenv("GEMINI_BREAKER_OPEN_SECONDS", 30))  # Thời gian ngắt trước khi thử lại
+
+# Endpoint /chat/batch
+CHAT_BATCH_MAX_SIZE = int(os.getenv("CHAT_BATCH_MAX_SIZE", 200))  # Số yêu cầu tối đa trong một lô
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", 16))  # Số yêu cầu trong lô xử lý cùng lúc
+
+# Phiên hội thoại lưu phía server (ChatRequest.session_id)
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")  # 'memory' hoặc 'sqlite'
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "chat_sessions.sqlite3")  # File SQLite khi backend = 'sqlite'
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 86400))  # Phiên hết hạn sau thời gian không hoạt động
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", 10000))  # Số phiên tối đa trong bộ nhớ (LRU)
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", 50))  # Số tin nhắn gần nhất giữ lại mỗi phiên
+
+# Chỉ mục không gian gym trong bộ nhớ
+GYM_INDEX_CELL_DEGREES = float(os.getenv("GYM_INDEX_CELL_DEGREES", 0.05))  # Kích thước ô lưới (độ), ≈ 5.5km
+GYM_INDEX_REFRESH_SECONDS = int(os.getenv("GYM_INDEX_REFRESH_SECONDS", 300))  # Chu kỳ nạp lại chỉ mục từ gym_search (giây), 0 = chỉ khi có thông báo thay đổi
+
+# Tìm gym/PT gần: 'knn' (k kết quả gần nhất theo chỉ mục) hoặc 'radius' (mọi kết quả trong bán kính đoán từ câu)
+NEARBY_SEARCH_MODE = os.getenv("NEARBY_SEARCH_MODE", "knn")
+NEARBY_KNN_LIMIT = int(os.getenv("NEARBY_KNN_LIMIT", 10))  # Số gym gần nhất trả về
+NEARBY_KNN_MAX_DISTANCE_KM = int(os.getenv("NEARBY_KNN_MAX_DISTANCE_KM", 50))  # Khi người dùng không nói "X km", 0 = không giới hạn
+NEARBY_KNN_CANDIDATE_FACTOR = int(os.getenv("NEARBY_KNN_CANDIDATE_FACTOR", 4))  # Lấy dư k * hệ số ứng viên theo độ rồi xếp lại theo km
+NEARBY_RINGS_KM = sorted(int(km) for km in os.getenv("NEARBY_RINGS_KM", "2,5,10,20,50").split(","))  # Các vòng bán kính được đếm khi không có gym gần
+
+# Cache ứng viên tìm gym/PT gần theo ô geohash: tọa độ lệch vài mét giữa các request vẫn dùng chung một ô
+GEO_CACHE_PRECISION = int(os.getenv("GEO_CACHE_PRECISION", 6))  # Độ dài geohash, 6 ≈ ô 1.2km x 0.6km
+GEO_CACHE_TTL_SECONDS = int(os.getenv("GEO_CACHE_TTL_SECONDS", 300))  # 0 = tắt cache
+GEO_CACHE_MAX_ENTRIES = int(os.getenv("GEO_CACHE_MAX_ENTRIES", 512))
+
+# Snapshot catalog PT dạng cột NumPy trong bộ nhớ (tìm PT theo bộ lọc và tìm PT gần không cần truy vấn DB)
+TRAINER_CATALOG_ENABLED = os.getenv("TRAINER_CATALOG_ENABLED", "true").lower() == "true"
+TRAINER_CATALOG_REFRESH_SECONDS = int(os.getenv("TRAINER_CATALOG_REFRESH_SECONDS", 300))  # Chu kỳ làm mới (giây), 0 = chỉ làm mới khi catalog thay đổi
+
 # Conversation settings
-MAX_CONVERSATION_HISTORY = 10
\ No newline at end of file
+MAX_CONVERSATION_HISTORY = int(os.getenv("MAX_CONVERSATION_HISTORY", 10))  # Số tin nhắn gần nhất giữ nguyên văn trong ngữ cảnh
+CONVERSATION_HISTORY_LIMIT = int(os.getenv("CONVERSATION_HISTORY_LIMIT", 100))  # Số tin nhắn tối đa nhận từ client mỗi request
+
+# Ngân sách ngữ cảnh hội thoại đưa vào prompt Gemini (ký tự, ~4 ký tự/token)
+CONTEXT_MAX_CHARS = int(os.getenv("CONTEXT_MAX_CHARS", 4000))  # Tổng ngữ cảnh (tóm tắt + tin nhắn gần đây)
+CONTEXT_MESSAGE_MAX_CHARS = int(os.getenv("CONTEXT_MESSAGE_MAX_CHARS", 600))  # Tin nhắn dài hơn (danh sách PT/gym) bị cắt
+CONTEXT_SUMMARY_MAX_CHARS = int(os.getenv("CONTEXT_SUMMARY_MAX_CHARS", 1000))  # Phần tóm tắt các lượt cũ
+CONTEXT_SUMMARY_ITEM_CHARS = int(os.getenv("CONTEXT_SUMMARY_ITEM_CHARS", 120))  # Mỗi mục tóm tắt
+CONTEXT_SUMMARY_CACHE_SIZE = int(os.getenv("CONTEXT_SUMMARY_CACHE_SIZE", 1024))  # Số hội thoại lưu tóm tắt
\ No newline at end of file
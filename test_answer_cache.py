@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Test tầng gần trùng của cache câu trả lời Gemini: câu hỏi khác nghĩa không được dùng chung câu trả lời
+Run this script: python -m pytest -q test_answer_cache.py
+"""
+
+import pytest
+from app.services.answer_cache_service import AnswerCache
+from app.utils.text_utils import build_hashing_vector, cosine_similarity
+
+THRESHOLD = 0.85
+
+# Cặp câu hỏi khác nghĩa nhưng cosine vẫn vượt ngưỡng
+DIFFERENT_QUESTIONS = [
+    ("bài tập giảm mỡ bụng cho nam", "bài tập giảm mỡ bụng cho nữ"),
+    ("tôi nên uống whey trước khi tập không", "tôi nên uống whey sau khi tập không"),
+    ("tập ngực 3 buổi một tuần được không", "tập ngực 5 buổi một tuần được không"),
+]
+
+# Cùng câu hỏi, chỉ khác từ đệm / dấu câu / chữ hoa
+SAME_QUESTIONS = [
+    ("bài tập giảm mỡ bụng cho nam", "Bài tập giảm mỡ bụng cho nam nhé!"),
+    ("tôi nên uống whey trước khi tập không", "Tôi nên uống whey trước khi tập không vậy"),
+]
+
+def make_cache():
+    return AnswerCache(max_entries=100, ttl_seconds=3600, similarity_threshold=THRESHOLD)
+
+@pytest.mark.parametrize("stored, asked", DIFFERENT_QUESTIONS)
+def test_different_meaning_is_near_miss(stored, asked):
+    # Cặp câu được chọn vì vector hashing gần nhau: chỉ bộ lọc từ mang nghĩa chặn được
+    assert cosine_similarity(build_hashing_vector(stored), build_hashing_vector(asked)) >= THRESHOLD
+    cache = make_cache()
+    cache.store(stored, "", "câu trả lời cho: " + stored)
+    assert cache.lookup(asked) == (None, None)
+
+@pytest.mark.parametrize("stored, asked", SAME_QUESTIONS)
+def test_filler_words_still_near_hit(stored, asked):
+    cache = make_cache()
+    cache.store(stored, "", "câu trả lời")
+    assert cache.lookup(asked) == ("câu trả lời", "near")
+
+def test_exact_hit_and_history_disables_near_tier():
+    cache = make_cache()
+    cache.store("whey là gì", "", "whey là đạm sữa")
+    assert cache.lookup("Whey là gì?") == ("whey là đạm sữa", "exact")
+    assert cache.lookup("Cho mình hỏi whey là gì", "user: chào") == (None, None)
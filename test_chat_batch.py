@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test xử lý chat theo lô: gom tìm kiếm DB giống nhau, giới hạn số yêu cầu chạy cùng lúc,
+giữ thứ tự kết quả và báo lỗi riêng cho từng phần tử (Gemini và database giả lập)
+Run this script: python -m pytest -q test_chat_batch.py
+"""
+
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+import FitBridge
+import app.services.response_service as response_service
+from app.models.chat_models import ChatRequest
+from app.services.answer_cache_service import AnswerCache
+
+class FakeAnswer:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGuard:
+    """Gemini guard giả: generate_async chờ latency giây, ghi lại số lời gọi đang chạy cùng lúc"""
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.active = 0
+        self.max_active = 0
+        self.prompts = []
+
+    async def generate_async(self, prompt):
+        self.prompts.append(prompt)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        return FakeAnswer(f"Trả lời {len(self.prompts)}")
+
+class FakeSearch:
+    """fetch_search_results_async giả: đếm số truy vấn theo câu hỏi, lỗi cho câu hỏi trong failing"""
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    async def __call__(self, plan):
+        self.calls.append(plan["user_input"])
+        await asyncio.sleep(0.01)
+        if plan["user_input"] in self.failing:
+            raise RuntimeError("database timeout")
+        return [{'id': len(self.calls), 'gymname': f"Gym {plan['user_input']}", 'gymaddress': 'TP. Hồ Chí Minh', 'hotresearch': False}]
+
+@pytest.fixture
+def guard(monkeypatch):
+    fake = FakeGuard()
+    monkeypatch.setattr(response_service, "gemini_guard", fake)
+    monkeypatch.setattr(response_service, "answer_cache", AnswerCache(max_entries=100, ttl_seconds=3600, similarity_threshold=0.85))
+    return fake
+
+@pytest.fixture
+def search(monkeypatch):
+    fake = FakeSearch()
+    monkeypatch.setattr(response_service, "fetch_search_results_async", fake)
+    return fake
+
+def run_batch(prompts, max_concurrency=16):
+    requests = [ChatRequest(prompt=prompt) for prompt in prompts]
+    return asyncio.run(response_service.process_chat_batch(requests, max_concurrency=max_concurrency))
+
+def test_identical_searches_share_one_query(guard, search):
+    prompts = ["tìm gym quận 1", "tìm gym quận 3", "tìm gym quận 1", "tìm gym quận 1", "tìm gym quận 3"]
+    batch = run_batch(prompts)
+    assert sorted(search.calls) == ["tìm gym quận 1", "tìm gym quận 3"]
+    assert (batch["search_requests"], batch["unique_searches"]) == (5, 2)
+    responses = [item["response"] for item in batch["results"]]
+    # Các phần tử cùng tìm kiếm nhận cùng kết quả
+    assert responses[0]["gyms"] == responses[2]["gyms"] == responses[3]["gyms"]
+    assert responses[1]["gyms"] == responses[4]["gyms"]
+    assert responses[0]["gyms"] != responses[1]["gyms"]
+
+def test_results_keep_input_order(guard, search):
+    prompts = ["tìm gym quận 1", "bài tập giảm mỡ bụng cho nam", "tìm gym quận 7", "tôi nên uống whey trước khi tập không"]
+    batch = run_batch(prompts)
+    assert [item["index"] for item in batch["results"]] == list(range(len(prompts)))
+    for item, prompt in zip(batch["results"], prompts):
+        assert item["status"] == "ok"
+        assert item["response"]["conversation_history"][0]["content"] == prompt
+    assert (batch["total"], batch["succeeded"], batch["failed"]) == (4, 4, 0)
+    # Chỉ câu hỏi tự do gọi Gemini
+    assert len(guard.prompts) == 2
+
+@pytest.mark.parametrize("max_concurrency", [1, 3, 8])
+def test_concurrency_is_bounded(guard, search, max_concurrency):
+    prompts = [f"câu hỏi về dinh dưỡng số {index} cho người mới tập" for index in range(12)]
+    batch = run_batch(prompts, max_concurrency=max_concurrency)
+    assert batch["succeeded"] == len(prompts)
+    assert guard.max_active == max_concurrency
+
+def test_item_errors_are_isolated(guard, monkeypatch):
+    failing = FakeSearch(failing={"tìm gym quận 3"})
+    monkeypatch.setattr(response_service, "fetch_search_results_async", failing)
+    batch = run_batch(["tìm gym quận 1", "tìm gym quận 3", "tìm gym quận 3", "bài tập giảm mỡ bụng cho nam"])
+    assert [item["status"] for item in batch["results"]] == ["ok", "error", "error", "ok"]
+    assert (batch["succeeded"], batch["failed"]) == (2, 2)
+    error_item = batch["results"][1]
+    assert error_item["error"] == "database timeout"
+    # Phần tử lỗi vẫn có phản hồi lỗi kèm lịch sử hội thoại
+    assert error_item["response"]["conversation_history"][-1]["role"] == "assistant"
+    # Truy vấn lỗi dùng chung cũng chỉ chạy một lần
+    assert failing.calls.count("tìm gym quận 3") == 1
+
+def test_unknown_session_is_item_error(guard, search):
+    requests = [ChatRequest(prompt="tìm gym quận 1"), ChatRequest(prompt="tìm gym quận 1", session_id="0" * 32)]
+    batch = asyncio.run(response_service.process_chat_batch(requests))
+    assert [item["status"] for item in batch["results"]] == ["ok", "error"]
+    assert "conversation_history" not in batch["results"][1]["response"]
+
+def test_batch_endpoint(guard, search):
+    client = TestClient(FitBridge.app)
+    response = client.post("/chat/batch", json={"requests": [{"prompt": "tìm gym quận 1"}, {"prompt": "tìm gym quận 1"}]})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["succeeded"], body["unique_searches"]) == (2, 2, 1)
+    assert client.post("/chat/batch", json={"requests": []}).status_code == 422
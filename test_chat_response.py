@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test hình dạng phản hồi /chat qua response_model ChatResponse (response_model_exclude_unset) và orjson:
+chỉ các khóa được đặt mới xuất hiện, kiểu dữ liệu từ database được chuyển đúng (database giả lập)
+Run this script: python -m pytest -q test_chat_response.py
+"""
+
+import uuid
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from fastapi.testclient import TestClient
+import FitBridge
+import app.services.response_service as response_service
+from app.services.answer_cache_service import AnswerCache
+from app.utils.format_utils import dumps_json
+
+class FakeAnswer:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGuard:
+    async def generate_async(self, prompt):
+        return FakeAnswer("Bạn nên kết hợp cardio và tập tạ.")
+
+def gym_row(index):
+    """Hàng gym_search giả lập (kiểu dữ liệu như psycopg trả về)"""
+    return {
+        'id': uuid.UUID(int=index + 1), 'gymname': f'FitBridge Gym {index}', 'fullname': 'Chủ gym',
+        'gymaddress': f'{index} Nguyễn Huệ, Quận 1', 'taxcode': '0312345678',
+        'longitude': Decimal('106.700900'), 'latitude': Decimal('10.776900'), 'hotresearch': index == 0,
+        'accountstatus': 'Active', 'email': f'gym{index}@fitbridge.vn', 'phonenumber': '0900000000',
+        'gymdescription': 'Phòng gym', 'avatarurl': None, 'gymimages': ['a.jpg'],
+        'createdat': datetime(2025, 1, 2, 3, 4, 5), 'updatedat': None, 'dob': None,
+        'hot_score': 20 if index == 0 else 0, 'relevance_score': 25, 'recency_score': 5
+    }
+
+def trainer_row(index):
+    return {
+        'id': uuid.UUID(int=1000 + index), 'fullname': f'PT {index}', 'email': f'pt{index}@fitbridge.vn',
+        'phonenumber': '0911111111', 'ismale': index % 2 == 0, 'dob': datetime(1995, 5, 6),
+        'avatarurl': None, 'bio': 'Giảm cân', 'accountstatus': 'Active',
+        'createdat': datetime(2025, 1, 2), 'updatedat': datetime(2025, 2, 3),
+        'experience': 5, 'certificates': ['NASM-CPT'], 'height': 170.5, 'weight': 68,
+        'biceps': None, 'chest': None, 'waist': None, 'goal_trainings': ['Giảm cân'],
+        'pt_type': 'gym', 'is_freelance': False, 'gym_id': uuid.UUID(int=1), 'gymname': 'FitBridge Gym 0',
+        'gymaddress': '1 Nguyễn Huệ', 'gym_latitude': Decimal('10.776900'), 'gym_longitude': Decimal('106.700900'),
+        'gym_hotresearch': True
+    }
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(response_service, "gemini_guard", FakeGuard())
+    monkeypatch.setattr(response_service, "answer_cache", AnswerCache(max_entries=100, ttl_seconds=3600, similarity_threshold=0.85))
+    return TestClient(FitBridge.app)
+
+@pytest.fixture
+def search_rows(monkeypatch):
+    """Kết quả tìm kiếm trả về cho mọi kế hoạch tìm kiếm"""
+    rows = {}
+
+    async def fake_fetch(plan):
+        return rows[plan["kind"]]
+
+    monkeypatch.setattr(response_service, "fetch_search_results_async", fake_fetch)
+    return rows
+
+def test_chat_answer_has_only_set_keys(client):
+    body = client.post("/chat", json={"prompt": "bài tập giảm mỡ bụng cho nam"}).json()
+    assert set(body) == {"promptResponse", "conversation_history"}
+    assert body["promptResponse"] == "Bạn nên kết hợp cardio và tập tạ."
+    assert [message["role"] for message in body["conversation_history"]] == ["user", "assistant"]
+
+def test_gym_results_shape(client, search_rows):
+    search_rows["gym"] = [gym_row(index) for index in range(3)]
+    response = client.post("/chat", json={"prompt": "tìm gym quận 1"})
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert set(body) == {"gyms", "promptResponse", "conversation_history"}
+    gym = body["gyms"][0]
+    assert gym["id"] == str(uuid.UUID(int=1))
+    assert (gym["latitude"], gym["longitude"]) == (10.7769, 106.7009)
+    assert gym["hotResearch"] is True
+    assert gym["createdAt"] == "2025-01-02T03:04:05"
+    assert gym["gymImages"] == ["a.jpg"]
+    assert "trainers" not in body and "next_cursor" not in body
+
+def test_next_cursor_only_when_more_pages(client, search_rows):
+    search_rows["gym"] = [gym_row(index) for index in range(60)]
+    body = client.post("/chat", json={"prompt": "tìm gym quận 1", "page_size": 5}).json()
+    assert len(body["gyms"]) == 5
+    assert isinstance(body["next_cursor"], str) and body["next_cursor"]
+    # Cursor dùng được cho trang tiếp theo (khóa keyset khớp truy vấn)
+    assert client.post("/chat", json={"prompt": "tìm gym quận 1", "page_size": 5, "cursor": body["next_cursor"]}).status_code == 200
+
+def test_trainer_results_shape(client, search_rows):
+    search_rows["trainer"] = [trainer_row(index) for index in range(2)]
+    body = client.post("/chat", json={"prompt": "tìm pt giảm cân"}).json()
+    assert set(body) == {"trainers", "promptResponse", "conversation_history"}
+    trainer = body["trainers"][0]
+    # Số nguyên giữ kiểu int, Decimal từ database thành float
+    assert trainer["experience"] == 5 and isinstance(trainer["experience"], int)
+    assert trainer["height"] == 170.5
+    assert trainer["gymLatitude"] == 10.7769
+    assert trainer["goalTrainings"] == ["Giảm cân"]
+    assert trainer["gymId"] == str(uuid.UUID(int=1))
+
+def test_session_response_replaces_history(client, search_rows):
+    search_rows["gym"] = [gym_row(0)]
+    session_id = client.post("/sessions").json()["session_id"]
+    body = client.post("/chat", json={"prompt": "tìm gym quận 1", "session_id": session_id}).json()
+    assert set(body) == {"gyms", "promptResponse", "session_id", "messages"}
+    assert body["session_id"] == session_id
+    assert [message["role"] for message in body["messages"]] == ["user", "assistant"]
+    client.delete(f"/sessions/{session_id}")
+
+def test_invalid_request_is_rejected(client):
+    assert client.post("/chat", json={}).status_code == 422
+    assert client.post("/chat", json={"prompt": "tìm gym", "page_size": 0}).status_code == 422
+    assert client.post("/chat", json={"prompt": "tìm gym", "session_id": "không hợp lệ"}).status_code == 422
+
+def test_dumps_json_handles_database_types():
+    assert dumps_json({"latitude": Decimal("10.5"), "id": uuid.UUID(int=1), "at": datetime(2025, 1, 2)}) == (
+        b'{"latitude":10.5,"id":"00000000-0000-0000-0000-000000000001","at":"2025-01-02T00:00:00"}'
+    )
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test streaming /chat/stream (SSE): thứ tự sự kiện chunk / result / error / done và làm sạch từng chunk
+với Gemini guard giả lập (không gọi mạng, không cần database)
+Run this script: python -m pytest -q test_chat_stream.py
+"""
+
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+import FitBridge
+import app.services.response_service as response_service
+from app.services.answer_cache_service import AnswerCache
+from app.services.gemini_guard_service import GeminiUnavailableError, GEMINI_FALLBACK_ANSWER
+from app.utils.format_utils import format_sse_event
+
+CHAT_PROMPT = "bài tập giảm mỡ bụng cho nam"
+SEARCH_PROMPT = "tìm gym quận 1"
+# Ký tự điều khiển và surrogate đơn lẻ phải bị loại khỏi từng chunk
+RAW_PARTS = ["Xin chào\x00 ", "bạn\x1f ", "\ud800nhé!"]
+CLEAN_PARTS = ["Xin chào ", "bạn ", "nhé!"]
+
+class FakeGuard:
+    """Gemini guard giả: stream_async trả lần lượt parts, raise GeminiUnavailableError trước phần tử fail_at"""
+    def __init__(self, parts=RAW_PARTS, fail_at=None):
+        self.parts = parts
+        self.fail_at = fail_at
+        self.prompts = []
+
+    async def stream_async(self, prompt):
+        self.prompts.append(prompt)
+        for index, text in enumerate(self.parts):
+            if index == self.fail_at:
+                raise GeminiUnavailableError("deadline exceeded")
+            yield text
+        if self.fail_at == len(self.parts):
+            raise GeminiUnavailableError("deadline exceeded")
+
+@pytest.fixture
+def guard(monkeypatch):
+    fake = FakeGuard()
+    monkeypatch.setattr(response_service, "gemini_guard", fake)
+    monkeypatch.setattr(response_service, "answer_cache", AnswerCache(max_entries=100, ttl_seconds=3600, similarity_threshold=0.85))
+    return fake
+
+def collect(prompt, conversation_history=None):
+    async def run():
+        return [event async for event in response_service.stream_response_with_history(prompt, conversation_history)]
+    return asyncio.run(run())
+
+def test_chunks_are_sanitized_then_done(guard):
+    events = collect(CHAT_PROMPT)
+    assert [event for event, _ in events] == ["chunk"] * len(RAW_PARTS) + ["done"]
+    assert [data["text"] for _, data in events[:-1]] == CLEAN_PARTS
+    done = events[-1][1]
+    assert done["promptResponse"] == "".join(CLEAN_PARTS)
+    assert [message["role"] for message in done["conversation_history"]] == ["user", "assistant"]
+    assert done["conversation_history"][-1]["content"] == "".join(CLEAN_PARTS)
+    assert len(guard.prompts) == 1
+
+def test_done_keeps_client_history(guard):
+    history = [{"role": "user", "content": "chào"}, {"role": "assistant", "content": "Chào bạn!"}]
+    done = collect(CHAT_PROMPT, history)[-1][1]
+    assert done["conversation_history"][:2] == history
+    assert done["conversation_history"][2]["content"] == CHAT_PROMPT
+
+def test_streamed_answer_is_cached(guard):
+    collect(CHAT_PROMPT)
+    # Lần hai lấy từ cache câu trả lời: một chunk đầy đủ, không gọi lại Gemini
+    events = collect(CHAT_PROMPT)
+    assert events[0] == ("chunk", {"text": "".join(CLEAN_PARTS)})
+    assert events[1][0] == "done"
+    assert len(events) == 2
+    assert len(guard.prompts) == 1
+
+def test_unavailable_before_first_chunk_falls_back(guard):
+    guard.fail_at = 0
+    events = collect(CHAT_PROMPT)
+    assert events[0] == ("chunk", {"text": GEMINI_FALLBACK_ANSWER})
+    assert events[1][0] == "done"
+    assert events[1][1]["promptResponse"] == GEMINI_FALLBACK_ANSWER
+    assert len(events) == 2
+    # Câu trả lời dự phòng không được lưu vào cache
+    assert response_service.answer_cache.lookup(CHAT_PROMPT)[0] is None
+
+def test_failure_mid_stream_reports_error(guard):
+    guard.fail_at = 2
+    events = collect(CHAT_PROMPT)
+    assert [event for event, _ in events] == ["chunk", "chunk", "error", "done"]
+    assert [data["text"] for _, data in events[:2]] == CLEAN_PARTS[:2]
+    assert events[2][1]["promptResponse"] == events[3][1]["promptResponse"]
+    assert response_service.answer_cache.lookup(CHAT_PROMPT)[0] is None
+
+def test_search_sends_result_then_done(guard, monkeypatch):
+    gyms = [{'id': 1, 'gymname': 'FitBridge Gym', 'gymaddress': 'Quận 1', 'hotresearch': False}]
+
+    async def fake_fetch(plan):
+        return gyms
+
+    monkeypatch.setattr(response_service, "fetch_search_results_async", fake_fetch)
+    events = collect(SEARCH_PROMPT)
+    assert [event for event, _ in events] == ["result", "done"]
+    result, done = events[0][1], events[1][1]
+    assert "conversation_history" not in result
+    assert result["promptResponse"] == done["promptResponse"]
+    assert done["conversation_history"][-1]["role"] == "assistant"
+    assert guard.prompts == []
+
+def test_format_sse_event():
+    frame = format_sse_event("chunk", {"text": "Chào bạn\nnhé"})
+    assert frame.startswith("event: chunk\ndata: ")
+    assert frame.endswith("\n\n")
+    # Xuống dòng trong dữ liệu được escape trong JSON: mỗi sự kiện chỉ có một dòng data
+    assert frame.count("\n") == 3
+    assert json.loads(frame.split("data: ", 1)[1]) == {"text": "Chào bạn\nnhé"}
+
+def test_stream_endpoint_frames(guard):
+    client = TestClient(FitBridge.app)
+    response = client.post("/chat/stream", json={"prompt": CHAT_PROMPT})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["x-accel-buffering"] == "no"
+    frames = [frame for frame in response.text.split("\n\n") if frame]
+    events = [(frame.split("\n")[0][len("event: "):], json.loads(frame.split("\n")[1][len("data: "):])) for frame in frames]
+    assert [event for event, _ in events] == ["chunk"] * len(RAW_PARTS) + ["done"]
+    assert [data["text"] for _, data in events[:-1]] == CLEAN_PARTS
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test ngữ cảnh hội thoại theo ngân sách: tin nhắn gần nhất nguyên văn, lượt cũ được tóm tắt cuốn chiếu
+và tóm tắt của lượt trước được dùng lại thay vì tóm tắt lại toàn bộ
+Run this script: python -m pytest -q test_conversation_context.py
+"""
+
+import pytest
+import app.utils.text_utils as text_utils
+from app.utils.cache_utils import TTLCache
+from app.utils.text_utils import build_conversation_context
+from config import (
+    MAX_CONVERSATION_HISTORY,
+    CONTEXT_MAX_CHARS,
+    CONTEXT_MESSAGE_MAX_CHARS,
+    CONTEXT_SUMMARY_MAX_CHARS,
+    CONTEXT_SUMMARY_ITEM_CHARS
+)
+
+SUMMARY_HEADER = "Tóm tắt các lượt trước:"
+RECENT_HEADER = "Gần đây:"
+
+def trainer_listing(turn):
+    """Câu trả lời dài kiểu danh sách PT"""
+    lines = [f"Mình tìm thấy 8 huấn luyện viên phù hợp (lượt {turn}):"]
+    for i in range(1, 9):
+        lines.append(f"{i}. **PT Nguyễn Văn {chr(64 + i)}{turn}** - Gym FitBridge Quận {i} | Kinh nghiệm: {i + 2} năm")
+    return "\n".join(lines)
+
+def build_conversation(turns):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"tìm pt giảm cân gần quận {turn % 12 + 1} (lượt {turn})"})
+        history.append({"role": "assistant", "content": trainer_listing(turn)})
+    return history
+
+def split_sections(context):
+    """Tách ngữ cảnh có tóm tắt thành (các mục tóm tắt, các dòng gần đây)"""
+    lines = context.split("\n")
+    assert lines[0] == SUMMARY_HEADER
+    recent_at = lines.index(RECENT_HEADER)
+    return lines[1:recent_at], "\n".join(lines[recent_at + 1:])
+
+@pytest.fixture(autouse=True)
+def summary_cache(monkeypatch):
+    cache = TTLCache(max_entries=64, ttl_seconds=3600)
+    monkeypatch.setattr(text_utils, "_context_summary_cache", cache)
+    return cache
+
+@pytest.fixture
+def summarize_calls(monkeypatch):
+    """Đếm số tin nhắn được tóm tắt (bỏ qua lru_cache của summarize_context_message)"""
+    calls = []
+    original = text_utils.summarize_context_message.__wrapped__
+
+    def counting(role, content):
+        calls.append(content)
+        return original(role, content)
+
+    monkeypatch.setattr(text_utils, "summarize_context_message", counting)
+    return calls
+
+def test_empty_history():
+    assert build_conversation_context([]) == ""
+    assert build_conversation_context(None) == ""
+
+def test_short_history_is_verbatim():
+    history = [
+        {"role": "user", "content": "chào bạn"},
+        {"role": "assistant", "content": "Chào bạn! Mình có thể giúp gì?"},
+        {"role": "user", "content": "tìm gym quận 1"}
+    ]
+    assert build_conversation_context(history) == (
+        "Người dùng: chào bạn\nFitBridge: Chào bạn! Mình có thể giúp gì?\nNgười dùng: tìm gym quận 1"
+    )
+
+def test_recent_messages_limited_to_max_history():
+    history = [{"role": "user" if index % 2 == 0 else "assistant", "content": f"tin nhắn {index}"} for index in range(MAX_CONVERSATION_HISTORY + 4)]
+    summary, recent = split_sections(build_conversation_context(history))
+    assert recent.split("\n") == [text_utils.render_context_message(message["role"], message["content"])
+                                  for message in history[-MAX_CONVERSATION_HISTORY:]]
+    assert len(summary) == 4
+    assert summary[0] == "- Người dùng: tin nhắn 0"
+
+def test_long_message_is_truncated():
+    context = build_conversation_context([{"role": "assistant", "content": "x" * (CONTEXT_MESSAGE_MAX_CHARS * 3)}])
+    content = context[len("FitBridge: "):]
+    assert len(content) == CONTEXT_MESSAGE_MAX_CHARS
+    assert content.endswith("…")
+
+def test_control_characters_are_removed():
+    context = build_conversation_context([{"role": "user", "content": "tìm\x00 gym\x1f \ud800quận 1"}])
+    assert context == "Người dùng: tìm gym quận 1"
+
+@pytest.mark.parametrize("turns", [6, 20, 60, 200])
+def test_context_stays_within_budget(turns):
+    context = build_conversation_context(build_conversation(turns))
+    summary, recent = split_sections(context)
+    assert sum(len(item) + 1 for item in summary) <= CONTEXT_SUMMARY_MAX_CHARS
+    assert len(recent) + 1 <= CONTEXT_MAX_CHARS - CONTEXT_SUMMARY_MAX_CHARS
+    assert all(len(item) <= CONTEXT_SUMMARY_ITEM_CHARS + len("- Người dùng: ") for item in summary)
+    # Lượt mới nhất luôn có trong ngữ cảnh, tóm tắt giữ các lượt cũ gần nhất
+    assert recent.endswith(text_utils.render_context_message("assistant", trainer_listing(turns - 1)))
+    assert summary[-1].startswith("- ")
+
+def test_summary_reuses_previous_turn(summarize_calls):
+    history = build_conversation(30)
+    build_conversation_context(history)
+    first_turn_calls = len(summarize_calls)
+    assert first_turn_calls > 0
+
+    # Lượt tiếp theo: chỉ các tin nhắn vừa rời khỏi phần gần đây được tóm tắt thêm
+    summarize_calls.clear()
+    history = history + build_conversation(31)[-2:]
+    build_conversation_context(history)
+    assert 0 < len(summarize_calls) <= 2
+    assert summarize_calls == [message["content"] for message in history[first_turn_calls:first_turn_calls + len(summarize_calls)]]
+
+def test_reused_summary_matches_fresh_summary(summary_cache):
+    history = build_conversation(40)
+    for turns in range(20, 41):
+        build_conversation_context(history[:turns * 2])
+    incremental = build_conversation_context(history)
+    summary_cache.clear()
+    assert build_conversation_context(history) == incremental
+
+def test_edited_history_is_not_reused(summarize_calls, summary_cache):
+    history = build_conversation(30)
+    build_conversation_context(history)
+    summarize_calls.clear()
+    # Sửa tin nhắn cũ nhất: dấu vân tay khác nên phải tóm tắt lại từ đầu
+    edited = [{"role": "user", "content": "tin nhắn đã sửa"}] + history[1:]
+    context = build_conversation_context(edited)
+    assert summarize_calls[0] == "tin nhắn đã sửa"
+    summary_cache.clear()
+    assert build_conversation_context(edited) == context
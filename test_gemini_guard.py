@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Test GeminiGuard (deadline, giới hạn đồng thời, retry, circuit breaker)
+với một Gemini giả lập cục bộ có thể cấu hình độ trễ và lỗi
+Run this script: python -m pytest -q test_gemini_guard.py
+"""
+
+import asyncio
+import threading
+import time
+from google.api_core import exceptions as google_exceptions
+from app.services.gemini_guard_service import GeminiGuard, CircuitBreaker, GeminiUnavailableError, GEMINI_FALLBACK_ANSWER
+import app.services.response_service as response_service
+
+class FakeChunk:
+    """Chunk/response giả có thuộc tính text như SDK"""
+    def __init__(self, text):
+        self.text = text
+
+class FakeStream:
+    """Response streaming giả: text = chunk đầu tiên, duyệt async đọc trước một chunk như SDK"""
+    def __init__(self, parts, chunk_latency):
+        self.parts = parts
+        self.chunk_latency = chunk_latency
+
+    @property
+    def text(self):
+        return self.parts[0]
+
+    async def __aiter__(self):
+        for index in range(len(self.parts)):
+            # Lấy chunk kế tiếp trước khi trả chunk hiện tại
+            if index + 1 < len(self.parts):
+                await asyncio.sleep(self.chunk_latency)
+            yield FakeChunk(self.parts[index])
+
+class FakeGemini:
+    """
+    Gemini giả lập: latency (giây) cho mỗi lời gọi, failures là danh sách lỗi
+    trả về lần lượt cho các lời gọi đầu tiên (None = thành công)
+    """
+    def __init__(self, latency=0.0, failures=None, always_fail=None, parts=None, chunk_latency=0.0):
+        self.latency = latency
+        self.failures = list(failures or [])
+        self.always_fail = always_fail
+        self.parts = parts or ["Xin chào ", "bạn ", "nhé!"]
+        self.chunk_latency = chunk_latency
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _next_error(self):
+        with self._lock:
+            self.calls += 1
+            if self.always_fail is not None:
+                return self.always_fail
+            return self.failures.pop(0) if self.failures else None
+
+    def _enter(self):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def _exit(self):
+        with self._lock:
+            self.active -= 1
+
+    def generate_content(self, prompt, request_options=None):
+        # SDK thật tự hủy lời gọi khi vượt request_options["timeout"]
+        timeout = (request_options or {}).get("timeout")
+        self._enter()
+        try:
+            if timeout is not None and self.latency > timeout:
+                time.sleep(timeout)
+                raise google_exceptions.DeadlineExceeded("fake deadline")
+            time.sleep(self.latency)
+            error = self._next_error()
+            if error is not None:
+                raise error
+            return FakeChunk("".join(self.parts))
+        finally:
+            self._exit()
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+            error = self._next_error()
+            if error is not None:
+                raise error
+            if stream:
+                return FakeStream(self.parts, self.chunk_latency)
+            return FakeChunk("".join(self.parts))
+        finally:
+            self._exit()
+
+def make_guard(fake, **overrides):
+    options = dict(timeout_seconds=1.0, max_concurrent=4, queue_timeout_seconds=0.05, max_retries=2,
+                   retry_base_seconds=0.01, retry_max_seconds=0.02,
+                   breaker=CircuitBreaker(window=10, min_calls=3, failure_rate=0.5, open_seconds=0.2))
+    options.update(overrides)
+    return GeminiGuard(fake, **options)
+
+def test_generate_success():
+    fake = FakeGemini()
+    guard = make_guard(fake)
+    assert guard.generate("chào").text == "Xin chào bạn nhé!"
+    stats = guard.stats()
+    assert stats["successes"] == 1 and stats["failures"] == 0 and stats["in_flight"] == 0
+
+def test_retry_transient_errors():
+    fake = FakeGemini(failures=[google_exceptions.ServiceUnavailable("503"), google_exceptions.ResourceExhausted("429")])
+    guard = make_guard(fake, breaker=CircuitBreaker(window=10, min_calls=10, failure_rate=0.5, open_seconds=0.2))
+    assert guard.generate("chào").text == "Xin chào bạn nhé!"
+    assert fake.calls == 3
+    assert guard.stats()["retries"] == 2
+
+def test_no_retry_on_permanent_error():
+    fake = FakeGemini(always_fail=google_exceptions.InvalidArgument("bad prompt"))
+    guard = make_guard(fake)
+    try:
+        guard.generate("chào")
+        assert False, "phải raise GeminiUnavailableError"
+    except GeminiUnavailableError:
+        pass
+    assert fake.calls == 1
+    assert guard.stats()["retries"] == 0
+
+def test_sync_deadline():
+    fake = FakeGemini(latency=1.0)
+    guard = make_guard(fake, timeout_seconds=0.05, max_retries=0)
+    started = time.perf_counter()
+    try:
+        guard.generate("chào")
+        assert False, "phải raise GeminiUnavailableError"
+    except GeminiUnavailableError:
+        pass
+    assert time.perf_counter() - started < 0.5
+    assert guard.stats()["timeouts"] == 1
+
+def test_async_deadline():
+    fake = FakeGemini(latency=1.0)
+    guard = make_guard(fake, timeout_seconds=0.05, max_retries=1)
+
+    async def run():
+        started = time.perf_counter()
+        try:
+            await guard.generate_async("chào")
+            assert False, "phải raise GeminiUnavailableError"
+        except GeminiUnavailableError:
+            pass
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) < 0.5
+    stats = guard.stats()
+    assert stats["timeouts"] == 2 and stats["retries"] == 1
+
+def test_concurrency_limit():
+    fake = FakeGemini(latency=0.3)
+    guard = make_guard(fake, max_concurrent=2)
+
+    async def call():
+        try:
+            await guard.generate_async("chào")
+            return True
+        except GeminiUnavailableError:
+            return False
+
+    async def run():
+        return await asyncio.gather(*(call() for _ in range(5)))
+
+    outcomes = asyncio.run(run())
+    assert outcomes.count(True) == 2
+    assert fake.max_active <= 2
+    assert guard.stats()["rejected"] == 3
+
+def test_circuit_breaker_opens_and_recovers():
+    fake = FakeGemini(always_fail=google_exceptions.ServiceUnavailable("503"))
+    guard = make_guard(fake, max_retries=0)
+
+    for _ in range(3):
+        try:
+            guard.generate("chào")
+        except GeminiUnavailableError:
+            pass
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    calls_when_open = fake.calls
+
+    # Breaker mở: trả lời ngay, không gọi Gemini
+    started = time.perf_counter()
+    try:
+        guard.generate("chào")
+        assert False, "phải raise GeminiUnavailableError"
+    except GeminiUnavailableError:
+        pass
+    assert time.perf_counter() - started < 0.05
+    assert fake.calls == calls_when_open
+    assert guard.stats()["short_circuited"] == 1
+
+    # Hết thời gian mở: một lời gọi thử thành công thì breaker đóng lại
+    time.sleep(0.25)
+    fake.always_fail = None
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+    assert guard.generate("chào").text == "Xin chào bạn nhé!"
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+def test_stream_first_chunk_without_lookahead():
+    fake = FakeGemini(parts=["Xin chào ", "bạn ", "nhé!"], chunk_latency=0.2)
+    guard = make_guard(fake)
+
+    async def run():
+        started = time.perf_counter()
+        first_at = None
+        texts = []
+        async for text in guard.stream_async("chào"):
+            if first_at is None:
+                first_at = time.perf_counter() - started
+            texts.append(text)
+        return first_at, texts
+
+    first_at, texts = asyncio.run(run())
+    assert texts == ["Xin chào ", "bạn ", "nhé!"]
+    assert first_at < 0.1
+    stats = guard.stats()
+    assert stats["successes"] == 1 and stats["in_flight"] == 0
+
+def test_response_service_fallback():
+    fake = FakeGemini(always_fail=google_exceptions.ServiceUnavailable("503"))
+    original_guard = response_service.gemini_guard
+    response_service.gemini_guard = make_guard(fake, max_retries=0)
+    try:
+        prompt = "cho mình hỏi cách hít thở khi chạy bộ đường dài"
+        result = response_service.get_response_with_history(prompt)
+        assert result["promptResponse"] == GEMINI_FALLBACK_ANSWER
+        assert result["conversation_history"][-1]["content"] == GEMINI_FALLBACK_ANSWER
+        # Câu trả lời fallback không được lưu vào cache
+        assert response_service.answer_cache.lookup(prompt)[0] is None
+    finally:
+        response_service.gemini_guard = original_guard
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"✅ {name}")
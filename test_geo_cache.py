@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Test cache ứng viên theo ô geohash: rank_gyms / rank_trainers trên tập ứng viên của ô
+cho cùng thứ tự với truy vấn không cache (tham chiếu viết lại theo SQL) tại mọi vị trí trong ô
+Run this script: python -m pytest -q test_geo_cache.py
+"""
+
+import operator
+import random
+import pytest
+import app.services.geo_cache_service as geo_cache_service
+from app.utils.cache_utils import TTLCache
+from app.utils.geo_utils import haversine_km, geohash_bounds
+from app.services.geo_cache_service import GeoCellCache
+from app.services.pt_search_service import extract_experience_requirement
+
+CENTER = (10.7769, 106.7009)
+UNLOCATED_DISTANCE_KM = 999999
+EXPERIENCE_OPERATORS = {'>=': operator.ge, '>': operator.gt, '=': operator.eq, '<': operator.lt, '<=': operator.le}
+
+def make_gyms(count, seed):
+    rng = random.Random(seed)
+    return [{
+        'id': f'gym-{i}',
+        'gymname': f'Gym {i:04d}',
+        'hotresearch': i % 6 == 0,
+        'latitude': CENTER[0] + rng.uniform(-0.15, 0.15),
+        'longitude': CENTER[1] + rng.uniform(-0.15, 0.15)
+    } for i in range(count)]
+
+def make_trainers(gyms, seed):
+    """
+    Hàng giống truy vấn PT gần: PT gym lấy tọa độ gym, PT tự do lấy vị trí riêng (có thể chưa có)
+    Kinh nghiệm không trùng nhau (tối đa một NULL mỗi gym / trong nhóm PT tự do chưa có vị trí)
+    để thứ tự SQL là duy nhất
+    """
+    rng = random.Random(seed)
+    experiences = iter(rng.sample(range(10000), 10000))
+    trainers = []
+    for gym_index, gym in enumerate(gyms):
+        for slot in range(rng.randint(1, 4)):
+            trainers.append({
+                'id': f'pt-{gym["id"]}-{slot}', 'pt_type': 'gym',
+                'experience': None if slot == 0 and gym_index % 5 == 0 else next(experiences),
+                'gym_latitude': gym['latitude'], 'gym_longitude': gym['longitude'],
+                'gym_hotresearch': gym['hotresearch']
+            })
+    for i in range(len(gyms)):
+        located = i % 4 != 0
+        trainers.append({
+            'id': f'pt-free-{i}', 'pt_type': 'freelance',
+            'experience': None if i == 0 else next(experiences),
+            'gym_latitude': CENTER[0] + rng.uniform(-0.15, 0.15) if located else None,
+            'gym_longitude': CENTER[1] + rng.uniform(-0.15, 0.15) if located else None,
+            'gym_hotresearch': False
+        })
+    return trainers
+
+def experience_desc(trainer):
+    return (trainer['experience'] is None, -(trainer['experience'] or 0))
+
+def matches_experience(trainer, user_input):
+    exp_operator, exp_years = extract_experience_requirement(user_input)
+    if not (exp_operator and exp_years):
+        return True
+    return trainer['experience'] is not None and EXPERIENCE_OPERATORS[exp_operator](trainer['experience'], exp_years)
+
+def with_distance(row, latitude, longitude, lat_field, lng_field):
+    if row[lat_field] is None or row[lng_field] is None:
+        return {**row, 'distance_km': None}
+    return {**row, 'distance_km': haversine_km(latitude, longitude, row[lat_field], row[lng_field])}
+
+def reference_gyms(gyms, latitude, longitude, max_distance_km, k=None):
+    """Truy vấn gym gần không cache: trong bán kính, ORDER BY distance_km, hotresearch DESC, gymname (LIMIT k)"""
+    rows = [with_distance(gym, latitude, longitude, 'latitude', 'longitude') for gym in gyms]
+    rows = sorted((row for row in rows if row['distance_km'] <= max_distance_km),
+                  key=lambda row: (row['distance_km'], not row['hotresearch'], row['gymname']))
+    return rows[:k] if k else rows
+
+def ranked_trainers(trainers, latitude, longitude, max_distance_km):
+    """Bước GymPTs / FreelancePTs của build_nearby_trainer_query: hai danh sách đã xếp theo rn"""
+    rows = [with_distance(trainer, latitude, longitude, 'gym_latitude', 'gym_longitude') for trainer in trainers]
+    gym_rows = sorted((row for row in rows if row['pt_type'] == 'gym' and row['distance_km'] <= max_distance_km),
+                      key=lambda row: (row['distance_km'], not row['gym_hotresearch'], experience_desc(row)))
+    located = [row for row in rows if row['pt_type'] == 'freelance' and row['distance_km'] is not None
+               and row['distance_km'] <= max_distance_km]
+    # PT tự do chưa có vị trí: LIMIT 10 theo kinh nghiệm
+    unlocated = sorted((row for row in rows if row['pt_type'] == 'freelance' and row['distance_km'] is None),
+                       key=experience_desc)[:10]
+    freelance_rows = sorted(located + unlocated, key=lambda row: (
+        UNLOCATED_DISTANCE_KM if row['distance_km'] is None else row['distance_km'], experience_desc(row)))
+    return gym_rows, freelance_rows
+
+def reference_trainers(trainers, latitude, longitude, max_distance_km):
+    """MixedResults + PARTITION BY rn % 2 + mixed_rn <= 5 của build_nearby_trainer_query, viết lại theo SQL"""
+    gym_rows, freelance_rows = ranked_trainers(trainers, latitude, longitude, max_distance_km)
+    mixed = [(rn, 0, row) for rn, row in enumerate(gym_rows[:10], start=1)]
+    mixed += [(rn, 1, row) for rn, row in enumerate(freelance_rows[:10], start=1)]
+    results = []
+    for parity in (0, 1):
+        partition = sorted((item for item in mixed if item[0] % 2 == parity), key=lambda item: (
+            item[1], item[2]['distance_km'] is None, item[2]['distance_km'] or 0, experience_desc(item[2])))
+        results += [(mixed_rn, pt_type, row) for mixed_rn, (_, pt_type, row) in enumerate(partition[:5], start=1)]
+    results.sort(key=lambda item: ((item[0] - 1) * 2 + item[1], item[2]['distance_km'] is None,
+                                   item[2]['distance_km'] or 0, experience_desc(item[2])))
+    return [row for _, _, row in results]
+
+def cell_gym_candidates(cache, gyms, plan, nearest):
+    """Tập ứng viên gym của ô như truy vấn ứng viên (tính từ tâm ô, bán kính nới thêm bán kính ô)"""
+    _, center_latitude, center_longitude, cell_radius_km = cache.cell(plan['latitude'], plan['longitude'])
+    radius_km = plan['key'][2] + cell_radius_km
+    rows = reference_gyms(gyms, center_latitude, center_longitude, radius_km)
+    if nearest and len(rows) >= plan['k']:
+        # Khoảng cách gym thứ k thật từ tâm là cận dưới của cận trên SQL dùng: tập ứng viên chặt hơn
+        radius_km = min(radius_km, rows[plan['k'] - 1]['distance_km'] + 2 * cell_radius_km)
+    return [{key: value for key, value in row.items() if key != 'distance_km'}
+            for row in rows if row['distance_km'] <= radius_km]
+
+def cell_trainer_candidates(cache, trainers, plan):
+    """Tập ứng viên PT của ô như build_nearby_trainer_query(candidate_margin_km=2 lần bán kính ô)"""
+    _, center_latitude, center_longitude, cell_radius_km = cache.cell(plan['latitude'], plan['longitude'])
+    gym_rows, freelance_rows = ranked_trainers(trainers, center_latitude, center_longitude, plan['key'][2] + cell_radius_km)
+    candidates = []
+    for rows in (gym_rows, freelance_rows):
+        top_distances = [row['distance_km'] for row in rows[:10] if row['distance_km'] is not None]
+        cutoff = max(top_distances) + 2 * cell_radius_km if top_distances else None
+        candidates += [{key: value for key, value in row.items() if key != 'distance_km'} for row in rows
+                       if row['distance_km'] is None or (cutoff is not None and row['distance_km'] <= cutoff)]
+    return candidates
+
+def points_in_cell(geohash, count, seed):
+    """Vị trí ngẫu nhiên trong ô geohash (kèm các góc của ô)"""
+    rng = random.Random(seed)
+    min_latitude, max_latitude, min_longitude, max_longitude = geohash_bounds(geohash)
+    # Cạnh trên / phải thuộc ô kế bên: lùi các góc vào trong ô
+    corners = [(latitude, longitude) for latitude in (min_latitude, max_latitude - 1e-9)
+               for longitude in (min_longitude, max_longitude - 1e-9)]
+    return corners + [(rng.uniform(min_latitude, max_latitude), rng.uniform(min_longitude, max_longitude)) for _ in range(count)]
+
+def user_locations(count, seed):
+    rng = random.Random(seed)
+    return [(CENTER[0] + rng.uniform(-0.1, 0.1), CENTER[1] + rng.uniform(-0.1, 0.1)) for _ in range(count)]
+
+@pytest.fixture
+def cache():
+    return GeoCellCache(store=TTLCache(max_entries=64, ttl_seconds=300))
+
+@pytest.fixture(scope="module")
+def gyms():
+    return make_gyms(400, seed=1)
+
+@pytest.fixture(scope="module")
+def trainers(gyms):
+    return make_trainers(gyms, seed=2)
+
+@pytest.mark.parametrize("max_distance_km", [1, 3, 7])
+def test_rank_gyms_radius_matches_uncached(cache, gyms, max_distance_km):
+    for latitude, longitude in user_locations(8, seed=3):
+        geohash = cache.plan_gyms(longitude, latitude, max_distance_km)['key'][1]
+        for point_latitude, point_longitude in points_in_cell(geohash, 6, seed=4):
+            plan = cache.plan_gyms(point_longitude, point_latitude, max_distance_km)
+            assert plan['key'][1] == geohash
+            expected = reference_gyms(gyms, point_latitude, point_longitude, max_distance_km)
+            result = cache.rank_gyms(plan, cell_gym_candidates(cache, gyms, plan, nearest=False))
+            assert [row['id'] for row in result] == [row['id'] for row in expected]
+            assert [row['distance_km'] for row in result] == pytest.approx([row['distance_km'] for row in expected], abs=1e-9)
+
+@pytest.mark.parametrize("max_distance_km, k", [(2, 3), (5, 10), (20, 10)])
+def test_rank_gyms_nearest_matches_uncached(cache, gyms, max_distance_km, k):
+    for latitude, longitude in user_locations(8, seed=5):
+        geohash = cache.plan_gyms(longitude, latitude, max_distance_km, nearest=True, k=k)['key'][1]
+        for point_latitude, point_longitude in points_in_cell(geohash, 6, seed=6):
+            plan = cache.plan_gyms(point_longitude, point_latitude, max_distance_km, nearest=True, k=k)
+            expected = reference_gyms(gyms, point_latitude, point_longitude, max_distance_km, k)
+            result = cache.rank_gyms(plan, cell_gym_candidates(cache, gyms, plan, nearest=True))
+            assert [row['id'] for row in result] == [row['id'] for row in expected]
+
+@pytest.mark.parametrize("max_distance_km", [1, 3, 8])
+@pytest.mark.parametrize("user_input", ["pt gần đây", "pt gần có ít nhất 3000 năm kinh nghiệm", "pt gần dưới 5000 năm kinh nghiệm"])
+def test_rank_trainers_matches_uncached(cache, trainers, max_distance_km, user_input):
+    filtered = [trainer for trainer in trainers if matches_experience(trainer, user_input)]
+    assert 0 < len(filtered) <= len(trainers)
+    for latitude, longitude in user_locations(6, seed=7):
+        geohash = cache.plan_trainers(longitude, latitude, max_distance_km, user_input)['key'][1]
+        for point_latitude, point_longitude in points_in_cell(geohash, 5, seed=8):
+            plan = cache.plan_trainers(point_longitude, point_latitude, max_distance_km, user_input)
+            expected = reference_trainers(filtered, point_latitude, point_longitude, max_distance_km)
+            result = cache.rank_trainers(plan, cell_trainer_candidates(cache, filtered, plan))
+            assert [row['id'] for row in result] == [row['id'] for row in expected]
+            assert [row['distance_km'] for row in result] == pytest.approx([row['distance_km'] for row in expected], abs=1e-9)
+
+def test_rank_trainers_on_full_catalog_matches_uncached(cache, trainers):
+    # Ứng viên là toàn bộ PT: chỉ kiểm tra phần xếp hạng / xen kẽ
+    for latitude, longitude in user_locations(20, seed=9):
+        plan = cache.plan_trainers(longitude, latitude, 5)
+        expected = reference_trainers(trainers, latitude, longitude, 5)
+        assert [row['id'] for row in cache.rank_trainers(plan, trainers)] == [row['id'] for row in expected]
+
+def test_plan_keys(cache):
+    latitude, longitude = CENTER
+    # Cùng ô, bán kính cùng bậc: dùng chung khóa; khác bậc / chế độ / bộ lọc kinh nghiệm: khóa khác
+    assert cache.plan_gyms(longitude, latitude, 4)['key'] == cache.plan_gyms(longitude, latitude, 5)['key']
+    assert cache.plan_gyms(longitude, latitude, 5)['key'] != cache.plan_gyms(longitude, latitude, 6)['key']
+    assert cache.plan_gyms(longitude, latitude, 5)['key'] != cache.plan_gyms(longitude, latitude, 5, nearest=True)['key']
+    assert cache.plan_trainers(longitude, latitude, 5, "pt gần")['key'] != \
+        cache.plan_trainers(longitude, latitude, 5, "pt gần ít nhất 3 năm kinh nghiệm")['key']
+    assert cache.plan_trainers(longitude, latitude, 5, "pt gần ít nhất 3 năm kinh nghiệm")['key'] != \
+        cache.plan_trainers(longitude, latitude, 5, "pt gần dưới 3 năm kinh nghiệm")['key']
+    assert cache.plan_gyms(longitude, latitude, 0) is None
+    assert GeoCellCache(store=TTLCache(max_entries=0)).plan_gyms(longitude, latitude, 5) is None
+
+def test_fetch_queries_once_per_cell(cache, gyms, monkeypatch):
+    calls = []
+
+    def fake_query_database(sql, params=None):
+        calls.append(params)
+        return cell_gym_candidates(cache, gyms, plan, nearest=False)
+
+    monkeypatch.setattr(geo_cache_service, "query_database", fake_query_database)
+    geohash = cache.plan_gyms(CENTER[1], CENTER[0], 5)['key'][1]
+    for latitude, longitude in points_in_cell(geohash, 5, seed=10):
+        plan = cache.plan_gyms(longitude, latitude, 5)
+        expected = reference_gyms(gyms, latitude, longitude, 5)
+        assert [row['id'] for row in cache.fetch(plan)] == [row['id'] for row in expected]
+    assert len(calls) == 1
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test chỉ mục lưới gym: nearest và count_rings so với duyệt toàn bộ bằng Haversine
+Run this script: python -m pytest -q test_gym_index.py
+"""
+
+import random
+import pytest
+from app.utils.geo_utils import haversine_km
+import app.services.gym_index_service as gym_index_service
+from app.services.gym_index_service import GymSpatialIndex, nearby_sort_key
+
+RINGS_KM = [1, 3, 5, 10, 25]
+
+def make_gyms(count, seed, center=(10.7769, 106.7009), spread=0.5):
+    """Gym ngẫu nhiên: phần lớn quanh trung tâm, một phần rải rác xa hơn"""
+    rng = random.Random(seed)
+    gyms = []
+    for i in range(count):
+        scale = spread if i % 10 else spread * 4
+        gyms.append({
+            'id': f'gym-{i}',
+            'gymname': f'Gym {i:05d}',
+            'hotresearch': i % 7 == 0,
+            'latitude': center[0] + rng.uniform(-scale, scale),
+            'longitude': center[1] + rng.uniform(-scale, scale)
+        })
+    return gyms
+
+def brute_force(gyms, latitude, longitude, max_distance_km=None):
+    """Mọi gym (trong bán kính nếu có) kèm khoảng cách, cùng thứ tự với SQL"""
+    results = [{**gym, 'distance_km': haversine_km(latitude, longitude, gym['latitude'], gym['longitude'])} for gym in gyms]
+    if max_distance_km is not None:
+        results = [row for row in results if row['distance_km'] <= max_distance_km]
+    return sorted(results, key=nearby_sort_key)
+
+def query_points(seed, count=40, center=(10.7769, 106.7009)):
+    rng = random.Random(seed)
+    return [(center[0] + rng.uniform(-0.7, 0.7), center[1] + rng.uniform(-0.7, 0.7)) for _ in range(count)]
+
+@pytest.fixture(scope="module")
+def gyms():
+    return make_gyms(800, seed=1)
+
+@pytest.mark.parametrize("cell_degrees", [0.01, 0.05, 0.5])
+@pytest.mark.parametrize("k", [1, 5, 20])
+@pytest.mark.parametrize("max_distance_km", [None, 2, 15])
+def test_nearest_matches_brute_force(gyms, cell_degrees, k, max_distance_km):
+    index = GymSpatialIndex(cell_degrees=cell_degrees)
+    index.load(gyms)
+    for latitude, longitude in query_points(seed=2):
+        expected = brute_force(gyms, latitude, longitude, max_distance_km)[:k]
+        result = index.nearest(latitude, longitude, k, max_distance_km)
+        assert [row['id'] for row in result] == [row['id'] for row in expected]
+        assert [row['distance_km'] for row in result] == pytest.approx([row['distance_km'] for row in expected], abs=1e-9)
+
+def test_nearest_far_from_every_gym(gyms):
+    index = GymSpatialIndex(cell_degrees=0.05)
+    index.load(gyms)
+    # Điểm cách xa mọi gym: phải mở rộng qua nhiều vòng ô trống
+    expected = brute_force(gyms, 13.5, 106.7)[:3]
+    assert [row['id'] for row in index.nearest(13.5, 106.7, 3)] == [row['id'] for row in expected]
+    assert index.nearest(13.5, 106.7, 3, max_distance_km=50) == []
+
+@pytest.mark.parametrize("cell_degrees", [0.01, 0.05])
+def test_nearest_far_points_on_fine_grid(cell_degrees):
+    # Ô nhỏ, gym rải rộng và điểm truy vấn rất xa (không giới hạn bán kính): hàng chục nghìn vòng ô trống
+    gyms = make_gyms(600, seed=6, spread=2.0)
+    index = GymSpatialIndex(cell_degrees=cell_degrees)
+    index.load(gyms)
+    for latitude, longitude in [(21.0285, 105.8542), (-33.8688, 151.2093), (51.5074, -0.1278), (16.0, 108.2)]:
+        expected = brute_force(gyms, latitude, longitude)[:5]
+        assert [row['id'] for row in index.nearest(latitude, longitude, 5)] == [row['id'] for row in expected]
+
+def test_nearest_returns_all_when_k_exceeds_size():
+    gyms = make_gyms(12, seed=3)
+    index = GymSpatialIndex(cell_degrees=0.05)
+    index.load(gyms)
+    result = index.nearest(10.7769, 106.7009, 50)
+    assert [row['id'] for row in result] == [row['id'] for row in brute_force(gyms, 10.7769, 106.7009)]
+
+def test_nearest_tie_break_matches_sql_order():
+    # Cùng tọa độ: hotresearch trước, rồi theo tên
+    gyms = [
+        {'id': 'b', 'gymname': 'Gym B', 'hotresearch': False, 'latitude': 10.78, 'longitude': 106.70},
+        {'id': 'a', 'gymname': 'Gym A', 'hotresearch': False, 'latitude': 10.78, 'longitude': 106.70},
+        {'id': 'c', 'gymname': 'Gym C', 'hotresearch': True, 'latitude': 10.78, 'longitude': 106.70},
+    ]
+    index = GymSpatialIndex(cell_degrees=0.05)
+    index.load(gyms)
+    assert [row['id'] for row in index.nearest(10.77, 106.70, 3)] == ['c', 'a', 'b']
+
+def test_nearest_edge_cases():
+    index = GymSpatialIndex(cell_degrees=0.05)
+    assert index.nearest(10.7769, 106.7009, 5) is None
+    index.load([])
+    assert index.nearest(10.7769, 106.7009, 5) == []
+    index.load(make_gyms(5, seed=4) + [{'id': 'x', 'gymname': 'Không tọa độ', 'latitude': None, 'longitude': None}])
+    assert index.nearest(10.7769, 106.7009, 0) == []
+    assert 'x' not in [row['id'] for row in index.nearest(10.7769, 106.7009, 10)]
+
+@pytest.mark.parametrize("cell_degrees", [0.01, 0.05, 0.5])
+def test_count_rings_matches_brute_force(gyms, cell_degrees):
+    index = GymSpatialIndex(cell_degrees=cell_degrees)
+    index.load(gyms)
+    for latitude, longitude in query_points(seed=5):
+        counts, results = index.count_rings(latitude, longitude, RINGS_KM)
+        expected = brute_force(gyms, latitude, longitude, max(RINGS_KM))
+        assert counts == [sum(1 for row in expected if row['distance_km'] <= ring_km) for ring_km in RINGS_KM]
+        assert [row['id'] for row in results] == [row['id'] for row in expected]
+
+def test_count_rings_not_ready():
+    assert GymSpatialIndex().count_rings(10.7769, 106.7009, RINGS_KM) is None
+
+@pytest.mark.parametrize("changed, refresh, view_stale", [
+    ({"gym_source"}, True, True),
+    ({"listen"}, True, True),
+    ({"gym_search"}, True, False),
+    ({"gym_search", "trainer_profiles"}, True, False),
+    ({"trainer_profiles"}, False, False),
+    (None, False, False),
+])
+def test_refresh_request_by_payload(changed, refresh, view_stale):
+    # Chỉ thay đổi bảng nguồn (hoặc có thể đã lỡ thông báo) mới làm mới materialized view
+    gym_index_service._refresh_requested.clear()
+    gym_index_service._view_stale.clear()
+    gym_index_service.request_gym_catalog_refresh(changed)
+    assert gym_index_service._refresh_requested.is_set() is refresh
+    assert gym_index_service._view_stale.is_set() is view_stale
+    gym_index_service._refresh_requested.clear()
+    gym_index_service._view_stale.clear()
+
+def test_refresh_gym_catalog_refreshes_view_then_index(monkeypatch):
+    calls = []
+    monkeypatch.setattr(gym_index_service, "refresh_gym_search", lambda: calls.append("view"))
+    monkeypatch.setattr(gym_index_service.gym_index, "refresh", lambda: calls.append("index") or True)
+    assert gym_index_service.refresh_gym_catalog() is True
+    assert calls == ["view", "index"]
+
+@pytest.mark.parametrize("changed, view_result, expected", [
+    # Làm mới view thành công hoặc worker khác đang làm mới: chờ NOTIFY gym_search để nạp lại chỉ mục
+    ({"gym_source"}, 120.5, ["view"]),
+    ({"gym_source"}, None, ["view"]),
+    ({"gym_source"}, "Lỗi cơ sở dữ liệu: timeout", ["view", "index"]),
+    ({"gym_search"}, 120.5, ["index"]),
+])
+def test_refresh_loop_refreshes_view_only_when_stale(monkeypatch, changed, view_result, expected):
+    calls = []
+
+    def fake_refresh_gym_search():
+        calls.append("view")
+        # Một vòng lặp duy nhất
+        gym_index_service._refresher_stop.set()
+        return view_result
+
+    def fake_index_refresh():
+        calls.append("index")
+        gym_index_service._refresher_stop.set()
+        return True
+
+    monkeypatch.setattr(gym_index_service, "refresh_gym_search", fake_refresh_gym_search)
+    monkeypatch.setattr(gym_index_service.gym_index, "refresh", fake_index_refresh)
+    gym_index_service._refresher_stop.clear()
+    gym_index_service._view_stale.clear()
+    gym_index_service.request_gym_catalog_refresh(changed)
+    gym_index_service._refresh_loop(60)
+    assert calls == expected
+    gym_index_service._refresher_stop.clear()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test cursor phân trang keyset của tìm kiếm gym: mã hóa/giải mã, cursor bị sửa và cursor của truy vấn khác
+Run this script: python -m pytest -q test_gym_pagination.py
+"""
+
+import base64
+import json
+import pytest
+from app.services.search_service import (
+    encode_gym_cursor, decode_gym_cursor, paginate_gym_query, gym_query_fingerprint, GYM_KEYSET_CONDITION
+)
+from config import DEFAULT_GYM_PAGE_SIZE, MAX_GYM_PAGE_SIZE
+
+QUERY = ("SELECT * FROM gym_search g WHERE g.search_text LIKE %(keyword)s", {'keyword': '%quan 1%'})
+OTHER_QUERY = ("SELECT * FROM gym_search g WHERE g.search_text LIKE %(keyword)s", {'keyword': '%quan 3%'})
+
+ROW = {
+    'id': '3f2b8c1e-6a0d-4c55-9d7e-2b1f0a9c8e77',
+    'gymname': 'Gym Sài Gòn – Quận 1',
+    'hot_score': 1,
+    'relevance_score': 0.75,
+    'recency_score': 0.5
+}
+
+def raw_cursor(payload):
+    """Cursor dựng tay từ payload tùy ý (giống cách encode_gym_cursor mã hóa)"""
+    raw = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def test_cursor_round_trip():
+    fingerprint = gym_query_fingerprint(QUERY)
+    cursor = encode_gym_cursor(ROW, fingerprint)
+    assert '=' not in cursor
+    assert decode_gym_cursor(cursor, fingerprint) == [-1, -0.75, -0.5, ROW['gymname'], ROW['id']]
+
+def test_fingerprint_depends_on_sql_and_params():
+    assert gym_query_fingerprint(QUERY) == gym_query_fingerprint((QUERY[0], dict(QUERY[1])))
+    assert gym_query_fingerprint(QUERY) != gym_query_fingerprint(OTHER_QUERY)
+    assert gym_query_fingerprint(QUERY) != gym_query_fingerprint((QUERY[0] + " ORDER BY g.id", QUERY[1]))
+
+def test_cursor_of_other_query_is_rejected():
+    cursor = encode_gym_cursor(ROW, gym_query_fingerprint(OTHER_QUERY))
+    assert decode_gym_cursor(cursor, gym_query_fingerprint(QUERY)) is None
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "không-phải-base64!!",
+    "a",
+    base64.urlsafe_b64encode(b"\xff\xfe\x00").decode('ascii'),
+    raw_cursor(["k", "q"]),
+    raw_cursor({"q": None, "k": [0, 0, 0, "a", "b"]}),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    assert decode_gym_cursor(cursor, gym_query_fingerprint(QUERY)) is None
+
+def test_tampered_cursor_is_rejected():
+    fingerprint = gym_query_fingerprint(QUERY)
+    # Thiếu/thừa thành phần khóa, thiếu khóa, đổi dấu vân tay
+    assert decode_gym_cursor(raw_cursor({"q": fingerprint, "k": [-1, -0.75, -0.5, "a"]}), fingerprint) is None
+    assert decode_gym_cursor(raw_cursor({"q": fingerprint, "k": [-1, -0.75, -0.5, "a", "b", "c"]}), fingerprint) is None
+    assert decode_gym_cursor(raw_cursor({"q": fingerprint}), fingerprint) is None
+    assert decode_gym_cursor(raw_cursor({"q": fingerprint[::-1], "k": [-1, -0.75, -0.5, "a", "b"]}), fingerprint) is None
+    # Cắt cụt cursor hợp lệ
+    cursor = encode_gym_cursor(ROW, fingerprint)
+    assert decode_gym_cursor(cursor[:len(cursor) // 2], fingerprint) is None
+
+def test_paginate_first_page():
+    (sql, params), page_size, fingerprint = paginate_gym_query(QUERY)
+    assert page_size == DEFAULT_GYM_PAGE_SIZE
+    assert params['page_limit'] == DEFAULT_GYM_PAGE_SIZE + 1
+    assert params['keyword'] == QUERY[1]['keyword']
+    assert fingerprint == gym_query_fingerprint(QUERY)
+    assert GYM_KEYSET_CONDITION not in sql
+    # Không sửa tham số của truy vấn gốc
+    assert 'page_limit' not in QUERY[1]
+
+@pytest.mark.parametrize("requested, expected", [(None, DEFAULT_GYM_PAGE_SIZE), (0, DEFAULT_GYM_PAGE_SIZE), (-5, 1), (3, 3), (10 ** 6, MAX_GYM_PAGE_SIZE)])
+def test_paginate_clamps_page_size(requested, expected):
+    (_, params), page_size, _ = paginate_gym_query(QUERY, requested)
+    assert page_size == expected
+    assert params['page_limit'] == expected + 1
+
+def test_paginate_next_page_uses_keyset():
+    _, _, fingerprint = paginate_gym_query(QUERY)
+    (sql, params), _, _ = paginate_gym_query(QUERY, 5, encode_gym_cursor(ROW, fingerprint))
+    assert GYM_KEYSET_CONDITION in sql
+    assert (params['after_hot_score'], params['after_relevance_score'], params['after_recency_score'],
+            params['after_gymname'], params['after_id']) == (-1, -0.75, -0.5, ROW['gymname'], ROW['id'])
+
+@pytest.mark.parametrize("cursor", ["rác", None])
+def test_paginate_invalid_cursor_falls_back_to_first_page(cursor):
+    (sql, params), _, _ = paginate_gym_query(QUERY, 5, cursor)
+    assert GYM_KEYSET_CONDITION not in sql
+    assert not any(name.startswith('after_') for name in params)
+
+def test_paginate_cursor_of_other_query_falls_back_to_first_page():
+    cursor = encode_gym_cursor(ROW, gym_query_fingerprint(OTHER_QUERY))
+    (sql, _), _, _ = paginate_gym_query(QUERY, 5, cursor)
+    assert GYM_KEYSET_CONDITION not in sql
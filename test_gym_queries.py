@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Test SQL và tham số của các truy vấn gym đọc từ materialized view gym_search (không cần database):
+chỉ đọc cột có trong view, mọi placeholder đều được bind và giá trị người dùng chỉ nằm trong params
+Run this script: python -m pytest -q test_gym_queries.py
+"""
+
+import re
+import pytest
+from app.database.schema import list_migrations
+from app.services.search_service import (
+    intelligent_gym_search, build_nearby_gym_query, build_nearest_gym_query, build_nearby_gym_search, with_ring_counts,
+    build_fulltext_query, ALL_GYMS_QUERY, GYM_SEARCH_COLUMNS
+)
+from app.utils.geo_utils import bounding_box
+from config import NEARBY_KNN_LIMIT, NEARBY_KNN_CANDIDATE_FACTOR, NEARBY_RINGS_KM
+
+PLACEHOLDER = re.compile(r"%\((\w+)\)s")
+
+def placeholders(sql):
+    return set(PLACEHOLDER.findall(sql))
+
+MIGRATIONS_SQL = "\n".join(path.read_text(encoding='utf-8') for _, path in list_migrations())
+
+def latest_view_select_list(name):
+    """Danh sách cột SELECT của materialized view theo migration mới nhất tạo lại view"""
+    definition = MIGRATIONS_SQL.split(f"CREATE MATERIALIZED VIEW {name} AS")[-1]
+    return definition.split("\nFROM ", 1)[0]
+
+def latest_view_columns(name):
+    return set(re.findall(r"\bAS (\w+),?\s*$", latest_view_select_list(name), flags=re.MULTILINE))
+
+GYM_SEARCH_VIEW_COLUMNS = latest_view_columns("gym_search")
+
+def gym_columns(sql):
+    """Các cột đọc qua alias g của gym_search"""
+    return set(re.findall(r"\bg\.(\w+)", sql))
+
+def search(user_input, search_mode='fulltext'):
+    query = intelligent_gym_search(user_input, search_mode)
+    assert query is not None
+    return query
+
+def gym_queries():
+    return [
+        search("tìm gym yoga sao"),
+        search("tìm gym quận 1"),
+        search("tìm gym nổi tiếng"),
+        search("tìm gym ở Đà Nẵng"),
+        (ALL_GYMS_QUERY, {}),
+        build_nearby_gym_query(106.7009, 10.7769, 5)
+    ]
+
+def test_view_has_precomputed_columns():
+    assert {'id', 'gymname', 'gymaddress', 'district', 'longitude', 'latitude', 'hot_score', 'recency_score'} <= GYM_SEARCH_VIEW_COLUMNS
+    assert gym_columns(GYM_SEARCH_COLUMNS) <= GYM_SEARCH_VIEW_COLUMNS
+
+@pytest.mark.parametrize("index", range(6))
+def test_queries_read_only_from_view(index):
+    sql, params = gym_queries()[index]
+    assert "FROM gym_search g" in sql
+    assert '"AspNetUsers"' not in sql and '"Addresses"' not in sql
+    # Không còn ghép địa chỉ hay ép kiểu tọa độ cho mỗi request
+    assert "CONCAT_WS" not in sql and "CAST(" not in sql
+    assert gym_columns(sql) <= GYM_SEARCH_VIEW_COLUMNS
+
+@pytest.mark.parametrize("index", range(6))
+def test_placeholders_match_params(index):
+    sql, params = gym_queries()[index]
+    assert placeholders(sql) == set(params)
+
+def test_ranked_queries_return_keyset_columns():
+    for sql, _ in gym_queries()[:5]:
+        assert "g.hot_score" in sql and "as relevance_score" in sql and "g.recency_score" in sql
+
+def test_all_gyms_query_has_no_filter():
+    assert "WHERE" not in ALL_GYMS_QUERY
+    assert placeholders(ALL_GYMS_QUERY) == set()
+
+def test_user_input_only_in_params():
+    user_input = "tìm gym có hồ bơi'; DROP TABLE gym_search;--"
+    for search_mode in ('fulltext', 'like'):
+        sql, params = search(user_input, search_mode)
+        assert "drop" not in sql.lower() and "bơi" not in sql
+        # Chuỗi hằng duy nhất trong SQL là cấu hình tsquery
+        assert "'" not in sql.replace("'simple'", "")
+        assert any("drop" in str(value) for value in params.values())
+
+def test_non_gym_input_has_no_query():
+    assert intelligent_gym_search("xin chào") is None
+    assert intelligent_gym_search("") is None
+    assert intelligent_gym_search(None) is None
+
+def test_hot_search_filters_on_view_column():
+    sql, _ = search("tìm gym nổi tiếng")
+    assert "g.hotresearch = true" in sql
+
+def test_nearby_params():
+    sql, params = build_nearby_gym_query(106.7009, 10.7769, 5)
+    assert (params['longitude'], params['latitude'], params['max_distance_km']) == (106.7009, 10.7769, 5)
+    assert params['min_latitude'] < 10.7769 < params['max_latitude']
+    assert params['min_longitude'] < 106.7009 < params['max_longitude']
+    assert "distance_km <= %(max_distance_km)s" in sql
+
+def trigram_indexed_columns():
+    return set(re.findall(r"ON gym_search USING gin \((\w+) gin_trgm_ops\)", MIGRATIONS_SQL))
+
+def test_like_keywords_are_normalized():
+    sql, params = search("tìm gym Sài Gòn yoga", 'like')
+    assert params['keyword_patterns'] == ['%sai%', '%gon%', '%yoga%']
+    assert params['primary_pattern'] == '%sai%'
+    for column in ('name_text', 'address_text', 'owner_text'):
+        assert f"g.{column} LIKE ANY(%(keyword_patterns)s)" in sql
+    # So khớp trên cột đã chuẩn hóa, không bỏ dấu / hạ chữ từng hàng lúc truy vấn
+    assert "ILIKE" not in sql and "LOWER(" not in sql.upper() and "unaccent" not in sql
+    assert "search_vector" not in sql and 'ts_query' not in params
+
+def test_district_search_matches_normalized_columns():
+    for search_mode in ('fulltext', 'like'):
+        sql, params = search("tìm gym quận 1", search_mode)
+        assert params['district_address_patterns'] == ['%quan 1%', '%district 1%']
+        assert params['district_patterns'] == ['%quan 1%', '%district 1%']
+        assert "g.address_text LIKE ANY(%(district_address_patterns)s)" in sql
+        assert "g.district_text LIKE ANY(%(district_patterns)s)" in sql
+
+def test_like_columns_have_trigram_indexes():
+    text_columns = set()
+    for user_input in ("tìm gym Sài Gòn yoga", "tìm gym quận 1", "tìm gym ở Đà Nẵng"):
+        sql, _ = search(user_input, 'like')
+        text_columns |= set(re.findall(r"\bg\.(\w+_text) LIKE", sql))
+    assert text_columns == {'name_text', 'address_text', 'owner_text', 'district_text'}
+    assert text_columns <= trigram_indexed_columns()
+    assert text_columns <= GYM_SEARCH_VIEW_COLUMNS
+
+def test_fulltext_query_format():
+    assert build_fulltext_query(['yoga']) == 'yoga:*'
+    assert build_fulltext_query(['yoga', 'sao', 'quan']) == 'yoga:* | sao:* | quan:*'
+
+def test_fulltext_search_uses_search_vector():
+    sql, params = search("tìm gym Sài Gòn yoga")
+    assert params == {'ts_query': 'sai:* | gon:* | yoga:*'}
+    assert "g.search_vector @@ to_tsquery('simple', %(ts_query)s)" in sql
+    # Xếp hạng bằng ts_rank_cd chuẩn hóa (32), không còn CASE theo từng cột
+    assert "ts_rank_cd(g.search_vector, to_tsquery('simple', %(ts_query)s), 32) * 100 as relevance_score" in sql
+    assert "CASE" not in sql and "LIKE" not in sql
+
+def test_search_vector_has_gin_index():
+    assert 'search_vector' in GYM_SEARCH_VIEW_COLUMNS
+    assert "ON gym_search USING gin (search_vector)" in MIGRATIONS_SQL
+    # Cùng cấu hình 'simple' với truy vấn để chỉ mục được dùng
+    assert "to_tsvector('simple'" in MIGRATIONS_SQL
+
+def test_fulltext_keeps_hot_filter():
+    sql, params = search("tìm gym yoga nổi tiếng")
+    assert "g.hotresearch = true" in sql
+    assert params['ts_query'].startswith('yoga:*')
+
+def gist_point_index(table):
+    """(biểu thức, điều kiện WHERE) của chỉ mục GiST point(...) mới nhất trên bảng"""
+    expression, predicate = re.findall(rf"ON {table} USING gist \((point\(\w+, \w+\))\)\s*WHERE ([^;]+);", MIGRATIONS_SQL)[-1]
+    return expression, " ".join(predicate.split())
+
+def test_coordinates_are_typed_in_view():
+    select_list = latest_view_select_list("gym_search")
+    assert 'CAST(u."Longitude" AS DOUBLE PRECISION) AS longitude' in select_list
+    assert 'CAST(u."Latitude" AS DOUBLE PRECISION) AS latitude' in select_list
+    # Chỉ mục B-tree (latitude, longitude) được thay bằng GiST
+    assert MIGRATIONS_SQL.rindex("DROP INDEX IF EXISTS gym_search_geo_idx") > MIGRATIONS_SQL.rindex("CREATE INDEX gym_search_geo_idx")
+
+@pytest.mark.parametrize("query", [
+    build_nearby_gym_query(106.7009, 10.7769, 5),
+    build_nearest_gym_query(106.7009, 10.7769, 10, 5),
+    build_nearest_gym_query(106.7009, 10.7769, 10),
+    with_ring_counts(build_nearby_gym_query(106.7009, 10.7769, 2))
+])
+def test_geo_conditions_match_gist_index(query):
+    sql, params = query
+    expression, predicate = gist_point_index("gym_search")
+    used = set(re.findall(r"(point\(g\.\w+, g\.\w+\)) <(?:@|->)", sql))
+    assert used and {point.replace("g.", "") for point in used} == {expression}
+    # Điều kiện của chỉ mục một phần có trong truy vấn để planner dùng được chỉ mục
+    for condition in predicate.split(" AND "):
+        assert f"g.{condition}" in sql
+    assert "CAST(" not in sql
+    assert placeholders(sql) == set(params)
+
+def test_bounding_box_geometry():
+    assert bounding_box(0, 0, 111) == pytest.approx((-1, 1, -1, 1))
+    # Ở vĩ độ 60°, một độ kinh chỉ dài bằng nửa một độ vĩ
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(60, 10, 111)
+    assert (min_latitude, max_latitude) == pytest.approx((59, 61))
+    assert (min_longitude, max_longitude) == pytest.approx((8, 12))
+
+def test_nearest_query_without_distance_limit():
+    sql, params = build_nearest_gym_query(106.7009, 10.7769, 7)
+    assert params == {'latitude': 10.7769, 'longitude': 106.7009, 'k': 7, 'candidate_limit': 7 * NEARBY_KNN_CANDIDATE_FACTOR}
+    assert "<@ box(" not in sql and "max_distance_km" not in sql
+    # Ứng viên theo thứ tự chỉ mục (<->) trước, xếp lại theo Haversine sau
+    nearest_order = sql.index("ORDER BY point(g.longitude, g.latitude) <-> point(%(longitude)s, %(latitude)s)")
+    assert nearest_order < sql.index("LIMIT %(candidate_limit)s") < sql.index("AS distance_km") < sql.index("LIMIT %(k)s")
+    assert sql.rstrip().endswith("LIMIT %(k)s")
+
+def test_nearest_query_with_distance_limit():
+    sql, params = build_nearest_gym_query(106.7009, 10.7769, 7, 3)
+    assert params['max_distance_km'] == 3
+    assert (params['min_latitude'], params['max_latitude'], params['min_longitude'], params['max_longitude']) == bounding_box(10.7769, 106.7009, 3)
+    assert "WHERE distance_km <= %(max_distance_km)s" in sql
+    assert sql.index("<@ box(") < sql.index("LIMIT %(candidate_limit)s")
+
+def test_nearby_gym_search_modes():
+    knn_sql, knn_params = build_nearby_gym_search(106.7009, 10.7769, 5, 'knn')
+    assert (knn_params['k'], knn_params['ring_limit']) == (NEARBY_KNN_LIMIT, NEARBY_KNN_LIMIT)
+    assert "<->" in knn_sql
+    radius_sql, radius_params = build_nearby_gym_search(106.7009, 10.7769, 5, 'radius')
+    assert 'k' not in radius_params and 'ring_limit' not in radius_params
+    assert "<->" not in radius_sql
+    for sql, params in ((knn_sql, knn_params), (radius_sql, radius_params)):
+        assert placeholders(sql) == set(params)
+
+def test_ring_counts_params():
+    query = build_nearby_gym_query(106.7009, 10.7769, 2)
+    sql, params = with_ring_counts(query, [5, 2, 10], limit=4)
+    assert (params['ring_0'], params['ring_1'], params['ring_2'], params['ring_limit']) == (2, 5, 10, 4)
+    assert (params['ring_min_latitude'], params['ring_max_latitude'], params['ring_min_longitude'], params['ring_max_longitude']) == bounding_box(10.7769, 106.7009, 10)
+    assert "WHERE NOT EXISTS (SELECT 1 FROM Nearby)" in sql
+    assert placeholders(sql) == set(params)
+    assert 'ring_limit' not in with_ring_counts(query, [5, 10])[1]
+
+@pytest.mark.parametrize("max_distance_km", [None, max(NEARBY_RINGS_KM), max(NEARBY_RINGS_KM) + 1])
+def test_ring_counts_skipped_without_wider_ring(max_distance_km):
+    query = build_nearest_gym_query(106.7009, 10.7769, 10, max_distance_km)
+    assert with_ring_counts(query) is query
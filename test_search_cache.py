@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test TTLCache (LRU, hết hạn) và khóa cache kết quả tìm kiếm (build_search_cache_key)
+Run this script: python -m pytest -q test_search_cache.py
+"""
+
+import pytest
+import app.utils.cache_utils as cache_utils
+import app.database.search_cache as search_cache_module
+from app.utils.cache_utils import TTLCache
+from app.database.search_cache import build_search_cache_key, query_database_cached
+from config import SEARCH_CACHE_COORD_DECIMALS
+
+class FakeClock:
+    """Đồng hồ monotonic giả để điều khiển thời gian hết hạn"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_utils.time, "monotonic", fake)
+    return fake
+
+def test_get_set_and_default():
+    cache = TTLCache(max_entries=4, ttl_seconds=60)
+    assert cache.get("a") is None
+    assert cache.get("a", "mặc định") == "mặc định"
+    cache.set("a", [1, 2])
+    assert cache.get("a") == [1, 2]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Đọc "a" làm nó mới dùng gần nhất, "b" bị loại khi thêm "c"
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+def test_set_existing_key_refreshes_recency():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 10)
+    cache.set("c", 3)
+    assert cache.get("a") == 10
+    assert cache.get("b") is None
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(max_entries=4, ttl_seconds=60)
+    cache.set("a", 1)
+    clock.now += 59.9
+    assert cache.get("a") == 1
+    clock.now += 0.1
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+def test_set_restarts_ttl(clock):
+    cache = TTLCache(max_entries=4, ttl_seconds=60)
+    cache.set("a", 1)
+    clock.now += 50
+    cache.set("a", 2)
+    clock.now += 50
+    assert cache.get("a") == 2
+
+def test_disabled_cache_stores_nothing():
+    for cache in (TTLCache(max_entries=0, ttl_seconds=60), TTLCache(max_entries=4, ttl_seconds=0)):
+        cache.set("a", 1)
+        assert not cache.enabled
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+def test_pop_and_clear():
+    cache = TTLCache(max_entries=4, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "không có") == "không có"
+    cache.clear()
+    assert cache.get("b") is None
+
+def test_stats():
+    cache = TTLCache(max_entries=4, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+SQL = "SELECT * FROM gym_search g WHERE g.latitude BETWEEN %(min_latitude)s AND %(max_latitude)s"
+
+def test_key_ignores_param_order():
+    first = build_search_cache_key("gym", (SQL, {'keyword': 'quận 1', 'page_limit': 21}))
+    second = build_search_cache_key("gym", (SQL, {'page_limit': 21, 'keyword': 'quận 1'}))
+    assert first == second
+    hash(first)
+
+def test_key_separates_kind_sql_and_params():
+    query = (SQL, {'keyword': 'quận 1'})
+    key = build_search_cache_key("gym", query)
+    assert key != build_search_cache_key("trainer", query)
+    assert key != build_search_cache_key("gym", (SQL + " LIMIT 5", query[1]))
+    assert key != build_search_cache_key("gym", (SQL, {'keyword': 'quận 3'}))
+    assert key != build_search_cache_key("gym", (SQL, {'keyword': 'quận 1', 'page_limit': 21}))
+
+def test_key_quantizes_coordinates_only():
+    step = 10 ** -SEARCH_CACHE_COORD_DECIMALS
+    base = {'latitude': 10.77691, 'longitude': 106.70091, 'max_distance_km': 5.00001}
+    near = {'latitude': 10.77691 + step * 0.2, 'longitude': 106.70091 - step * 0.2, 'max_distance_km': 5.00001}
+    far = {'latitude': 10.77691 + step * 2, 'longitude': 106.70091, 'max_distance_km': 5.00001}
+    assert build_search_cache_key("nearby_gym", (SQL, base)) == build_search_cache_key("nearby_gym", (SQL, near))
+    assert build_search_cache_key("nearby_gym", (SQL, base)) != build_search_cache_key("nearby_gym", (SQL, far))
+    # Tham số không phải tọa độ giữ nguyên giá trị
+    assert build_search_cache_key("nearby_gym", (SQL, base)) != build_search_cache_key(
+        "nearby_gym", (SQL, {**base, 'max_distance_km': 5.00002}))
+
+def test_key_freezes_lists_and_none():
+    key = build_search_cache_key("trainer", (SQL, {'goals': ['Giảm cân', 'Tăng cơ'], 'latitude': None}))
+    hash(key)
+    assert dict(key[2])['goals'] == ('Giảm cân', 'Tăng cơ')
+    assert dict(key[2])['latitude'] is None
+
+def test_cached_query_skips_error_strings(monkeypatch):
+    calls = []
+    responses = iter(["Lỗi truy vấn: timeout", [{'id': 1}]])
+
+    def fake_query_database(sql, params=None):
+        calls.append(sql)
+        return next(responses)
+
+    monkeypatch.setattr(search_cache_module, "query_database", fake_query_database)
+    monkeypatch.setattr(search_cache_module, "search_cache", TTLCache(max_entries=4, ttl_seconds=60))
+    query = (SQL, {'keyword': 'test_search_cache'})
+    assert query_database_cached("gym", query) == "Lỗi truy vấn: timeout"
+    assert query_database_cached("gym", query) == [{'id': 1}]
+    assert query_database_cached("gym", query) == [{'id': 1}]
+    assert len(calls) == 2
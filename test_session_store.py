@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test kho phiên hội thoại (bộ nhớ và SQLite): chỉ phiên do create cấp, giới hạn tin nhắn, hết hạn, xóa
+Run this script: python -m pytest -q test_session_store.py
+"""
+
+import time
+import pytest
+from app.database.session_store import SessionStore, MemorySessionStore, SQLiteSessionStore, SessionNotFoundError
+
+TTL_SECONDS = 60
+MAX_MESSAGES = 4
+
+class FakeClock:
+    """Đồng hồ giả dùng cho cả time.monotonic (TTLCache) và time.time (SQLite)"""
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    monkeypatch.setattr(time, "time", fake)
+    return fake
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemorySessionStore(max_entries=100, ttl_seconds=TTL_SECONDS, max_messages=MAX_MESSAGES)
+    return SQLiteSessionStore(path=str(tmp_path / "sessions.sqlite3"), ttl_seconds=TTL_SECONDS, max_messages=MAX_MESSAGES)
+
+def message(index):
+    return {"role": "user" if index % 2 == 0 else "assistant", "content": f"tin nhắn {index} – tiếng Việt"}
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+def test_created_session_is_empty(store):
+    session_id = store.create()
+    assert store.exists(session_id)
+    assert store.load(session_id) == []
+    assert len(store) == 1
+    assert store.create() != session_id
+
+def test_unknown_session_is_rejected(store):
+    assert not store.exists("khong-ton-tai")
+    assert store.load("khong-ton-tai") is None
+    with pytest.raises(SessionNotFoundError):
+        store.append("khong-ton-tai", [message(0)])
+    # append bị từ chối không tạo phiên mới
+    assert store.load("khong-ton-tai") is None
+    assert len(store) == 0
+
+def test_append_keeps_order(store):
+    session_id = store.create()
+    store.append(session_id, [message(0), message(1)])
+    store.append(session_id, [message(2)])
+    assert store.load(session_id) == [message(0), message(1), message(2)]
+
+def test_append_trims_to_max_messages(store):
+    session_id = store.create()
+    store.append(session_id, [message(index) for index in range(3)])
+    store.append(session_id, [message(index) for index in range(3, 6)])
+    assert store.load(session_id) == [message(index) for index in range(6 - MAX_MESSAGES, 6)]
+    store.append(session_id, [message(index) for index in range(6, 6 + MAX_MESSAGES + 2)])
+    assert store.load(session_id) == [message(index) for index in range(8, 8 + MAX_MESSAGES)]
+
+def test_sessions_are_isolated(store):
+    first, second = store.create(), store.create()
+    store.append(first, [message(0)])
+    store.append(second, [message(1)])
+    assert store.load(first) == [message(0)]
+    assert store.load(second) == [message(1)]
+
+def test_session_expires_after_ttl(store, clock):
+    session_id = store.create()
+    store.append(session_id, [message(0)])
+    clock.now += TTL_SECONDS - 1
+    assert store.load(session_id) == [message(0)]
+    clock.now += 1
+    assert not store.exists(session_id)
+    assert store.load(session_id) is None
+    with pytest.raises(SessionNotFoundError):
+        store.append(session_id, [message(1)])
+    assert len(store) == 0
+
+def test_append_renews_ttl(store, clock):
+    session_id = store.create()
+    clock.now += TTL_SECONDS - 1
+    store.append(session_id, [message(0)])
+    clock.now += TTL_SECONDS - 1
+    assert store.load(session_id) == [message(0)]
+
+def test_delete(store):
+    session_id = store.create()
+    store.append(session_id, [message(0)])
+    assert store.delete(session_id) is True
+    assert store.load(session_id) is None
+    assert store.delete(session_id) is False
+    with pytest.raises(SessionNotFoundError):
+        store.append(session_id, [message(1)])
+
+def test_stats(store):
+    session_id = store.create()
+    store.load(session_id)
+    store.load("khong-ton-tai")
+    store.append(session_id, [message(0)])
+    stats = store.stats()
+    assert stats["backend"] == store.backend
+    assert (stats["sessions"], stats["creates"], stats["loads"], stats["hits"], stats["appends"]) == (1, 1, 2, 1, 1)
+
+def test_sqlite_sessions_survive_reopen(tmp_path, clock):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SQLiteSessionStore(path=path, ttl_seconds=TTL_SECONDS, max_messages=MAX_MESSAGES)
+    session_id = store.create()
+    store.append(session_id, [message(0)])
+    reopened = SQLiteSessionStore(path=path, ttl_seconds=TTL_SECONDS, max_messages=MAX_MESSAGES)
+    assert reopened.load(session_id) == [message(0)]
+
+@pytest.mark.parametrize("options", [
+    {"max_entries": 0, "ttl_seconds": TTL_SECONDS},
+    {"max_entries": 100, "ttl_seconds": 0},
+])
+def test_memory_store_rejects_disabled_config(options):
+    # Cache bị tắt thì create vẫn cấp session_id nhưng không lưu gì: báo lỗi ngay khi khởi tạo
+    with pytest.raises(ValueError):
+        MemorySessionStore(max_messages=MAX_MESSAGES, **options)
+
+def test_sqlite_store_rejects_zero_ttl(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteSessionStore(path=str(tmp_path / "sessions.sqlite3"), ttl_seconds=0, max_messages=MAX_MESSAGES)
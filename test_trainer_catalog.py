@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Test snapshot catalog PT (NumPy): tìm theo bộ lọc và tìm gần so với cài đặt tham chiếu
+viết lại theo build_trainer_search_query / build_nearby_trainer_query (duyệt toàn bộ bằng Python)
+Run this script: python -m pytest -q test_trainer_catalog.py
+"""
+
+import itertools
+import math
+import operator
+import random
+import uuid
+import pytest
+from app.utils.geo_utils import haversine_km
+from app.services.pt_search_service import parse_trainer_search, extract_experience_requirement
+import app.services.trainer_catalog_service as trainer_catalog_service
+from app.services.trainer_catalog_service import TrainerCatalog, TRAINER_PROFILE_FIELDS
+from config import NEARBY_KNN_LIMIT, NEARBY_KNN_CANDIDATE_FACTOR
+
+CENTER = (10.7769, 106.7009)
+GOALS = ['Giảm cân', 'Tăng cơ', 'Thể hình', 'Sức mạnh', 'Sức bền', 'Linh hoạt', 'Phục hồi chức năng', 'Thể lực tổng hợp']
+EXPERIENCE_OPERATORS = {'>=': operator.ge, '>': operator.gt, '=': operator.eq, '<': operator.lt, '<=': operator.le}
+UNLOCATED_DISTANCE_KM = 999999
+
+def make_catalog(trainers=1500, gyms=120, seed=42):
+    """Hàng giống TRAINER_CATALOG_QUERY: PT gym (gym đang hoạt động hoặc không), PT tự do (có/không vị trí)"""
+    rng = random.Random(seed)
+    gym_rows = [{
+        'gym_id': uuid.UUID(int=rng.getrandbits(128)),
+        'gymname': f'FitBridge Gym {i}',
+        'gymaddress': f'{i} Nguyễn Huệ, TP. Hồ Chí Minh',
+        'gym_latitude': None if i % 40 == 0 else CENTER[0] + rng.uniform(-0.2, 0.2),
+        'gym_longitude': None if i % 40 == 0 else CENTER[1] + rng.uniform(-0.2, 0.2),
+        'gym_hotresearch': i % 9 == 0,
+        # Gym không còn trong gym_search: PT của gym này không được tìm thấy
+        'gym_active': i % 25 != 0
+    } for i in range(gyms)]
+    names = [f'PT {name:05d}' for name in rng.sample(range(100000), trainers)]
+    rows = []
+    for i in range(trainers):
+        freelance = i % 5 == 0
+        gym = {} if freelance and i % 3 else rng.choice(gym_rows)
+        located = freelance and i % 4 != 0
+        rows.append({
+            **{field: None for field in TRAINER_PROFILE_FIELDS},
+            'id': uuid.UUID(int=rng.getrandbits(128)), 'fullname': names[i], 'accountstatus': 'Active',
+            'ismale': None if i % 31 == 0 else i % 2 == 0,
+            'experience': None if i % 13 == 0 else rng.randint(0, 15),
+            'goal_trainings': rng.sample(GOALS, rng.randint(0, 3)), 'certificates': [],
+            'is_freelance': freelance, 'gym_id': gym.get('gym_id'),
+            'pt_latitude': CENTER[0] + rng.uniform(-0.2, 0.2) if located else None,
+            'pt_longitude': CENTER[1] + rng.uniform(-0.2, 0.2) if located else None,
+            'gym_active': bool(gym.get('gym_active')),
+            **{field: gym.get(field) if gym.get('gym_active') else None
+               for field in ('gymname', 'gymaddress', 'gym_latitude', 'gym_longitude', 'gym_hotresearch')}
+        })
+    # name_rank: thứ tự fullname như ROW_NUMBER() OVER (ORDER BY t.fullname, t.id)
+    for rank, row in enumerate(sorted(rows, key=lambda row: (row['fullname'], row['id'])), start=1):
+        row['name_rank'] = rank
+    return rows
+
+def experience_desc(row):
+    return (row['experience'] is None, -(row['experience'] or 0))
+
+def matches_experience(row, exp_operator, exp_years):
+    if not (exp_operator and exp_years):
+        return True
+    return row['experience'] is not None and EXPERIENCE_OPERATORS[exp_operator](row['experience'], exp_years)
+
+def is_gym_trainer(row):
+    return row['gym_active']
+
+def is_freelance_trainer(row):
+    return row['is_freelance'] and row['gym_id'] is None
+
+def interleave(gym_rows, freelance_rows, order_key):
+    """MixedResults: rn <= 10 mỗi loại, PARTITION BY rn % 2, mixed_rn <= 5, xếp theo lượt rồi order_key"""
+    mixed = [(rn, 0, row) for rn, row in enumerate(gym_rows[:10], start=1)]
+    mixed += [(rn, 1, row) for rn, row in enumerate(freelance_rows[:10], start=1)]
+    results = []
+    for parity in (0, 1):
+        partition = sorted((item for item in mixed if item[0] % 2 == parity),
+                           key=lambda item: (item[1], order_key(item[2]), item[0]))
+        results += [((mixed_rn - 1) * 2 + pt_type, order_key(row), rn, row)
+                    for mixed_rn, (rn, pt_type, row) in enumerate(partition[:5], start=1)]
+    # Hòa (cùng lượt, cùng order_key) ở hai nhóm: SQL không xác định thứ tự, snapshot giữ nhóm rn chẵn trước
+    results.sort(key=lambda item: item[:2])
+    return [row for *_, row in results[:10]]
+
+def reference_search(rows, prompt):
+    """build_trainer_search_query (không tìm gần) trên danh sách hàng"""
+    spec = parse_trainer_search(prompt)
+    matched = [
+        row for row in rows
+        if (spec['is_male'] is None or row['ismale'] == spec['is_male'])
+        and (not spec['goals'] or set(spec['goals']) & set(row['goal_trainings']))
+        and matches_experience(row, spec['exp_operator'], spec['exp_years'])
+    ]
+    freelance_rows = sorted(filter(is_freelance_trainer, matched), key=lambda row: (experience_desc(row), row['name_rank']))
+    gym_rows = sorted(filter(is_gym_trainer, matched),
+                      key=lambda row: (not row['gym_hotresearch'], experience_desc(row), row['name_rank']))
+    if spec['only_freelance']:
+        return freelance_rows[:10]
+    if spec['only_gym']:
+        return gym_rows[:10]
+    return interleave(gym_rows, freelance_rows, lambda row: (not row['gym_hotresearch'], experience_desc(row)))
+
+def nearest_candidates(rows, latitude, longitude, lat_field, lng_field):
+    """ORDER BY point(lng, lat) <-> point(...) LIMIT candidate_limit (khoảng cách phẳng theo độ)"""
+    rows = sorted(rows, key=lambda row: math.hypot(row[lng_field] - longitude, row[lat_field] - latitude))
+    return rows[:NEARBY_KNN_LIMIT * NEARBY_KNN_CANDIDATE_FACTOR]
+
+def reference_nearby(rows, latitude, longitude, max_distance_km, prompt, nearest):
+    """build_nearby_trainer_query trên danh sách hàng, trả về (hàng, distance_km)"""
+    exp_operator, exp_years = extract_experience_requirement(prompt)
+
+    def within(distance_km):
+        return max_distance_km is None or distance_km <= max_distance_km
+
+    # RankedGyms: gym đang hoạt động có tọa độ, trong bán kính (kNN: chỉ các gym ứng viên gần nhất)
+    gyms = {}
+    for row in filter(is_gym_trainer, rows):
+        if row['gym_latitude'] is not None and row['gym_longitude'] is not None:
+            gyms[row['gym_id']] = row
+    gyms = [gym for gym in gyms.values()
+            if within(haversine_km(latitude, longitude, gym['gym_latitude'], gym['gym_longitude']))]
+    if nearest:
+        gyms = nearest_candidates(gyms, latitude, longitude, 'gym_latitude', 'gym_longitude')
+    gym_ids = {gym['gym_id'] for gym in gyms}
+    gym_rows = [
+        (row, haversine_km(latitude, longitude, row['gym_latitude'], row['gym_longitude']))
+        for row in filter(is_gym_trainer, rows)
+        if row['gym_id'] in gym_ids and matches_experience(row, exp_operator, exp_years)
+    ]
+    gym_rows.sort(key=lambda item: (item[1], not item[0]['gym_hotresearch'], experience_desc(item[0]), item[0]['name_rank']))
+
+    # FreelanceCandidates: có vị trí trong bán kính (kNN: ứng viên gần nhất), chưa có vị trí: 10 người đầu
+    freelancers = [row for row in filter(is_freelance_trainer, rows) if matches_experience(row, exp_operator, exp_years)]
+    located = [row for row in freelancers if row['pt_latitude'] is not None
+               and within(haversine_km(latitude, longitude, row['pt_latitude'], row['pt_longitude']))]
+    if nearest:
+        located = nearest_candidates(located, latitude, longitude, 'pt_latitude', 'pt_longitude')
+    unlocated = sorted((row for row in freelancers if row['pt_latitude'] is None),
+                       key=lambda row: (experience_desc(row), row['name_rank']))[:10]
+    freelance_rows = [(row, haversine_km(latitude, longitude, row['pt_latitude'], row['pt_longitude'])) for row in located]
+    freelance_rows += [(row, None) for row in unlocated]
+    freelance_rows.sort(key=lambda item: (UNLOCATED_DISTANCE_KM if item[1] is None else item[1],
+                                          experience_desc(item[0]), item[0]['name_rank']))
+
+    return interleave(gym_rows, freelance_rows, lambda item: (item[1] is None, item[1] or 0, experience_desc(item[0])))
+
+PROMPTS = [
+    " ".join(filter(None, ("tìm pt",) + parts))
+    for parts in itertools.product(
+        ["", "nam", "nữ"],
+        ["", "giảm cân", "tăng cơ yoga", "phục hồi"],
+        ["", "ít nhất 5 năm kinh nghiệm", "dưới 3 năm kinh nghiệm", "hơn 10 năm"],
+        ["", "tự do", "tại gym"]
+    )
+]
+
+NEARBY_PROMPTS = ["pt gần đây", "pt gần có ít nhất 8 năm kinh nghiệm", "pt gần dưới 2 năm kinh nghiệm", "pt gần hơn 14 năm"]
+
+@pytest.fixture(scope="module")
+def rows():
+    return make_catalog()
+
+@pytest.fixture(scope="module")
+def catalog(rows):
+    catalog = TrainerCatalog()
+    catalog.load(rows)
+    return catalog
+
+def test_snapshot_classifies_trainers(catalog, rows):
+    stats = catalog.stats()
+    assert stats["ready"] and stats["trainers"] == len(rows)
+    assert stats["gym_trainers"] == sum(map(is_gym_trainer, rows))
+    assert stats["freelance_trainers"] == sum(map(is_freelance_trainer, rows))
+    # Có PT không thuộc loại nào (gym không còn hoạt động) để kiểm tra chúng không được trả về
+    assert stats["gym_trainers"] + stats["freelance_trainers"] < len(rows)
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_search_matches_reference(catalog, rows, prompt):
+    expected = reference_search(rows, prompt)
+    result = catalog.search(prompt)
+    assert [row['id'] for row in result] == [row['id'] for row in expected]
+    for trainer in result:
+        assert trainer['pt_type'] == ('gym' if trainer['gym_id'] is not None else 'freelance')
+        assert set(TRAINER_PROFILE_FIELDS) <= set(trainer)
+
+@pytest.mark.parametrize("nearest", [False, True])
+@pytest.mark.parametrize("max_distance_km", [1, 3, 10, None])
+@pytest.mark.parametrize("prompt", NEARBY_PROMPTS)
+def test_nearby_matches_reference(catalog, rows, nearest, max_distance_km, prompt):
+    rng = random.Random(7)
+    for _ in range(15):
+        latitude, longitude = CENTER[0] + rng.uniform(-0.25, 0.25), CENTER[1] + rng.uniform(-0.25, 0.25)
+        expected = reference_nearby(rows, latitude, longitude, max_distance_km, prompt, nearest)
+        result = catalog.nearby(longitude, latitude, max_distance_km, prompt, nearest)
+        assert [trainer['id'] for trainer in result] == [row['id'] for row, _ in expected]
+        assert [trainer['distance_km'] for trainer in result] == pytest.approx([distance for _, distance in expected], abs=1e-9)
+
+def test_nearby_knn_cap_applies_before_experience_filter():
+    # 60 gym xếp hàng theo khoảng cách, chỉ gym xa nhất có PT đủ kinh nghiệm: kNN không được thấy gym đó
+    rows = []
+    for i in range(60):
+        gym_id = uuid.UUID(int=i + 1)
+        rows.append({
+            **{field: None for field in TRAINER_PROFILE_FIELDS},
+            'id': uuid.UUID(int=1000 + i), 'fullname': f'PT {i:03d}', 'gym_id': gym_id, 'is_freelance': False,
+            'experience': 20 if i == 59 else 1, 'goal_trainings': [], 'pt_latitude': None, 'pt_longitude': None,
+            'gym_active': True, 'gymname': f'Gym {i}', 'gymaddress': '', 'gym_hotresearch': False,
+            'gym_latitude': CENTER[0] + 0.001 * (i + 1), 'gym_longitude': CENTER[1], 'name_rank': i + 1
+        })
+    catalog = TrainerCatalog()
+    catalog.load(rows)
+    prompt = "pt gần có ít nhất 10 năm kinh nghiệm"
+    assert [trainer['id'] for trainer in catalog.nearby(CENTER[1], CENTER[0], None, prompt)] == [uuid.UUID(int=1059)]
+    assert catalog.nearby(CENTER[1], CENTER[0], None, prompt, nearest=True) == []
+    assert reference_nearby(rows, CENTER[0], CENTER[1], None, prompt, True) == []
+
+def test_catalog_not_ready():
+    catalog = TrainerCatalog()
+    assert catalog.search("tìm pt") is None
+    assert catalog.nearby(CENTER[1], CENTER[0], 5, "pt gần") is None
+    assert catalog.stats()["ready"] is False
+
+@pytest.mark.parametrize("changed, expected", [
+    ({"trainer_profiles"}, True),
+    ({"gym_search"}, True),
+    ({"gym_search", "other"}, True),
+    ({"other"}, False),
+    (None, False),
+])
+def test_refresh_request_filters_payload(monkeypatch, changed, expected):
+    monkeypatch.setattr(trainer_catalog_service, "_skip_first_listen", False)
+    trainer_catalog_service._refresh_requested.clear()
+    trainer_catalog_service.request_trainer_catalog_refresh(changed)
+    assert trainer_catalog_service._refresh_requested.is_set() is expected
+    trainer_catalog_service._refresh_requested.clear()
+
+def test_refresh_request_skips_first_listen(monkeypatch):
+    # Snapshot vừa nạp khi khởi động: lần LISTEN đầu bỏ qua, các lần kết nối lại sau đó thì nạp lại
+    monkeypatch.setattr(trainer_catalog_service, "_skip_first_listen", True)
+    trainer_catalog_service._refresh_requested.clear()
+    trainer_catalog_service.request_trainer_catalog_refresh({"listen"})
+    assert not trainer_catalog_service._refresh_requested.is_set()
+    trainer_catalog_service.request_trainer_catalog_refresh({"listen"})
+    assert trainer_catalog_service._refresh_requested.is_set()
+    trainer_catalog_service._refresh_requested.clear()
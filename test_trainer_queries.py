@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test SQL và tham số của các truy vấn PT đọc từ bảng hồ sơ tính sẵn trainer_profiles (không cần database):
+không gộp lại mục tiêu / gói freelance mỗi request, chỉ đọc cột có trong bảng và mọi placeholder đều được bind
+Run this script: python -m pytest -q test_trainer_queries.py
+"""
+
+import re
+import pytest
+from app.database.schema import list_migrations
+import app.services.pt_search_service as pt_search_service
+from app.services.pt_search_service import build_trainer_search_query, build_nearby_trainer_query, build_trainers_cte
+from app.utils.geo_utils import KM_PER_DEGREE
+from config import NEARBY_KNN_LIMIT, NEARBY_KNN_CANDIDATE_FACTOR
+
+PLACEHOLDER = re.compile(r"%\((\w+)\)s")
+
+def placeholders(sql):
+    return set(PLACEHOLDER.findall(sql))
+
+MIGRATIONS_SQL = "\n".join(path.read_text(encoding='utf-8') for _, path in list_migrations())
+
+# Danh sách cột SELECT của trainer_profile_source (trainer_profiles = CREATE TABLE ... AS SELECT * FROM view này)
+TRAINER_PROFILE_SELECT = MIGRATIONS_SQL.split("CREATE OR REPLACE VIEW trainer_profile_source AS")[-1].split("\nFROM ", 1)[0]
+
+def trainer_profile_columns():
+    return set(re.findall(r"\bAS (\w+),?\s*$", TRAINER_PROFILE_SELECT, flags=re.MULTILINE))
+
+TRAINER_PROFILE_COLUMNS = trainer_profile_columns()
+
+SEARCH_PROMPTS = [
+    "tìm pt nữ giảm cân",
+    "tìm pt tự do có ít nhất 3 năm kinh nghiệm",
+    "tìm pt tại gym tăng cơ",
+    "tìm pt nam"
+]
+
+def trainer_queries():
+    return [build_trainer_search_query(prompt) for prompt in SEARCH_PROMPTS] + [
+        build_nearby_trainer_query(106.7009, 10.7769, 5, "pt gần đây có hơn 2 năm kinh nghiệm")
+    ]
+
+@pytest.mark.parametrize("index", range(len(SEARCH_PROMPTS) + 1))
+def test_queries_read_precomputed_profiles(index):
+    sql, params = trainer_queries()[index]
+    assert "trainer_profiles t" in sql
+    # Mục tiêu, gói freelance và hồ sơ chi tiết đã được tính sẵn, không gộp lại mỗi request
+    for source in ('"AspNetUsers"', '"PTGoalTrainings"', '"GoalTrainings"', '"PTFreelancePackages"', '"UserDetails"'):
+        assert source not in sql
+    assert "ARRAY_AGG" not in sql.upper() and "GROUP BY" not in sql.upper()
+    assert set(re.findall(r"\bt\.(\w+)", sql)) <= TRAINER_PROFILE_COLUMNS | {'distance_km'}
+
+@pytest.mark.parametrize("index", range(len(SEARCH_PROMPTS) + 1))
+def test_placeholders_match_params(index):
+    sql, params = trainer_queries()[index]
+    assert placeholders(sql) == set(params)
+
+def test_profile_columns():
+    assert {'goal_trainings', 'is_freelance', 'pt_gym_id', 'pt_latitude', 'pt_longitude', 'experience'} <= TRAINER_PROFILE_COLUMNS
+
+def test_filters_bind_values():
+    sql, params = build_trainer_search_query("tìm pt nữ giảm cân")
+    assert params == {'is_male': False, 'goals': ['Giảm cân']}
+    assert "t.ismale = %(is_male)s" in sql
+    # Lọc mục tiêu bằng toán tử mảng (chỉ mục GIN trên goal_trainings)
+    assert "t.goal_trainings && %(goals)s::TEXT[]" in sql
+
+def test_experience_filter():
+    sql, params = build_trainer_search_query("tìm pt tự do có ít nhất 3 năm kinh nghiệm")
+    assert params == {'exp_years': 3}
+    assert "t.experience >= %(exp_years)s" in sql
+    assert "t.is_freelance = true AND t.pt_gym_id IS NULL" in sql
+
+def test_gym_trainers_join_view():
+    sql, _ = build_trainer_search_query("tìm pt tại gym tăng cơ")
+    assert "INNER JOIN gym_search g ON g.id = t.pt_gym_id" in sql
+
+def test_trainers_cte_without_conditions():
+    cte = build_trainers_cte([])
+    assert "FROM trainer_profiles t" in cte
+    assert "WHERE TRUE" in cte
+    assert "WHERE t.ismale = %(is_male)s AND t.experience > %(exp_years)s" in build_trainers_cte(
+        ['t.ismale = %(is_male)s', '', 't.experience > %(exp_years)s'])
+
+def cte_body(sql, name, next_name):
+    """Phần SQL của CTE name (đến CTE tiếp theo next_name)"""
+    return sql.split(f"{name} AS (", 1)[1].split(f"{next_name} AS (", 1)[0]
+
+def test_nearby_bounding_box_params():
+    _, params = build_nearby_trainer_query(106.7009, 10.7769, 5)
+    assert params['max_distance_km'] == 5
+    assert params['max_latitude'] - params['min_latitude'] == pytest.approx(2 * 5 / KM_PER_DEGREE)
+    assert params['min_latitude'] < 10.7769 < params['max_latitude']
+    # Kinh độ rộng hơn vĩ độ (1 độ kinh tuyến ngắn hơn khi rời xích đạo)
+    assert params['max_longitude'] - params['min_longitude'] > params['max_latitude'] - params['min_latitude']
+
+def test_location_filter_runs_before_trainers_are_joined():
+    sql, _ = build_nearby_trainer_query(106.7009, 10.7769, 5, "pt gần đây có hơn 2 năm kinh nghiệm")
+    ranked_gyms = cte_body(sql, "RankedGyms", "GymPTs")
+    assert "FROM trainer_profiles" not in ranked_gyms and "JOIN trainer_profiles" not in ranked_gyms
+    assert "point(g.longitude, g.latitude) <@ box(" in ranked_gyms
+    assert "d.distance_km <= %(max_distance_km)s" in ranked_gyms
+    # PT gym chỉ được ghép với gym trong bán kính, lọc kinh nghiệm ngay khi ghép
+    gym_pts = cte_body(sql, "GymPTs", "FreelanceCandidates")
+    assert "FROM RankedGyms g" in gym_pts
+    assert "INNER JOIN trainer_profiles t ON t.pt_gym_id = g.gym_id AND t.experience > %(exp_years)s" in gym_pts
+    freelance = cte_body(sql, "FreelanceCandidates", "FreelancePTs")
+    assert "point(t.pt_longitude, t.pt_latitude) <@ box(" in freelance
+    assert "d.distance_km <= %(max_distance_km)s" in freelance
+    assert freelance.count("t.experience > %(exp_years)s") == 2
+    # PT chưa có vị trí: chỉ 10 PT kinh nghiệm cao nhất
+    assert "LIMIT 10" in freelance
+
+def test_haversine_computed_once_per_row():
+    sql, _ = build_nearby_trainer_query(106.7009, 10.7769, 5)
+    assert sql.count("CROSS JOIN LATERAL") == 2
+    assert "ROW_NUMBER() OVER (ORDER BY g.distance_km ASC" in sql
+
+def test_no_distance_limit_has_no_location_filter():
+    sql, params = build_nearby_trainer_query(106.7009, 10.7769, None, nearest=True)
+    assert "<@ box(" not in sql and "max_distance_km" not in params
+    assert not any(name.startswith(('min_', 'max_')) for name in params)
+    assert placeholders(sql) == set(params)
+
+def test_candidate_margin_query():
+    sql, params = build_nearby_trainer_query(106.7009, 10.7769, 5, candidate_margin_km=1.5)
+    assert params['candidate_margin_km'] == 1.5
+    assert placeholders(sql) == set(params)
+    assert "mixed_rn" not in sql
+
+def test_freelance_coordinates_are_typed():
+    assert 'CAST(pt."Latitude" AS DOUBLE PRECISION) AS pt_latitude' in TRAINER_PROFILE_SELECT
+    assert 'CAST(pt."Longitude" AS DOUBLE PRECISION) AS pt_longitude' in TRAINER_PROFILE_SELECT
+
+@pytest.mark.parametrize("max_distance_km, nearest", [(5, False), (5, True), (None, True)])
+def test_freelance_location_matches_gist_index(max_distance_km, nearest):
+    sql, _ = build_nearby_trainer_query(106.7009, 10.7769, max_distance_km, nearest=nearest)
+    expression, predicate = re.findall(
+        r"ON trainer_profiles USING gist \((point\(\w+, \w+\))\)\s*WHERE ([^;]+);", MIGRATIONS_SQL)[-1]
+    freelance = cte_body(sql, "FreelanceCandidates", "FreelancePTs").split("UNION ALL", 1)[0]
+    used = set(re.findall(r"(point\(t\.\w+, t\.\w+\)) <(?:@|->)", freelance))
+    assert used and {point.replace("t.", "") for point in used} == {expression}
+    # Điều kiện của chỉ mục một phần có trong truy vấn để planner dùng được chỉ mục
+    for condition in " ".join(predicate.split()).split(" AND "):
+        assert f"t.{condition}" in freelance
+    assert "CAST(" not in sql
+
+def test_nearest_trainers_take_index_ordered_candidates():
+    sql, params = build_nearby_trainer_query(106.7009, 10.7769, None, nearest=True)
+    assert params == {'latitude': 10.7769, 'longitude': 106.7009, 'candidate_limit': NEARBY_KNN_LIMIT * NEARBY_KNN_CANDIDATE_FACTOR}
+    ranked_gyms = cte_body(sql, "RankedGyms", "GymPTs")
+    assert "ORDER BY point(g.longitude, g.latitude) <-> point(%(longitude)s, %(latitude)s)" in ranked_gyms
+    assert "LIMIT %(candidate_limit)s" in ranked_gyms
+    freelance = cte_body(sql, "FreelanceCandidates", "FreelancePTs").split("UNION ALL", 1)[0]
+    assert "ORDER BY point(t.pt_longitude, t.pt_latitude) <-> point(%(longitude)s, %(latitude)s)" in freelance
+    assert "LIMIT %(candidate_limit)s" in freelance
+
+def test_radius_trainers_have_no_candidate_limit():
+    sql, params = build_nearby_trainer_query(106.7009, 10.7769, 5)
+    assert "<->" not in sql and 'candidate_limit' not in params
+
+@pytest.mark.parametrize("search_mode, nearest", [('knn', True), ('radius', False)])
+def test_search_mode_selects_nearby_query(monkeypatch, search_mode, nearest):
+    monkeypatch.setattr(pt_search_service, "NEARBY_SEARCH_MODE", search_mode)
+    sql, params = build_trainer_search_query("tìm pt gần đây", 106.7009, 10.7769)
+    assert ('candidate_limit' in params) == nearest
+    assert ("<->" in sql) == nearest
+    assert placeholders(sql) == set(params)